@@ -36,6 +36,12 @@ extern "C" {
  */
 typedef struct svdep_s *svdep_t;
 
+/**
+ * Opaque handle to a scan pool, which shares file state between the
+ * contexts of a multi-unit build
+ */
+typedef struct svdep_pool_s *svdep_pool_t;
+
 /**
  * Create a new SVDep context
  * @return A new context handle, or NULL on failure
@@ -64,6 +70,59 @@ SVDEP_EXPORT int svdep_add_incdir(svdep_t ctx, const char *path);
  */
 SVDEP_EXPORT int svdep_add_root_file(svdep_t ctx, const char *path);
 
+/**
+ * Add a user-supplied macro definition (equivalent to +define+name=value)
+ * @param ctx The context
+ * @param name The macro name
+ * @param value The macro value, or NULL for a valueless define
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_add_define(svdep_t ctx, const char *name, const char *value);
+
+/**
+ * Remove all user-supplied macro definitions. Used to re-run svdep_build
+ * under a different define set. Directive skeletons scanned by earlier
+ * builds on the same context are reused.
+ * @param ctx The context
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_clear_defines(svdep_t ctx);
+
+/**
+ * Select compilation-unit mode. When enabled, macro state flows through
+ * includes in order and across root files, as in a single-unit compile.
+ * When disabled (the default), each file starts from the user defines.
+ * @param ctx The context
+ * @param enable 1 to enable compilation-unit mode, 0 to disable
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_set_compilation_unit(svdep_t ctx, int enable);
+
+/**
+ * Select path canonicalization. When enabled, files are recorded by their
+ * real path, so a file reached through different include directories,
+ * '..' segments or symlinks is stat'd and scanned once. The path a file
+ * was first reached by is recorded as its "spelled" path when it differs.
+ * Disabled by default.
+ * @param ctx The context
+ * @param enable 1 to enable canonicalization, 0 to disable
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_set_canonical(svdep_t ctx, int enable);
+
+/**
+ * Define a path variable, making collections relocatable. JSON from
+ * svdep_get_json writes paths under dir as "${name}" followed by the rest
+ * of the path (the longest matching directory wins). svdep_load_json
+ * expands "${name}" with dir, which may be another workspace's directory,
+ * and fails if the JSON uses a variable that isn't defined.
+ * @param ctx The context
+ * @param name Variable name
+ * @param dir Directory the variable stands for
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_add_path_var(svdep_t ctx, const char *name, const char *dir);
+
 /**
  * Build the file collection by processing all root files
  * @param ctx The context
@@ -81,13 +140,32 @@ SVDEP_EXPORT int svdep_build(svdep_t ctx);
 SVDEP_EXPORT const char *svdep_get_json(svdep_t ctx);
 
 /**
- * Load a file collection from JSON
+ * Load a file collection from JSON. Include guards recorded in the
+ * collection are remembered, so that a later svdep_build on the same
+ * context can skip unchanged guarded headers whose guard is defined.
  * @param ctx The context
  * @param json The JSON string
  * @return 0 on success, non-zero on failure
  */
 SVDEP_EXPORT int svdep_load_json(svdep_t ctx, const char *json);
 
+/**
+ * Load the collections of many contexts, one per compilation unit, from a
+ * single JSON document. A file recorded alike by many units, such as a
+ * shared header, is written and parsed once. The document is an object
+ * with a "files" array of file entries, as in the "file_info" of
+ * svdep_load_json, followed by a "units" array with an element per
+ * context. Each element is null, leaving the context without a
+ * collection, or an object with "root_files" (file entries) and
+ * "file_info" (indexes into "files"). Paths are expanded with the path
+ * variables of the first context.
+ * @param ctxs The contexts to load
+ * @param n The number of contexts
+ * @param json The JSON string
+ * @return 0 on success, non-zero on failure, with the error set on every context
+ */
+SVDEP_EXPORT int svdep_load_json_units(svdep_t *ctxs, int n, const char *json);
+
 /**
  * Check if the file collection is up to date
  * @param ctx The context with loaded JSON
@@ -96,6 +174,192 @@ SVDEP_EXPORT int svdep_load_json(svdep_t ctx, const char *json);
  */
 SVDEP_EXPORT int svdep_check_up_to_date(svdep_t ctx, double last_timestamp);
 
+/**
+ * Like svdep_check_up_to_date, but the check doesn't stop at the first
+ * stale file. Every stale file is recorded in the check result, and a
+ * root-file mismatch doesn't end the check early.
+ * @param ctx The context with loaded JSON
+ * @param last_timestamp The timestamp to check against
+ * @return 1 if up to date, 0 if not, -1 on error
+ */
+SVDEP_EXPORT int svdep_check_up_to_date_all(svdep_t ctx, double last_timestamp);
+
+/**
+ * Get the outcome of the last svdep_check_up_to_date or
+ * svdep_check_up_to_date_all call, as a JSON object with the keys
+ * up_to_date, timestamp and stale (a list of {path, recorded, current},
+ * where current is null for a missing file). When the root files differ
+ * from those in the collection, roots_recorded and roots_requested are
+ * also set. The returned string is valid until the next call to
+ * svdep_get_check_result or until the context is destroyed.
+ * @param ctx The context
+ * @return JSON string, or NULL on failure
+ */
+SVDEP_EXPORT const char *svdep_get_check_result(svdep_t ctx);
+
+/**
+ * Like svdep_check_up_to_date_all, but gives a verdict for each root file
+ * added with svdep_add_root_file, in the same order: 1 if neither the root
+ * nor anything it includes changed, 0 otherwise. Each file is stat'd once,
+ * however many roots include it. A root missing from the collection is
+ * stale. The full outcome is available from svdep_get_check_result.
+ * @param ctx The context with loaded JSON
+ * @param last_timestamp The timestamp to check against
+ * @param verdicts Receives one verdict per root file
+ * @param n The size of verdicts, which must equal the number of root files
+ * @return 1 if the whole collection is up to date, 0 if not, -1 on error
+ */
+SVDEP_EXPORT int svdep_check_roots(svdep_t ctx, double last_timestamp, int *verdicts, int n);
+
+/**
+ * Check many contexts at once, one per compilation unit. Each context
+ * must have its collection loaded (svdep_load_json) and its root files
+ * added, as for svdep_check_up_to_date. The files recorded in all the
+ * collections are gathered first, and each distinct path is stat'd once,
+ * however many units include it. Each context's check result is then
+ * available from svdep_get_check_result.
+ * @param ctxs The contexts to check
+ * @param n The number of contexts
+ * @param last_timestamps The reference time of each context
+ * @param verdicts Receives 1 for each up-to-date context, 0 otherwise
+ * @param collect_all 1 to record every stale file, as for
+ *        svdep_check_up_to_date_all, 0 to stop at the first
+ * @return 0 on success, -1 on error
+ */
+SVDEP_EXPORT int svdep_check_units(svdep_t *ctxs, int n, const double *last_timestamps,
+                                   int *verdicts, int collect_all);
+
+/**
+ * Select the preprocessor scan path used by svdep_build. The fast path
+ * (the default) skips between directive, comment and string delimiters
+ * using memchr/SIMD searches. The byte-wise path is kept as a reference.
+ * @param ctx The context
+ * @param enable 1 to use the fast path, 0 for the byte-wise scanner
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_set_fast_scan(svdep_t ctx, int enable);
+
+/**
+ * Load a scan cache written by svdep_save_scan_cache. The cache holds the
+ * directive skeleton of each file, keyed by path, modification time and
+ * size. svdep_build replays the skeletons of unchanged files instead of
+ * reading them. A missing or unusable cache file is treated as empty.
+ * @param ctx The context
+ * @param path The cache file path
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_load_scan_cache(svdep_t ctx, const char *path);
+
+/**
+ * Save the directive skeletons of all files scanned by this context.
+ * The cache file is replaced atomically.
+ * @param ctx The context
+ * @param path The cache file path
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_save_scan_cache(svdep_t ctx, const char *path);
+
+/**
+ * Use a content-addressed scan store shared between workspaces and
+ * machines. Files missing from the scan cache are looked up in the store
+ * by a digest of their contents before being scanned, and new scans are
+ * added to it. Entries are written atomically, so many processes may
+ * share a store directory. Store failures are ignored.
+ * @param ctx The context
+ * @param dir The store directory, created if needed
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_set_scan_store(svdep_t ctx, const char *dir);
+
+/**
+ * Get the files that directly include a file in the context's collection
+ * (from svdep_build or svdep_load_json), as a JSON array of paths. The
+ * reverse index is built on the first query and kept until the collection
+ * changes. The returned string is valid until the next reverse-dependency
+ * query or until the context is destroyed.
+ * @param ctx The context
+ * @param path The included file, as recorded in the collection
+ * @return JSON string, or NULL on failure
+ */
+SVDEP_EXPORT const char *svdep_get_includers(svdep_t ctx, const char *path);
+
+/**
+ * Get the root files that depend on a file, directly or through includes,
+ * as a JSON array of paths in root-file order. A root file depends on
+ * itself. The returned string is valid until the next reverse-dependency
+ * query or until the context is destroyed.
+ * @param ctx The context
+ * @param path The file, as recorded in the collection
+ * @return JSON string, or NULL on failure
+ */
+SVDEP_EXPORT const char *svdep_get_affected_roots(svdep_t ctx, const char *path);
+
+/**
+ * Get the counters and per-phase timings accumulated by this context, as
+ * a JSON object. The keys match the fields of the Python FileDepsReport:
+ * files_scanned, bytes_read, stats, include_probes, include_probes_failed,
+ * include_cache_hits, scan_cache_hits, scan_cache_misses, files_checked,
+ * and time_stat, time_read, time_scan, time_resolve, time_json and
+ * time_total in seconds. The returned string is valid until the next call
+ * to svdep_get_report or until the context is destroyed.
+ * @param ctx The context
+ * @return JSON string, or NULL on failure
+ */
+SVDEP_EXPORT const char *svdep_get_report(svdep_t ctx);
+
+/**
+ * Create a scan pool for svdep_build_units
+ * @return A new pool handle, or NULL on failure
+ */
+SVDEP_EXPORT svdep_pool_t svdep_pool_create(void);
+
+/**
+ * Destroy a scan pool. No build may be using it
+ * @param pool The pool to destroy
+ */
+SVDEP_EXPORT void svdep_pool_destroy(svdep_pool_t pool);
+
+/**
+ * Load a scan cache (see svdep_load_scan_cache) into a pool
+ * @param pool The pool
+ * @param path The cache file path
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_pool_load_scan_cache(svdep_pool_t pool, const char *path);
+
+/**
+ * Use a content-addressed scan store for files scanned through a pool
+ * (see svdep_set_scan_store). Must not be called while builds are running
+ * @param pool The pool
+ * @param dir The store directory, created if needed
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_pool_set_scan_store(svdep_pool_t pool, const char *dir);
+
+/**
+ * Save the directive skeletons of all files scanned through a pool.
+ * The cache file is replaced atomically.
+ * @param pool The pool
+ * @param path The cache file path
+ * @return 0 on success, non-zero on failure
+ */
+SVDEP_EXPORT int svdep_pool_save_scan_cache(svdep_pool_t pool, const char *path);
+
+/**
+ * Build many contexts, one per compilation unit, on up to 'jobs' threads.
+ * Each context is set up as for svdep_build. The contexts share the pool,
+ * so a file included by several units is stat'd once, and read and
+ * scanned at most once, per call. Skeletons held by the pool are reused
+ * by later calls for files that haven't changed. Every context is built
+ * even if another fails; failed contexts report svdep_get_error.
+ * @param pool The pool
+ * @param ctxs The contexts to build. Each must appear only once
+ * @param n The number of contexts
+ * @param jobs The maximum number of threads, or 0 for one per CPU
+ * @return 0 if every build succeeded, non-zero otherwise
+ */
+SVDEP_EXPORT int svdep_build_units(svdep_pool_t pool, svdep_t *ctxs, int n, int jobs);
+
 /**
  * Get the last error message
  * @param ctx The context
@@ -0,0 +1,73 @@
+/*
+ * CheckResult.cpp
+ *
+ * Outcome of an up-to-date check
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#include "CheckResult.h"
+#include "FileCollection.h"
+#include <iomanip>
+#include <sstream>
+
+namespace svdep {
+
+void CheckResult::clear() {
+    timestamp = 0;
+    stale.clear();
+    rootMismatch = false;
+    rootsRecorded.clear();
+    rootsRequested.clear();
+}
+
+static void writeList(std::ostringstream& os, const std::vector<std::string>& l) {
+    os << "[";
+    for (size_t i = 0; i < l.size(); i++) {
+        if (i > 0) os << ", ";
+        os << "\"" << escapeJson(l[i]) << "\"";
+    }
+    os << "]";
+}
+
+std::string CheckResult::toJson() const {
+    std::ostringstream os;
+    os << std::fixed << std::setprecision(6);
+    os << "{\"up_to_date\": " << (upToDate() ? "true" : "false");
+    os << ", \"timestamp\": " << timestamp;
+    os << ", \"stale\": [";
+    for (size_t i = 0; i < stale.size(); i++) {
+        if (i > 0) os << ", ";
+        os << "{\"path\": \"" << escapeJson(stale[i].path) << "\"";
+        os << ", \"recorded\": " << stale[i].recorded;
+        os << ", \"current\": ";
+        if (stale[i].current == 0) {
+            os << "null";
+        } else {
+            os << stale[i].current;
+        }
+        os << "}";
+    }
+    os << "]";
+    if (rootMismatch) {
+        os << ", \"roots_recorded\": ";
+        writeList(os, rootsRecorded);
+        os << ", \"roots_requested\": ";
+        writeList(os, rootsRequested);
+    }
+    os << "}";
+    return os.str();
+}
+
+} // namespace svdep
@@ -0,0 +1,56 @@
+/*
+ * CheckResult.h
+ *
+ * Outcome of an up-to-date check
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef CHECKRESULT_H
+#define CHECKRESULT_H
+
+#include <string>
+#include <vector>
+
+namespace svdep {
+
+struct StaleFile {
+    std::string path;
+    // Timestamp recorded in the collection
+    double recorded;
+    // Current modification time, or 0 if the file is missing
+    double current;
+};
+
+/**
+ * Mirrors the Python CheckResult. 'stale' holds the first stale file found,
+ * or every stale file when the check collected all of them.
+ */
+struct CheckResult {
+    double timestamp = 0;
+    std::vector<StaleFile> stale;
+    bool rootMismatch = false;
+    std::vector<std::string> rootsRecorded;
+    std::vector<std::string> rootsRequested;
+
+    bool upToDate() const { return !rootMismatch && stale.empty(); }
+
+    void clear();
+
+    std::string toJson() const;
+};
+
+} // namespace svdep
+
+#endif /* CHECKRESULT_H */
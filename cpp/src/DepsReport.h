@@ -0,0 +1,91 @@
+/*
+ * DepsReport.h
+ *
+ * Counters and per-phase timings of context operations
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef DEPSREPORT_H
+#define DEPSREPORT_H
+
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <string>
+
+namespace svdep {
+
+/**
+ * Mirrors the Python FileDepsReport. Counters and timings accumulate over
+ * the life of a context. Times are in seconds.
+ */
+struct DepsReport {
+    int64_t files_scanned = 0;
+    int64_t bytes_read = 0;
+    int64_t stats = 0;
+    int64_t include_probes = 0;
+    int64_t include_probes_failed = 0;
+    int64_t include_cache_hits = 0;
+    int64_t scan_cache_hits = 0;
+    int64_t scan_cache_misses = 0;
+    int64_t scan_store_hits = 0;
+    int64_t scan_store_misses = 0;
+    int64_t files_checked = 0;
+    double time_stat = 0;
+    double time_read = 0;
+    double time_scan = 0;
+    double time_resolve = 0;
+    double time_json = 0;
+    double time_total = 0;
+
+    std::string toJson() const {
+        char buf[1024];
+        snprintf(buf, sizeof(buf),
+            "{\"files_scanned\": %lld, \"bytes_read\": %lld, \"stats\": %lld, "
+            "\"include_probes\": %lld, \"include_probes_failed\": %lld, "
+            "\"include_cache_hits\": %lld, \"scan_cache_hits\": %lld, "
+            "\"scan_cache_misses\": %lld, \"scan_store_hits\": %lld, "
+            "\"scan_store_misses\": %lld, \"files_checked\": %lld, "
+            "\"time_stat\": %.9f, \"time_read\": %.9f, \"time_scan\": %.9f, "
+            "\"time_resolve\": %.9f, \"time_json\": %.9f, \"time_total\": %.9f}",
+            (long long)files_scanned, (long long)bytes_read, (long long)stats,
+            (long long)include_probes, (long long)include_probes_failed,
+            (long long)include_cache_hits, (long long)scan_cache_hits,
+            (long long)scan_cache_misses, (long long)scan_store_hits,
+            (long long)scan_store_misses, (long long)files_checked,
+            time_stat, time_read, time_scan, time_resolve, time_json, time_total);
+        return buf;
+    }
+};
+
+/**
+ * Adds the time between construction and destruction to a report field
+ */
+class PhaseTimer {
+public:
+    explicit PhaseTimer(double& acc) : m_acc(acc), m_start(std::chrono::steady_clock::now()) {}
+
+    ~PhaseTimer() {
+        m_acc += std::chrono::duration<double>(std::chrono::steady_clock::now() - m_start).count();
+    }
+
+private:
+    double& m_acc;
+    std::chrono::steady_clock::time_point m_start;
+};
+
+} // namespace svdep
+
+#endif /* DEPSREPORT_H */
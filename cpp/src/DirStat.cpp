@@ -0,0 +1,151 @@
+/*
+ * DirStat.cpp
+ *
+ * Directory-relative file stats
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef _GNU_SOURCE
+#define _GNU_SOURCE
+#endif
+#include "DirStat.h"
+#include <sys/stat.h>
+
+#ifndef _WIN32
+#include <cerrno>
+#include <fcntl.h>
+#include <unistd.h>
+#endif
+
+namespace svdep {
+
+DirStat::DirStat(size_t maxDirs) : m_maxDirs(maxDirs) {
+}
+
+DirStat::~DirStat() {
+    clear();
+}
+
+void DirStat::clear() {
+    std::lock_guard<std::mutex> lock(m_mutex);
+#ifndef _WIN32
+    for (const auto& kv : m_dirFds) {
+        if (kv.second >= 0) {
+            close(kv.second);
+        }
+    }
+#endif
+    m_dirFds.clear();
+}
+
+bool DirStat::statPath(const std::string& path, FileStat& st) {
+    st = FileStat();
+    struct stat sb;
+    if (::stat(path.c_str(), &sb) != 0) {
+        return false;
+    }
+    st.exists = true;
+#ifdef __APPLE__
+    st.mtimeNs = sb.st_mtimespec.tv_sec * 1000000000LL + sb.st_mtimespec.tv_nsec;
+    st.timestamp = sb.st_mtimespec.tv_sec + sb.st_mtimespec.tv_nsec / 1e9;
+#elif defined(_WIN32)
+    st.mtimeNs = static_cast<int64_t>(sb.st_mtime) * 1000000000LL;
+    st.timestamp = static_cast<double>(sb.st_mtime);
+#else
+    st.mtimeNs = sb.st_mtim.tv_sec * 1000000000LL + sb.st_mtim.tv_nsec;
+    st.timestamp = sb.st_mtim.tv_sec + sb.st_mtim.tv_nsec / 1e9;
+#endif
+    st.size = sb.st_size;
+    return true;
+}
+
+#ifdef _WIN32
+
+int DirStat::dirFd(const std::string& dir) {
+    return -1;
+}
+
+bool DirStat::stat(const std::string& path, FileStat& st) {
+    return statPath(path, st);
+}
+
+#else
+
+int DirStat::dirFd(const std::string& dir) {
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto it = m_dirFds.find(dir);
+    if (it != m_dirFds.end()) {
+        return it->second;
+    }
+    if (m_dirFds.size() >= m_maxDirs) {
+        return -1;
+    }
+    int fd = open(dir.c_str(), O_RDONLY | O_DIRECTORY | O_CLOEXEC);
+    if (fd < 0 && (errno == ENOENT || errno == ENOTDIR)) {
+        fd = DIR_MISSING;
+    }
+    m_dirFds[dir] = fd;
+    return fd;
+}
+
+bool DirStat::stat(const std::string& path, FileStat& st) {
+    size_t pos = path.rfind('/');
+    if (pos == std::string::npos || pos + 1 == path.size()) {
+        return statPath(path, st);
+    }
+    int fd = dirFd(pos == 0 ? std::string("/") : path.substr(0, pos));
+    if (fd == DIR_MISSING) {
+        // Common for include probes. No need to look any further
+        st = FileStat();
+        return false;
+    } else if (fd < 0) {
+        return statPath(path, st);
+    }
+    const char *name = path.c_str() + pos + 1;
+
+    st = FileStat();
+#if defined(__linux__) && defined(STATX_MTIME)
+    struct statx sx;
+    if (statx(fd, name, AT_STATX_SYNC_AS_STAT, STATX_MTIME | STATX_SIZE, &sx) == 0) {
+        st.exists = true;
+        st.mtimeNs = sx.stx_mtime.tv_sec * 1000000000LL + sx.stx_mtime.tv_nsec;
+        st.timestamp = sx.stx_mtime.tv_sec + sx.stx_mtime.tv_nsec / 1e9;
+        st.size = sx.stx_size;
+        return true;
+    }
+    if (errno != ENOSYS) {
+        return false;
+    }
+    // Kernel without statx. Fall through to fstatat
+#endif
+    struct stat sb;
+    if (fstatat(fd, name, &sb, 0) != 0) {
+        return false;
+    }
+    st.exists = true;
+#ifdef __APPLE__
+    st.mtimeNs = sb.st_mtimespec.tv_sec * 1000000000LL + sb.st_mtimespec.tv_nsec;
+    st.timestamp = sb.st_mtimespec.tv_sec + sb.st_mtimespec.tv_nsec / 1e9;
+#else
+    st.mtimeNs = sb.st_mtim.tv_sec * 1000000000LL + sb.st_mtim.tv_nsec;
+    st.timestamp = sb.st_mtim.tv_sec + sb.st_mtim.tv_nsec / 1e9;
+#endif
+    st.size = sb.st_size;
+    return true;
+}
+
+#endif
+
+} // namespace svdep
@@ -0,0 +1,80 @@
+/*
+ * DirStat.h
+ *
+ * Directory-relative file stats
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef DIRSTAT_H
+#define DIRSTAT_H
+
+#include <cstdint>
+#include <mutex>
+#include <string>
+#include <unordered_map>
+
+namespace svdep {
+
+struct FileStat {
+    bool exists = false;
+    double timestamp = 0;
+    int64_t mtimeNs = 0;
+    int64_t size = 0;
+};
+
+/**
+ * Stats files relative to an open descriptor of their directory, so the
+ * kernel resolves a long directory path once rather than once per file.
+ * Where available, statx() is asked for only the modification time and
+ * size. Files in a directory found not to exist (common for include
+ * probes) are reported missing without a further system call. Files in a
+ * directory that can't be opened, or beyond 'maxDirs' directories, are
+ * stat'd by full path. Elsewhere (eg Windows), every file is stat'd by
+ * full path.
+ *
+ * Descriptors stay open until clear(), so a directory replaced in the
+ * meantime would still be seen as it was. Callers clear once per build
+ * or check. Safe to use from several threads, but clear() must not run
+ * concurrently with stat().
+ */
+class DirStat {
+public:
+    explicit DirStat(size_t maxDirs = 1024);
+    ~DirStat();
+
+    // Returns false, with st.exists false, if the file doesn't exist
+    bool stat(const std::string& path, FileStat& st);
+
+    // Close all directory descriptors
+    void clear();
+
+private:
+    // Descriptor of a directory, DIR_MISSING if it doesn't exist, or -1
+    // if it can't be used
+    int dirFd(const std::string& dir);
+
+    static const int DIR_MISSING = -2;
+
+    // Stat by full path
+    static bool statPath(const std::string& path, FileStat& st);
+
+    size_t m_maxDirs;
+    std::mutex m_mutex;
+    std::unordered_map<std::string, int> m_dirFds;
+};
+
+} // namespace svdep
+
+#endif /* DIRSTAT_H */
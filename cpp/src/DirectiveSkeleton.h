@@ -0,0 +1,61 @@
+/*
+ * DirectiveSkeleton.h
+ *
+ * Macro-state-independent summary of a file's preprocessor directives
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef DIRECTIVESKELETON_H
+#define DIRECTIVESKELETON_H
+
+#include <string>
+#include <vector>
+
+namespace svdep {
+
+enum class DirectiveKind {
+    Include,
+    Define,
+    Undef,
+    Ifdef,
+    Ifndef,
+    Elsif,
+    Else,
+    Endif
+};
+
+struct DirectiveEvent {
+    DirectiveKind kind;
+    // Include filename or macro name. Empty for `else and `endif
+    std::string arg;
+
+    DirectiveEvent(DirectiveKind k, const std::string& a) : kind(k), arg(a) {}
+};
+
+/**
+ * The ordered list of dependency-relevant directives in a file, recorded
+ * regardless of whether they are active. Replaying a skeleton against a
+ * macro table gives the same includes as scanning the source under that
+ * macro table.
+ */
+struct DirectiveSkeleton {
+    std::vector<DirectiveEvent> events;
+    // Include-guard macro, if the file uses the classic guard pattern
+    std::string guard;
+};
+
+} // namespace svdep
+
+#endif /* DIRECTIVESKELETON_H */
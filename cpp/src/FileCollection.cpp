@@ -18,13 +18,15 @@
  * limitations under the License.
  */
 #include "FileCollection.h"
+#include <algorithm>
+#include <unordered_set>
 #include <sstream>
 #include <iomanip>
 #include <cstring>
 
 namespace svdep {
 
-FileCollection::FileCollection() {
+FileCollection::FileCollection() : m_indexValid(false) {
 }
 
 FileCollection::~FileCollection() {
@@ -33,10 +35,129 @@ FileCollection::~FileCollection() {
 void FileCollection::clear() {
     root_files.clear();
     file_info.clear();
+    invalidateIndex();
+}
+
+// Calls f for each distinct element of includes, in order
+template <class F> static void forEachUnique(const std::vector<std::string>& includes, F f) {
+    std::unordered_set<std::string> seen;
+    for (const auto& inc : includes) {
+        if (seen.insert(inc).second) {
+            f(inc);
+        }
+    }
+}
+
+void FileCollection::buildIndex() {
+    m_includers.clear();
+    m_affectedRoots.clear();
+    for (const auto& kv : file_info) {
+        forEachUnique(kv.second.includes, [&](const std::string& inc) {
+            m_includers[inc].push_back(kv.first);
+        });
+    }
+    m_indexValid = true;
+}
+
+const std::vector<std::string>& FileCollection::getIncluders(const std::string& path) {
+    static const std::vector<std::string> empty;
+    if (!m_indexValid) {
+        buildIndex();
+    }
+    auto it = m_includers.find(path);
+    return (it != m_includers.end()) ? it->second : empty;
+}
+
+const std::vector<std::string>& FileCollection::getAffectedRoots(const std::string& path) {
+    if (!m_indexValid) {
+        buildIndex();
+    }
+    auto it = m_affectedRoots.find(path);
+    if (it != m_affectedRoots.end()) {
+        return it->second;
+    }
+
+    // Walk the reverse edges
+    std::unordered_set<std::string> seen = {path};
+    std::vector<std::string> stack = {path};
+    while (!stack.empty()) {
+        std::string p = stack.back();
+        stack.pop_back();
+        auto inc = m_includers.find(p);
+        if (inc == m_includers.end()) {
+            continue;
+        }
+        for (const auto& includer : inc->second) {
+            if (seen.insert(includer).second) {
+                stack.push_back(includer);
+            }
+        }
+    }
+
+    std::vector<std::string>& ret = m_affectedRoots[path];
+    for (const auto& root : root_files) {
+        if (seen.count(root.name)) {
+            ret.push_back(root.name);
+        }
+    }
+    return ret;
+}
+
+// Remove path from a list of includers. It may be absent if file_info was
+// modified without invalidating the index
+static void eraseIncluder(std::vector<std::string>& includers, const std::string& path) {
+    auto it = std::find(includers.begin(), includers.end(), path);
+    if (it != includers.end()) {
+        includers.erase(it);
+    }
+}
+
+void FileCollection::updateFile(const FileInfo& info) {
+    auto it = file_info.find(info.name);
+    if (m_indexValid) {
+        std::unordered_set<std::string> oldIncs;
+        if (it != file_info.end()) {
+            oldIncs.insert(it->second.includes.begin(), it->second.includes.end());
+        }
+        std::unordered_set<std::string> newIncs(info.includes.begin(), info.includes.end());
+        for (const auto& inc : oldIncs) {
+            if (!newIncs.count(inc)) {
+                eraseIncluder(m_includers[inc], info.name);
+            }
+        }
+        forEachUnique(info.includes, [&](const std::string& inc) {
+            if (!oldIncs.count(inc)) {
+                m_includers[inc].push_back(info.name);
+            }
+        });
+        // Any file's set of affected roots may have changed
+        m_affectedRoots.clear();
+    }
+    file_info[info.name] = info;
+}
+
+void FileCollection::removeFile(const std::string& path) {
+    auto it = file_info.find(path);
+    if (it == file_info.end()) {
+        return;
+    }
+    if (m_indexValid) {
+        forEachUnique(it->second.includes, [&](const std::string& inc) {
+            eraseIncluder(m_includers[inc], path);
+        });
+        m_affectedRoots.clear();
+    }
+    file_info.erase(it);
+}
+
+void FileCollection::invalidateIndex() {
+    m_indexValid = false;
+    m_includers.clear();
+    m_affectedRoots.clear();
 }
 
 // Simple JSON escape
-static std::string escapeJson(const std::string& s) {
+std::string escapeJson(const std::string& s) {
     std::ostringstream o;
     for (char c : s) {
         switch (c) {
@@ -58,20 +179,36 @@ static std::string escapeJson(const std::string& s) {
     return o.str();
 }
 
-static void writeFileInfo(std::ostringstream& os, const FileInfo& info) {
+static void writePath(std::ostringstream& os, const std::string& path, const PathVars *vars) {
+    os << "\"" << escapeJson(vars ? vars->encode(path) : path) << "\"";
+}
+
+static void writeFileInfo(std::ostringstream& os, const FileInfo& info, const PathVars *vars) {
     os << "{";
-    os << "\"name\": \"" << escapeJson(info.name) << "\", ";
+    os << "\"name\": ";
+    writePath(os, info.name, vars);
+    os << ", ";
     os << "\"timestamp\": " << std::fixed << std::setprecision(6) << info.timestamp << ", ";
     os << "\"includes\": [";
     for (size_t i = 0; i < info.includes.size(); i++) {
         if (i > 0) os << ", ";
-        os << "\"" << escapeJson(info.includes[i]) << "\"";
+        writePath(os, info.includes[i], vars);
     }
     os << "]";
+    if (!info.guard.empty()) {
+        os << ", \"guard\": \"" << escapeJson(info.guard) << "\"";
+    }
+    if (info.changes) {
+        os << ", \"changes\": " << info.changes;
+    }
+    if (!info.spelled.empty()) {
+        os << ", \"spelled\": ";
+        writePath(os, info.spelled, vars);
+    }
     os << "}";
 }
 
-std::string FileCollection::toJson() const {
+std::string FileCollection::toJson(const PathVars *vars) const {
     std::ostringstream os;
     os << "{";
     
@@ -79,7 +216,7 @@ std::string FileCollection::toJson() const {
     os << "\"root_files\": [";
     for (size_t i = 0; i < root_files.size(); i++) {
         if (i > 0) os << ", ";
-        writeFileInfo(os, root_files[i]);
+        writeFileInfo(os, root_files[i], vars);
     }
     os << "], ";
     
@@ -89,8 +226,9 @@ std::string FileCollection::toJson() const {
     for (const auto& kv : file_info) {
         if (!first) os << ", ";
         first = false;
-        os << "\"" << escapeJson(kv.first) << "\": ";
-        writeFileInfo(os, kv.second);
+        writePath(os, kv.first, vars);
+        os << ": ";
+        writeFileInfo(os, kv.second, vars);
     }
     os << "}";
     
@@ -101,7 +239,9 @@ std::string FileCollection::toJson() const {
 // Simple JSON parser helpers
 class JsonParser {
 public:
-    JsonParser(const std::string& json) : m_json(json), m_pos(0) {}
+    JsonParser(const std::string& json, const PathVars& vars) : m_json(json), m_pos(0), m_vars(vars) {}
+
+    const std::string& getError() const { return m_error; }
 
     void skipWhitespace() {
         while (m_pos < m_json.size() && 
@@ -146,6 +286,15 @@ public:
         return result;
     }
 
+    // Parse a path, expanding any path variable
+    std::string parsePath() {
+        std::string ret;
+        if (!m_vars.decode(parseString(), ret, m_error)) {
+            return "";
+        }
+        return ret;
+    }
+
     double parseNumber() {
         skipWhitespace();
         size_t start = m_pos;
@@ -178,9 +327,15 @@ public:
             if (!match(':')) break;
             
             if (key == "name") {
-                info.name = parseString();
+                info.name = parsePath();
+            } else if (key == "guard") {
+                info.guard = parseString();
+            } else if (key == "spelled") {
+                info.spelled = parsePath();
             } else if (key == "timestamp") {
                 info.timestamp = parseNumber();
+            } else if (key == "changes") {
+                info.changes = static_cast<int>(parseNumber());
             } else if (key == "includes") {
                 if (match('[')) {
                     while (m_pos < m_json.size()) {
@@ -189,7 +344,7 @@ public:
                             m_pos++;
                             break;
                         }
-                        info.includes.push_back(parseString());
+                        info.includes.push_back(parsePath());
                         match(',');
                     }
                 }
@@ -234,7 +389,7 @@ public:
                             m_pos++;
                             break;
                         }
-                        std::string path = parseString();
+                        std::string path = parsePath();
                         if (!match(':')) break;
                         collection.file_info[path] = parseFileInfo();
                         match(',');
@@ -245,18 +400,163 @@ public:
             match(',');
         }
         
-        return true;
+        return m_error.empty();
+    }
+
+    // A batch of collections, as written for svdep_load_json_units. The
+    // shared "files" table must come before "units"
+    bool parseUnits(const std::vector<FileCollection*>& collections,
+                    std::vector<bool>& loaded) {
+        std::vector<FileInfo> files;
+        size_t unit = 0;
+        if (!match('{')) return false;
+
+        while (m_pos < m_json.size()) {
+            skipWhitespace();
+            if (m_json[m_pos] == '}') {
+                m_pos++;
+                break;
+            }
+
+            std::string key = parseString();
+            if (!match(':')) break;
+
+            if (key == "files") {
+                if (match('[')) {
+                    while (m_pos < m_json.size()) {
+                        skipWhitespace();
+                        if (m_json[m_pos] == ']') {
+                            m_pos++;
+                            break;
+                        }
+                        files.push_back(parseFileInfo());
+                        match(',');
+                    }
+                }
+            } else if (key == "units") {
+                if (!match('[')) return false;
+                while (m_pos < m_json.size()) {
+                    skipWhitespace();
+                    if (m_json[m_pos] == ']') {
+                        m_pos++;
+                        break;
+                    }
+                    if (unit >= collections.size()) {
+                        m_error = "More collections than contexts";
+                        return false;
+                    }
+                    if (m_json.compare(m_pos, 4, "null") == 0) {
+                        m_pos += 4;
+                    } else if (parseUnit(*collections[unit], files)) {
+                        loaded[unit] = true;
+                    } else {
+                        return false;
+                    }
+                    unit++;
+                    match(',');
+                }
+            }
+
+            match(',');
+        }
+
+        if (m_error.empty() && unit != collections.size()) {
+            m_error = "Fewer collections than contexts";
+        }
+        return m_error.empty();
     }
 
 private:
+    // One collection of a batch. Its files are indexes into the batch's
+    // file table
+    bool parseUnit(FileCollection& collection, const std::vector<FileInfo>& files) {
+        if (!match('{')) return false;
+
+        while (m_pos < m_json.size()) {
+            skipWhitespace();
+            if (m_json[m_pos] == '}') {
+                m_pos++;
+                break;
+            }
+
+            std::string key = parseString();
+            if (!match(':')) break;
+
+            if (key == "root_files") {
+                if (match('[')) {
+                    while (m_pos < m_json.size()) {
+                        skipWhitespace();
+                        if (m_json[m_pos] == ']') {
+                            m_pos++;
+                            break;
+                        }
+                        collection.root_files.push_back(parseFileInfo());
+                        match(',');
+                    }
+                }
+            } else if (key == "file_info") {
+                if (match('[')) {
+                    while (m_pos < m_json.size()) {
+                        skipWhitespace();
+                        if (m_json[m_pos] == ']') {
+                            m_pos++;
+                            break;
+                        }
+                        double index = parseNumber();
+                        if (index < 0 || index >= static_cast<double>(files.size())) {
+                            m_error = "File index out of range";
+                            return false;
+                        }
+                        const FileInfo& info = files[static_cast<size_t>(index)];
+                        collection.file_info[info.name] = info;
+                        match(',');
+                    }
+                }
+            }
+
+            match(',');
+        }
+
+        return m_error.empty();
+    }
+
     const std::string& m_json;
     size_t m_pos;
+    const PathVars& m_vars;
+    std::string m_error;
 };
 
-bool FileCollection::fromJson(const std::string& json) {
+bool FileCollection::fromJson(const std::string& json, const PathVars *vars,
+                              std::string *error) {
+    static const PathVars noVars;
     clear();
-    JsonParser parser(json);
-    return parser.parse(*this);
+    JsonParser parser(json, vars ? *vars : noVars);
+    if (!parser.parse(*this)) {
+        if (error) {
+            *error = parser.getError().empty() ? "Failed to parse JSON" : parser.getError();
+        }
+        return false;
+    }
+    return true;
+}
+
+bool FileCollection::fromJsonUnits(const std::string& json,
+                                   const std::vector<FileCollection*>& collections,
+                                   std::vector<bool>& loaded, const PathVars *vars,
+                                   std::string *error) {
+    static const PathVars noVars;
+    loaded.assign(collections.size(), false);
+    for (FileCollection *collection : collections) {
+        collection->clear();
+    }
+    JsonParser parser(json, vars ? *vars : noVars);
+    if (!parser.parseUnits(collections, loaded)) {
+        if (error) {
+            *error = parser.getError().empty() ? "Failed to parse JSON" : parser.getError();
+        }
+        return false;
+    }
+    return true;
 }
 
 } // namespace svdep
@@ -24,9 +24,16 @@
 #include <vector>
 #include <unordered_map>
 #include "FileInfo.h"
+#include "PathVars.h"
 
 namespace svdep {
 
+/**
+ * Root files and the FileInfo of every file they include. Reverse queries
+ * are answered from an index built on first use. updateFile and removeFile
+ * keep the index current; after modifying root_files or file_info
+ * directly, call invalidateIndex (clear and fromJson do so).
+ */
 class FileCollection {
 public:
     FileCollection();
@@ -38,16 +45,54 @@ public:
     // Map of all file info by path
     std::unordered_map<std::string, FileInfo> file_info;
 
-    // Convert to JSON string
-    std::string toJson() const;
+    // Convert to JSON string. Paths under the directories of vars, if
+    // given, are written relative to them
+    std::string toJson(const PathVars *vars = nullptr) const;
+
+    // Load from JSON string, expanding paths written relative to path
+    // variables. Returns false, with error set if given, if the JSON is
+    // malformed or uses a variable that vars doesn't define
+    bool fromJson(const std::string& json, const PathVars *vars = nullptr,
+                  std::string *error = nullptr);
 
-    // Load from JSON string
-    bool fromJson(const std::string& json);
+    // Load many collections from one batch, written as for
+    // svdep_load_json_units. loaded[i] is set if the batch holds a
+    // collection for collections[i]; the others are left empty
+    static bool fromJsonUnits(const std::string& json,
+                              const std::vector<FileCollection*>& collections,
+                              std::vector<bool>& loaded, const PathVars *vars = nullptr,
+                              std::string *error = nullptr);
 
     // Clear the collection
     void clear();
+
+    // Files that directly include path
+    const std::vector<std::string>& getIncluders(const std::string& path);
+
+    // Root files that depend on path, directly or through includes, in
+    // root-file order. A root file depends on itself
+    const std::vector<std::string>& getAffectedRoots(const std::string& path);
+
+    // Add or replace the entry of a file, updating the reverse index
+    void updateFile(const FileInfo& info);
+
+    // Remove the entry of a file, updating the reverse index
+    void removeFile(const std::string& path);
+
+    // Discard the reverse index. It is rebuilt on the next query
+    void invalidateIndex();
+
+private:
+    void buildIndex();
+
+    bool m_indexValid;
+    std::unordered_map<std::string, std::vector<std::string>> m_includers;
+    std::unordered_map<std::string, std::vector<std::string>> m_affectedRoots;
 };
 
+// Escape a string for inclusion in a JSON string literal
+std::string escapeJson(const std::string& s);
+
 } // namespace svdep
 
 #endif /* FILECOLLECTION_H */
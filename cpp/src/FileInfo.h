@@ -28,12 +28,28 @@ namespace svdep {
 struct FileInfo {
     std::string name;
     double timestamp;
+    // Traversal state of a check: whether the file's includes have been
+    // followed, and whether the file itself has been stat'd
     bool checked;
+    bool stated;
     std::vector<std::string> includes;
+    // Include-guard macro, if the file uses the classic guard pattern
+    std::string guard;
+    // Number of rebuilds that found the file modified. Checks look at
+    // frequently-changed files first
+    int changes;
+    // Path the file was first reached by, when paths are canonicalized
+    // and it differs from name
+    std::string spelled;
 
-    FileInfo() : timestamp(0), checked(false) {}
+    // Whether path names this file, as recorded or as spelled
+    bool matches(const std::string& path) const {
+        return path == name || (!spelled.empty() && path == spelled);
+    }
+
+    FileInfo() : timestamp(0), checked(false), stated(false), changes(0) {}
     FileInfo(const std::string& n, double ts) 
-        : name(n), timestamp(ts), checked(false) {}
+        : name(n), timestamp(ts), checked(false), stated(false), changes(0) {}
 };
 
 } // namespace svdep
@@ -0,0 +1,66 @@
+/*
+ * PathVars.cpp
+ *
+ * Path variables for relocatable collections
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#include "PathVars.h"
+#include <algorithm>
+
+namespace svdep {
+
+void PathVars::add(const std::string& name, const std::string& dir) {
+    // The directory itself is matched, as is anything under it. A root
+    // directory becomes an empty prefix
+    std::string d = dir;
+    while (!d.empty() && (d.back() == '/' || d.back() == '\\')) {
+        d.pop_back();
+    }
+    m_vars.push_back({name, d});
+    std::stable_sort(m_vars.begin(), m_vars.end(), [](const auto& a, const auto& b) {
+        return a.second.size() > b.second.size();
+    });
+}
+
+std::string PathVars::encode(const std::string& path) const {
+    for (const auto& v : m_vars) {
+        const std::string& dir = v.second;
+        if (path.compare(0, dir.size(), dir) == 0 &&
+                (path.size() == dir.size() || path[dir.size()] == '/' || path[dir.size()] == '\\')) {
+            return "${" + v.first + "}" + path.substr(dir.size());
+        }
+    }
+    return path;
+}
+
+bool PathVars::decode(const std::string& path, std::string& out, std::string& error) const {
+    size_t end;
+    if (path.compare(0, 2, "${") != 0 || (end = path.find('}')) == std::string::npos) {
+        out = path;
+        return true;
+    }
+    std::string name = path.substr(2, end - 2);
+    for (const auto& v : m_vars) {
+        if (v.first == name) {
+            out = v.second + path.substr(end + 1);
+            return true;
+        }
+    }
+    error = "Undefined path variable " + name + " in " + path;
+    return false;
+}
+
+} // namespace svdep
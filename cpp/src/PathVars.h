@@ -0,0 +1,56 @@
+/*
+ * PathVars.h
+ *
+ * Path variables for relocatable collections
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef PATHVARS_H
+#define PATHVARS_H
+
+#include <string>
+#include <utility>
+#include <vector>
+
+namespace svdep {
+
+/**
+ * Mirrors the Python PathVars. Named directories for relocatable
+ * collections: when a collection is written, a path under one of the
+ * directories becomes '${NAME}' followed by the rest of the path, using
+ * the longest matching directory. When it is read, each '${NAME}' is
+ * replaced by the directory given for NAME, which may differ from the
+ * workspace that wrote it. Paths outside every directory are unchanged.
+ */
+class PathVars {
+public:
+    void add(const std::string& name, const std::string& dir);
+
+    bool empty() const { return m_vars.empty(); }
+
+    std::string encode(const std::string& path) const;
+
+    // Expand a path that may start with a variable. Returns false, with
+    // 'error' set, if the variable isn't defined
+    bool decode(const std::string& path, std::string& out, std::string& error) const;
+
+private:
+    // (name, directory), longest directory first
+    std::vector<std::pair<std::string, std::string>> m_vars;
+};
+
+} // namespace svdep
+
+#endif /* PATHVARS_H */
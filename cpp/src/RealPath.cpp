@@ -0,0 +1,100 @@
+/*
+ * RealPath.cpp
+ *
+ * Cached path canonicalization
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#include "RealPath.h"
+#include <climits>
+#include <cstdlib>
+#include <sys/stat.h>
+
+namespace svdep {
+
+std::string RealPathCache::resolve(const std::string& path) {
+#ifdef _WIN32
+    char buf[_MAX_PATH];
+    return _fullpath(buf, path.c_str(), sizeof(buf)) ? std::string(buf) : std::string();
+#else
+    char *p = ::realpath(path.c_str(), nullptr);
+    if (!p) {
+        return "";
+    }
+    std::string ret(p);
+    free(p);
+    return ret;
+#endif
+}
+
+std::string RealPathCache::realPath(const std::string& path) {
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = m_paths.find(path);
+        if (it != m_paths.end()) {
+            return it->second;
+        }
+    }
+
+    // Resolve the directory first. Collapsing '..' before that would be
+    // wrong if the directory is a symlink
+    size_t pos = path.find_last_of("/\\");
+    std::string dir = (pos == std::string::npos) ? "." : (pos == 0 ? "/" : path.substr(0, pos));
+    std::string name = (pos == std::string::npos) ? path : path.substr(pos + 1);
+
+    std::string realDir;
+    bool found;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = m_dirs.find(dir);
+        found = (it != m_dirs.end());
+        if (found) {
+            realDir = it->second;
+        }
+    }
+    if (!found) {
+        realDir = resolve(dir);
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_dirs.emplace(dir, realDir);
+    }
+
+    std::string ret;
+    if (realDir.empty()) {
+        ret = path;
+    } else {
+        ret = (realDir == "/") ? realDir + name : realDir + "/" + name;
+#ifndef _WIN32
+        struct stat sb;
+        if (lstat(ret.c_str(), &sb) == 0 && S_ISLNK(sb.st_mode)) {
+            std::string target = resolve(ret);
+            if (!target.empty()) {
+                ret = target;
+            }
+        }
+#endif
+    }
+
+    // Racing lookups of the same path resolve it the same way
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_paths.emplace(path, ret).first->second;
+}
+
+void RealPathCache::clear() {
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_dirs.clear();
+    m_paths.clear();
+}
+
+} // namespace svdep
@@ -0,0 +1,57 @@
+/*
+ * RealPath.h
+ *
+ * Cached path canonicalization
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef REALPATH_H
+#define REALPATH_H
+
+#include <mutex>
+#include <string>
+#include <unordered_map>
+
+namespace svdep {
+
+/**
+ * Memoized canonical paths, so that a file reached through different
+ * include directories, '..' segments or symlinks is known by one name.
+ * A directory is resolved once, however many of its files are looked up.
+ * After that, a file costs one lstat() to rule out a symlink. A path that
+ * can't be resolved is returned as given.
+ *
+ * Entries stay until clear(). Callers clear once per build. Safe to use
+ * from several threads, but clear() must not run concurrently with
+ * realPath().
+ */
+class RealPathCache {
+public:
+    std::string realPath(const std::string& path);
+
+    void clear();
+
+private:
+    // Resolve a path with the system's realpath(), or "" on failure
+    static std::string resolve(const std::string& path);
+
+    std::mutex m_mutex;
+    std::unordered_map<std::string, std::string> m_dirs;
+    std::unordered_map<std::string, std::string> m_paths;
+};
+
+} // namespace svdep
+
+#endif /* REALPATH_H */
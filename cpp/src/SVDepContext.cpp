@@ -19,9 +19,10 @@
  */
 #include "SVDepContext.h"
 #include "SVPreprocessor.h"
+#include <algorithm>
+#include <cmath>
 #include <fstream>
 #include <sstream>
-#include <sys/stat.h>
 #include <cstring>
 
 #ifdef _WIN32
@@ -33,14 +34,15 @@
 
 namespace svdep {
 
-SVDepContext::SVDepContext() {
+SVDepContext::SVDepContext() : m_collectAll(false), m_fastScan(true), m_compilationUnit(false), m_canonical(false),
+        m_scanPool(nullptr), m_checkTimestamps(nullptr), m_collectionLoaded(false) {
 }
 
 SVDepContext::~SVDepContext() {
 }
 
 int SVDepContext::addIncdir(const std::string& path) {
-    m_incdirs.push_back(path);
+    m_userIncdirs.push_back(path);
     return 0;
 }
 
@@ -49,7 +51,41 @@ int SVDepContext::addRootFile(const std::string& path) {
     return 0;
 }
 
+int SVDepContext::addDefine(const std::string& name, const std::string& value) {
+    if (name.empty()) {
+        m_error = "Empty macro name";
+        return -1;
+    }
+    m_defines[name] = value.empty() ? "1" : value;
+    return 0;
+}
+
+void SVDepContext::clearDefines() {
+    m_defines.clear();
+}
+
+void SVDepContext::setCompilationUnit(bool enable) {
+    m_compilationUnit = enable;
+}
+
+void SVDepContext::addPathVar(const std::string& name, const std::string& dir) {
+    m_pathVars.add(name, dir);
+}
+
+void SVDepContext::setCanonical(bool enable) {
+    m_canonical = enable;
+}
+
+std::string SVDepContext::canonicalPath(const std::string& path) {
+    if (!m_canonical) {
+        return path;
+    }
+    PhaseTimer timer(m_report.time_resolve);
+    return m_scanPool ? m_scanPool->realPaths().realPath(path) : m_realPaths.realPath(path);
+}
+
 std::string SVDepContext::readFile(const std::string& path) {
+    PhaseTimer timer(m_report.time_read);
     std::ifstream file(path);
     if (!file.is_open()) {
         m_error = "Failed to open file: " + path;
@@ -57,38 +93,126 @@ std::string SVDepContext::readFile(const std::string& path) {
     }
     std::stringstream buffer;
     buffer << file.rdbuf();
-    return buffer.str();
+    std::string content = buffer.str();
+    m_report.bytes_read += content.size();
+    return content;
+}
+
+const SVDepContext::FileScan& SVDepContext::scanFile(const std::string& path) {
+    auto it = m_fileScans.find(path);
+    if (it != m_fileScans.end()) {
+        return it->second;
+    }
+
+    FileScan& scan = m_fileScans[path];
+    scan.timestamp = 0;
+    scan.skeleton = nullptr;
+
+    if (m_scanPool) {
+        const ScanPool::FileStat *st;
+        {
+            PhaseTimer timer(m_report.time_stat);
+            st = &m_scanPool->stat(path, m_report);
+        }
+        if (!st->exists) {
+            m_error = "Failed to open file: " + path;
+            return scan;
+        }
+        scan.timestamp = st->timestamp;
+        scan.skeleton = m_scanPool->scan(path, *st, m_fastScan, m_report, m_error);
+        return scan;
+    }
+
+    FileStat st;
+    {
+        PhaseTimer timer(m_report.time_stat);
+        m_dirStat.stat(path, st);
+        m_report.stats++;
+    }
+    if (!st.exists) {
+        m_error = "Failed to open file: " + path;
+        return scan;
+    }
+    scan.timestamp = st.timestamp;
+
+    scan.skeleton = m_scanCache.find(path, st.mtimeNs, st.size);
+    if (scan.skeleton) {
+        m_report.scan_cache_hits++;
+    } else {
+        m_report.scan_cache_misses++;
+        std::string content = readFile(path);
+        if (content.empty() && !m_error.empty()) {
+            return scan;
+        }
+        scan.skeleton = &m_scanCache.insert(path, st.mtimeNs, st.size,
+            scanContent(content, path, m_fastScan, m_scanStore.get(), m_report));
+    }
+    return scan;
+}
+
+void SVDepContext::loadScanCache(const std::string& path) {
+    m_scanCache.load(path);
+}
+
+int SVDepContext::saveScanCache(const std::string& path) {
+    if (!m_scanCache.save(path)) {
+        m_error = "Failed to write scan cache: " + path;
+        return -1;
+    }
+    return 0;
+}
+
+void SVDepContext::setScanStore(const std::string& dir) {
+    m_scanStore.reset(new ScanStore(dir));
+}
+
+void SVDepContext::setScanPool(ScanPool *pool) {
+    m_scanPool = pool;
 }
 
 double SVDepContext::getFileTimestamp(const std::string& path) {
-    struct stat st;
-    if (stat(path.c_str(), &st) != 0) {
-        return 0;
+    PhaseTimer timer(m_report.time_stat);
+    m_report.stats++;
+    FileStat st;
+    m_dirStat.stat(path, st);
+    return st.timestamp;
+}
+
+double SVDepContext::getBuildTimestamp(const std::string& path) {
+    if (!m_scanPool) {
+        return getFileTimestamp(path);
     }
-#ifdef __APPLE__
-    return st.st_mtimespec.tv_sec + st.st_mtimespec.tv_nsec / 1e9;
-#elif defined(_WIN32)
-    return static_cast<double>(st.st_mtime);
-#else
-    return st.st_mtim.tv_sec + st.st_mtim.tv_nsec / 1e9;
-#endif
+    PhaseTimer timer(m_report.time_stat);
+    return m_scanPool->stat(path, m_report).timestamp;
+}
+
+bool SVDepContext::probeInclude(const std::string& path) {
+    if (m_scanPool) {
+        return m_scanPool->stat(path, m_report).exists;
+    }
+    FileStat st;
+    m_report.stats++;
+    return m_dirStat.stat(path, st);
 }
 
 std::string SVDepContext::resolveInclude(const std::string& filename) {
     // Check cache first
     auto it = m_includeCache.find(filename);
     if (it != m_includeCache.end()) {
+        m_report.include_cache_hits++;
         return it->second;
     }
 
     // Search in include directories
+    PhaseTimer timer(m_report.time_resolve);
     for (const auto& incdir : m_incdirs) {
         std::string fullPath = incdir + "/" + filename;
-        struct stat st;
-        if (stat(fullPath.c_str(), &st) == 0) {
+        m_report.include_probes++;
+        if (probeInclude(fullPath)) {
             m_includeCache[filename] = fullPath;
             return fullPath;
         }
+        m_report.include_probes_failed++;
     }
 
     return "";
@@ -102,78 +226,224 @@ static std::string getDirname(const std::string& path) {
     return path.substr(0, pos);
 }
 
-FileInfo SVDepContext::buildFileInfo(const std::string& path) {
+FileInfo SVDepContext::buildFileInfo(const std::string& path, const std::string& spelled) {
     // Check if already processed
     auto it = m_collection.file_info.find(path);
     if (it != m_collection.file_info.end()) {
         return it->second;
     }
 
-    FileInfo info;
-    info.name = path;
-    info.timestamp = getFileTimestamp(path);
+    // Includes are followed depth-first with an explicit stack, so that
+    // include depth isn't limited by the thread's stack size
+    struct Frame {
+        FileInfo info;
+        std::vector<std::string> includes;
+        size_t next;
+    };
+    std::vector<Frame> stack;
+
+    auto enter = [&](const std::string& path, const std::string& spelled) {
+        const FileScan& scan = scanFile(path);
+
+        Frame frame;
+        frame.next = 0;
+        frame.info.name = path;
+        frame.info.timestamp = scan.timestamp;
+        if (spelled != path) {
+            frame.info.spelled = spelled;
+        }
+        applyHistory(frame.info);
+
+        // Add to collection first to handle circular includes
+        m_collection.updateFile(frame.info);
+
+        if (scan.skeleton) {
+            // Evaluate the file's directives without re-reading the source
+            SVPreprocessor pp;
+            for (const auto& kv : m_defines) {
+                pp.defineMacro(kv.first, kv.second);
+            }
+            pp.replay(*scan.skeleton);
+            frame.info.guard = pp.getIncludeGuard();
+            frame.includes = pp.getIncludes();
+        }
+        stack.push_back(std::move(frame));
+    };
+
+    FileInfo ret;
+    enter(path, spelled);
+    while (!stack.empty()) {
+        Frame& frame = stack.back();
+        if (frame.next == frame.includes.size()) {
+            // Update the stored info with includes
+            m_collection.updateFile(frame.info);
+            if (stack.size() == 1) {
+                ret = std::move(frame.info);
+            }
+            stack.pop_back();
+            continue;
+        }
+
+        std::string incPath = resolveInclude(frame.includes[frame.next++]);
+        if (incPath.empty()) {
+            continue;
+        }
+        // Add directory of included file to search path
+        addIncdirUnique(getDirname(incPath));
+
+        std::string canonPath = canonicalPath(incPath);
+        frame.info.includes.push_back(canonPath);
+        if (m_collection.file_info.find(canonPath) == m_collection.file_info.end()) {
+            // Invalidates 'frame'
+            enter(canonPath, incPath);
+        }
+    }
+    return ret;
+}
+
+bool SVDepContext::enterFileUnit(const std::string& path, const std::string& spelled,
+                                 std::vector<std::unique_ptr<UnitFrame>>& stack) {
+    // A file that (transitively) includes itself would recurse forever
+    // in a real compile too. Record the edge, but don't re-enter
+    if (m_includeStack.count(path)) {
+        return false;
+    }
+
+    // A file may be processed several times in a unit, each time under
+    // the macro state at its point of inclusion
+    bool first = (m_collection.file_info.find(path) == m_collection.file_info.end());
+    if (first) {
+        FileInfo info(path, getBuildTimestamp(path));
+        if (spelled != path) {
+            info.spelled = spelled;
+        }
+
+        // A guard recorded by an earlier scan still holds if the file
+        // hasn't changed since (JSON timestamps are rounded to 1us)
+        const FileInfo *prev = applyHistory(info);
+        if (prev && std::fabs(prev->timestamp - info.timestamp) < 1e-6) {
+            info.guard = prev->guard;
+        }
+        m_collection.file_info[path] = info;
+    }
 
-    // Add to collection first to handle circular includes
-    m_collection.file_info[path] = info;
+    // Multiple-include optimization: while the guard macro is defined, the
+    // file can't contribute anything, so don't read or scan it again
+    const std::string& guard = m_collection.file_info[path].guard;
+    if (!guard.empty() && m_unitMacros.count(guard)) {
+        return false;
+    }
 
-    // Read and process the file
-    std::string content = readFile(path);
-    if (content.empty() && !m_error.empty()) {
-        return info;
+    const FileScan& scan = scanFile(path);
+    if (!scan.skeleton) {
+        return false;
     }
 
-    SVPreprocessor pp;
-    pp.setInput(content, path);
-    pp.process();
+    m_includeStack.insert(path);
+
+    std::unique_ptr<UnitFrame> frame(new UnitFrame());
+    frame->path = path;
+    frame->first = first;
+    frame->skeleton = scan.skeleton;
+    frame->next = 0;
+    frame->pp.setMacroTable(&m_unitMacros);
+    stack.push_back(std::move(frame));
+    return true;
+}
+
+void SVDepContext::buildFileInfoUnit(const std::string& path, const std::string& spelled) {
+    // Each file's skeleton is replayed up to its next active include. The
+    // include is then processed in-place, so that any macros it defines
+    // are visible to the rest of the including file. An explicit stack
+    // keeps include depth from being limited by the thread's stack size
+    std::vector<std::unique_ptr<UnitFrame>> stack;
+    enterFileUnit(path, spelled, stack);
+    while (!stack.empty()) {
+        UnitFrame& frame = *stack.back();
+        std::string inc;
+        frame.next = frame.pp.replayStep(*frame.skeleton, frame.next, inc);
+        if (inc.empty()) {
+            m_collection.file_info[frame.path].guard = frame.pp.getIncludeGuard();
+            m_includeStack.erase(frame.path);
+            stack.pop_back();
+            continue;
+        }
 
-    // Process includes
-    const auto& includes = pp.getIncludes();
-    for (const auto& inc : includes) {
         std::string incPath = resolveInclude(inc);
-        if (!incPath.empty()) {
-            // Add directory of included file to search path
-            std::string incDir = getDirname(incPath);
-            bool found = false;
-            for (const auto& dir : m_incdirs) {
-                if (dir == incDir) {
-                    found = true;
-                    break;
-                }
-            }
-            if (!found) {
-                m_incdirs.push_back(incDir);
-            }
+        if (incPath.empty()) {
+            continue;
+        }
+        addIncdirUnique(getDirname(incPath));
+        std::string canonPath = canonicalPath(incPath);
+
+        // Element references are stable across unordered_map rehashes
+        std::vector<std::string>& includes = m_collection.file_info[frame.path].includes;
+        if (frame.first || std::find(includes.begin(), includes.end(), canonPath) == includes.end()) {
+            includes.push_back(canonPath);
+        }
+        enterFileUnit(canonPath, incPath, stack);
+    }
+}
 
-            // Recursively process include
-            buildFileInfo(incPath);
-            info.includes.push_back(incPath);
+void SVDepContext::addIncdirUnique(const std::string& dir) {
+    for (const auto& d : m_incdirs) {
+        if (d == dir) {
+            return;
         }
     }
+    m_incdirs.push_back(dir);
+}
 
-    // Update the stored info with includes
-    m_collection.file_info[path] = info;
-    return info;
+const FileInfo* SVDepContext::applyHistory(FileInfo& info) const {
+    auto it = m_previous.find(info.name);
+    if (it == m_previous.end()) {
+        return nullptr;
+    }
+    info.changes = it->second.changes;
+    if (std::fabs(it->second.timestamp - info.timestamp) >= 1e-6) {
+        info.changes++;
+    }
+    return &it->second;
 }
 
 int SVDepContext::build() {
+    PhaseTimer timer(m_report.time_total);
+    if (m_collectionLoaded) {
+        // Keep the loaded collection's files as history for this and
+        // later builds
+        m_previous = std::move(m_collection.file_info);
+        m_collectionLoaded = false;
+    }
     m_collection.clear();
     m_error.clear();
 
+    // Directories may have been replaced since the last build
+    m_dirStat.clear();
+    m_realPaths.clear();
+    m_unitMacros = m_defines;
+    m_includeStack.clear();
+
+    // The search path grows as includes are found. Start each build from
+    // the user-supplied directories so repeated builds are independent
+    m_incdirs = m_userIncdirs;
+    m_includeCache.clear();
+
+    // Files may change between builds. Skeletons stay cached, but are
+    // re-validated against the file's current mtime and size
+    m_fileScans.clear();
+
     for (const auto& rootPath : m_rootFiles) {
         // Add directory of root file to search path
-        std::string rootDir = getDirname(rootPath);
-        bool found = false;
-        for (const auto& dir : m_incdirs) {
-            if (dir == rootDir) {
-                found = true;
-                break;
-            }
-        }
-        if (!found) {
-            m_incdirs.push_back(rootDir);
+        addIncdirUnique(getDirname(rootPath));
+
+        std::string path = canonicalPath(rootPath);
+        FileInfo info;
+        if (m_compilationUnit) {
+            buildFileInfoUnit(path, rootPath);
+            info = m_collection.file_info[path];
+        } else {
+            info = buildFileInfo(path, rootPath);
         }
-
-        FileInfo info = buildFileInfo(rootPath);
         if (!m_error.empty()) {
             return -1;
         }
@@ -184,73 +454,258 @@ int SVDepContext::build() {
 }
 
 const std::string& SVDepContext::getJson() {
-    m_json = m_collection.toJson();
+    PhaseTimer timer(m_report.time_json);
+    m_json = m_collection.toJson(m_pathVars.empty() ? nullptr : &m_pathVars);
     return m_json;
 }
 
 int SVDepContext::loadJson(const std::string& json) {
+    PhaseTimer timer(m_report.time_json);
     m_collection.clear();
-    if (!m_collection.fromJson(json)) {
-        m_error = "Failed to parse JSON";
+    if (!m_collection.fromJson(json, &m_pathVars, &m_error)) {
         return -1;
     }
+    m_collectionLoaded = true;
     return 0;
 }
 
-bool SVDepContext::checkFileUpToDate(const std::string& path, double lastTimestamp) {
-    auto it = m_collection.file_info.find(path);
-    if (it == m_collection.file_info.end()) {
-        return false;
+int SVDepContext::loadJsonUnits(const std::vector<SVDepContext*>& ctxs,
+                                const std::string& json) {
+    if (ctxs.empty()) {
+        return 0;
     }
-
-    FileInfo& info = it->second;
-    if (info.checked) {
-        return true;
+    PhaseTimer timer(ctxs[0]->m_report.time_json);
+    std::vector<FileCollection*> collections;
+    for (SVDepContext *ctx : ctxs) {
+        collections.push_back(&ctx->m_collection);
     }
-    info.checked = true;
-
-    // Check if file still exists and timestamp matches
-    double currentTs = getFileTimestamp(path);
-    if (currentTs == 0) {
-        return false; // File doesn't exist
+    std::vector<bool> loaded;
+    std::string error;
+    if (!FileCollection::fromJsonUnits(json, collections, loaded,
+                                       &ctxs[0]->m_pathVars, &error)) {
+        for (SVDepContext *ctx : ctxs) {
+            ctx->m_error = error;
+        }
+        return -1;
     }
-
-    if (currentTs > lastTimestamp) {
-        return false; // File was modified after last check
+    for (size_t i = 0; i < ctxs.size(); i++) {
+        ctxs[i]->m_collectionLoaded = loaded[i];
     }
+    return 0;
+}
+
+bool SVDepContext::checkFileUpToDate(const std::string& rootPath, double lastTimestamp) {
+    // Depth-first in include order. An explicit stack keeps deep include
+    // chains from overflowing the call stack. The collection isn't
+    // modified during a check, so the string pointers stay valid
+    bool ret = true;
+    std::vector<const std::string*> stack = {&rootPath};
+    while (!stack.empty()) {
+        const std::string& path = *stack.back();
+        stack.pop_back();
+
+        auto it = m_collection.file_info.find(path);
+        if (it == m_collection.file_info.end()) {
+            // Not recorded in the collection, so its state is unknown
+            m_checkResult.stale.push_back({path, 0, getCheckTimestamp(path)});
+            if (!m_collectAll) {
+                return false;
+            }
+            ret = false;
+            continue;
+        }
+
+        FileInfo& info = it->second;
+        if (info.checked) {
+            continue;
+        }
+        info.checked = true;
+
+        // A file is stale if it no longer exists (timestamp 0), or was
+        // modified after the reference time. Files looked at first, for
+        // their change history, are only up to date here
+        if (!info.stated) {
+            info.stated = true;
+            m_report.files_checked++;
+            double currentTs = getCheckTimestamp(path);
+            if (currentTs == 0 || currentTs > lastTimestamp) {
+                m_checkResult.stale.push_back({path, info.timestamp, currentTs});
+                if (!m_collectAll) {
+                    return false;
+                }
+                ret = false;
+            }
+        }
 
-    // Check all includes
-    for (const auto& incPath : info.includes) {
-        if (!checkFileUpToDate(incPath, lastTimestamp)) {
-            return false;
+        for (auto inc = info.includes.rbegin(); inc != info.includes.rend(); ++inc) {
+            stack.push_back(&*inc);
         }
     }
 
-    return true;
+    return ret;
 }
 
-int SVDepContext::checkUpToDate(double lastTimestamp) {
+int SVDepContext::checkUpToDate(double lastTimestamp, bool collectAll) {
+    PhaseTimer timer(m_report.time_total);
+    m_checkResult.clear();
+    m_checkResult.timestamp = lastTimestamp;
+    m_collectAll = collectAll;
+    m_dirStat.clear();
+
     // Check that root files match
-    if (m_rootFiles.size() != m_collection.root_files.size()) {
-        return 0; // Different number of root files
+    bool rootsMatch = (m_rootFiles.size() == m_collection.root_files.size());
+    for (size_t i = 0; rootsMatch && i < m_rootFiles.size(); i++) {
+        // Roots of a canonicalized collection may be requested as spelled
+        rootsMatch = m_collection.root_files[i].matches(m_rootFiles[i]);
+    }
+    if (!rootsMatch) {
+        m_checkResult.rootMismatch = true;
+        m_checkResult.rootsRequested = m_rootFiles;
+        for (const auto& root : m_collection.root_files) {
+            m_checkResult.rootsRecorded.push_back(root.name);
+        }
+        if (!collectAll) {
+            return 0;
+        }
     }
 
     // Reset checked flags
     for (auto& kv : m_collection.file_info) {
         kv.second.checked = false;
+        kv.second.stated = false;
+    }
+
+    if (!collectAll) {
+        // Files that changed in earlier rebuilds are the likeliest to have
+        // changed again. Look at them first, so a stale collection is
+        // usually found after a few stats
+        std::vector<FileInfo*> hot;
+        for (auto& kv : m_collection.file_info) {
+            if (kv.second.changes > 0) {
+                hot.push_back(&kv.second);
+            }
+        }
+        std::sort(hot.begin(), hot.end(), [](const FileInfo *a, const FileInfo *b) {
+            return a->changes != b->changes ? a->changes > b->changes : a->name < b->name;
+        });
+        for (FileInfo *info : hot) {
+            // Its includes are still followed from the roots
+            info->stated = true;
+            m_report.files_checked++;
+            double currentTs = getCheckTimestamp(info->name);
+            if (currentTs == 0 || currentTs > lastTimestamp) {
+                m_checkResult.stale.push_back({info->name, info->timestamp, currentTs});
+                return 0;
+            }
+        }
     }
 
     // Check each root file
-    for (size_t i = 0; i < m_rootFiles.size(); i++) {
-        if (m_rootFiles[i] != m_collection.root_files[i].name) {
-            return 0; // Root file list changed
+    for (const auto& root : m_collection.root_files) {
+        if (!checkFileUpToDate(root.name, lastTimestamp) && !collectAll) {
+            break;
         }
-        if (!checkFileUpToDate(m_rootFiles[i], lastTimestamp)) {
-            return 0;
+    }
+
+    return m_checkResult.upToDate() ? 1 : 0;
+}
+
+int SVDepContext::checkRoots(double lastTimestamp, std::vector<int>& verdicts) {
+    int ret = checkUpToDate(lastTimestamp, true);
+    if (ret < 0) {
+        return ret;
+    }
+
+    std::unordered_set<std::string> stale;
+    for (const auto& f : m_checkResult.stale) {
+        for (const auto& root : m_collection.getAffectedRoots(f.path)) {
+            stale.insert(root);
+        }
+    }
+    // Recorded root, by name and spelling
+    std::unordered_map<std::string, std::string> recorded;
+    for (const auto& root : m_collection.root_files) {
+        recorded[root.name] = root.name;
+    }
+    for (const auto& root : m_collection.root_files) {
+        if (!root.spelled.empty()) {
+            recorded.emplace(root.spelled, root.name);
+        }
+    }
+
+    verdicts.clear();
+    for (const auto& root : m_rootFiles) {
+        auto it = recorded.find(root);
+        verdicts.push_back(it != recorded.end() && !stale.count(it->second) ? 1 : 0);
+    }
+    return ret;
+}
+
+double SVDepContext::getCheckTimestamp(const std::string& path) {
+    if (m_checkTimestamps) {
+        auto it = m_checkTimestamps->find(path);
+        if (it != m_checkTimestamps->end()) {
+            return it->second;
+        }
+    }
+    return getFileTimestamp(path);
+}
+
+void SVDepContext::checkUnits(const std::vector<SVDepContext*>& ctxs,
+                              const double *lastTimestamps, int *verdicts,
+                              bool collectAll) {
+    // Deduplicate first, so headers shared by many units are stat'd once.
+    // Each path is stat'd by the context that recorded it first
+    std::unordered_map<std::string, double> timestamps;
+    std::vector<std::pair<const std::string*, SVDepContext*>> paths;
+    for (SVDepContext *ctx : ctxs) {
+        for (const auto& kv : ctx->m_collection.file_info) {
+            if (timestamps.emplace(kv.first, 0).second) {
+                paths.push_back({&kv.first, ctx});
+            }
         }
     }
 
-    return 1; // Up to date
+    // Sorting keeps the files of a directory together, so each directory
+    // is opened once even if there are more than DirStat holds open
+    std::sort(paths.begin(), paths.end(), [](const auto& a, const auto& b) {
+        return *a.first < *b.first;
+    });
+    DirStat dirStat;
+    for (const auto& p : paths) {
+        DepsReport& report = p.second->m_report;
+        PhaseTimer timer(report.time_stat);
+        report.stats++;
+        FileStat st;
+        dirStat.stat(*p.first, st);
+        timestamps[*p.first] = st.timestamp;
+    }
+
+    for (size_t i = 0; i < ctxs.size(); i++) {
+        ctxs[i]->m_checkTimestamps = &timestamps;
+        verdicts[i] = ctxs[i]->checkUpToDate(lastTimestamps[i], collectAll);
+        ctxs[i]->m_checkTimestamps = nullptr;
+    }
+}
+
+const CheckResult& SVDepContext::getCheckResult() const {
+    return m_checkResult;
+}
+
+const std::vector<std::string>& SVDepContext::getIncluders(const std::string& path) {
+    return m_collection.getIncluders(path);
+}
+
+const std::vector<std::string>& SVDepContext::getAffectedRoots(const std::string& path) {
+    return m_collection.getAffectedRoots(path);
+}
+
+void SVDepContext::setFastScan(bool enable) {
+    m_fastScan = enable;
+}
+
+const DepsReport& SVDepContext::getReport() const {
+    return m_report;
 }
 
 const std::string& SVDepContext::getError() const {
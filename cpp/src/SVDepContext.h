@@ -20,11 +20,18 @@
 #ifndef SVDEPCONTEXT_H
 #define SVDEPCONTEXT_H
 
+#include <memory>
 #include <string>
 #include <vector>
 #include <unordered_map>
 #include <unordered_set>
+#include "CheckResult.h"
+#include "DepsReport.h"
+#include "DirStat.h"
 #include "FileCollection.h"
+#include "ScanCache.h"
+#include "ScanPool.h"
+#include "SVPreprocessor.h"
 
 namespace svdep {
 
@@ -39,45 +46,219 @@ public:
     // Add a root file
     int addRootFile(const std::string& path);
 
+    // Add a user-supplied (+define+) macro
+    int addDefine(const std::string& name, const std::string& value);
+
+    // Remove all user-supplied macros
+    void clearDefines();
+
+    // Select compilation-unit mode, where macro state flows through
+    // includes and across root files in order
+    void setCompilationUnit(bool enable);
+
+    // Record files by their real path, so a file reached through different
+    // include directories, '..' segments or symlinks is stat'd and scanned
+    // once. The path a file was first reached by is kept as its spelling
+    void setCanonical(bool enable);
+
+    // Define a path variable. Collections are written with paths under
+    // dir relative to name, and paths relative to name are expanded with
+    // dir when loaded (see PathVars)
+    void addPathVar(const std::string& name, const std::string& dir);
+
     // Build the file collection
     int build();
 
     // Get the JSON representation
     const std::string& getJson();
 
-    // Load from JSON
+    // Load from JSON. Include guards and change counts recorded in the
+    // loaded collection are remembered and used by later builds on this
+    // context
     int loadJson(const std::string& json);
 
-    // Check if up to date
-    int checkUpToDate(double lastTimestamp);
+    // Load the collections of many contexts from one batch (see
+    // svdep_load_json_units), with the path variables of the first.
+    // Contexts the batch has no collection for are left without one. On
+    // failure, the error is set on every context
+    static int loadJsonUnits(const std::vector<SVDepContext*>& ctxs, const std::string& json);
+
+    // Check if up to date. The check stops at the first stale file
+    // unless collectAll is set, in which case every stale file is recorded.
+    // When stopping early, files with the most recorded changes are
+    // checked first
+    int checkUpToDate(double lastTimestamp, bool collectAll = false);
+
+    // Get a verdict per root file, in the order the root files were
+    // added: 1 if neither the root nor anything it includes changed,
+    // otherwise 0. Every file is stat'd once, however many roots include
+    // it. A root missing from the collection is stale. The full outcome
+    // is available from getCheckResult()
+    int checkRoots(double lastTimestamp, std::vector<int>& verdicts);
+
+    // Get the outcome of the last check
+    const CheckResult& getCheckResult() const;
+
+    // Check many contexts, each with a loaded collection and root files,
+    // against their own reference times. The paths of all collections are
+    // gathered first, and each distinct path is stat'd once (counted in the
+    // report of the first context that records it). verdicts[i] is set to
+    // 1 if context i is up to date, otherwise 0
+    static void checkUnits(const std::vector<SVDepContext*>& ctxs,
+                           const double *lastTimestamps, int *verdicts,
+                           bool collectAll = false);
+
+    // Get the files that directly include path in the current collection
+    const std::vector<std::string>& getIncluders(const std::string& path);
+
+    // Get the root files of the current collection that depend on path
+    const std::vector<std::string>& getAffectedRoots(const std::string& path);
+
+    // Select the fast or byte-wise preprocessor scan path
+    void setFastScan(bool enable);
+
+    // Load directive skeletons saved by an earlier run. Files whose
+    // modification time and size are unchanged are not read again
+    void loadScanCache(const std::string& path);
+
+    // Save the directive skeletons of every file scanned so far
+    int saveScanCache(const std::string& path);
+
+    // Look skeletons up in, and add them to, a content-addressed store
+    // (see ScanStore) before scanning files
+    void setScanStore(const std::string& dir);
+
+    // Share file state with contexts building other units. While a pool
+    // is set, builds stat, read and scan files through it instead of the
+    // context's own scan cache. Pass nullptr to detach
+    void setScanPool(ScanPool *pool);
+
+    // Get the counters and timings accumulated by this context
+    const DepsReport& getReport() const;
 
     // Get the last error
     const std::string& getError() const;
 
 private:
-    // Build file info for a single file
-    FileInfo buildFileInfo(const std::string& path);
+    // Build file info for a single file. 'spelled' is the path the file
+    // was reached by, before canonicalization
+    FileInfo buildFileInfo(const std::string& path, const std::string& spelled);
+
+    // Build file info for a file in compilation-unit mode. Includes are
+    // processed in-place against the shared unit macro table
+    void buildFileInfoUnit(const std::string& path, const std::string& spelled);
+
+    // A file being processed in compilation-unit mode, and how far its
+    // skeleton has been replayed
+    struct UnitFrame {
+        std::string path;
+        bool first;
+        const DirectiveSkeleton *skeleton;
+        size_t next;
+        SVPreprocessor pp;
+    };
+
+    // Start processing a file in compilation-unit mode, pushing its frame
+    // unless it is already being processed, is guarded or can't be read.
+    // Returns whether a frame was pushed
+    bool enterFileUnit(const std::string& path, const std::string& spelled,
+                       std::vector<std::unique_ptr<UnitFrame>>& stack);
+
+    // Get the real path of a file when canonicalizing, otherwise path
+    std::string canonicalPath(const std::string& path);
+
+    // Add a directory to the include search path if not already present
+    void addIncdirUnique(const std::string& dir);
 
     // Resolve include path
     std::string resolveInclude(const std::string& filename);
 
+    struct FileScan {
+        double timestamp;
+        // Null if the file couldn't be read (m_error is set)
+        const DirectiveSkeleton *skeleton;
+    };
+
+    // Get the directive skeleton of a file, reading and scanning the
+    // file only if the scan cache has no valid entry for it
+    const FileScan& scanFile(const std::string& path);
+
     // Read file contents
     std::string readFile(const std::string& path);
 
     // Get file modification time
     double getFileTimestamp(const std::string& path);
 
+    // Get a file's modification time during a build, through the scan
+    // pool if one is set
+    double getBuildTimestamp(const std::string& path);
+
+    // Check whether an include candidate exists
+    bool probeInclude(const std::string& path);
+
     // Check if a single file is up to date
     bool checkFileUpToDate(const std::string& path, double lastTimestamp);
 
+    // Get a file's modification time during a check, from the batch-check
+    // timestamps if set
+    double getCheckTimestamp(const std::string& path);
+
+    std::vector<std::string> m_userIncdirs;
     std::vector<std::string> m_incdirs;
     std::vector<std::string> m_rootFiles;
     FileCollection m_collection;
     std::string m_json;
     std::string m_error;
+    CheckResult m_checkResult;
+    bool m_collectAll;
+    DepsReport m_report;
+    bool m_fastScan;
+    bool m_compilationUnit;
+    bool m_canonical;
+    PathVars m_pathVars;
+
+    // User-supplied defines, and the macro state of the current unit
+    std::unordered_map<std::string, std::string> m_defines;
+    std::unordered_map<std::string, std::string> m_unitMacros;
+
+    // Files currently being processed in compilation-unit mode
+    std::unordered_set<std::string> m_includeStack;
+
+    // Carry a file's change count over from the previous collection,
+    // counting a modification-time change. Returns the previous entry, or
+    // nullptr if there is none
+    const FileInfo* applyHistory(FileInfo& info) const;
+
+    // Files of the collection last loaded with loadJson, taken over by the
+    // next build for their include guards and change counts
+    std::unordered_map<std::string, FileInfo> m_previous;
+    bool m_collectionLoaded;
 
     // Cache for resolved include paths
     std::unordered_map<std::string, std::string> m_includeCache;
+
+    // Directive skeletons, shared across builds and optionally persisted
+    ScanCache m_scanCache;
+
+    // Shared content-addressed store, if set
+    std::unique_ptr<ScanStore> m_scanStore;
+
+    // Stats files relative to their directories. Cleared by each build
+    // and check
+    DirStat m_dirStat;
+
+    // Canonical paths, when not building through a scan pool. Cleared by
+    // each build
+    RealPathCache m_realPaths;
+
+    // Shared with other contexts when building many units. Not owned
+    ScanPool *m_scanPool;
+
+    // Modification times (0 if missing) gathered by checkUnits. Not owned
+    const std::unordered_map<std::string, double> *m_checkTimestamps;
+
+    // Files already stat'd and scanned during the current build
+    std::unordered_map<std::string, FileScan> m_fileScans;
 };
 
 } // namespace svdep
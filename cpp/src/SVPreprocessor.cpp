@@ -18,13 +18,55 @@
  * limitations under the License.
  */
 #include "SVPreprocessor.h"
+#include <algorithm>
 #include <cctype>
+#include <cstring>
 #include <stdexcept>
 
+#if defined(__SSE2__) && (defined(__GNUC__) || defined(__clang__))
+#include <emmintrin.h>
+#define SVDEP_HAVE_SSE2 1
+#endif
+
 namespace svdep {
 
+/**
+ * Find the first occurrence of any of three bytes in data[pos..len).
+ * Uses 16-byte SSE2 compares where available, with a scalar tail.
+ * Returns len if none of the bytes is found.
+ */
+static size_t findAnyOf3(const char *data, size_t pos, size_t len, char a, char b, char c) {
+#ifdef SVDEP_HAVE_SSE2
+    const __m128i va = _mm_set1_epi8(a);
+    const __m128i vb = _mm_set1_epi8(b);
+    const __m128i vc = _mm_set1_epi8(c);
+    while (pos + 16 <= len) {
+        __m128i v = _mm_loadu_si128(reinterpret_cast<const __m128i *>(data + pos));
+        __m128i m = _mm_or_si128(
+            _mm_or_si128(_mm_cmpeq_epi8(v, va), _mm_cmpeq_epi8(v, vb)),
+            _mm_cmpeq_epi8(v, vc));
+        int mask = _mm_movemask_epi8(m);
+        if (mask) {
+            return pos + __builtin_ctz(mask);
+        }
+        pos += 16;
+    }
+#endif
+    while (pos < len) {
+        char d = data[pos];
+        if (d == a || d == b || d == c) {
+            return pos;
+        }
+        pos++;
+    }
+    return len;
+}
+
 SVPreprocessor::SVPreprocessor()
-    : m_pos(0), m_line(1), m_column(1), m_hasPeeked(false) {
+    : m_pos(0), m_line(1), m_column(1), m_hasPeeked(false), m_fastScan(true),
+      m_macroTable(&m_macros), m_skeleton(nullptr), m_directiveStart(0),
+      m_guardDepth(0), m_numDirectives(0),
+      m_guardStart(0), m_guardEnd(std::string::npos), m_guardValid(true) {
 }
 
 SVPreprocessor::~SVPreprocessor() {
@@ -39,6 +81,14 @@ void SVPreprocessor::setInput(const std::string& content, const std::string& fil
     m_hasPeeked = false;
     m_includes.clear();
     m_condStack.clear();
+    m_directiveStart = 0;
+    m_guardDepth = 0;
+    m_numDirectives = 0;
+    m_guardCandidate.clear();
+    m_guardStart = 0;
+    m_guardEnd = std::string::npos;
+    m_guardValid = true;
+    m_includeGuard.clear();
 }
 
 void SVPreprocessor::setIncludeCallback(IncludeCallback callback) {
@@ -66,24 +116,178 @@ const std::vector<std::string>& SVPreprocessor::getIncludes() const {
 }
 
 void SVPreprocessor::process() {
-    while (!isAtEnd()) {
-        Token tok = nextToken();
-        if (tok.type == TokenType::END_OF_FILE) {
-            break;
+    if (m_fastScan) {
+        processFast();
+    } else {
+        while (!isAtEnd()) {
+            Token tok = nextToken();
+            if (tok.type == TokenType::END_OF_FILE) {
+                break;
+            }
+        }
+    }
+    finishIncludeGuard();
+}
+
+DirectiveSkeleton SVPreprocessor::extractSkeleton() {
+    // With m_skeleton set, directive handlers record rather than apply.
+    // The conditional stack stays empty, so every branch is scanned
+    DirectiveSkeleton skeleton;
+    m_skeleton = &skeleton;
+    process();
+    m_skeleton = nullptr;
+    skeleton.guard = m_includeGuard;
+    return skeleton;
+}
+
+void SVPreprocessor::replay(const DirectiveSkeleton& skeleton) {
+    std::string include;
+    size_t pos = 0;
+    do {
+        pos = replayStep(skeleton, pos, include);
+        if (!include.empty() && m_includeCallback) {
+            // Let the caller process the include in-place, so that any
+            // macros it defines are visible to the rest of this file
+            m_includeCallback(include);
+        }
+    } while (!include.empty());
+}
+
+size_t SVPreprocessor::replayStep(const DirectiveSkeleton& skeleton, size_t pos,
+                                  std::string& include) {
+    for (; pos < skeleton.events.size(); pos++) {
+        const DirectiveEvent& ev = skeleton.events[pos];
+        switch (ev.kind) {
+            case DirectiveKind::Include:
+                if (isActive()) {
+                    m_includes.push_back(ev.arg);
+                    include = ev.arg;
+                    return pos + 1;
+                }
+                break;
+            case DirectiveKind::Define:
+                if (isActive()) applyDefine(ev.arg, "1");
+                break;
+            case DirectiveKind::Undef:
+                if (isActive()) applyUndef(ev.arg);
+                break;
+            case DirectiveKind::Ifdef: applyIfdef(ev.arg, false); break;
+            case DirectiveKind::Ifndef: applyIfdef(ev.arg, true); break;
+            case DirectiveKind::Elsif: applyElsif(ev.arg); break;
+            case DirectiveKind::Else: applyElse(); break;
+            case DirectiveKind::Endif: applyEndif(); break;
         }
     }
+    include.clear();
+    m_includeGuard = skeleton.guard;
+    return pos;
+}
+
+const std::string& SVPreprocessor::getIncludeGuard() const {
+    return m_includeGuard;
 }
 
 void SVPreprocessor::defineMacro(const std::string& name, const std::string& value) {
-    m_macros[name] = value;
+    (*m_macroTable)[name] = value;
 }
 
 void SVPreprocessor::undefineMacro(const std::string& name) {
-    m_macros.erase(name);
+    m_macroTable->erase(name);
 }
 
 bool SVPreprocessor::isMacroDefined(const std::string& name) const {
-    return m_macros.find(name) != m_macros.end();
+    return m_macroTable->find(name) != m_macroTable->end();
+}
+
+void SVPreprocessor::setMacroTable(MacroTable *table) {
+    m_macroTable = table ? table : &m_macros;
+}
+
+void SVPreprocessor::setFastScan(bool enable) {
+    m_fastScan = enable;
+}
+
+/**
+ * Fast-path equivalent of the token loop in process(). For dependency
+ * purposes only directives, comments and strings matter, so everything
+ * in between is skipped with a multi-byte search. Directives are still
+ * handed to the regular directive handlers. Line/column counters are
+ * not maintained across skipped regions.
+ */
+void SVPreprocessor::processFast() {
+    const char *data = m_content.data();
+    const size_t len = m_content.size();
+
+    while (m_pos < len) {
+        m_pos = findAnyOf3(data, m_pos, len, '`', '"', '/');
+        if (m_pos >= len) {
+            break;
+        }
+
+        char c = data[m_pos];
+        if (c == '`') {
+            scanDirective();
+        } else if (c == '"') {
+            fastSkipString();
+        } else if (m_pos + 1 < len && data[m_pos + 1] == '/') {
+            fastSkipLineComment();
+        } else if (m_pos + 1 < len && data[m_pos + 1] == '*') {
+            fastSkipBlockComment();
+        } else {
+            m_pos++; // Division operator
+        }
+    }
+}
+
+void SVPreprocessor::fastSkipString() {
+    const char *data = m_content.data();
+    const size_t len = m_content.size();
+
+    m_pos++; // consume opening "
+    while (m_pos < len) {
+        m_pos = findAnyOf3(data, m_pos, len, '"', '\\', '\n');
+        if (m_pos >= len) {
+            break;
+        }
+        char c = data[m_pos];
+        if (c == '"') {
+            m_pos++; // consume closing "
+            break;
+        } else if (c == '\\') {
+            // Escape sequence: the escaped character (even a newline) is
+            // part of the string
+            m_pos = std::min(m_pos + 2, len);
+        } else {
+            // Unterminated string. Leave the newline unconsumed
+            break;
+        }
+    }
+}
+
+void SVPreprocessor::fastSkipLineComment() {
+    const void *nl = std::memchr(
+        m_content.data() + m_pos, '\n', m_content.size() - m_pos);
+    m_pos = nl ? (static_cast<const char *>(nl) - m_content.data()) + 1 : m_content.size();
+}
+
+void SVPreprocessor::fastSkipBlockComment() {
+    const char *data = m_content.data();
+    const size_t len = m_content.size();
+
+    m_pos += 2; // consume /*
+    while (m_pos < len) {
+        const void *star = std::memchr(data + m_pos, '*', len - m_pos);
+        if (!star) {
+            m_pos = len;
+            break;
+        }
+        m_pos = static_cast<const char *>(star) - data;
+        if (m_pos + 1 < len && data[m_pos + 1] == '/') {
+            m_pos += 2; // consume */
+            break;
+        }
+        m_pos++;
+    }
 }
 
 char SVPreprocessor::peek() const {
@@ -271,6 +475,7 @@ Token SVPreprocessor::scanNumber() {
 }
 
 Token SVPreprocessor::scanDirective() {
+    m_directiveStart = m_pos;
     advance(); // consume `
     
     std::string name;
@@ -283,6 +488,8 @@ Token SVPreprocessor::scanDirective() {
         }
     }
 
+    trackIncludeGuard(name);
+
     // Handle directive if we're in active code
     if (!name.empty()) {
         handleDirective(name);
@@ -404,7 +611,20 @@ void SVPreprocessor::handleInclude() {
     }
 
     if (!filename.empty()) {
-        m_includes.push_back(filename);
+        if (m_skeleton) {
+            m_skeleton->events.emplace_back(DirectiveKind::Include, filename);
+        } else {
+            applyInclude(filename);
+        }
+    }
+}
+
+void SVPreprocessor::applyInclude(const std::string& filename) {
+    m_includes.push_back(filename);
+    if (m_includeCallback) {
+        // Let the caller process the include in-place, so that any
+        // macros it defines are visible to the rest of this file
+        m_includeCallback(filename);
     }
 }
 
@@ -460,22 +680,48 @@ void SVPreprocessor::handleDefine() {
         value.pop_back();
     }
 
-    m_macros[name] = value.empty() ? "1" : value;
+    if (m_skeleton) {
+        m_skeleton->events.emplace_back(DirectiveKind::Define, name);
+    } else {
+        applyDefine(name, value.empty() ? "1" : value);
+    }
+}
+
+void SVPreprocessor::applyDefine(const std::string& name, const std::string& value) {
+    (*m_macroTable)[name] = value;
 }
 
 void SVPreprocessor::handleUndef() {
     skipWhitespaceNotNewline();
     std::string name = parseIdentifier();
     if (!name.empty()) {
-        m_macros.erase(name);
+        if (m_skeleton) {
+            m_skeleton->events.emplace_back(DirectiveKind::Undef, name);
+        } else {
+            applyUndef(name);
+        }
     }
     skipToEndOfLine();
 }
 
+void SVPreprocessor::applyUndef(const std::string& name) {
+    m_macroTable->erase(name);
+}
+
 void SVPreprocessor::handleIfdef(bool invert) {
     skipWhitespaceNotNewline();
     std::string name = parseIdentifier();
     
+    if (m_skeleton) {
+        m_skeleton->events.emplace_back(
+            invert ? DirectiveKind::Ifndef : DirectiveKind::Ifdef, name);
+    } else {
+        applyIfdef(name, invert);
+    }
+    skipToEndOfLine();
+}
+
+void SVPreprocessor::applyIfdef(const std::string& name, bool invert) {
     bool defined = isMacroDefined(name);
     if (invert) defined = !defined;
 
@@ -485,26 +731,32 @@ void SVPreprocessor::handleIfdef(bool invert) {
     state.in_else = false;
     
     m_condStack.push_back(state);
-    skipToEndOfLine();
 }
 
 void SVPreprocessor::handleElsif() {
+    skipWhitespaceNotNewline();
+    std::string name = parseIdentifier();
+
+    if (m_skeleton) {
+        m_skeleton->events.emplace_back(DirectiveKind::Elsif, name);
+    } else {
+        applyElsif(name);
+    }
+    skipToEndOfLine();
+}
+
+void SVPreprocessor::applyElsif(const std::string& name) {
     if (m_condStack.empty()) {
         // Error: elsif without ifdef
-        skipToEndOfLine();
         return;
     }
 
     CondState& state = m_condStack.back();
     if (state.in_else) {
         // Error: elsif after else
-        skipToEndOfLine();
         return;
     }
 
-    skipWhitespaceNotNewline();
-    std::string name = parseIdentifier();
-    
     bool defined = isMacroDefined(name);
     
     // Parent must be active, and we haven't seen a true branch yet
@@ -517,11 +769,17 @@ void SVPreprocessor::handleElsif() {
     } else {
         state.active = false;
     }
-    
-    skipToEndOfLine();
 }
 
 void SVPreprocessor::handleElse() {
+    if (m_skeleton) {
+        m_skeleton->events.emplace_back(DirectiveKind::Else, "");
+    } else {
+        applyElse();
+    }
+}
+
+void SVPreprocessor::applyElse() {
     if (m_condStack.empty()) {
         // Error: else without ifdef
         return;
@@ -543,11 +801,101 @@ void SVPreprocessor::handleElse() {
 }
 
 void SVPreprocessor::handleEndif() {
+    if (m_skeleton) {
+        m_skeleton->events.emplace_back(DirectiveKind::Endif, "");
+    } else {
+        applyEndif();
+    }
+}
+
+void SVPreprocessor::applyEndif() {
     if (!m_condStack.empty()) {
         m_condStack.pop_back();
     }
 }
 
+/**
+ * Returns true if content[pos..end) holds only whitespace and comments
+ */
+static bool isTrivia(const std::string& content, size_t pos, size_t end) {
+    while (pos < end) {
+        char c = content[pos];
+        if (c == ' ' || c == '\t' || c == '\r' || c == '\n' || c == '\f') {
+            pos++;
+        } else if (c == '/' && pos + 1 < end && content[pos + 1] == '/') {
+            size_t nl = content.find('\n', pos);
+            pos = (nl == std::string::npos) ? end : nl + 1;
+        } else if (c == '/' && pos + 1 < end && content[pos + 1] == '*') {
+            size_t close = content.find("*/", pos + 2);
+            if (close == std::string::npos) {
+                return false;
+            }
+            pos = close + 2;
+        } else {
+            return false;
+        }
+    }
+    return true;
+}
+
+/**
+ * Called for every directive, before it is handled. The file is guarded
+ * if its first directive is `ifndef X, the matching `endif has no `else
+ * or `elsif, and only whitespace and comments lie outside the pair.
+ * Nesting is tracked here rather than via the conditional stack, so the
+ * result is the same for every macro state and during skeleton extraction.
+ */
+void SVPreprocessor::trackIncludeGuard(const std::string& directive) {
+    if (!m_guardValid) {
+        return;
+    }
+
+    if (m_guardEnd != std::string::npos) {
+        // Anything after the closing `endif defeats the guard
+        m_guardValid = false;
+    } else if (m_numDirectives == 0) {
+        if (directive == "ifndef") {
+            m_guardCandidate = peekIdentifier();
+            m_guardStart = m_directiveStart;
+            m_guardDepth = 1;
+            m_guardValid = !m_guardCandidate.empty();
+        } else {
+            m_guardValid = false;
+        }
+    } else if (directive == "ifdef" || directive == "ifndef") {
+        m_guardDepth++;
+    } else if (directive == "endif") {
+        if (--m_guardDepth == 0) {
+            m_guardEnd = m_pos;
+        }
+    } else if (m_guardDepth == 1 &&
+            (directive == "else" || directive == "elsif" || directive == "elseif")) {
+        m_guardValid = false;
+    }
+    m_numDirectives++;
+}
+
+void SVPreprocessor::finishIncludeGuard() {
+    m_includeGuard.clear();
+    if (m_guardValid && m_numDirectives > 0 && m_guardEnd != std::string::npos &&
+            isTrivia(m_content, 0, m_guardStart) &&
+            isTrivia(m_content, m_guardEnd, m_content.size())) {
+        m_includeGuard = m_guardCandidate;
+    }
+}
+
+std::string SVPreprocessor::peekIdentifier() const {
+    size_t pos = m_pos;
+    while (pos < m_content.size() && (m_content[pos] == ' ' || m_content[pos] == '\t')) {
+        pos++;
+    }
+    size_t start = pos;
+    while (pos < m_content.size() && (std::isalnum(static_cast<unsigned char>(m_content[pos])) || m_content[pos] == '_')) {
+        pos++;
+    }
+    return m_content.substr(start, pos - start);
+}
+
 std::string SVPreprocessor::parseIdentifier() {
     std::string name;
     while (!isAtEnd()) {
@@ -25,6 +25,7 @@
 #include <unordered_map>
 #include <unordered_set>
 #include <functional>
+#include "DirectiveSkeleton.h"
 
 namespace svdep {
 
@@ -62,6 +63,7 @@ struct Token {
 class SVPreprocessor {
 public:
     using IncludeCallback = std::function<std::string(const std::string&)>;
+    using MacroTable = std::unordered_map<std::string, std::string>;
 
     SVPreprocessor();
     ~SVPreprocessor();
@@ -84,6 +86,26 @@ public:
     // Process the entire input, collecting includes
     void process();
 
+    // Scan the entire input, recording every dependency-relevant directive
+    // regardless of macro state. Macro state and includes are not updated
+    DirectiveSkeleton extractSkeleton();
+
+    // Evaluate a skeleton from extractSkeleton() against the macro table,
+    // collecting includes as process() would for the original source
+    void replay(const DirectiveSkeleton& skeleton);
+
+    // Replay a skeleton from event 'pos' up to and including the next
+    // active `include, whose name is set in 'include' (and added to
+    // getIncludes()) without calling the include callback. Returns the
+    // position to resume from. At the end of the skeleton, 'include' is
+    // cleared and the include guard is set
+    size_t replayStep(const DirectiveSkeleton& skeleton, size_t pos, std::string& include);
+
+    // Guard macro if the whole file is wrapped in `ifndef X ... `endif
+    // (the classic include-guard pattern), otherwise empty. Valid after
+    // process(). While X is defined, re-including the file has no effect
+    const std::string& getIncludeGuard() const;
+
     // Define a macro
     void defineMacro(const std::string& name, const std::string& value = "1");
 
@@ -93,6 +115,15 @@ public:
     // Check if macro is defined
     bool isMacroDefined(const std::string& name) const;
 
+    // Use an externally-owned macro table, so that macro state can flow
+    // between preprocessor instances (eg across a compilation unit).
+    // Passing nullptr reverts to the instance's own table
+    void setMacroTable(MacroTable *table);
+
+    // Select the memchr/SIMD fast path for process() (default) or the
+    // byte-wise reference scanner
+    void setFastScan(bool enable);
+
 private:
     std::string m_content;
     std::string m_filename;
@@ -102,9 +133,11 @@ private:
     
     Token m_peeked;
     bool m_hasPeeked;
+    bool m_fastScan;
 
     std::vector<std::string> m_includes;
-    std::unordered_map<std::string, std::string> m_macros;
+    MacroTable m_macros;
+    MacroTable *m_macroTable;
     
     // Conditional compilation stack
     struct CondState {
@@ -116,6 +149,19 @@ private:
 
     IncludeCallback m_includeCallback;
 
+    // Set while extracting a skeleton
+    DirectiveSkeleton *m_skeleton;
+
+    // Include-guard detection state
+    size_t m_directiveStart;
+    int m_guardDepth;
+    size_t m_numDirectives;
+    std::string m_guardCandidate;
+    size_t m_guardStart;
+    size_t m_guardEnd;
+    bool m_guardValid;
+    std::string m_includeGuard;
+
     // Lexer helpers
     char peek() const;
     char advance();
@@ -133,6 +179,12 @@ private:
     Token scanLineComment();
     Token scanBlockComment();
     
+    // Fast-path scanning: jump between bytes that matter for dependencies
+    void processFast();
+    void fastSkipString();
+    void fastSkipLineComment();
+    void fastSkipBlockComment();
+
     // Directive handling
     void handleDirective(const std::string& directive);
     void handleInclude();
@@ -142,9 +194,23 @@ private:
     void handleElsif();
     void handleElse();
     void handleEndif();
+
+    // Directive semantics, shared by source scanning and skeleton replay
+    void applyInclude(const std::string& filename);
+    void applyDefine(const std::string& name, const std::string& value);
+    void applyUndef(const std::string& name);
+    void applyIfdef(const std::string& name, bool invert);
+    void applyElsif(const std::string& name);
+    void applyElse();
+    void applyEndif();
     
     // Conditional compilation
     bool isActive() const;
+
+    // Include-guard detection
+    void trackIncludeGuard(const std::string& directive);
+    void finishIncludeGuard();
+    std::string peekIdentifier() const;
     
     // Parse helpers
     std::string parseString();
@@ -0,0 +1,275 @@
+/*
+ * ScanCache.cpp
+ *
+ * Persistent cache of per-file directive skeletons
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#include "ScanCache.h"
+#include <atomic>
+#include <cstdio>
+#include <fstream>
+
+#ifdef _WIN32
+#include <process.h>
+#define getpid _getpid
+#else
+#include <unistd.h>
+#endif
+
+namespace svdep {
+
+const char *ScanCache::SCANNER = "native-1";
+
+static const char *HEADER = "svdep-scan-cache 1 ";
+
+static const char *kindName(DirectiveKind kind) {
+    switch (kind) {
+        case DirectiveKind::Include: return "include";
+        case DirectiveKind::Define: return "define";
+        case DirectiveKind::Undef: return "undef";
+        case DirectiveKind::Ifdef: return "ifdef";
+        case DirectiveKind::Ifndef: return "ifndef";
+        case DirectiveKind::Elsif: return "elsif";
+        case DirectiveKind::Else: return "else";
+        case DirectiveKind::Endif: return "endif";
+    }
+    return "";
+}
+
+static bool parseKind(const std::string& name, DirectiveKind& kind) {
+    static const std::unordered_map<std::string, DirectiveKind> kinds = {
+        {"include", DirectiveKind::Include},
+        {"define", DirectiveKind::Define},
+        {"undef", DirectiveKind::Undef},
+        {"ifdef", DirectiveKind::Ifdef},
+        {"ifndef", DirectiveKind::Ifndef},
+        {"elsif", DirectiveKind::Elsif},
+        {"else", DirectiveKind::Else},
+        {"endif", DirectiveKind::Endif},
+    };
+    auto it = kinds.find(name);
+    if (it == kinds.end()) {
+        return false;
+    }
+    kind = it->second;
+    return true;
+}
+
+static std::string escape(const std::string& s) {
+    std::string ret;
+    ret.reserve(s.size());
+    for (char c : s) {
+        switch (c) {
+            case '\\': ret += "\\\\"; break;
+            case '\n': ret += "\\n"; break;
+            case '\r': ret += "\\r"; break;
+            default: ret += c; break;
+        }
+    }
+    return ret;
+}
+
+static bool unescape(const std::string& s, std::string& out) {
+    out.clear();
+    for (size_t i = 0; i < s.size(); i++) {
+        if (s[i] != '\\') {
+            out += s[i];
+            continue;
+        }
+        if (++i >= s.size()) {
+            return false;
+        }
+        switch (s[i]) {
+            case '\\': out += '\\'; break;
+            case 'n': out += '\n'; break;
+            case 'r': out += '\r'; break;
+            default: return false;
+        }
+    }
+    return true;
+}
+
+// Splits "<word> <rest>" at the first space. 'rest' is empty if there is none
+static void splitWord(const std::string& line, std::string& word, std::string& rest) {
+    size_t sp = line.find(' ');
+    if (sp == std::string::npos) {
+        word = line;
+        rest.clear();
+    } else {
+        word = line.substr(0, sp);
+        rest = line.substr(sp + 1);
+    }
+}
+
+static bool parseInt(const std::string& s, int64_t& value) {
+    if (s.empty()) {
+        return false;
+    }
+    size_t i = (s[0] == '-') ? 1 : 0;
+    if (i == s.size()) {
+        return false;
+    }
+    value = 0;
+    for (; i < s.size(); i++) {
+        if (s[i] < '0' || s[i] > '9') {
+            return false;
+        }
+        value = value * 10 + (s[i] - '0');
+    }
+    if (s[0] == '-') {
+        value = -value;
+    }
+    return true;
+}
+
+void ScanCache::writeSkeleton(std::ostream& out, const DirectiveSkeleton& skeleton) {
+    if (!skeleton.guard.empty()) {
+        out << "guard " << escape(skeleton.guard) << "\n";
+    }
+    for (const auto& ev : skeleton.events) {
+        out << kindName(ev.kind);
+        if (!ev.arg.empty()) {
+            out << " " << escape(ev.arg);
+        }
+        out << "\n";
+    }
+}
+
+bool ScanCache::parseSkeletonLine(const std::string& line, DirectiveSkeleton& skeleton) {
+    std::string word, rest, arg;
+    splitWord(line, word, rest);
+    if (!unescape(rest, arg)) {
+        return false;
+    }
+    DirectiveKind kind;
+    if (word == "guard") {
+        skeleton.guard = arg;
+    } else if (parseKind(word, kind)) {
+        skeleton.events.emplace_back(kind, arg);
+    } else {
+        return false;
+    }
+    return true;
+}
+
+const DirectiveSkeleton* ScanCache::find(const std::string& path, int64_t mtimeNs, int64_t size) const {
+    auto it = m_entries.find(path);
+    if (it == m_entries.end() || it->second.mtimeNs != mtimeNs || it->second.size != size) {
+        return nullptr;
+    }
+    return &it->second.skeleton;
+}
+
+const DirectiveSkeleton& ScanCache::insert(const std::string& path, int64_t mtimeNs, int64_t size,
+                                           DirectiveSkeleton&& skeleton) {
+    Entry& entry = m_entries[path];
+    entry.mtimeNs = mtimeNs;
+    entry.size = size;
+    entry.skeleton = std::move(skeleton);
+    return entry.skeleton;
+}
+
+void ScanCache::load(const std::string& path) {
+    m_entries.clear();
+
+    std::ifstream in(path);
+    if (!in.is_open()) {
+        return;
+    }
+
+    std::string line;
+    if (!std::getline(in, line) || line != std::string(HEADER) + SCANNER) {
+        return;
+    }
+
+    std::string word, rest;
+    Entry *entry = nullptr;
+    std::string entryPath;
+
+    while (std::getline(in, line)) {
+        splitWord(line, word, rest);
+
+        if (!entry) {
+            // Expect "file <mtime_ns> <size> <path>"
+            std::string mtime, size;
+            int64_t mtimeNs, sizeV;
+            if (word != "file") break;
+            splitWord(rest, mtime, rest);
+            splitWord(rest, size, rest);
+            if (!parseInt(mtime, mtimeNs) || !parseInt(size, sizeV) ||
+                    !unescape(rest, entryPath) || entryPath.empty()) {
+                break;
+            }
+            entry = &m_entries[entryPath];
+            entry->mtimeNs = mtimeNs;
+            entry->size = sizeV;
+            entry->skeleton = DirectiveSkeleton();
+            continue;
+        }
+
+        if (word == "end") {
+            entry = nullptr;
+            continue;
+        }
+
+        if (!parseSkeletonLine(line, entry->skeleton)) {
+            break;
+        }
+    }
+
+    if (entry || !in.eof()) {
+        // Truncated or corrupt. Don't trust any of it
+        m_entries.clear();
+    }
+}
+
+bool ScanCache::save(const std::string& path) const {
+    // Several processes (and threads) may save the same cache at once.
+    // Each writes its own temporary, so none can rename another's
+    // half-written file into place
+    static std::atomic<unsigned> counter(0);
+    std::string tmp = path + ".tmp-" + std::to_string(getpid()) + "-" + std::to_string(counter++);
+    {
+        std::ofstream out(tmp, std::ios::trunc);
+        if (!out.is_open()) {
+            return false;
+        }
+
+        out << HEADER << SCANNER << "\n";
+        for (const auto& kv : m_entries) {
+            const Entry& entry = kv.second;
+            out << "file " << entry.mtimeNs << " " << entry.size << " "
+                << escape(kv.first) << "\n";
+            writeSkeleton(out, entry.skeleton);
+            out << "end\n";
+        }
+
+        out.flush();
+        if (!out) {
+            std::remove(tmp.c_str());
+            return false;
+        }
+    }
+
+    // Readers see either the old cache or the new one, never a partial file
+    if (std::rename(tmp.c_str(), path.c_str()) != 0) {
+        std::remove(tmp.c_str());
+        return false;
+    }
+    return true;
+}
+
+} // namespace svdep
@@ -0,0 +1,90 @@
+/*
+ * ScanCache.h
+ *
+ * Persistent cache of per-file directive skeletons
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef SCANCACHE_H
+#define SCANCACHE_H
+
+#include <cstdint>
+#include <ostream>
+#include <string>
+#include <unordered_map>
+#include "DirectiveSkeleton.h"
+
+namespace svdep {
+
+/**
+ * Maps a file path to the skeleton extracted from it. An entry is only
+ * valid while the file's modification time and size are unchanged.
+ *
+ * The on-disk form is line-oriented text:
+ *
+ *   svdep-scan-cache 1 <scanner>
+ *   file <mtime_ns> <size> <path>
+ *   guard <macro>            (optional)
+ *   <kind> <arg>             (one per directive)
+ *   end
+ *
+ * Backslash, newline and carriage return in paths and arguments are
+ * escaped as \\, \n and \r.
+ */
+class ScanCache {
+public:
+    // Identifies the scanner that produced the skeletons. Caches from a
+    // different scanner (or format version) are ignored on load
+    static const char *SCANNER;
+
+    // Returns the cached skeleton for path, or nullptr if there is none
+    // or the file has changed since it was scanned
+    const DirectiveSkeleton* find(const std::string& path, int64_t mtimeNs, int64_t size) const;
+
+    // Store a skeleton, replacing any existing entry for the path
+    const DirectiveSkeleton& insert(const std::string& path, int64_t mtimeNs, int64_t size,
+                                    DirectiveSkeleton&& skeleton);
+
+    // Load entries from a cache file. A missing, unreadable or corrupt
+    // file leaves the cache empty and is not an error
+    void load(const std::string& path);
+
+    // Write all entries to a cache file. The file is replaced atomically
+    bool save(const std::string& path) const;
+
+    void clear() { m_entries.clear(); }
+
+    // Write the guard and directive records of a skeleton
+    static void writeSkeleton(std::ostream& out, const DirectiveSkeleton& skeleton);
+
+    // Add a guard or directive record to a skeleton. Returns false if the
+    // line is neither
+    static bool parseSkeletonLine(const std::string& line, DirectiveSkeleton& skeleton);
+
+    size_t size() const { return m_entries.size(); }
+
+private:
+    struct Entry {
+        int64_t mtimeNs;
+        int64_t size;
+        DirectiveSkeleton skeleton;
+    };
+
+    std::unordered_map<std::string, Entry> m_entries;
+};
+
+} // namespace svdep
+
+#endif /* SCANCACHE_H */
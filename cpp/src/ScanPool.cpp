@@ -0,0 +1,113 @@
+/*
+ * ScanPool.cpp
+ *
+ * File state shared by the builds of many compilation units
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#include "ScanPool.h"
+#include <fstream>
+#include <sstream>
+
+namespace svdep {
+
+void ScanPool::begin() {
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_stats.clear();
+    m_scans.clear();
+    m_dirStat.clear();
+    m_realPaths.clear();
+}
+
+template <class T> T& ScanPool::entry(std::unordered_map<std::string, std::unique_ptr<T>>& m,
+                                      const std::string& path) {
+    std::lock_guard<std::mutex> lock(m_mutex);
+    std::unique_ptr<T>& e = m[path];
+    if (!e) {
+        e.reset(new T());
+    }
+    return *e;
+}
+
+const ScanPool::FileStat& ScanPool::stat(const std::string& path, DepsReport& report) {
+    StatEntry& e = entry(m_stats, path);
+    std::call_once(e.once, [&]() {
+        report.stats++;
+        m_dirStat.stat(path, e.st);
+    });
+    return e.st;
+}
+
+const DirectiveSkeleton* ScanPool::scan(const std::string& path, const FileStat& st,
+                                        bool fastScan, DepsReport& report, std::string& error) {
+    ScanEntry& e = entry(m_scans, path);
+    bool owner = false;
+    std::call_once(e.once, [&]() {
+        owner = true;
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            e.skeleton = m_scanCache.find(path, st.mtimeNs, st.size);
+        }
+        if (e.skeleton) {
+            report.scan_cache_hits++;
+            return;
+        }
+        report.scan_cache_misses++;
+
+        std::string content;
+        {
+            PhaseTimer timer(report.time_read);
+            std::ifstream file(path);
+            if (!file.is_open()) {
+                e.error = "Failed to open file: " + path;
+                return;
+            }
+            std::stringstream buffer;
+            buffer << file.rdbuf();
+            content = buffer.str();
+            report.bytes_read += content.size();
+        }
+
+        DirectiveSkeleton skeleton = scanContent(content, path, fastScan, m_scanStore.get(), report);
+
+        std::lock_guard<std::mutex> lock(m_mutex);
+        e.skeleton = &m_scanCache.insert(path, st.mtimeNs, st.size, std::move(skeleton));
+    });
+
+    if (!owner) {
+        // Another context got there first
+        report.scan_cache_hits++;
+    }
+    if (!e.error.empty()) {
+        error = e.error;
+    }
+    return e.skeleton;
+}
+
+void ScanPool::setScanStore(const std::string& dir) {
+    m_scanStore.reset(new ScanStore(dir));
+}
+
+void ScanPool::loadScanCache(const std::string& path) {
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_scanCache.load(path);
+}
+
+bool ScanPool::saveScanCache(const std::string& path) {
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_scanCache.save(path);
+}
+
+} // namespace svdep
@@ -0,0 +1,107 @@
+/*
+ * ScanPool.h
+ *
+ * File state shared by the builds of many compilation units
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef SCANPOOL_H
+#define SCANPOOL_H
+
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <unordered_map>
+#include "DepsReport.h"
+#include "DirStat.h"
+#include "DirectiveSkeleton.h"
+#include "RealPath.h"
+#include "ScanCache.h"
+#include "ScanStore.h"
+
+namespace svdep {
+
+/**
+ * Stat results and directive skeletons shared by contexts building
+ * different units, possibly on different threads. Within a generation
+ * (see begin()), each file is stat'd once and read and scanned at most
+ * once, by whichever context reaches it first. Skeletons carry over to
+ * later generations while a file's modification time and size are
+ * unchanged.
+ *
+ * Work is counted in the report of the context that performs it.
+ */
+class ScanPool {
+public:
+    using FileStat = svdep::FileStat;
+
+    // Start a new generation: files are stat'd again before their
+    // skeletons are reused. Must not be called while builds are running
+    void begin();
+
+    // Stat a path, counting the stat in the report. The time is left to
+    // the caller, since include probes are timed as resolution
+    const FileStat& stat(const std::string& path, DepsReport& report);
+
+    // Get the skeleton of an existing file, reading and scanning it only
+    // if no valid skeleton is known. Returns nullptr, with error set, if
+    // the file can't be read
+    const DirectiveSkeleton* scan(const std::string& path, const FileStat& st,
+                                  bool fastScan, DepsReport& report, std::string& error);
+
+    // Canonical paths, for contexts with canonicalization enabled.
+    // Cleared by begin()
+    RealPathCache& realPaths() { return m_realPaths; }
+
+    // Look skeletons up in, and add them to, a content-addressed store
+    // before scanning files. Must not be called while builds are running
+    void setScanStore(const std::string& dir);
+
+    // Load and save the underlying scan cache (see ScanCache)
+    void loadScanCache(const std::string& path);
+    bool saveScanCache(const std::string& path);
+
+private:
+    struct StatEntry {
+        std::once_flag once;
+        FileStat st;
+    };
+
+    struct ScanEntry {
+        std::once_flag once;
+        const DirectiveSkeleton *skeleton = nullptr;
+        std::string error;
+    };
+
+    // Returns the entry for path, creating it if needed. Entries are
+    // heap-allocated so references stay valid while the map grows
+    template <class T> T& entry(std::unordered_map<std::string, std::unique_ptr<T>>& m,
+                                const std::string& path);
+
+    // Guards the maps and the scan cache. Held only for lookups and
+    // inserts, never while reading or scanning a file
+    std::mutex m_mutex;
+    DirStat m_dirStat;
+    RealPathCache m_realPaths;
+    ScanCache m_scanCache;
+    std::unique_ptr<ScanStore> m_scanStore;
+    std::unordered_map<std::string, std::unique_ptr<StatEntry>> m_stats;
+    std::unordered_map<std::string, std::unique_ptr<ScanEntry>> m_scans;
+};
+
+} // namespace svdep
+
+#endif /* SCANPOOL_H */
@@ -0,0 +1,154 @@
+/*
+ * ScanStore.cpp
+ *
+ * Content-addressed store of directive skeletons
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#include "ScanStore.h"
+#include "SVPreprocessor.h"
+#include "ScanCache.h"
+#include "Sha256.h"
+#include <cstdio>
+#include <filesystem>
+#include <fstream>
+#include <sstream>
+
+#ifdef _WIN32
+#include <atomic>
+#include <process.h>
+#else
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+namespace svdep {
+
+static const char *HEADER = "svdep-scan-store 1 ";
+
+ScanStore::ScanStore(const std::string& dir) : m_dir(dir) {
+}
+
+std::string ScanStore::entryDir(const std::string& digest) const {
+    return m_dir + "/" + ScanCache::SCANNER + "/" + digest.substr(0, 2);
+}
+
+bool ScanStore::find(const std::string& digest, DirectiveSkeleton& skeleton) const {
+    std::ifstream in(entryDir(digest) + "/" + digest);
+    if (!in.is_open()) {
+        return false;
+    }
+    std::string line;
+    if (!std::getline(in, line) || line != std::string(HEADER) + ScanCache::SCANNER) {
+        return false;
+    }
+    skeleton = DirectiveSkeleton();
+    while (std::getline(in, line)) {
+        if (line == "end") {
+            return true;
+        }
+        if (!ScanCache::parseSkeletonLine(line, skeleton)) {
+            return false;
+        }
+    }
+    // Truncated
+    return false;
+}
+
+void ScanStore::insert(const std::string& digest, const DirectiveSkeleton& skeleton) const {
+    std::string dir = entryDir(digest);
+    std::error_code ec;
+    std::filesystem::create_directories(dir, ec);
+    if (ec) {
+        return;
+    }
+
+    std::ostringstream os;
+    os << HEADER << ScanCache::SCANNER << "\n";
+    ScanCache::writeSkeleton(os, skeleton);
+    os << "end\n";
+    const std::string data = os.str();
+
+    // Write under a name no other writer, on this machine or another, can
+    // be using. The rename then replaces any entry atomically
+#ifdef _WIN32
+    static std::atomic<unsigned> counter(0);
+    std::string tmp = dir + "/.tmp-" + std::to_string(_getpid()) + "-" + std::to_string(counter++);
+    {
+        std::ofstream out(tmp, std::ios::binary | std::ios::trunc);
+        if (!out.is_open()) {
+            return;
+        }
+        out << data;
+        out.flush();
+        if (!out) {
+            out.close();
+            std::remove(tmp.c_str());
+            return;
+        }
+    }
+#else
+    std::string tmp = dir + "/.tmp-XXXXXX";
+    int fd = mkstemp(&tmp[0]);
+    if (fd < 0) {
+        return;
+    }
+    // Other users of the store must be able to read the entry
+    fchmod(fd, 0644);
+    size_t written = 0;
+    while (written < data.size()) {
+        ssize_t n = write(fd, data.data() + written, data.size() - written);
+        if (n <= 0) {
+            break;
+        }
+        written += static_cast<size_t>(n);
+    }
+    if (close(fd) != 0 || written != data.size()) {
+        std::remove(tmp.c_str());
+        return;
+    }
+#endif
+    if (std::rename(tmp.c_str(), (dir + "/" + digest).c_str()) != 0) {
+        std::remove(tmp.c_str());
+    }
+}
+
+DirectiveSkeleton scanContent(const std::string& content, const std::string& path,
+                              bool fastScan, const ScanStore *store, DepsReport& report) {
+    PhaseTimer timer(report.time_scan);
+    DirectiveSkeleton skeleton;
+    std::string digest;
+    if (store) {
+        digest = sha256Hex(content);
+        if (store->find(digest, skeleton)) {
+            report.scan_store_hits++;
+            return skeleton;
+        }
+        report.scan_store_misses++;
+    }
+
+    SVPreprocessor pp;
+    pp.setFastScan(fastScan);
+    pp.setInput(content, path);
+    skeleton = pp.extractSkeleton();
+    report.files_scanned++;
+
+    if (store) {
+        store->insert(digest, skeleton);
+    }
+    return skeleton;
+}
+
+} // namespace svdep
@@ -0,0 +1,66 @@
+/*
+ * ScanStore.h
+ *
+ * Content-addressed store of directive skeletons
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef SCANSTORE_H
+#define SCANSTORE_H
+
+#include <string>
+#include "DepsReport.h"
+#include "DirectiveSkeleton.h"
+
+namespace svdep {
+
+/**
+ * Mirrors the Python DirScanStore. Directive skeletons keyed by the
+ * SHA-256 of the file content and the scanner (ScanCache::SCANNER), in a
+ * directory that many machines may share, eg an NFS mount. An entry is
+ * valid for any file with that content, wherever it was scanned.
+ *
+ * Entries are files at '<dir>/<scanner>/<digest[:2]>/<digest>', each
+ * written to a temporary file in the same directory and renamed into
+ * place, so concurrent writers can't corrupt it. Failures to read or
+ * write are not errors: the store is only an optimization.
+ */
+class ScanStore {
+public:
+    explicit ScanStore(const std::string& dir);
+
+    // Get the skeleton stored for a digest. Returns false if there is
+    // no usable entry
+    bool find(const std::string& digest, DirectiveSkeleton& skeleton) const;
+
+    // Store the skeleton of content with the given digest
+    void insert(const std::string& digest, const DirectiveSkeleton& skeleton) const;
+
+private:
+    std::string entryDir(const std::string& digest) const;
+
+    std::string m_dir;
+};
+
+// Extract the skeleton of file content, taking it from 'store' (if not
+// null) when the store has it. Otherwise the content is scanned and the
+// skeleton added to the store. Counts store hits and misses, scans and
+// scan time in the report
+DirectiveSkeleton scanContent(const std::string& content, const std::string& path,
+                              bool fastScan, const ScanStore *store, DepsReport& report);
+
+} // namespace svdep
+
+#endif /* SCANSTORE_H */
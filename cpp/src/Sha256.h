@@ -0,0 +1,32 @@
+/*
+ * Sha256.h
+ *
+ * SHA-256 digests
+ *
+ * Copyright 2024 Matthew Ballance and Contributors
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License.
+ * You may obtain a copy of the License at:
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+#ifndef SHA256_H
+#define SHA256_H
+
+#include <string>
+
+namespace svdep {
+
+// Lower-case hex SHA-256 digest of data
+std::string sha256Hex(const std::string& data);
+
+} // namespace svdep
+
+#endif /* SHA256_H */
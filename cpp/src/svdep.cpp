@@ -19,13 +19,39 @@
  */
 #include "svdep.h"
 #include "SVDepContext.h"
+#include "FileCollection.h"
+#include "ScanPool.h"
+#include <algorithm>
+#include <atomic>
+#include <thread>
+#include <vector>
 
 using namespace svdep;
 
 struct svdep_s {
     SVDepContext ctx;
+    // Storage for the string returned by svdep_get_report
+    std::string report;
+    // Storage for the string returned by svdep_get_check_result
+    std::string checkResult;
+    // Storage for the string returned by the reverse-dependency queries
+    std::string query;
 };
 
+struct svdep_pool_s {
+    ScanPool pool;
+};
+
+static const char *listToJson(svdep_t ctx, const std::vector<std::string>& l) {
+    ctx->query = "[";
+    for (size_t i = 0; i < l.size(); i++) {
+        if (i > 0) ctx->query += ", ";
+        ctx->query += "\"" + escapeJson(l[i]) + "\"";
+    }
+    ctx->query += "]";
+    return ctx->query.c_str();
+}
+
 extern "C" {
 
 svdep_t svdep_create(void) {
@@ -46,6 +72,41 @@ int svdep_add_root_file(svdep_t ctx, const char *path) {
     return ctx->ctx.addRootFile(path);
 }
 
+int svdep_add_define(svdep_t ctx, const char *name, const char *value) {
+    if (!ctx || !name) return -1;
+    return ctx->ctx.addDefine(name, value ? value : "");
+}
+
+int svdep_clear_defines(svdep_t ctx) {
+    if (!ctx) return -1;
+    ctx->ctx.clearDefines();
+    return 0;
+}
+
+int svdep_set_compilation_unit(svdep_t ctx, int enable) {
+    if (!ctx) return -1;
+    ctx->ctx.setCompilationUnit(enable != 0);
+    return 0;
+}
+
+int svdep_set_scan_store(svdep_t ctx, const char *dir) {
+    if (!ctx || !dir) return -1;
+    ctx->ctx.setScanStore(dir);
+    return 0;
+}
+
+int svdep_add_path_var(svdep_t ctx, const char *name, const char *dir) {
+    if (!ctx || !name || !dir) return -1;
+    ctx->ctx.addPathVar(name, dir);
+    return 0;
+}
+
+int svdep_set_canonical(svdep_t ctx, int enable) {
+    if (!ctx) return -1;
+    ctx->ctx.setCanonical(enable != 0);
+    return 0;
+}
+
 int svdep_build(svdep_t ctx) {
     if (!ctx) return -1;
     return ctx->ctx.build();
@@ -61,11 +122,155 @@ int svdep_load_json(svdep_t ctx, const char *json) {
     return ctx->ctx.loadJson(json);
 }
 
+int svdep_load_json_units(svdep_t *ctxs, int n, const char *json) {
+    if (n < 0 || (n > 0 && !ctxs) || !json) return -1;
+    std::vector<SVDepContext*> contexts;
+    for (int i = 0; i < n; i++) {
+        if (!ctxs[i]) return -1;
+        contexts.push_back(&ctxs[i]->ctx);
+    }
+    return SVDepContext::loadJsonUnits(contexts, json);
+}
+
 int svdep_check_up_to_date(svdep_t ctx, double last_timestamp) {
     if (!ctx) return -1;
     return ctx->ctx.checkUpToDate(last_timestamp);
 }
 
+int svdep_check_up_to_date_all(svdep_t ctx, double last_timestamp) {
+    if (!ctx) return -1;
+    return ctx->ctx.checkUpToDate(last_timestamp, true);
+}
+
+int svdep_check_roots(svdep_t ctx, double last_timestamp, int *verdicts, int n) {
+    if (!ctx || (n > 0 && !verdicts)) return -1;
+    std::vector<int> v;
+    int ret = ctx->ctx.checkRoots(last_timestamp, v);
+    if (ret < 0) return ret;
+    if (v.size() != (size_t)n) return -1;
+    std::copy(v.begin(), v.end(), verdicts);
+    return ret;
+}
+
+int svdep_check_units(svdep_t *ctxs, int n, const double *last_timestamps,
+                      int *verdicts, int collect_all) {
+    if (n < 0 || (n > 0 && (!ctxs || !last_timestamps || !verdicts))) return -1;
+    std::vector<SVDepContext*> contexts;
+    for (int i = 0; i < n; i++) {
+        if (!ctxs[i]) return -1;
+        contexts.push_back(&ctxs[i]->ctx);
+    }
+    SVDepContext::checkUnits(contexts, last_timestamps, verdicts, collect_all != 0);
+    return 0;
+}
+
+const char *svdep_get_check_result(svdep_t ctx) {
+    if (!ctx) return nullptr;
+    ctx->checkResult = ctx->ctx.getCheckResult().toJson();
+    return ctx->checkResult.c_str();
+}
+
+int svdep_set_fast_scan(svdep_t ctx, int enable) {
+    if (!ctx) return -1;
+    ctx->ctx.setFastScan(enable != 0);
+    return 0;
+}
+
+int svdep_load_scan_cache(svdep_t ctx, const char *path) {
+    if (!ctx || !path) return -1;
+    ctx->ctx.loadScanCache(path);
+    return 0;
+}
+
+int svdep_save_scan_cache(svdep_t ctx, const char *path) {
+    if (!ctx || !path) return -1;
+    return ctx->ctx.saveScanCache(path);
+}
+
+const char *svdep_get_includers(svdep_t ctx, const char *path) {
+    if (!ctx || !path) return nullptr;
+    return listToJson(ctx, ctx->ctx.getIncluders(path));
+}
+
+const char *svdep_get_affected_roots(svdep_t ctx, const char *path) {
+    if (!ctx || !path) return nullptr;
+    return listToJson(ctx, ctx->ctx.getAffectedRoots(path));
+}
+
+const char *svdep_get_report(svdep_t ctx) {
+    if (!ctx) return nullptr;
+    ctx->report = ctx->ctx.getReport().toJson();
+    return ctx->report.c_str();
+}
+
+svdep_pool_t svdep_pool_create(void) {
+    return new svdep_pool_s();
+}
+
+void svdep_pool_destroy(svdep_pool_t pool) {
+    delete pool;
+}
+
+int svdep_pool_load_scan_cache(svdep_pool_t pool, const char *path) {
+    if (!pool || !path) return -1;
+    pool->pool.loadScanCache(path);
+    return 0;
+}
+
+int svdep_pool_set_scan_store(svdep_pool_t pool, const char *dir) {
+    if (!pool || !dir) return -1;
+    pool->pool.setScanStore(dir);
+    return 0;
+}
+
+int svdep_pool_save_scan_cache(svdep_pool_t pool, const char *path) {
+    if (!pool || !path) return -1;
+    return pool->pool.saveScanCache(path) ? 0 : -1;
+}
+
+int svdep_build_units(svdep_pool_t pool, svdep_t *ctxs, int n, int jobs) {
+    if (!pool || (n > 0 && !ctxs)) return -1;
+    for (int i = 0; i < n; i++) {
+        if (!ctxs[i]) return -1;
+    }
+
+    pool->pool.begin();
+    for (int i = 0; i < n; i++) {
+        ctxs[i]->ctx.setScanPool(&pool->pool);
+    }
+
+    // Workers take the next unbuilt context until none are left
+    std::atomic<int> next(0);
+    std::atomic<int> failed(0);
+    auto worker = [&]() {
+        int i;
+        while ((i = next++) < n) {
+            if (ctxs[i]->ctx.build() != 0) {
+                failed++;
+            }
+        }
+    };
+
+    if (jobs <= 0) {
+        jobs = std::max(1u, std::thread::hardware_concurrency());
+    }
+    jobs = std::min(jobs, n);
+    std::vector<std::thread> threads;
+    for (int i = 1; i < jobs; i++) {
+        threads.emplace_back(worker);
+    }
+    worker();
+    for (auto& t : threads) {
+        t.join();
+    }
+
+    // Later single builds on these contexts must not see stale stats
+    for (int i = 0; i < n; i++) {
+        ctxs[i]->ctx.setScanPool(nullptr);
+    }
+    return failed ? -1 : 0;
+}
+
 const char *svdep_get_error(svdep_t ctx) {
     if (!ctx) return nullptr;
     const std::string& err = ctx->ctx.getError();
@@ -1,16 +1,42 @@
 
 from .file_collection import FileCollection
-from .native import is_native_available, get_native_library_path
-from .hash_files import compute_hash_for_files
+from .path_vars import PathVars
 
-# Import pure-Python implementations
-from .task_check_up_to_date import TaskCheckUpToDate as _PythonTaskCheckUpToDate
-from .task_build_file_collection import TaskBuildFileCollection as _PythonTaskBuildFileCollection
+# Everything else is loaded on first access (PEP 562), so that 'import svdep'
+# doesn't import ply or load the native library until they're needed
+_LAZY_ATTRS = {
+    "is_native_available": ("native", "is_native_available"),
+    "get_native_library_path": ("native", "get_native_library_path"),
+    "compute_hash_for_files": ("hash_files", "compute_hash_for_files"),
+    "_PythonTaskCheckUpToDate": ("task_check_up_to_date", "TaskCheckUpToDate"),
+    "_PythonTaskBuildFileCollection": ("task_build_file_collection", "TaskBuildFileCollection"),
+    "_PythonTaskBuildUnits": ("task_build_units", "TaskBuildUnits"),
+    "_PythonTaskCheckUnits": ("task_check_units", "TaskCheckUnits"),
+    "BuildUnit": ("build_unit", "BuildUnit"),
+    "CollectionDb": ("collection_db", "CollectionDb"),
+}
 
-# Use native implementations if available, otherwise fall back to pure-Python
-if is_native_available():
-    from .native import NativeTaskCheckUpToDate as TaskCheckUpToDate
-    from .native import NativeTaskBuildFileCollection as TaskBuildFileCollection
-else:
-    TaskCheckUpToDate = _PythonTaskCheckUpToDate
-    TaskBuildFileCollection = _PythonTaskBuildFileCollection
\ No newline at end of file
+def _import_attr(module, attr):
+    # Equivalent to 'from .<module> import <attr>'
+    return getattr(__import__(module, globals(), None, [attr], 1), attr)
+
+def __getattr__(name):
+    if name in ("TaskCheckUpToDate", "TaskBuildFileCollection", "TaskBuildUnits",
+                "TaskCheckUnits"):
+        # Use native implementations if available, otherwise fall back to pure-Python
+        if __getattr__("is_native_available")():
+            value = _import_attr("native", "Native" + name)
+        else:
+            value = __getattr__("_Python" + name)
+    elif name in _LAZY_ATTRS.keys():
+        value = _import_attr(*_LAZY_ATTRS[name])
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_ATTRS.keys()) +
+                  ["TaskCheckUpToDate", "TaskBuildFileCollection", "TaskBuildUnits",
+                   "TaskCheckUnits"])
@@ -1,6 +1,673 @@
+#****************************************************************************
+#* __main__.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import argparse
+import json
+import os
+import shlex
+import sys
+import time
+from typing import Dict, List
+from .collection_journal import load_collection, save_collection, saved_time
+from .file_collection import FileCollection
+from .file_deps_report import FileDepsReport
+from .filelist import Filelist
+from .path_vars import PathVars
 
-def main():
+# Exit codes. A usage error also exits with EXIT_ERROR
+EXIT_OK = 0
+EXIT_STALE = 1
+EXIT_ERROR = 2
+
+class CmdEnv(object):
+    """
+    Where a command runs: the directory relative paths are resolved
+    against, and the streams it writes to. The command-line tool uses the
+    process' working directory and standard streams. The server supplies an
+    environment per request, with collections and scans kept warm.
+
+    'report' accumulates the counters and timings of every build, check
+    and collection load/save run through the environment. Collections are
+    loaded and saved relative to 'path_vars' (see PathVars). When 'db' is
+    set, collections are units of that CollectionDb rather than JSON files,
+    and are named rather than given by path. When 'journal' is set, saving
+    a collection file that was loaded through the environment appends the
+    changes to its journal (see collection_journal).
+    """
+
+    def __init__(self, cwd : str = None, out = None, err = None):
+        self.cwd = cwd
+        self.out = out if out is not None else sys.stdout
+        self.err = err if err is not None else sys.stderr
+        self.report = FileDepsReport()
+        self.path_vars = PathVars()
+        self.db = None
+        self.journal = False
+        # Collection files as last loaded or saved, for journaling
+        self._loaded : Dict[str,FileCollection] = {}
+
+    def path(self, path : str) -> str:
+        if path is None or self.cwd is None:
+            return path
+        return os.path.join(self.cwd, path)
+
+    def collectionPath(self, collection : str) -> str:
+        """Where a collection given on the command line is loaded and saved"""
+        return collection if self.db is not None else self.path(collection)
+
+    def collectionTime(self, path) -> float:
+        """When a collection was saved"""
+        if self.db is not None:
+            return self.db.saved(path)
+        return saved_time(path)
+
+    def loadCollection(self, path) -> FileCollection:
+        start = time.perf_counter()
+        if self.db is not None:
+            ret = self.db.load(path, self.path_vars)
+        else:
+            ret = load_collection(path, self.path_vars)
+            self._loaded[path] = ret
+        self.report.time_json += time.perf_counter() - start
+        return ret
+
+    def saveCollection(self, path, collection : FileCollection):
+        start = time.perf_counter()
+        if self.db is not None:
+            self.db.save(path, collection, self.path_vars)
+        else:
+            save_collection(path, collection, self.path_vars,
+                            previous=self._loaded.get(path) if self.journal else None)
+            self._loaded[path] = collection
+        self.report.time_json += time.perf_counter() - start
+
+    def build(self, args, unit : '_Unit', previous : FileCollection = None) -> FileCollection:
+        from . import TaskBuildFileCollection
+        if len(unit.filelist.files) == 0:
+            raise ValueError("No source files specified")
+        task = TaskBuildFileCollection(
+            unit.filelist.files,
+            incdirs=unit.filelist.incdirs,
+            defines=unit.filelist.defines,
+            compilation_unit=args.compilation_unit,
+            previous=previous,
+            canonical=args.canonical,
+            scan_cache=self.path(args.scan_cache),
+            scan_store=self.path(args.scan_store),
+            **self.buildArgs())
+        ret = task.build()
+        self.report.add(task.report)
+        return ret
+
+    def buildUnits(self, args, units : List['_Unit'],
+                   previous : List[FileCollection] = None) -> List[FileCollection]:
+        """Builds many units together, sharing file scans between them"""
+        from . import BuildUnit, TaskBuildUnits
+        if len(units) == 1:
+            return [self.build(args, units[0], previous[0] if previous is not None else None)]
+        build_units = []
+        for i, unit in enumerate(units):
+            if len(unit.filelist.files) == 0:
+                raise ValueError("No source files specified for %s" % unit.name)
+            build_units.append(BuildUnit(
+                unit.filelist.files,
+                incdirs=unit.filelist.incdirs,
+                defines=unit.filelist.defines,
+                compilation_unit=args.compilation_unit,
+                previous=previous[i] if previous is not None else None,
+                canonical=args.canonical))
+        task = TaskBuildUnits(
+            build_units,
+            jobs=args.jobs,
+            scan_cache=self.path(args.scan_cache),
+            scan_store=self.path(args.scan_store),
+            **self.buildArgs())
+        ret = task.build()
+        self.report.add(task.report)
+        return ret
+
+    def buildArgs(self):
+        """Extra keyword arguments for TaskBuildFileCollection and TaskBuildUnits"""
+        return {}
+
+    def check(self, unit : '_Unit', collection : FileCollection, timestamp : float) -> bool:
+        from . import TaskCheckUpToDate
+        task = TaskCheckUpToDate(unit.filelist.files, unit.filelist.incdirs)
+        ret = task.check(collection, timestamp)
+        self.report.add(task.report)
+        return ret
+
+    def checkUnits(self, units : List['_Unit'], collections : List[FileCollection],
+                   timestamps : List[float]) -> List[bool]:
+        """Checks many units together, stat'ing each shared file once"""
+        from . import TaskCheckUnits
+        task = TaskCheckUnits([unit.filelist.files for unit in units])
+        ret = task.check(collections, timestamps)
+        self.report.add(task.report)
+        return ret
+
+    def checkRoots(self, unit : '_Unit', collection : FileCollection,
+                   timestamp : float) -> Dict[str,bool]:
+        from . import TaskCheckUpToDate
+        task = TaskCheckUpToDate(unit.filelist.files, unit.filelist.incdirs)
+        ret = task.check_roots(collection, timestamp)
+        self.report.add(task.report)
+        return ret
+
+    def checkResult(self, unit : '_Unit', collection : FileCollection, timestamp : float,
+                    collect_all : bool = False) -> 'CheckResult':
+        from . import TaskCheckUpToDate
+        task = TaskCheckUpToDate(unit.filelist.files, unit.filelist.incdirs)
+        ret = task.check_result(collection, timestamp, collect_all)
+        self.report.add(task.report)
+        return ret
+
+class _Unit(object):
+    """One compilation unit: its collection file and source arguments"""
+
+    def __init__(self, env : CmdEnv, collection : str, args : List[str], basedir : str = None):
+        # 'name' is the collection as given, for reporting
+        self.name = collection
+        self.collection = env.collectionPath(collection)
+        self.filelist = Filelist()
+        self.filelist.addArgs(args, basedir if basedir is not None else env.cwd)
+
+def _get_units(env, args, extra) -> List[_Unit]:
+    if args.manifest is not None:
+        if extra:
+            raise ValueError("Source arguments can't be combined with --manifest")
+        return _read_manifest(env, env.path(args.manifest))
+    return [_Unit(env, args.collection, extra)]
+
+def _read_manifest(env, path) -> List[_Unit]:
+    """
+    Each non-blank line of a manifest is a collection file followed by the
+    source arguments of its unit, eg: 'unit1.json -f unit1.f +define+FOO'.
+    Lines starting with '#' are comments
+    """
+    ret = []
+    with open(path, "r") as fp:
+        for line in fp.read().splitlines():
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            fields = shlex.split(line)
+            ret.append(_Unit(env, fields[0], fields[1:]))
+    return ret
+
+def _load_for_check(env, args, unit : _Unit):
+    """Returns the unit's collection and the timestamp to check against"""
+    collection = env.loadCollection(unit.collection)
+    if args.timestamp_file is not None:
+        return collection, os.path.getmtime(env.path(args.timestamp_file))
+    return collection, env.collectionTime(unit.collection)
+
+def _is_up_to_date(env, args, unit : _Unit, collections : List = None) -> bool:
+    """
+    Whether a unit's collection is up to date. When given, 'collections'
+    receives the collection the check loaded, or None if it couldn't
+    """
+    collection = None
+    try:
+        collection, timestamp = _load_for_check(env, args, unit)
+        return env.check(unit, collection, timestamp)
+    except (OSError, ValueError, KeyError):
+        # A missing or unreadable collection, or a dependency that no
+        # longer exists, means the unit must be rebuilt
+        return False
+    finally:
+        if collections is not None:
+            collections.append(collection)
+
+def _up_to_date_units(env, args, units : List[_Unit], collections : List = None) -> List[bool]:
+    """Like _is_up_to_date, for many units checked together"""
+    if len(units) == 1:
+        return [_is_up_to_date(env, args, units[0], collections)]
+    ret = [False] * len(units)
+    loaded = []
+    for i, unit in enumerate(units):
+        try:
+            loaded.append((i,) + _load_for_check(env, args, unit))
+        except (OSError, ValueError, KeyError):
+            pass
+    if collections is not None:
+        collections.extend([None] * len(units))
+        for i, collection, _ in loaded:
+            collections[-len(units) + i] = collection
+    if len(loaded) > 0:
+        verdicts = env.checkUnits(
+            [units[i] for i, _, _ in loaded],
+            [collection for _, collection, _ in loaded],
+            [timestamp for _, _, timestamp in loaded])
+        for (i, _, _), verdict in zip(loaded, verdicts):
+            ret[i] = verdict
+    return ret
+
+def _explain_check(env, args, unit : _Unit) -> bool:
+    """Like _is_up_to_date, but prints why a stale unit is stale"""
+    try:
+        collection, timestamp = _load_for_check(env, args, unit)
+        result = env.checkResult(unit, collection, timestamp, args.all)
+        reasons = result.format().splitlines()
+    except (OSError, ValueError, KeyError) as e:
+        reasons = ["can't check: %s" % str(e)]
+    for reason in reasons:
+        if args.manifest is not None:
+            print("%s: %s" % (unit.name, reason), file=env.out)
+        else:
+            print(reason, file=env.out)
+    return len(reasons) == 0
+
+def _cmd_build(env, args, extra) -> int:
+    units = _get_units(env, args, extra)
+    for unit, collection in zip(units, env.buildUnits(args, units)):
+        env.saveCollection(unit.collection, collection)
+    return EXIT_OK
+
+def _stale_roots(env, args, unit : _Unit) -> List[str]:
+    """The unit's root files that must be recompiled"""
+    try:
+        collection, timestamp = _load_for_check(env, args, unit)
+    except (OSError, ValueError, KeyError):
+        return list(unit.filelist.files)
+    verdicts = env.checkRoots(unit, collection, timestamp)
+    return [root for root, up_to_date in verdicts.items() if not up_to_date]
+
+def _cmd_check(env, args, extra) -> int:
+    ret = EXIT_OK
+    units = _get_units(env, args, extra)
+    if args.roots:
+        for unit in units:
+            for root in _stale_roots(env, args, unit):
+                if args.manifest is not None:
+                    print("%s: %s" % (unit.name, root), file=env.out)
+                else:
+                    print(root, file=env.out)
+                ret = EXIT_STALE
+        return ret
+
+    if args.explain or args.all:
+        for unit in units:
+            if not _explain_check(env, args, unit):
+                ret = EXIT_STALE
+        return ret
+
+    for unit, up_to_date in zip(units, _up_to_date_units(env, args, units)):
+        if not up_to_date:
+            if args.manifest is not None:
+                print(unit.name, file=env.out)
+            ret = EXIT_STALE
+    return ret
+
+def _cmd_update(env, args, extra) -> int:
+    stale = []
+    previous = []
+    units = _get_units(env, args, extra)
+    # Rebuild the stale units from the collections their check loaded
+    loaded = []
+    verdicts = _up_to_date_units(env, args, units, loaded)
+    for unit, up_to_date, collection in zip(units, verdicts, loaded):
+        if not up_to_date:
+            stale.append(unit)
+            previous.append(collection)
+    if len(stale) == 0:
+        return EXIT_OK
+
+    for unit, collection in zip(stale, env.buildUnits(args, stale, previous)):
+        env.saveCollection(unit.collection, collection)
+        if args.verbose:
+            print("Updated %s" % unit.name, file=env.out)
+    return EXIT_OK
+
+def _cmd_hash(env, args, extra) -> int:
+    from .hash_files import compute_hash_for_collection
+    units = _get_units(env, args, extra)
+    for unit, collection in zip(units, env.buildUnits(args, units)):
+        digest = compute_hash_for_collection(collection)
+        if digest is None:
+            raise ValueError("Failed to hash %s" % " ".join(unit.filelist.files))
+        if args.manifest is not None:
+            print("%s %s" % (digest, unit.name), file=env.out)
+        else:
+            print(digest, file=env.out)
+    return EXIT_OK
+
+def _cmd_deps(env, args, extra) -> int:
+    if args.manifest is not None:
+        raise ValueError("deps doesn't support --manifest")
+    if extra:
+        collection = env.build(args, _Unit(env, args.collection, extra))
+    elif args.collection is not None:
+        collection = env.loadCollection(env.collectionPath(args.collection))
+    else:
+        raise ValueError("Specify source arguments or a collection file")
+
+    files = collection.all_files()
+    if args.format == "make":
+        if args.target is None:
+            raise ValueError("--format make requires --target")
+        # Make-style depfile, as consumed by make 'include' and ninja 'depfile'
+        deps = " \\\n  ".join(f.replace(" ", "\\ ") for f in files)
+        print("%s: \\\n  %s" % (args.target.replace(" ", "\\ "), deps), file=env.out)
+    else:
+        for f in files:
+            print(f, file=env.out)
+    return EXIT_OK
+
+def _cmd_affected(env, args, extra) -> int:
+    if len(extra) == 0:
+        raise ValueError("Specify the changed files")
+    for p in extra:
+        if p.startswith("-") or p.startswith("+"):
+            raise ValueError("Unexpected option: %s" % p)
+    changed = [os.path.abspath(env.path(p)) for p in extra]
+
+    if args.manifest is not None:
+        units = _read_manifest(env, env.path(args.manifest))
+    else:
+        units = [_Unit(env, args.collection, [])]
+
+    for unit in units:
+        collection = env.loadCollection(unit.collection)
+        # Collections record paths as given to the build (or canonical
+        # paths, and the path first used). Match them against the changed
+        # files by absolute path
+        abs_m = {}
+        for p, fi in collection.file_info.items():
+            abs_m[os.path.abspath(env.path(p))] = p
+            if fi.spelled is not None:
+                abs_m.setdefault(os.path.abspath(env.path(fi.spelled)), p)
+        roots = []
+        for path in changed:
+            if path not in abs_m.keys():
+                # A canonicalized collection may know the file by its real path
+                path = os.path.realpath(path)
+            if path in abs_m.keys():
+                for root in collection.affected_roots(abs_m[path]):
+                    if root not in roots:
+                        roots.append(root)
+        if args.manifest is not None:
+            if len(roots):
+                print(unit.name, file=env.out)
+        else:
+            for root in roots:
+                print(root, file=env.out)
+    return EXIT_OK
+
+def _cmd_server(env, args, extra) -> int:
+    from .client import SOCKET_ENV
+    from .server import serve
+    socket_path = args.socket if args.socket is not None else os.environ.get(SOCKET_ENV)
+    if socket_path is None:
+        raise ValueError("Specify --socket or set %s" % SOCKET_ENV)
+    serve(socket_path, args.watch)
+    return EXIT_OK
+
+def _cmd_bench(env, args, extra) -> int:
+    import tempfile
+    from .bench import TreeSpec, run_benchmarks, format_results
+    if extra:
+        raise ValueError("Unexpected arguments: %s" % " ".join(extra))
+    spec = TreeSpec(
+        num_files=args.files,
+        num_roots=args.roots,
+        fanout=args.fanout,
+        depth=args.depth,
+        num_incdirs=args.incdirs,
+        file_size=args.file_size,
+        ifdef_density=args.ifdef_density,
+        shared_headers=args.shared_headers,
+        seed=args.seed)
+    with tempfile.TemporaryDirectory(prefix="svdep-bench-") as workdir:
+        results = run_benchmarks(spec, workdir, args.repeat, args.impl)
+    if args.format == "json":
+        print(json.dumps(results, indent=2), file=env.out)
+    else:
+        print(format_results(results), file=env.out)
+    return EXIT_OK
+
+class _UsageError(Exception):
     pass
 
+class _ArgumentParser(argparse.ArgumentParser):
+    """
+    Reports usage errors by raising, and writes help to the environment's
+    stream, so that the server can run commands in-process
+    """
+
+    def __init__(self, *args, env : CmdEnv = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.env = env
+
+    def error(self, message):
+        raise _UsageError("%s: error: %s" % (self.prog, message))
+
+    def _print_message(self, message, file=None):
+        if message:
+            (self.env.out if file in (None, sys.stdout) else self.env.err).write(message)
+
+def get_parser(env : CmdEnv = None) -> argparse.ArgumentParser:
+    if env is None:
+        env = CmdEnv()
+    parser = _ArgumentParser(
+        env=env,
+        prog="svdep",
+        allow_abbrev=False,
+        description="Tracks SystemVerilog include dependencies. Source files, "
+            "+incdir+, +define+, -I, -D and -f/-F filelist arguments are "
+            "accepted alongside the options below.",
+        epilog="Exit status: 0 on success or up-to-date, 1 if 'check' found a "
+            "stale unit, 2 on error.")
+    subparsers = parser.add_subparsers(dest="cmd", required=True,
+        parser_class=lambda **kwargs: _ArgumentParser(env=env, **kwargs))
+
+    def add_path_var(p):
+        p.add_argument("--path-var", action="append", metavar="NAME=DIR",
+            help="Save collection paths under DIR relative to NAME, and load "
+                "them relative to this DIR, so collections can be reused in "
+                "another workspace. May be repeated")
+
+    def add_db(p):
+        p.add_argument("--db", metavar="FILE",
+            help="Keep collections in this SQLite database, which many "
+                "processes may update at once. Collections (-c, and the "
+                "first field of --manifest lines) are then unit names")
+
+    def add_common(p):
+        p.add_argument("-c", "--collection",
+            help="Collection (JSON) file to read or write")
+        add_db(p)
+        p.add_argument("--manifest",
+            help="File listing many units, one '<collection> <source args>' per line")
+        p.add_argument("--compilation-unit", action="store_true",
+            help="Macro state flows through includes and across root files")
+        p.add_argument("--canonical", action="store_true",
+            help="Record files by real path, so a file reached through "
+                "symlinks or different include directories is scanned once")
+        add_path_var(p)
+        p.add_argument("--journal", action="store_true",
+            help="Append the changes to an updated collection to a journal "
+                "next to it, rather than rewriting it. The journal is "
+                "compacted into the collection as it grows")
+        p.add_argument("--scan-cache",
+            help="Persistent cache of per-file directive scans")
+        p.add_argument("--scan-store", metavar="DIR",
+            help="Directory of directive scans keyed by file content, which "
+                "may be shared by many workspaces and machines")
+        p.add_argument("--stats", action="store_true",
+            help="Report file-system, scan and JSON counters and timings on stderr")
+        p.add_argument("-j", "--jobs", type=int,
+            help="Build up to this many --manifest units in parallel "
+                "(default: one per CPU)")
+
+    build = subparsers.add_parser("build", allow_abbrev=False,
+        help="Scan sources and write the collection")
+    add_common(build)
+    build.set_defaults(func=_cmd_build, need_collection=True)
+
+    check = subparsers.add_parser("check", allow_abbrev=False,
+        help="Exit 1 if any file changed since the collection was written")
+    add_common(check)
+    check.add_argument("--timestamp-file",
+        help="Compare against this file's mtime instead of the collection's")
+    check.add_argument("--explain", action="store_true",
+        help="Print why each stale unit is stale: the first stale or missing "
+            "file, or the root-file mismatch")
+    check.add_argument("--all", action="store_true",
+        help="Like --explain, but list every stale file")
+    check.add_argument("--roots", action="store_true",
+        help="Print each root file that is stale: the root or one of its "
+            "includes changed")
+    check.set_defaults(func=_cmd_check, need_collection=True)
+
+    update = subparsers.add_parser("update", allow_abbrev=False,
+        help="Rewrite the collection only if it is out of date")
+    add_common(update)
+    update.add_argument("--timestamp-file",
+        help="Compare against this file's mtime instead of the collection's")
+    update.add_argument("-v", "--verbose", action="store_true",
+        help="Report each collection that is rewritten")
+    update.set_defaults(func=_cmd_update, need_collection=True)
+
+    hash_p = subparsers.add_parser("hash", allow_abbrev=False,
+        help="Print a content hash of the sources and their includes")
+    add_common(hash_p)
+    hash_p.set_defaults(func=_cmd_hash, need_collection=False)
+
+    deps = subparsers.add_parser("deps", allow_abbrev=False,
+        help="List every file the sources depend on")
+    add_common(deps)
+    deps.add_argument("--format", choices=("list", "make"), default="list",
+        help="One path per line, or a make-style depfile")
+    deps.add_argument("--target",
+        help="Target named in a make-style depfile")
+    deps.set_defaults(func=_cmd_deps, need_collection=False)
+
+    affected = subparsers.add_parser("affected", allow_abbrev=False,
+        help="List the root files (or, with --manifest, the units) that "
+            "depend on the given files")
+    affected.add_argument("-c", "--collection",
+        help="Collection (JSON) file to query")
+    affected.add_argument("--manifest",
+        help="File listing many units, one '<collection> <source args>' per line")
+    add_path_var(affected)
+    add_db(affected)
+    affected.set_defaults(func=_cmd_affected, need_collection=True)
+
+    server = subparsers.add_parser("server", allow_abbrev=False,
+        help="Answer commands from svdep-client over a Unix domain socket")
+    server.add_argument("--socket",
+        help="Socket path (default: $SVDEP_SOCKET)")
+    server.add_argument("--watch", action="store_true",
+        help="Answer checks from file-change notifications (inotify) where available")
+    server.set_defaults(func=_cmd_server, need_collection=False)
+
+    bench = subparsers.add_parser("bench", allow_abbrev=False,
+        help="Time build, check, hash and JSON save/load on a synthetic tree")
+    bench.add_argument("--files", type=int, default=200,
+        help="Number of files, including root files")
+    bench.add_argument("--roots", type=int, default=4,
+        help="Number of root files")
+    bench.add_argument("--fanout", type=int, default=4,
+        help="Headers included by each file from the next level")
+    bench.add_argument("--depth", type=int, default=4,
+        help="Levels of headers below the root files")
+    bench.add_argument("--incdirs", type=int, default=4,
+        help="Number of include directories")
+    bench.add_argument("--file-size", type=int, default=4096,
+        help="Approximate size of each file in bytes")
+    bench.add_argument("--ifdef-density", type=float, default=0.25,
+        help="Fraction of includes wrapped in `ifndef")
+    bench.add_argument("--shared-headers", type=int, default=4,
+        help="Include-guarded headers included by every file")
+    bench.add_argument("--seed", type=int, default=0,
+        help="Seed for the tree generator")
+    bench.add_argument("--repeat", type=int, default=3,
+        help="Timed runs of each operation")
+    bench.add_argument("--impl", action="append", choices=("python", "native"),
+        help="Implementation to time (default: both). May be repeated")
+    bench.add_argument("--format", choices=("table", "json"), default="table",
+        help="Print a table, or machine-readable JSON")
+    bench.set_defaults(func=_cmd_bench, need_collection=False)
+
+    return parser
+
+def _source_args(parser, extra) -> List[str]:
+    """
+    Arguments argparse didn't recognize are simulator-style source
+    arguments. Simulator options start with a single '-' or '+', so an
+    unrecognized '--' option is a mistyped svdep option. Arguments after
+    a '--' separator are passed through as they are
+    """
+    if "--" in extra:
+        i = extra.index("--")
+        head, tail = extra[:i], extra[i+1:]
+    else:
+        head, tail = extra, []
+    unknown = [a for a in head if a.startswith("--")]
+    if unknown:
+        parser.error("unrecognized arguments: %s" % " ".join(unknown))
+    return head + tail
+
+def main(argv : List[str] = None, env : CmdEnv = None) -> int:
+    if env is None:
+        env = CmdEnv()
+    parser = get_parser(env)
+
+    try:
+        args, extra = parser.parse_known_args(argv)
+        extra = _source_args(parser, extra)
+        if getattr(args, "need_collection", False) and args.manifest is None \
+                and args.collection is None:
+            parser.error("%s requires -c/--collection or --manifest" % args.cmd)
+    except _UsageError as e:
+        parser.print_usage(env.err)
+        print(str(e), file=env.err)
+        return EXIT_ERROR
+    except SystemExit as e:
+        # --help
+        return e.code if isinstance(e.code, int) else EXIT_ERROR
+
+    start = time.perf_counter()
+    try:
+        env.path_vars = PathVars.parse(getattr(args, "path_var", None), env.cwd)
+        env.journal = getattr(args, "journal", False)
+        if getattr(args, "db", None) is not None:
+            from .collection_db import CollectionDb
+            env.db = CollectionDb(env.path(args.db))
+        ret = args.func(env, args, extra)
+    except Exception as e:
+        # Build failures are reported as plain Exceptions
+        print("svdep: error: %s" % str(e), file=env.err)
+        ret = EXIT_ERROR
+    finally:
+        if env.db is not None:
+            env.db.close()
+            env.db = None
+
+    if getattr(args, "stats", False):
+        # The whole command, including collection load/save between tasks
+        env.report.time_total = time.perf_counter() - start
+        print(env.report.format(), file=env.err)
+    return ret
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
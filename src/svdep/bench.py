@@ -0,0 +1,256 @@
+#****************************************************************************
+#* bench.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import dataclasses as dc
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+from .file_collection import FileCollection
+
+@dc.dataclass
+class TreeSpec(object):
+    """
+    Shape of a synthetic SystemVerilog source tree. 'num_files' counts root
+    files and headers. Headers are spread over 'depth' include levels and
+    'num_incdirs' directories. Each file includes 'fanout' headers from the
+    next level, plus every shared header (which are include-guarded).
+    'ifdef_density' is the fraction of includes wrapped in `ifndef, and
+    'file_size' is the approximate size of each file in bytes.
+    """
+    num_files : int = 200
+    num_roots : int = 4
+    fanout : int = 4
+    depth : int = 4
+    num_incdirs : int = 4
+    file_size : int = 4096
+    ifdef_density : float = 0.25
+    shared_headers : int = 4
+    seed : int = 0
+
+# Filler that exercises the scanner: comments, strings and operators, with
+# backticks that aren't directives
+_FILLER = [
+    "  logic [31:0] data_%d; // `include \"not_a_dep.svh\"\n",
+    "  assign sum_%d = a / b + c;\n",
+    "  initial $display(\"value %%0d `ifdef in a string\", %d);\n",
+    "  /* block comment %d\n     spanning lines */\n",
+    "  always_ff @(posedge clk) q_%d <= d;\n",
+]
+
+def _filler(rng, nbytes) -> str:
+    ret = []
+    size = 0
+    i = 0
+    while size < nbytes:
+        line = rng.choice(_FILLER) % i
+        ret.append(line)
+        size += len(line)
+        i += 1
+    return "".join(ret)
+
+def generate_tree(spec : TreeSpec, outdir : str) -> Tuple[List[str], List[str]]:
+    """
+    Writes a synthetic tree under 'outdir'. Returns (root files, incdirs).
+    The same spec always produces the same tree.
+    """
+    rng = random.Random(spec.seed)
+    incdirs = [os.path.join(outdir, "inc%d" % i) for i in range(max(1, spec.num_incdirs))]
+    for d in incdirs:
+        os.makedirs(d, exist_ok=True)
+
+    num_shared = min(spec.shared_headers, max(0, spec.num_files - spec.num_roots))
+    num_levels = max(1, spec.depth)
+    num_headers = max(0, spec.num_files - spec.num_roots - num_shared)
+
+    # Header names by level. A header's directory is chosen at random
+    levels : List[List[Tuple[str,str]]] = [[] for _ in range(num_levels)]
+    for i in range(num_headers):
+        name = "hdr_%d.svh" % i
+        levels[i * num_levels // max(1, num_headers)].append((name, rng.choice(incdirs)))
+    shared = [("shared_%d.svh" % i, rng.choice(incdirs)) for i in range(num_shared)]
+
+    def include_lines(children) -> str:
+        ret = []
+        for name, _ in children:
+            if rng.random() < spec.ifdef_density:
+                macro = "BENCH_DISABLE_%s" % name.split(".")[0].upper()
+                ret.append("`ifndef %s\n`include \"%s\"\n`endif\n" % (macro, name))
+            else:
+                ret.append("`include \"%s\"\n" % name)
+        return "".join(ret)
+
+    def children_of(level, index, count) -> List[Tuple[str,str]]:
+        # Every header is included by at least one file on the level above
+        if level >= num_levels:
+            return []
+        nxt = levels[level]
+        if len(nxt) == 0:
+            return []
+        ret = nxt[index::count]
+        while len(ret) < min(spec.fanout, len(nxt)):
+            c = rng.choice(nxt)
+            if c not in ret:
+                ret.append(c)
+        return ret
+
+    def write(path, guard, body):
+        with open(path, "w") as fp:
+            if guard is not None:
+                fp.write("`ifndef %s\n`define %s\n" % (guard, guard))
+            fp.write(body)
+            if guard is not None:
+                fp.write("`endif\n")
+
+    for name, dir in shared:
+        guard = name.split(".")[0].upper()
+        write(os.path.join(dir, name), guard, _filler(rng, spec.file_size))
+
+    for level, headers in enumerate(levels):
+        for i, (name, dir) in enumerate(headers):
+            body = include_lines(children_of(level + 1, i, len(headers)))
+            body += include_lines(shared)
+            write(os.path.join(dir, name), None, body + _filler(rng, spec.file_size))
+
+    roots = []
+    for i in range(spec.num_roots):
+        path = os.path.join(outdir, "root_%d.sv" % i)
+        body = "module root_%d;\n" % i
+        body += include_lines(shared)
+        body += include_lines(children_of(0, i, spec.num_roots))
+        body += _filler(rng, spec.file_size) + "endmodule\n"
+        write(path, None, body)
+        roots.append(path)
+
+    return roots, incdirs
+
+def _time(f : Callable, repeat : int) -> Dict:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        runs.append(time.perf_counter() - start)
+    return {
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+    }
+
+def _implementations() -> Dict[str,Tuple]:
+    from . import _PythonTaskBuildFileCollection, _PythonTaskCheckUpToDate, _PythonTaskCheckUnits
+    from . import is_native_available
+    ret = {"python": (_PythonTaskBuildFileCollection, _PythonTaskCheckUpToDate,
+                      _PythonTaskCheckUnits)}
+    if is_native_available():
+        from .native import NativeTaskBuildFileCollection, NativeTaskCheckUpToDate
+        from .native import NativeTaskCheckUnits
+        ret["native"] = (NativeTaskBuildFileCollection, NativeTaskCheckUpToDate,
+                         NativeTaskCheckUnits)
+    return ret
+
+def run_benchmarks(spec : TreeSpec, workdir : str, repeat : int = 3,
+                   impls : List[str] = None) -> Dict:
+    """
+    Generates the tree described by 'spec' under 'workdir', then times
+    build, check, hash and JSON save/load with each implementation. Each
+    root file is also made a unit of its own, and the units are checked
+    one call at a time ('check_each') and together ('check_units').
+    Returns a JSON-serializable dict of results. Implementations that
+    aren't available are listed under 'skipped'.
+    """
+    from .hash_files import compute_hash_for_collection
+    from .native import get_native_library_path
+
+    roots, incdirs = generate_tree(spec, workdir)
+    available = _implementations()
+    if impls is None:
+        impls = ["python", "native"]
+
+    ret = {
+        "spec": dc.asdict(spec),
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "native_lib": get_native_library_path() if "native" in available.keys() else None,
+        },
+        "results": [],
+        "skipped": [],
+    }
+
+    for impl in impls:
+        if impl not in available.keys():
+            ret["skipped"].append(impl)
+            continue
+        build_cls, check_cls, check_units_cls = available[impl]
+
+        # Evaluate conditionals in both implementations, so they do the
+        # same work
+        def build():
+            return build_cls(roots, incdirs=incdirs, defines={}).build()
+        collection = build()
+        timestamp = max(os.path.getmtime(p) for p in collection.file_info.keys())
+        data = json.dumps(collection.to_dict())
+
+        def check():
+            if not check_cls(roots, incdirs).check(collection, timestamp):
+                raise Exception("Benchmark tree unexpectedly out-of-date")
+
+        units = [build_cls([root], incdirs=incdirs, defines={}).build() for root in roots]
+
+        def check_each():
+            for root, unit in zip(roots, units):
+                if not check_cls([root], incdirs).check(unit, timestamp):
+                    raise Exception("Benchmark tree unexpectedly out-of-date")
+
+        def check_units():
+            verdicts = check_units_cls([[root] for root in roots]).check(
+                units, [timestamp] * len(units))
+            if not all(verdicts):
+                raise Exception("Benchmark tree unexpectedly out-of-date")
+
+        ops = [
+            ("build", build),
+            ("check", check),
+            ("check_each", check_each),
+            ("check_units", check_units),
+            ("hash", lambda: compute_hash_for_collection(collection)),
+            ("json_save", lambda: json.dumps(collection.to_dict())),
+            ("json_load", lambda: FileCollection.from_dict(json.loads(data))),
+        ]
+        for op, f in ops:
+            res = {"impl": impl, "op": op, "files": len(collection.file_info)}
+            res.update(_time(f, repeat))
+            ret["results"].append(res)
+
+    return ret
+
+def format_results(results : Dict) -> str:
+    """Human-readable table of run_benchmarks() results"""
+    lines = ["%-8s %-11s %6s %12s %12s" % ("impl", "op", "files", "min (ms)", "median (ms)")]
+    for r in results["results"]:
+        lines.append("%-8s %-11s %6d %12.3f %12.3f" % (
+            r["impl"], r["op"], r["files"], r["min"] * 1000, r["median"] * 1000))
+    for impl in results["skipped"]:
+        lines.append("%-8s (not available)" % impl)
+    return "\n".join(lines)
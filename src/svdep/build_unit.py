@@ -0,0 +1,38 @@
+#****************************************************************************
+#* build_unit.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import dataclasses as dc
+from typing import Dict, List
+from .file_collection import FileCollection
+
+@dc.dataclass
+class BuildUnit(object):
+    """
+    One compilation unit of a multi-unit build (TaskBuildUnits). The fields
+    have the same meaning as the TaskBuildFileCollection arguments of the
+    same name.
+    """
+    root_paths : List[str]
+    incdirs : List[str] = dc.field(default_factory=list)
+    defines : Dict[str,str] = None
+    compilation_unit : bool = False
+    previous : FileCollection = None
+    canonical : bool = False
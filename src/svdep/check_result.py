@@ -0,0 +1,106 @@
+#****************************************************************************
+#* check_result.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may 
+#* not use this file except in compliance with the License.  
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software 
+#* distributed under the License is distributed on an "AS IS" BASIS, 
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  
+#* See the License for the specific language governing permissions and 
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author: 
+#*
+#****************************************************************************
+import dataclasses as dc
+from typing import List
+
+@dc.dataclass
+class StaleFile(object):
+    """A dependency that is newer than the reference timestamp, or missing"""
+    path : str
+    # Timestamp recorded in the collection when it was built
+    recorded : float
+    # Current modification time, or None if the file no longer exists
+    current : float = None
+
+    @property
+    def missing(self) -> bool:
+        return self.current is None
+
+    def to_dict(self):
+        return {"path": self.path, "recorded": self.recorded, "current": self.current}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["path"], d["recorded"], d.get("current"))
+
+@dc.dataclass
+class CheckResult(object):
+    """
+    Outcome of an up-to-date check. 'stale' lists stale files in traversal
+    order: only the first one found, unless every file was collected.
+    'roots_recorded' and 'roots_requested' are set when the root files
+    differ from those in the collection. A CheckResult is true when the
+    collection is up to date.
+    """
+    timestamp : float
+    stale : List[StaleFile] = dc.field(default_factory=list)
+    roots_recorded : List[str] = None
+    roots_requested : List[str] = None
+
+    @property
+    def root_mismatch(self) -> bool:
+        return self.roots_recorded is not None
+
+    @property
+    def up_to_date(self) -> bool:
+        return not self.root_mismatch and len(self.stale) == 0
+
+    @property
+    def first_stale(self) -> StaleFile:
+        return self.stale[0] if len(self.stale) else None
+
+    def __bool__(self):
+        return self.up_to_date
+
+    def to_dict(self):
+        ret = {
+            "up_to_date": self.up_to_date,
+            "timestamp": self.timestamp,
+            "stale": [s.to_dict() for s in self.stale],
+        }
+        if self.root_mismatch:
+            ret["roots_recorded"] = list(self.roots_recorded)
+            ret["roots_requested"] = list(self.roots_requested)
+        return ret
+
+    @classmethod
+    def from_dict(cls, d):
+        ret = cls(d["timestamp"])
+        for s in d["stale"]:
+            ret.stale.append(StaleFile.from_dict(s))
+        ret.roots_recorded = d.get("roots_recorded")
+        ret.roots_requested = d.get("roots_requested")
+        return ret
+
+    def format(self) -> str:
+        """One line per reason the collection is stale"""
+        lines = []
+        if self.root_mismatch:
+            lines.append("root files changed: recorded [%s], requested [%s]" % (
+                " ".join(self.roots_recorded), " ".join(self.roots_requested)))
+        for s in self.stale:
+            if s.missing:
+                lines.append("missing: %s" % s.path)
+            else:
+                lines.append("newer: %s (recorded %f, current %f, reference %f)" % (
+                    s.path, s.recorded, s.current, self.timestamp))
+        return "\n".join(lines)
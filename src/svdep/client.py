@@ -0,0 +1,76 @@
+#****************************************************************************
+#* client.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import json
+import os
+import socket
+import sys
+from typing import Dict, List
+
+# Socket used when --socket isn't given
+SOCKET_ENV = "SVDEP_SOCKET"
+
+def request(socket_path : str, argv : List[str], cwd : str = None) -> Dict:
+    """
+    Sends one command to an svdep server and returns its response: a dict
+    with 'status' (the exit code), 'stdout' and 'stderr'. The protocol is
+    one JSON object per line in each direction.
+    """
+    req = {"argv": argv, "cwd": cwd if cwd is not None else os.getcwd()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(req) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as fp:
+            line = fp.readline()
+    if not line:
+        raise ConnectionError("svdep server closed the connection")
+    return json.loads(line)
+
+def main(argv : List[str] = None) -> int:
+    """
+    svdep-client [--socket PATH] <svdep arguments>
+
+    Runs an svdep command in a server started with 'svdep server'. Output
+    and exit status are those of the command.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    socket_path = os.environ.get(SOCKET_ENV)
+    if len(argv) >= 2 and argv[0] == "--socket":
+        socket_path = argv[1]
+        argv = argv[2:]
+    if socket_path is None:
+        print("svdep-client: error: specify --socket or set %s" % SOCKET_ENV, file=sys.stderr)
+        return 2
+
+    try:
+        rsp = request(socket_path, argv)
+    except (OSError, ValueError) as e:
+        print("svdep-client: error: %s" % str(e), file=sys.stderr)
+        return 2
+
+    sys.stdout.write(rsp.get("stdout", ""))
+    sys.stderr.write(rsp.get("stderr", ""))
+    return rsp.get("status", 2)
+
+if __name__ == "__main__":
+    sys.exit(main())
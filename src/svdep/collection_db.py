@@ -0,0 +1,254 @@
+#****************************************************************************
+#* collection_db.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import dataclasses as dc
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+from .file_collection import FileCollection
+from .file_info import FileInfo
+from .path_vars import PathVars
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    saved REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS roots (
+    unit_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    path_id INTEGER NOT NULL,
+    spelled_id INTEGER,
+    PRIMARY KEY (unit_id, seq));
+CREATE TABLE IF NOT EXISTS files (
+    unit_id INTEGER NOT NULL,
+    path_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    guard TEXT,
+    changes INTEGER NOT NULL,
+    spelled_id INTEGER,
+    PRIMARY KEY (unit_id, path_id));
+CREATE TABLE IF NOT EXISTS includes (
+    unit_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    inc_id INTEGER NOT NULL,
+    PRIMARY KEY (unit_id, file_id, seq));
+"""
+
+class CollectionDb(object):
+    """
+    The collections of many units in one SQLite database, which any number
+    of processes may read and update at once. Paths are stored once, in a
+    table shared by every unit. Each unit has its own rows of files (with
+    their timestamps, guards and change counts) and include edges.
+
+    save() runs in a single write transaction and only writes the rows of
+    files whose entries changed. The database is in WAL mode, so readers
+    see the last committed state of a unit and are never blocked by a
+    writer. Writers wait up to 'timeout' seconds for each other.
+
+    Paths are stored relative to 'path_vars', if supplied to load() and
+    save() (see PathVars).
+    """
+
+    def __init__(self, path : str, timeout : float = 60.0):
+        self.path = path
+        # Transactions are begun explicitly
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        # Paths are never renumbered, so IDs can be remembered
+        self._path_ids : Dict[str,int] = {}
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def units(self) -> List[str]:
+        """Names of the stored units"""
+        return [r[0] for r in self._db.execute("SELECT name FROM units ORDER BY name")]
+
+    def saved(self, unit : str) -> float:
+        """When a unit was last saved. Raises KeyError if it isn't stored"""
+        row = self._db.execute("SELECT saved FROM units WHERE name = ?", (unit,)).fetchone()
+        if row is None:
+            raise KeyError(unit)
+        return row[0]
+
+    def load(self, unit : str, path_vars : PathVars = None) -> FileCollection:
+        """
+        The collection of a unit. Raises KeyError if it isn't stored, and
+        ValueError if it uses a path variable 'path_vars' doesn't define
+        """
+        decode = (path_vars if path_vars is not None else PathVars()).decode
+        db = self._db
+        # One read transaction, so the unit can't change part-way through
+        db.execute("BEGIN")
+        try:
+            row = db.execute("SELECT id FROM units WHERE name = ?", (unit,)).fetchone()
+            if row is None:
+                raise KeyError(unit)
+            unit_id = row[0]
+            paths = {}
+            for path_id, path in db.execute(
+                    "SELECT id, path FROM paths WHERE id IN ("
+                    "SELECT path_id FROM files WHERE unit_id = ?1 UNION "
+                    "SELECT spelled_id FROM files WHERE unit_id = ?1 UNION "
+                    "SELECT inc_id FROM includes WHERE unit_id = ?1 UNION "
+                    "SELECT path_id FROM roots WHERE unit_id = ?1 UNION "
+                    "SELECT spelled_id FROM roots WHERE unit_id = ?1)", (unit_id,)):
+                paths[path_id] = decode(path)
+
+            ret = FileCollection()
+            info_m = {}
+            for path_id, timestamp, guard, changes, spelled_id in db.execute(
+                    "SELECT path_id, timestamp, guard, changes, spelled_id "
+                    "FROM files WHERE unit_id = ?", (unit_id,)):
+                info = FileInfo(paths[path_id], timestamp, guard=guard, changes=changes,
+                                spelled=paths[spelled_id] if spelled_id is not None else None)
+                info_m[path_id] = info
+                ret.file_info[info.name] = info
+            for file_id, inc_id in db.execute(
+                    "SELECT file_id, inc_id FROM includes WHERE unit_id = ? "
+                    "ORDER BY file_id, seq", (unit_id,)):
+                info_m[file_id].includes.append(paths[inc_id])
+            for path_id, spelled_id in db.execute(
+                    "SELECT path_id, spelled_id FROM roots WHERE unit_id = ? "
+                    "ORDER BY seq", (unit_id,)):
+                info = info_m.get(path_id)
+                info = FileInfo(paths[path_id], 0) if info is None else \
+                    dc.replace(info, includes=list(info.includes))
+                info.spelled = paths[spelled_id] if spelled_id is not None else None
+                ret.root_files.append(info)
+        finally:
+            db.execute("COMMIT")
+        return ret
+
+    def save(self, unit : str, collection : FileCollection, path_vars : PathVars = None) -> int:
+        """
+        Stores the collection of a unit, replacing any earlier one. Returns
+        the number of files whose rows were written or removed
+        """
+        encode = path_vars.encode if path_vars is not None else (lambda p: p)
+        db = self._db
+        # Take the write lock up front, so concurrent saves queue rather
+        # than fail when upgrading a read transaction
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            intern = self._pathId
+            saved = time.time()
+            row = db.execute("SELECT id FROM units WHERE name = ?", (unit,)).fetchone()
+            if row is None:
+                unit_id = db.execute("INSERT INTO units (name, saved) VALUES (?, ?)",
+                                     (unit, saved)).lastrowid
+            else:
+                unit_id = row[0]
+                db.execute("UPDATE units SET saved = ? WHERE id = ?", (saved, unit_id))
+
+            # Current rows of the unit: path ID -> (file row, include IDs)
+            old : Dict[int,Tuple[tuple,List[int]]] = {}
+            for r in db.execute(
+                    "SELECT path_id, timestamp, guard, changes, spelled_id "
+                    "FROM files WHERE unit_id = ?", (unit_id,)):
+                old[r[0]] = (r[1:], [])
+            for file_id, inc_id in db.execute(
+                    "SELECT file_id, inc_id FROM includes WHERE unit_id = ? "
+                    "ORDER BY file_id, seq", (unit_id,)):
+                old[file_id][1].append(inc_id)
+
+            written = 0
+            new_ids = set()
+            for info in collection.file_info.values():
+                path_id = intern(encode(info.name))
+                new_ids.add(path_id)
+                spelled_id = intern(encode(info.spelled)) if info.spelled is not None else None
+                row = (info.timestamp, info.guard, info.changes, spelled_id)
+                incs = [intern(encode(inc)) for inc in info.includes]
+                prev = old.get(path_id)
+                if prev is not None and prev[0] == row and prev[1] == incs:
+                    continue
+                written += 1
+                db.execute(
+                    "INSERT OR REPLACE INTO files "
+                    "(unit_id, path_id, timestamp, guard, changes, spelled_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (unit_id, path_id) + row)
+                if prev is None or prev[1] != incs:
+                    db.execute("DELETE FROM includes WHERE unit_id = ? AND file_id = ?",
+                               (unit_id, path_id))
+                    db.executemany(
+                        "INSERT INTO includes (unit_id, file_id, seq, inc_id) VALUES (?, ?, ?, ?)",
+                        [(unit_id, path_id, i, inc_id) for i, inc_id in enumerate(incs)])
+            for path_id in old.keys() - new_ids:
+                written += 1
+                db.execute("DELETE FROM files WHERE unit_id = ? AND path_id = ?", (unit_id, path_id))
+                db.execute("DELETE FROM includes WHERE unit_id = ? AND file_id = ?",
+                           (unit_id, path_id))
+
+            # Root lists are short. Rewrite them
+            db.execute("DELETE FROM roots WHERE unit_id = ?", (unit_id,))
+            db.executemany(
+                "INSERT INTO roots (unit_id, seq, path_id, spelled_id) VALUES (?, ?, ?, ?)",
+                [(unit_id, i, intern(encode(r.name)),
+                  intern(encode(r.spelled)) if r.spelled is not None else None)
+                 for i, r in enumerate(collection.root_files)])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            # IDs of paths added by this transaction are gone
+            self._path_ids.clear()
+            raise
+        return written
+
+    def remove(self, unit : str):
+        """Removes a unit, if stored"""
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT id FROM units WHERE name = ?", (unit,)).fetchone()
+            if row is not None:
+                for table in ("roots", "files", "includes"):
+                    db.execute("DELETE FROM %s WHERE unit_id = ?" % table, (row[0],))
+                db.execute("DELETE FROM units WHERE id = ?", (row[0],))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _pathId(self, path : str) -> int:
+        """ID of a path, adding it if needed. Called within a write transaction"""
+        ret = self._path_ids.get(path)
+        if ret is None:
+            row = self._db.execute("SELECT id FROM paths WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                ret = row[0]
+            else:
+                ret = self._db.execute("INSERT INTO paths (path) VALUES (?)", (path,)).lastrowid
+            self._path_ids[path] = ret
+        return ret
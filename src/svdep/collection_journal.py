@@ -0,0 +1,216 @@
+#****************************************************************************
+#* collection_journal.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import errno
+import json
+import os
+import tempfile
+from typing import List, Optional
+from .file_collection import FileCollection
+from .file_info import FileInfo
+from .path_vars import PathVars
+
+# The journal of collection file 'x.json' is 'x.json.journal'
+JOURNAL_SUFFIX = ".journal"
+
+def journal_path(path : str) -> str:
+    return path + JOURNAL_SUFFIX
+
+def load_collection(path : str, path_vars : PathVars = None) -> FileCollection:
+    """
+    Loads a collection file (the snapshot), and replays the changes
+    recorded in its journal, if any. A journal written against a different
+    snapshot is ignored, as is an incomplete batch at its end
+    """
+    # Identify the snapshot before reading it, in case it's replaced
+    header = _header(path)
+    with open(path, "r") as fp:
+        ret = FileCollection.from_dict(json.load(fp), path_vars)
+    try:
+        fp = open(journal_path(path), "r")
+    except FileNotFoundError:
+        return ret
+    with fp:
+        lines = fp.read().splitlines()
+    if len(lines) == 0 or header != _parse(lines[0]):
+        return ret
+
+    batch = []
+    for line in lines[1:]:
+        rec = _parse(line)
+        if not isinstance(rec, dict) or len(rec) != 1:
+            break
+        if "end" in rec.keys():
+            if rec["end"] != len(batch):
+                break
+            for op, arg in batch:
+                _apply(ret, op, arg, path_vars)
+            batch = []
+        else:
+            batch.extend(rec.items())
+    return ret
+
+def save_collection(path : str, collection : FileCollection, path_vars : PathVars = None,
+                    previous : FileCollection = None, compact_ratio : float = 0.5) -> bool:
+    """
+    Saves a collection. When 'previous' is the collection as last loaded
+    from or saved to 'path', only the files that differ from it are
+    appended to the journal. Otherwise, or once the journal outgrows
+    'compact_ratio' times the snapshot, the whole collection is written
+    as a new snapshot and the journal is removed. Returns True if a
+    snapshot was written
+    """
+    if previous is not None and _append(path, collection, path_vars, previous, compact_ratio):
+        return False
+
+    # Write via a temporary so a failed write never leaves a truncated
+    # collection that a later 'check' would trust. Each writer has its own
+    # temporary, so concurrent saves can't rename each other's
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                               prefix=os.path.basename(path) + ".tmp-")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump(collection.to_dict(path_vars), fp)
+        # mkstemp() creates the file private to its owner
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    # A journal left behind no longer matches the snapshot, and would be
+    # ignored. Remove it
+    try:
+        os.remove(journal_path(path))
+    except FileNotFoundError:
+        pass
+    return True
+
+def saved_time(path : str) -> float:
+    """When a collection was last saved: its snapshot or journal, whichever is later"""
+    ret = os.path.getmtime(path)
+    try:
+        ret = max(ret, os.path.getmtime(journal_path(path)))
+    except OSError:
+        pass
+    return ret
+
+def _header(path) -> Optional[dict]:
+    """Identifies the snapshot a journal applies to"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"journal": 1, "snapshot": [st.st_size, st.st_mtime_ns]}
+
+def _parse(line : str):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _same(a : FileInfo, b : FileInfo) -> bool:
+    # 'checked' is transient, and isn't saved
+    return a.name == b.name and a.timestamp == b.timestamp and a.includes == b.includes \
+        and a.guard == b.guard and a.changes == b.changes and a.spelled == b.spelled
+
+def _apply(collection : FileCollection, op : str, arg, path_vars):
+    if op == "put":
+        collection.update_file(FileInfo.from_dict(arg, path_vars))
+    elif op == "del":
+        if path_vars is None:
+            path_vars = PathVars()
+        collection.remove_file(path_vars.decode(arg))
+    elif op == "roots":
+        collection.update_roots([FileInfo.from_dict(d, path_vars) for d in arg])
+
+def _append(path, collection, path_vars, previous, compact_ratio, retry=True) -> bool:
+    """Appends the changes since 'previous' to the journal. False if a snapshot is needed instead"""
+    header = _header(path)
+    if header is None:
+        return False
+    jpath = journal_path(path)
+    try:
+        jsize = os.path.getsize(jpath)
+        with open(jpath, "rb") as fp:
+            if _parse(fp.readline()) != header:
+                return False
+            # A batch cut short by a crash would hide every later batch
+            # from the loader. Start over from a snapshot instead
+            fp.seek(max(0, jsize - 64))
+            tail = fp.read()
+            last = _parse(tail.splitlines()[-1]) if tail.endswith(b"\n") else None
+            if not isinstance(last, dict) or "end" not in last.keys():
+                return False
+    except FileNotFoundError:
+        jsize = 0
+
+    recs : List[dict] = []
+    for name, info in collection.file_info.items():
+        prev = previous.file_info.get(name)
+        if prev is None or not _same(prev, info):
+            recs.append({"put": info.to_dict(path_vars)})
+    for name in previous.file_info.keys():
+        if name not in collection.file_info.keys():
+            recs.append({"del": path_vars.encode(name) if path_vars is not None else name})
+    if len(collection.root_files) != len(previous.root_files) or \
+            not all(_same(a, b) for a, b in zip(collection.root_files, previous.root_files)):
+        recs.append({"roots": [r.to_dict(path_vars) for r in collection.root_files]})
+    recs.append({"end": len(recs)})
+
+    lines = [json.dumps(r) for r in recs]
+    if jsize == 0:
+        lines.insert(0, json.dumps(header))
+    data = "\n".join(lines) + "\n"
+    if jsize + len(data) > compact_ratio * header["snapshot"][0]:
+        return False
+    data = data.encode("utf-8")
+    if jsize == 0:
+        # Publish a new journal complete with its header and first batch,
+        # so a concurrent writer never sees it empty. When another writer
+        # created it first, append to theirs instead
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(jpath) or ".",
+                                   prefix=os.path.basename(jpath) + ".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(data)
+            os.chmod(tmp, 0o644)
+            os.link(tmp, jpath)
+        except FileExistsError:
+            return retry and _append(path, collection, path_vars, previous, compact_ratio, False)
+        finally:
+            os.remove(tmp)
+        return True
+
+    # One unbuffered write to a file opened for appending, so a batch is
+    # never interleaved with another writer's. A concurrent snapshot may
+    # have removed the journal since
+    try:
+        fd = os.open(jpath, os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        return False
+    try:
+        if os.write(fd, data) != len(data):
+            # Out of space. The partial batch has no 'end' record, so the
+            # loader ignores it and the next save writes a snapshot
+            raise OSError(errno.ENOSPC, "Failed to append to %s" % jpath)
+    finally:
+        os.close(fd)
+    return True
@@ -20,31 +20,274 @@
 #*
 #****************************************************************************
 import dataclasses as dc
+import threading
 from typing import Dict, List
 from .file_info import FileInfo
+from .path_vars import PathVars
 
 @dc.dataclass
 class FileCollection(object):
+    """
+    Root files and the FileInfo of every file they (transitively) include.
+
+    closure() gives the files reachable from a root. Files are interned to
+    integer IDs, in depth-first order from the roots, and the reachable set
+    of every file is memoized as a bitset over those IDs, so subgraphs
+    shared between roots are only walked once. Traversals are iterative, so
+    include depth isn't limited by Python's recursion limit.
+
+    includers() and affected_roots() answer reverse queries ("what must
+    recompile if this header changes") from an index that is built on first
+    use and then kept. update_file() and remove_file() keep the reverse
+    index current. After modifying root_files, file_info or a FileInfo's
+    includes directly, call invalidate_index(): until then, queries keep
+    answering from the old state.
+
+    Queries and updates may be made from several threads at once.
+    """
     root_files : List = dc.field(default_factory=list)
+    # NOTE: memoized closures and the reverse index don't see changes made
+    # to root_files or file_info directly. Use update_file(), remove_file()
+    # and update_roots(), or call invalidate_index() afterwards
     file_info : Dict[str, object] = dc.field(default_factory=dict)
+    # Guards the memoized state below, which is filled in on demand. A
+    # collection may be queried from several threads, eg by the server
+    _lock : threading.RLock = dc.field(default_factory=threading.RLock, init=False, repr=False, compare=False)
+    # path -> files that directly include it
+    _includers : Dict[str,List[str]] = dc.field(default=None, init=False, repr=False, compare=False)
+    # Interned file IDs: path -> ID, and ID -> path
+    _ids : Dict[str,int] = dc.field(default=None, init=False, repr=False, compare=False)
+    _paths : List[str] = dc.field(default=None, init=False, repr=False, compare=False)
+    # file ID -> bitset of the IDs reachable from it, including itself
+    _reach : Dict[int,int] = dc.field(default=None, init=False, repr=False, compare=False)
+    # path -> closure() result
+    _closure_m : Dict[str,List[str]] = dc.field(default=None, init=False, repr=False, compare=False)
+
+    def closure(self, path : str) -> List[str]:
+        """
+        Files reachable from 'path' (usually a root file), including
+        itself, in depth-first order from the roots
+        """
+        with self._lock:
+            self._intern()
+            ret = self._closure_m.get(path)
+            if ret is None:
+                ret = self._decode(self.closure_bits(path))
+                self._closure_m[path] = ret
+            return list(ret)
+
+    def closure_bits(self, path : str) -> int:
+        """closure() as a bitset: bit N is set if file_path(N) is reachable"""
+        with self._lock:
+            self._intern()
+            start = self._id(path)
+            if start not in self._reach.keys():
+                self._computeReach(start)
+            return self._reach[start]
+
+    def all_files(self) -> List[str]:
+        """Every file reachable from a root file, in depth-first order"""
+        with self._lock:
+            bits = 0
+            for r in self.root_files:
+                bits |= self.closure_bits(r.name)
+            return self._decode(bits)
+
+    def file_id(self, path : str) -> int:
+        """The ID of a file in closure_bits() bitsets"""
+        with self._lock:
+            self._intern()
+            return self._id(path)
+
+    def file_path(self, id : int) -> str:
+        with self._lock:
+            self._intern()
+            return self._paths[id]
+
+    def includers(self, path : str) -> List[str]:
+        """Files that directly include 'path'"""
+        with self._lock:
+            return list(self._index().get(path, ()))
+
+    def affected_roots(self, path : str) -> List[str]:
+        """
+        Root files that depend on 'path', directly or through includes, in
+        root-file order. A root file depends on itself.
+        """
+        with self._lock:
+            self._intern()
+            id = self._ids.get(path)
+            if id is None:
+                # Not reachable from any root
+                return []
+            return [r.name for r in self.root_files if (self.closure_bits(r.name) >> id) & 1]
+
+    def update_file(self, info : FileInfo):
+        """
+        Adds or replaces the entry of a file, updating the reverse index.
+        Pass a new FileInfo rather than one modified in place
+        """
+        with self._lock:
+            old = self.file_info.get(info.name)
+            self.file_info[info.name] = info
+            if self._includers is not None:
+                old_incs = set(old.includes) if old is not None else set()
+                for inc in old_incs.difference(info.includes):
+                    self._removeIncluder(inc, info.name)
+                for inc in dict.fromkeys(info.includes):
+                    if inc not in old_incs:
+                        self._includers.setdefault(inc, []).append(info.name)
+            # Any closure may have changed
+            self._ids = None
+
+    def remove_file(self, path : str):
+        """Removes the entry of a file, updating the reverse index"""
+        with self._lock:
+            old = self.file_info.pop(path, None)
+            if old is not None and self._includers is not None:
+                for inc in set(old.includes):
+                    self._removeIncluder(inc, path)
+            self._ids = None
+
+    def update_roots(self, root_files : List[FileInfo]):
+        """Replaces the root files. The reverse index is kept"""
+        with self._lock:
+            self.root_files = root_files
+            self._ids = None
+
+    def invalidate_index(self):
+        """Discards the reverse index and memoized closures"""
+        with self._lock:
+            self._includers = None
+            self._ids = None
+
+    def _index(self) -> Dict[str,List[str]]:
+        if self._includers is None:
+            self._includers = {}
+            for path, info in self.file_info.items():
+                for inc in dict.fromkeys(info.includes):
+                    self._includers.setdefault(inc, []).append(path)
+        return self._includers
+
+    def _removeIncluder(self, path, includer):
+        # Absent if file_info was modified without invalidating the index
+        includers = self._includers.get(path)
+        if includers is not None and includer in includers:
+            includers.remove(includer)
+
+    def _intern(self):
+        if self._ids is not None:
+            return
+        self._ids = {}
+        self._paths = []
+        self._reach = {}
+        self._closure_m = {}
+        # Number files in depth-first order from the roots, so that bitset
+        # order is discovery order however file_info is ordered
+        stack = [r.name for r in reversed(self.root_files)]
+        while len(stack):
+            path = stack.pop()
+            if path in self._ids.keys():
+                continue
+            self._ids[path] = len(self._paths)
+            self._paths.append(path)
+            info = self.file_info.get(path)
+            if info is not None:
+                stack.extend(reversed(info.includes))
+
+    def _id(self, path) -> int:
+        ret = self._ids.get(path)
+        if ret is None:
+            ret = len(self._paths)
+            self._ids[path] = ret
+            self._paths.append(path)
+        return ret
+
+    def _succ(self, id) -> List[int]:
+        info = self.file_info.get(self._paths[id])
+        return [self._id(p) for p in info.includes] if info is not None else []
+
+    def _computeReach(self, start):
+        """
+        Fills in _reach for every file reachable from 'start'. Include
+        cycles are possible, so this finds strongly-connected components
+        (Tarjan's algorithm, with an explicit stack). Components complete
+        in reverse topological order, so each one's successors are already
+        known when it completes.
+        """
+        reach = self._reach
+        index = {start: 0}
+        low = {start: 0}
+        scc_stack = [start]
+        on_stack = {start}
+        work = [(start, iter(self._succ(start)))]
+        while len(work):
+            v, succ = work[-1]
+            for w in succ:
+                if w in reach.keys():
+                    continue
+                if w not in index.keys():
+                    index[w] = low[w] = len(index)
+                    scc_stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(self._succ(w))))
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if len(work):
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    members = []
+                    while True:
+                        w = scc_stack.pop()
+                        on_stack.remove(w)
+                        members.append(w)
+                        if w == v:
+                            break
+                    bits = 0
+                    for m in members:
+                        bits |= 1 << m
+                    for m in members:
+                        for w in self._succ(m):
+                            if w in reach.keys():
+                                bits |= reach[w]
+                    for m in members:
+                        reach[m] = bits
+
+    def _decode(self, bits) -> List[str]:
+        return [self._paths[i] for i, b in enumerate(bin(bits)[:1:-1]) if b == "1"]
 
-    def to_dict(self):
+    def to_dict(self, path_vars : PathVars = None):
+        """
+        When 'path_vars' is supplied, paths under its directories are
+        written relative to them, so the collection can be loaded in another
+        workspace (see PathVars)
+        """
         ret = {}
         ret["root_files"] = []
         for file in self.root_files:
-            ret["root_files"].append(file.to_dict())
+            ret["root_files"].append(file.to_dict(path_vars))
         ret["file_info"] = {}
         for path in self.file_info.keys():
-            ret["file_info"][path] = self.file_info[path].to_dict()
+            key = path_vars.encode(path) if path_vars is not None else path
+            ret["file_info"][key] = self.file_info[path].to_dict(path_vars)
         return ret
     
     @classmethod
-    def from_dict(cls, d):
+    def from_dict(cls, d, path_vars : PathVars = None):
+        """
+        Relative paths are expanded with the directories of 'path_vars'.
+        Raises ValueError if the collection uses a variable it doesn't define
+        """
         ret = FileCollection()
         for file in d["root_files"]:
-            ret.root_files.append(FileInfo.from_dict(file))
+            ret.root_files.append(FileInfo.from_dict(file, path_vars))
         for path in d["file_info"].keys():
-            ret.file_info[path] = FileInfo.from_dict(d["file_info"][path])
+            info = FileInfo.from_dict(d["file_info"][path], path_vars)
+            ret.file_info[info.name] = info
         return ret
 
 
@@ -19,9 +19,64 @@
 #*     Author: 
 #*
 #****************************************************************************
+import dataclasses as dc
 
+@dc.dataclass
 class FileDepsReport(object):
+    """
+    Counters and per-phase timings from a build or check, filled in by both
+    implementations. Times are in seconds:
 
-    def __init__(self):
-        pass
+    - time_stat: modification-time and existence checks of known files
+    - time_read: reading file content
+    - time_scan: lexing and directive extraction
+    - time_resolve: searching include directories and canonicalizing
+      paths. Probe stats are counted in 'stats', but their time is
+      counted here
+    - time_json: serializing and parsing collections
+    - time_total: the whole operation, including the phases above
+    """
+    files_scanned : int = 0
+    bytes_read : int = 0
+    stats : int = 0
+    include_probes : int = 0
+    include_probes_failed : int = 0
+    include_cache_hits : int = 0
+    scan_cache_hits : int = 0
+    scan_cache_misses : int = 0
+    scan_store_hits : int = 0
+    scan_store_misses : int = 0
+    files_checked : int = 0
+    time_stat : float = 0.0
+    time_read : float = 0.0
+    time_scan : float = 0.0
+    time_resolve : float = 0.0
+    time_json : float = 0.0
+    time_total : float = 0.0
 
+    def add(self, other : 'FileDepsReport'):
+        """Accumulates another report into this one"""
+        for f in dc.fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+    def to_dict(self):
+        return dc.asdict(self)
+
+    @classmethod
+    def from_dict(cls, d):
+        ret = cls()
+        for f in dc.fields(ret):
+            if f.name in d.keys():
+                setattr(ret, f.name, f.type(d[f.name]))
+        return ret
+
+    def format(self) -> str:
+        """One 'name: value' line per counter and timing"""
+        lines = []
+        for f in dc.fields(self):
+            value = getattr(self, f.name)
+            if f.name.startswith("time_"):
+                lines.append("%-22s %10.3f ms" % (f.name + ":", value * 1000))
+            else:
+                lines.append("%-22s %10d" % (f.name + ":", value))
+        return "\n".join(lines)
@@ -1,5 +1,6 @@
 import dataclasses as dc
 from typing import List
+from .path_vars import PathVars
 
 @dc.dataclass
 class FileInfo(object):
@@ -7,8 +8,20 @@ class FileInfo(object):
     timestamp : int
     checked : bool = False
     includes : List[str] = dc.field(default_factory=list)
+    guard : str = None
+    # Number of rebuilds that found the file modified. Checks look at
+    # frequently-changed files first
+    changes : int = 0
+    # Path the file was first reached by, when paths are canonicalized and
+    # it differs from 'name'
+    spelled : str = None
 
-    def to_dict(self):
+    def matches(self, path) -> bool:
+        """Whether 'path' names this file, as recorded or as spelled"""
+        return path == self.name or (self.spelled is not None and path == self.spelled)
+
+    def to_dict(self, path_vars : 'PathVars' = None):
+        """Paths are written relative to 'path_vars', if supplied"""
         ret = {
             "name": self.name,
             "timestamp": self.timestamp,
@@ -16,14 +29,37 @@ class FileInfo(object):
         }
         for inc in self.includes:
             ret["includes"].append(inc)
+        if self.guard is not None:
+            ret["guard"] = self.guard
+        if self.changes:
+            ret["changes"] = self.changes
+        if self.spelled is not None:
+            ret["spelled"] = self.spelled
+        if path_vars is not None:
+            ret["name"] = path_vars.encode(self.name)
+            ret["includes"] = [path_vars.encode(inc) for inc in self.includes]
+            if self.spelled is not None:
+                ret["spelled"] = path_vars.encode(self.spelled)
         
         return ret
 
     @classmethod    
-    def from_dict(cls, d):
-        ret = cls(d["name"], d["timestamp"])
+    def from_dict(cls, d, path_vars : 'PathVars' = None):
+        """
+        Paths written relative to path variables are expanded with
+        'path_vars'. Raises ValueError if a variable isn't defined
+        """
+        if path_vars is None:
+            path_vars = _NO_PATH_VARS
+        ret = cls(path_vars.decode(d["name"]), d["timestamp"])
         for path in d["includes"]:
-            ret.includes.append(path)
+            ret.includes.append(path_vars.decode(path))
+        ret.guard = d.get("guard", None)
+        ret.changes = int(d.get("changes", 0))
+        spelled = d.get("spelled", None)
+        ret.spelled = path_vars.decode(spelled) if spelled is not None else None
         return ret
 
+_NO_PATH_VARS = PathVars()
+
 
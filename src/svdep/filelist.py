@@ -0,0 +1,109 @@
+#****************************************************************************
+#* filelist.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may 
+#* not use this file except in compliance with the License.  
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software 
+#* distributed under the License is distributed on an "AS IS" BASIS, 
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  
+#* See the License for the specific language governing permissions and 
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author: 
+#*
+#****************************************************************************
+import dataclasses as dc
+import os
+import shlex
+from typing import Dict, List
+
+@dc.dataclass
+class Filelist(object):
+    """
+    Source files, include directories and defines gathered from simulator-
+    style arguments and filelists. 'defines' is None unless at least one
+    +define+ or -D was given, so that builds without defines keep following
+    every `include.
+    """
+    files : List[str] = dc.field(default_factory=list)
+    incdirs : List[str] = dc.field(default_factory=list)
+    defines : Dict[str,str] = None
+
+    def addArgs(self, args : List[str], basedir : str = None):
+        """
+        Processes simulator-style arguments: source files, +incdir+dir,
+        -I dir, +define+NAME[=VALUE], -D NAME[=VALUE], and -f/-F filelist.
+        Relative paths are resolved against 'basedir' when it is given
+        (-F semantics), otherwise against the current directory.
+        """
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if arg in ("-f", "-F", "-I", "-D"):
+                if i >= len(args):
+                    raise ValueError("Option %s requires an argument" % arg)
+                val = args[i]
+                i += 1
+                if arg == "-f":
+                    self.addFilelist(self._path(val, basedir))
+                elif arg == "-F":
+                    path = self._path(val, basedir)
+                    self.addFilelist(path, os.path.dirname(path))
+                elif arg == "-I":
+                    self._addIncdir(self._path(val, basedir))
+                else:
+                    self._addDefine(val)
+            elif arg.startswith("-I"):
+                self._addIncdir(self._path(arg[2:], basedir))
+            elif arg.startswith("-D"):
+                self._addDefine(arg[2:])
+            elif arg.startswith("+incdir+"):
+                for incdir in arg[len("+incdir+"):].split("+"):
+                    if incdir != "":
+                        self._addIncdir(self._path(incdir, basedir))
+            elif arg.startswith("+define+"):
+                for define in arg[len("+define+"):].split("+"):
+                    if define != "":
+                        self._addDefine(define)
+            elif arg.startswith("+") or arg.startswith("-"):
+                # Other simulator options don't affect dependencies
+                pass
+            else:
+                self.files.append(self._path(arg, basedir))
+
+    def addFilelist(self, path : str, basedir : str = None):
+        """Reads arguments from a filelist. '//' and '#' start comments"""
+        with open(path, "r") as fp:
+            content = fp.read()
+
+        args = []
+        for line in content.splitlines():
+            line = line.split("//", 1)[0].strip()
+            if line == "" or line.startswith("#"):
+                continue
+            args.extend(shlex.split(os.path.expandvars(line)))
+        self.addArgs(args, basedir)
+
+    def _path(self, path, basedir):
+        path = os.path.expandvars(path)
+        if basedir is not None and not os.path.isabs(path):
+            path = os.path.join(basedir, path)
+        return path
+
+    def _addIncdir(self, incdir):
+        if incdir not in self.incdirs:
+            self.incdirs.append(incdir)
+
+    def _addDefine(self, define):
+        if self.defines is None:
+            self.defines = {}
+        name, eq, value = define.partition("=")
+        self.defines[name] = value if eq else None
@@ -21,7 +21,8 @@
 #****************************************************************************
 import hashlib
 import logging
-from typing import List, Optional, Set
+from typing import List, Optional
+from .file_collection import FileCollection
 from .task_build_file_collection import TaskBuildFileCollection
 
 _log = logging.getLogger(__name__)
@@ -46,44 +47,37 @@ def compute_hash_for_files(files: List[str], incdirs: Optional[List[str]] = None
         task = TaskBuildFileCollection(root_paths=files, incdirs=incdirs)
         collection = task.build()
         
-        # Collect all files in dependency order
-        all_files: Set[str] = set()
-        
-        # Add all root files
-        for root_file in collection.root_files:
-            _collect_files_recursive(root_file.name, collection.file_info, all_files)
-        
-        # Sort for deterministic hashing
-        sorted_files = sorted(all_files)
-        
-        # Compute hash over all file contents
-        hasher = hashlib.md5()
-        for filepath in sorted_files:
-            try:
-                with open(filepath, 'rb') as f:
-                    content = f.read()
-                    hasher.update(filepath.encode('utf-8'))  # Include path in hash
-                    hasher.update(content)
-            except Exception as e:
-                _log.warning(f"Failed to read file {filepath}: {e}")
-                return None
-        
-        return hasher.hexdigest()
+        return compute_hash_for_collection(collection)
         
     except Exception as e:
         _log.error(f"Failed to compute hash for files: {e}")
         return None
 
 
-def _collect_files_recursive(filepath: str, file_info: dict, collected: Set[str]) -> None:
-    """Recursively collect all files including transitive includes."""
-    if filepath in collected:
-        return
+def compute_hash_for_collection(collection: FileCollection) -> Optional[str]:
+    """
+    Compute a content-based hash over every file in an already-built collection.
     
-    collected.add(filepath)
+    Args:
+        collection: File collection whose root files and transitive includes are hashed
+        
+    Returns:
+        MD5 hash string of all file contents, or None if a file can't be read
+    """
+    # Sort for deterministic hashing
+    sorted_files = sorted(collection.all_files())
     
-    # Add all includes
-    if filepath in file_info:
-        info = file_info[filepath]
-        for inc_path in info.includes:
-            _collect_files_recursive(inc_path, file_info, collected)
+    # Compute hash over all file contents
+    hasher = hashlib.md5()
+    for filepath in sorted_files:
+        try:
+            with open(filepath, 'rb') as f:
+                content = f.read()
+                hasher.update(filepath.encode('utf-8'))  # Include path in hash
+                hasher.update(content)
+        except Exception as e:
+            _log.warning(f"Failed to read file {filepath}: {e}")
+            return None
+    
+    return hasher.hexdigest()
+
@@ -25,32 +25,40 @@ import ctypes
 import json
 import os
 import sys
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional
 
+from .build_unit import BuildUnit
+from .check_result import CheckResult
 from .file_collection import FileCollection
+from .file_deps_report import FileDepsReport
+from .file_info import FileInfo
+from .scan_store import DirScanStore
 
 # Try to load the native library
 _lib = None
 _lib_path = None
 
-def _find_native_library() -> Optional[str]:
-    """Find the native svdep library."""
-    # Determine library name based on platform
+# Environment variable naming the native library to load. Set it to 'none'
+# to always use the pure-Python implementation
+NATIVE_LIB_ENV = "SVDEP_NATIVE_LIB"
+
+def _native_lib_name() -> str:
     if sys.platform == 'win32':
-        lib_name = 'svdep.dll'
+        return 'svdep.dll'
     elif sys.platform == 'darwin':
-        lib_name = 'libsvdep.dylib'
+        return 'libsvdep.dylib'
     else:
-        lib_name = 'libsvdep.so'
-    
-    # Search paths
+        return 'libsvdep.so'
+
+def _search_paths() -> List[str]:
     search_paths = []
     
-    # Check relative to this module
+    # Check relative to this module: an installed package ships the
+    # library alongside, and a source checkout builds it in cpp/build
     module_dir = os.path.dirname(os.path.abspath(__file__))
-    search_paths.append(module_dir)
-    search_paths.append(os.path.join(module_dir, '..', '..', '..', 'cpp', 'build'))
-    search_paths.append(os.path.join(module_dir, '..', '..', '..', 'cpp', 'build', 'lib'))
+    search_paths.append(os.path.join(module_dir, '..', '..', 'cpp', 'build'))
+    search_paths.append(os.path.join(module_dir, '..', '..', 'cpp', 'build', 'lib'))
     
     # Check standard library paths
     if 'LD_LIBRARY_PATH' in os.environ:
@@ -62,14 +70,72 @@ def _find_native_library() -> Optional[str]:
     
     # Standard system paths
     search_paths.extend(['/usr/local/lib', '/usr/lib'])
-    
+    return search_paths
+
+def _cache_file(search_paths : List[str]) -> str:
+    """
+    Per-user file recording where the library was last found. It is keyed
+    by the search path, so a different environment probes afresh
+    """
+    import hashlib
+    if sys.platform == 'win32':
+        cache_dir = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    key = hashlib.sha1(os.pathsep.join(search_paths).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, 'svdep', 'native-lib-%s' % key)
+
+def _find_native_library() -> Optional[str]:
+    """Find the native svdep library."""
+    override = os.environ.get(NATIVE_LIB_ENV)
+    if override:
+        # Explicit choice. Don't second-guess it by searching
+        return None if override.lower() == 'none' else override
+
+    lib_name = _native_lib_name()
+
+    # Shipped with the package: no further probing needed
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    full_path = os.path.join(module_dir, lib_name)
+    if os.path.isfile(full_path):
+        return full_path
+
+    search_paths = _search_paths()
+    cache_file = _cache_file(search_paths)
+    # Trust the record while the library is still there. Only a miss
+    # searches again, so a library added to a directory searched ahead of
+    # it isn't picked up until the recorded one goes away
+    try:
+        with open(cache_file, 'r') as fp:
+            cached = json.load(fp)['path']
+        if os.path.isfile(cached):
+            return cached
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
     for path in search_paths:
         full_path = os.path.join(path, lib_name)
         if os.path.isfile(full_path):
+            _record_native_library(cache_file, os.path.abspath(full_path))
             return full_path
     
     return None
 
+def _record_native_library(cache_file, path):
+    # The cache directory may be read-only, as HOME is for some batch
+    # jobs. Failing to record the result only costs the next search
+    tmp = "%s.%d" % (cache_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp, 'w') as fp:
+            json.dump({'path': path}, fp)
+        os.replace(tmp, cache_file)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
 def _load_native_library():
     """Load the native library and setup function signatures."""
     global _lib, _lib_path
@@ -100,6 +166,22 @@ def _load_native_library():
     _lib.svdep_add_root_file.restype = ctypes.c_int
     _lib.svdep_add_root_file.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
     
+    # int svdep_add_define(svdep_t ctx, const char *name, const char *value)
+    _lib.svdep_add_define.restype = ctypes.c_int
+    _lib.svdep_add_define.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+    
+    # int svdep_clear_defines(svdep_t ctx)
+    _lib.svdep_clear_defines.restype = ctypes.c_int
+    _lib.svdep_clear_defines.argtypes = [ctypes.c_void_p]
+    
+    # int svdep_set_compilation_unit(svdep_t ctx, int enable)
+    _lib.svdep_set_compilation_unit.restype = ctypes.c_int
+    _lib.svdep_set_compilation_unit.argtypes = [ctypes.c_void_p, ctypes.c_int]
+
+    # int svdep_set_canonical(svdep_t ctx, int enable)
+    _lib.svdep_set_canonical.restype = ctypes.c_int
+    _lib.svdep_set_canonical.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    
     # int svdep_build(svdep_t ctx)
     _lib.svdep_build.restype = ctypes.c_int
     _lib.svdep_build.argtypes = [ctypes.c_void_p]
@@ -113,44 +195,198 @@ def _load_native_library():
     _lib.svdep_load_json.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
     
     # int svdep_check_up_to_date(svdep_t ctx, double last_timestamp)
+    _lib.svdep_load_json_units.restype = ctypes.c_int
+    _lib.svdep_load_json_units.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_int,
+                                           ctypes.c_char_p]
+    
     _lib.svdep_check_up_to_date.restype = ctypes.c_int
     _lib.svdep_check_up_to_date.argtypes = [ctypes.c_void_p, ctypes.c_double]
     
+    # int svdep_load_scan_cache(svdep_t ctx, const char *path)
+    _lib.svdep_load_scan_cache.restype = ctypes.c_int
+    _lib.svdep_load_scan_cache.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    # int svdep_save_scan_cache(svdep_t ctx, const char *path)
+    _lib.svdep_save_scan_cache.restype = ctypes.c_int
+    _lib.svdep_save_scan_cache.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    # int svdep_set_scan_store(svdep_t ctx, const char *dir)
+    _lib.svdep_set_scan_store.restype = ctypes.c_int
+    _lib.svdep_set_scan_store.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    # int svdep_check_up_to_date_all(svdep_t ctx, double last_timestamp)
+    _lib.svdep_check_up_to_date_all.restype = ctypes.c_int
+    _lib.svdep_check_up_to_date_all.argtypes = [ctypes.c_void_p, ctypes.c_double]
+    
+    # const char *svdep_get_check_result(svdep_t ctx)
+    _lib.svdep_get_check_result.restype = ctypes.c_char_p
+    _lib.svdep_get_check_result.argtypes = [ctypes.c_void_p]
+    
+    # const char *svdep_get_report(svdep_t ctx)
+    _lib.svdep_get_report.restype = ctypes.c_char_p
+    _lib.svdep_get_report.argtypes = [ctypes.c_void_p]
+    
+    # int svdep_check_roots(svdep_t ctx, double last_timestamp, int *verdicts, int n)
+    _lib.svdep_check_roots.restype = ctypes.c_int
+    _lib.svdep_check_roots.argtypes = [ctypes.c_void_p, ctypes.c_double,
+                                       ctypes.POINTER(ctypes.c_int), ctypes.c_int]
+    
+    # int svdep_check_units(svdep_t *ctxs, int n, const double *last_timestamps,
+    #                       int *verdicts, int collect_all)
+    _lib.svdep_check_units.restype = ctypes.c_int
+    _lib.svdep_check_units.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_int,
+                                       ctypes.POINTER(ctypes.c_double),
+                                       ctypes.POINTER(ctypes.c_int), ctypes.c_int]
+    
+    # svdep_pool_t svdep_pool_create(void)
+    _lib.svdep_pool_create.restype = ctypes.c_void_p
+    _lib.svdep_pool_create.argtypes = []
+    
+    # void svdep_pool_destroy(svdep_pool_t pool)
+    _lib.svdep_pool_destroy.restype = None
+    _lib.svdep_pool_destroy.argtypes = [ctypes.c_void_p]
+    
+    # int svdep_pool_load_scan_cache(svdep_pool_t pool, const char *path)
+    _lib.svdep_pool_load_scan_cache.restype = ctypes.c_int
+    _lib.svdep_pool_load_scan_cache.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    # int svdep_pool_save_scan_cache(svdep_pool_t pool, const char *path)
+    _lib.svdep_pool_save_scan_cache.restype = ctypes.c_int
+    _lib.svdep_pool_save_scan_cache.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    # int svdep_pool_set_scan_store(svdep_pool_t pool, const char *dir)
+    _lib.svdep_pool_set_scan_store.restype = ctypes.c_int
+    _lib.svdep_pool_set_scan_store.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    # int svdep_build_units(svdep_pool_t pool, svdep_t *ctxs, int n, int jobs)
+    _lib.svdep_build_units.restype = ctypes.c_int
+    _lib.svdep_build_units.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p),
+                                       ctypes.c_int, ctypes.c_int]
+    
     # const char *svdep_get_error(svdep_t ctx)
     _lib.svdep_get_error.restype = ctypes.c_char_p
     _lib.svdep_get_error.argtypes = [ctypes.c_void_p]
     
     return True
 
-# Try to load on import
-_native_available = _load_native_library()
+# The library is loaded on first use, so that importing svdep stays cheap
+# for callers that never need it. None until the first attempt
+_native_available = None
 
 def is_native_available() -> bool:
-    """Check if the native library is available."""
+    """Check if the native library is available, loading it if needed."""
+    global _native_available
+    if _native_available is None:
+        _native_available = _load_native_library()
     return _native_available
 
 def get_native_library_path() -> Optional[str]:
     """Get the path to the loaded native library."""
-    return _lib_path
+    return _lib_path if is_native_available() else None
+
+def _scan_store_dir(store) -> Optional[str]:
+    """Directory of a scan store. The native library supports directory stores only"""
+    if store is None or isinstance(store, str):
+        return store
+    if isinstance(store, DirScanStore):
+        return store.path
+    raise TypeError(f"Native builds support directory scan stores only, not {type(store).__name__}")
+
+def _get_report(ctx) -> FileDepsReport:
+    """Counters and timings accumulated by a native context"""
+    return FileDepsReport.from_dict(json.loads(_lib.svdep_get_report(ctx).decode('utf-8')))
+
+
+def _same_file(a: FileInfo, b: FileInfo) -> bool:
+    return a is b or (a.timestamp == b.timestamp and a.includes == b.includes and
+                      a.guard == b.guard and a.changes == b.changes and a.spelled == b.spelled)
+
+
+def _units_json(collections: List[Optional[FileCollection]]) -> bytes:
+    """
+    Encode collections for svdep_load_json_units. A file recorded alike by
+    many collections, such as a shared header, is encoded once.
+    """
+    files = []
+    index = {}
+    units = []
+    for collection in collections:
+        if collection is None:
+            units.append(None)
+            continue
+        ids = []
+        for info in collection.file_info.values():
+            same = index.setdefault(info.name, [])
+            for i in same:
+                if _same_file(files[i], info):
+                    break
+            else:
+                i = len(files)
+                files.append(info)
+                same.append(i)
+            ids.append(i)
+        units.append({
+            "root_files": [r.to_dict() for r in collection.root_files],
+            "file_info": ids})
+    return json.dumps({
+        "files": [info.to_dict() for info in files],
+        "units": units}).encode('utf-8')
+
+
+def _load_units(ctxs, collections: List[Optional[FileCollection]]):
+    """Load the collections of many contexts in one call."""
+    n = len(ctxs)
+    ctx_a = (ctypes.c_void_p * n)(*ctxs)
+    if _lib.svdep_load_json_units(ctx_a, n, _units_json(collections)) != 0:
+        error = _lib.svdep_get_error(ctxs[0]) if n > 0 else None
+        raise RuntimeError(f"Failed to load JSON: {error.decode('utf-8') if error else 'unknown error'}")
 
 
 class NativeTaskBuildFileCollection:
     """Native implementation of TaskBuildFileCollection."""
     
-    def __init__(self, root_paths: List[str], incdirs: List[str] = None):
+    def __init__(self, root_paths: List[str], incdirs: List[str] = None,
+                 defines: Dict[str, str] = None, compilation_unit: bool = False,
+                 previous: FileCollection = None, scan_cache: str = None,
+                 canonical: bool = False, scan_store = None):
         self.root_paths = root_paths
         self.incdirs = incdirs if incdirs is not None else []
+        self.defines = defines
+        self.compilation_unit = compilation_unit
+        self.previous = previous
+        self.scan_cache = scan_cache
+        self.canonical = canonical
+        self.scan_store = scan_store
+        self.report = None
         self._ctx = None
     
     def build(self) -> FileCollection:
-        if not _native_available:
+        return self.build_define_sets([{}])[0]
+    
+    def build_define_sets(self, define_sets: List[Dict[str, str]]) -> List[FileCollection]:
+        """Build one collection per define set, scanning each file once across sets."""
+        if not is_native_available():
             raise RuntimeError("Native library not available")
         
+        start = time.perf_counter()
+        store_dir = _scan_store_dir(self.scan_store)
+        self.report = FileDepsReport()
+        self._json_time = 0.0
         self._ctx = _lib.svdep_create()
         if not self._ctx:
             raise RuntimeError("Failed to create svdep context")
         
         try:
+            # Seed include guards from a previous scan
+            if self.previous is not None:
+                json_start = time.perf_counter()
+                json_str = json.dumps(self.previous.to_dict())
+                self._json_time += time.perf_counter() - json_start
+                result = _lib.svdep_load_json(self._ctx, json_str.encode('utf-8'))
+                if result != 0:
+                    error = _lib.svdep_get_error(self._ctx)
+                    raise RuntimeError(f"Failed to load JSON: {error.decode('utf-8') if error else 'unknown error'}")
+            
             # Add include directories
             for incdir in self.incdirs:
                 result = _lib.svdep_add_incdir(self._ctx, incdir.encode('utf-8'))
@@ -158,6 +394,14 @@ class NativeTaskBuildFileCollection:
                     error = _lib.svdep_get_error(self._ctx)
                     raise RuntimeError(f"Failed to add incdir: {error.decode('utf-8') if error else 'unknown error'}")
             
+            _lib.svdep_set_compilation_unit(self._ctx, 1 if self.compilation_unit else 0)
+            _lib.svdep_set_canonical(self._ctx, 1 if self.canonical else 0)
+            
+            if self.scan_cache is not None:
+                _lib.svdep_load_scan_cache(self._ctx, self.scan_cache.encode('utf-8'))
+            if store_dir is not None:
+                _lib.svdep_set_scan_store(self._ctx, store_dir.encode('utf-8'))
+            
             # Add root files
             for path in self.root_paths:
                 result = _lib.svdep_add_root_file(self._ctx, path.encode('utf-8'))
@@ -165,26 +409,58 @@ class NativeTaskBuildFileCollection:
                     error = _lib.svdep_get_error(self._ctx)
                     raise RuntimeError(f"Failed to add root file: {error.decode('utf-8') if error else 'unknown error'}")
             
-            # Build
-            result = _lib.svdep_build(self._ctx)
-            if result != 0:
-                error = _lib.svdep_get_error(self._ctx)
-                raise RuntimeError(f"Build failed: {error.decode('utf-8') if error else 'unknown error'}")
+            ret = []
+            for define_set in define_sets:
+                defines = dict(self.defines or {})
+                defines.update(define_set)
+                ret.append(self._build(defines))
             
-            # Get JSON result
-            json_str = _lib.svdep_get_json(self._ctx)
-            if not json_str:
-                error = _lib.svdep_get_error(self._ctx)
-                raise RuntimeError(f"Failed to get JSON: {error.decode('utf-8') if error else 'unknown error'}")
+            if self.scan_cache is not None:
+                result = _lib.svdep_save_scan_cache(self._ctx, self.scan_cache.encode('utf-8'))
+                if result != 0:
+                    error = _lib.svdep_get_error(self._ctx)
+                    raise RuntimeError(f"Failed to save scan cache: {error.decode('utf-8') if error else 'unknown error'}")
             
-            # Parse JSON and create FileCollection
-            data = json.loads(json_str.decode('utf-8'))
-            return FileCollection.from_dict(data)
+            self.report = _get_report(self._ctx)
+            self.report.time_json += self._json_time
+            self.report.time_total = time.perf_counter() - start
+            return ret
         
         finally:
             if self._ctx:
                 _lib.svdep_destroy(self._ctx)
                 self._ctx = None
+    
+    def _build(self, defines: Dict[str, str]) -> FileCollection:
+        # Add user defines
+        _lib.svdep_clear_defines(self._ctx)
+        for name, value in defines.items():
+            result = _lib.svdep_add_define(
+                self._ctx,
+                name.encode('utf-8'),
+                value.encode('utf-8') if value is not None else None)
+            if result != 0:
+                error = _lib.svdep_get_error(self._ctx)
+                raise RuntimeError(f"Failed to add define: {error.decode('utf-8') if error else 'unknown error'}")
+        
+        # Build
+        result = _lib.svdep_build(self._ctx)
+        if result != 0:
+            error = _lib.svdep_get_error(self._ctx)
+            raise RuntimeError(f"Build failed: {error.decode('utf-8') if error else 'unknown error'}")
+        
+        # Get JSON result
+        json_str = _lib.svdep_get_json(self._ctx)
+        if not json_str:
+            error = _lib.svdep_get_error(self._ctx)
+            raise RuntimeError(f"Failed to get JSON: {error.decode('utf-8') if error else 'unknown error'}")
+        
+        # Parse JSON and create FileCollection
+        json_start = time.perf_counter()
+        data = json.loads(json_str.decode('utf-8'))
+        ret = FileCollection.from_dict(data)
+        self._json_time += time.perf_counter() - json_start
+        return ret
 
 
 class NativeTaskCheckUpToDate:
@@ -193,33 +469,226 @@ class NativeTaskCheckUpToDate:
     def __init__(self, root_files: List[str], incdirs: List[str] = None):
         self.root_files = root_files
         self.incdirs = incdirs if incdirs is not None else []
+        self.report = None
+        self.last_result = None
         self._ctx = None
     
     def check(self, info: FileCollection, timestamp: float) -> bool:
-        if not _native_available:
+        return self.check_result(info, timestamp).up_to_date
+    
+    def check_result(self, info: FileCollection, timestamp: float,
+                     collect_all: bool = False) -> CheckResult:
+        """Like check(), but reports the stale files and any root mismatch."""
+        return self._check(info, timestamp, collect_all, None)
+    
+    def check_roots(self, info: FileCollection, timestamp: float) -> Dict[str, bool]:
+        """A verdict per root file, stat'ing each file once across roots."""
+        verdicts = (ctypes.c_int * len(self.root_files))()
+        self.last_result = self._check(info, timestamp, True, verdicts)
+        return {root: bool(v) for root, v in zip(self.root_files, verdicts)}
+    
+    def _check(self, info: FileCollection, timestamp: float, collect_all: bool,
+               verdicts) -> CheckResult:
+        if not is_native_available():
             raise RuntimeError("Native library not available")
         
+        start = time.perf_counter()
+        self.report = FileDepsReport()
         self._ctx = _lib.svdep_create()
         if not self._ctx:
             raise RuntimeError("Failed to create svdep context")
         
         try:
             # Load the file collection as JSON
+            json_start = time.perf_counter()
             json_str = json.dumps(info.to_dict())
+            json_time = time.perf_counter() - json_start
             result = _lib.svdep_load_json(self._ctx, json_str.encode('utf-8'))
             if result != 0:
                 error = _lib.svdep_get_error(self._ctx)
                 raise RuntimeError(f"Failed to load JSON: {error.decode('utf-8') if error else 'unknown error'}")
             
+            # The root files are compared against those in the collection
+            for path in self.root_files:
+                result = _lib.svdep_add_root_file(self._ctx, path.encode('utf-8'))
+                if result != 0:
+                    error = _lib.svdep_get_error(self._ctx)
+                    raise RuntimeError(f"Failed to add root file: {error.decode('utf-8') if error else 'unknown error'}")
+            
             # Check if up to date
-            result = _lib.svdep_check_up_to_date(self._ctx, timestamp)
+            if verdicts is not None:
+                result = _lib.svdep_check_roots(self._ctx, timestamp, verdicts, len(verdicts))
+            elif collect_all:
+                result = _lib.svdep_check_up_to_date_all(self._ctx, timestamp)
+            else:
+                result = _lib.svdep_check_up_to_date(self._ctx, timestamp)
             if result == -1:
                 error = _lib.svdep_get_error(self._ctx)
                 raise RuntimeError(f"Check failed: {error.decode('utf-8') if error else 'unknown error'}")
             
-            return result == 1
+            ret = CheckResult.from_dict(json.loads(
+                _lib.svdep_get_check_result(self._ctx).decode('utf-8')))
+            
+            self.report = _get_report(self._ctx)
+            self.report.time_json += json_time
+            self.report.time_total = time.perf_counter() - start
+            return ret
         
         finally:
             if self._ctx:
                 _lib.svdep_destroy(self._ctx)
                 self._ctx = None
+
+
+class NativeTaskCheckUnits:
+    """Native implementation of TaskCheckUnits."""
+    
+    def __init__(self, root_files: List[List[str]]):
+        self.root_files = root_files
+        self.report = None
+    
+    def check(self, collections: List[FileCollection], timestamps: List[float]) -> List[bool]:
+        return [r.up_to_date for r in self.check_results(collections, timestamps)]
+    
+    def check_results(self, collections: List[FileCollection], timestamps: List[float],
+                      collect_all: bool = False) -> List[CheckResult]:
+        """Check every collection in one call, stat'ing each distinct file once."""
+        if not is_native_available():
+            raise RuntimeError("Native library not available")
+        
+        start = time.perf_counter()
+        self.report = FileDepsReport()
+        json_time = 0.0
+        ctxs = []
+        
+        try:
+            for root_files in self.root_files[:len(collections)]:
+                ctx = _lib.svdep_create()
+                if not ctx:
+                    raise RuntimeError("Failed to create svdep context")
+                ctxs.append(ctx)
+                for path in root_files:
+                    if _lib.svdep_add_root_file(ctx, path.encode('utf-8')) != 0:
+                        error = _lib.svdep_get_error(ctx)
+                        raise RuntimeError(f"Failed to add root file: {error.decode('utf-8') if error else 'unknown error'}")
+            
+            # All the collections in one batch, sharing the files they
+            # have in common
+            json_start = time.perf_counter()
+            _load_units(ctxs, collections[:len(ctxs)])
+            json_time += time.perf_counter() - json_start
+            
+            n = len(ctxs)
+            ctx_a = (ctypes.c_void_p * n)(*ctxs)
+            timestamp_a = (ctypes.c_double * n)(*timestamps[:n])
+            verdict_a = (ctypes.c_int * n)()
+            if _lib.svdep_check_units(ctx_a, n, timestamp_a, verdict_a, 1 if collect_all else 0) != 0:
+                raise RuntimeError("Check failed")
+            
+            ret = []
+            for ctx in ctxs:
+                ret.append(CheckResult.from_dict(json.loads(
+                    _lib.svdep_get_check_result(ctx).decode('utf-8'))))
+                self.report.add(_get_report(ctx))
+            self.report.time_json += json_time
+            self.report.time_total = time.perf_counter() - start
+            return ret
+        
+        finally:
+            for ctx in ctxs:
+                _lib.svdep_destroy(ctx)
+
+
+class NativeTaskBuildUnits:
+    """Native implementation of TaskBuildUnits."""
+    
+    def __init__(self, units: List[BuildUnit], jobs: int = None, scan_cache: str = None,
+                 scan_store = None):
+        self.units = units
+        self.jobs = jobs
+        self.scan_cache = scan_cache
+        self.scan_store = scan_store
+        self.report = None
+    
+    def build(self) -> List[FileCollection]:
+        """Build one collection per unit. Units are built in parallel, outside the GIL."""
+        if not is_native_available():
+            raise RuntimeError("Native library not available")
+        
+        start = time.perf_counter()
+        store_dir = _scan_store_dir(self.scan_store)
+        self.report = FileDepsReport()
+        json_time = 0.0
+        pool = _lib.svdep_pool_create()
+        if not pool:
+            raise RuntimeError("Failed to create svdep scan pool")
+        ctxs = []
+        
+        def error(ctx, what):
+            err = _lib.svdep_get_error(ctx)
+            return RuntimeError(f"{what}: {err.decode('utf-8') if err else 'unknown error'}")
+        
+        try:
+            if self.scan_cache is not None:
+                _lib.svdep_pool_load_scan_cache(pool, self.scan_cache.encode('utf-8'))
+            if store_dir is not None:
+                _lib.svdep_pool_set_scan_store(pool, store_dir.encode('utf-8'))
+            
+            for unit in self.units:
+                ctx = _lib.svdep_create()
+                if not ctx:
+                    raise RuntimeError("Failed to create svdep context")
+                ctxs.append(ctx)
+                
+                for incdir in unit.incdirs:
+                    if _lib.svdep_add_incdir(ctx, incdir.encode('utf-8')) != 0:
+                        raise error(ctx, "Failed to add incdir")
+                for path in unit.root_paths:
+                    if _lib.svdep_add_root_file(ctx, path.encode('utf-8')) != 0:
+                        raise error(ctx, "Failed to add root file")
+                for name, value in (unit.defines or {}).items():
+                    result = _lib.svdep_add_define(
+                        ctx,
+                        name.encode('utf-8'),
+                        value.encode('utf-8') if value is not None else None)
+                    if result != 0:
+                        raise error(ctx, "Failed to add define")
+                _lib.svdep_set_compilation_unit(ctx, 1 if unit.compilation_unit else 0)
+                _lib.svdep_set_canonical(ctx, 1 if unit.canonical else 0)
+            
+            previous = [unit.previous for unit in self.units]
+            if any(p is not None for p in previous):
+                json_start = time.perf_counter()
+                _load_units(ctxs, previous)
+                json_time += time.perf_counter() - json_start
+            
+            ctx_a = (ctypes.c_void_p * len(ctxs))(*ctxs)
+            if _lib.svdep_build_units(pool, ctx_a, len(ctxs), self.jobs or 0) != 0:
+                for ctx in ctxs:
+                    if _lib.svdep_get_error(ctx):
+                        raise error(ctx, "Build failed")
+                raise RuntimeError("Build failed: unknown error")
+            
+            ret = []
+            for ctx in ctxs:
+                json_str = _lib.svdep_get_json(ctx)
+                if not json_str:
+                    raise error(ctx, "Failed to get JSON")
+                json_start = time.perf_counter()
+                ret.append(FileCollection.from_dict(json.loads(json_str.decode('utf-8'))))
+                json_time += time.perf_counter() - json_start
+            
+            if self.scan_cache is not None:
+                if _lib.svdep_pool_save_scan_cache(pool, self.scan_cache.encode('utf-8')) != 0:
+                    raise RuntimeError(f"Failed to save scan cache: {self.scan_cache}")
+            
+            for ctx in ctxs:
+                self.report.add(_get_report(ctx))
+            self.report.time_json += json_time
+            self.report.time_total = time.perf_counter() - start
+            return ret
+        
+        finally:
+            for ctx in ctxs:
+                _lib.svdep_destroy(ctx)
+            _lib.svdep_pool_destroy(pool)
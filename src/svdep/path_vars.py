@@ -0,0 +1,83 @@
+#****************************************************************************
+#* path_vars.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import os
+from typing import Dict, List, Tuple
+
+class PathVars(object):
+    """
+    Named directories for relocatable collections. When a collection is
+    saved, a path under one of the directories is written as '${NAME}'
+    followed by the rest of the path, using the longest matching
+    directory. When it is loaded, each '${NAME}' is replaced by the
+    directory given for NAME in the loading workspace, which may differ.
+
+    Paths outside every directory are written unchanged.
+    """
+
+    def __init__(self, vars : Dict[str,str] = None):
+        self._vars : List[Tuple[str,str]] = []
+        for name, dir in (vars or {}).items():
+            self.add(name, dir)
+
+    @classmethod
+    def parse(cls, specs : List[str], cwd : str = None) -> 'PathVars':
+        """
+        From 'NAME=DIR' specifications, as given on the command line.
+        Relative directories are made absolute against 'cwd'
+        """
+        ret = cls()
+        for spec in specs or []:
+            name, sep, dir = spec.partition("=")
+            if sep == "" or name == "" or dir == "":
+                raise ValueError("Path variable must be NAME=DIR: %s" % spec)
+            if cwd is not None:
+                dir = os.path.join(cwd, dir)
+            ret.add(name, os.path.abspath(dir))
+        return ret
+
+    def add(self, name : str, dir : str):
+        # 'dir' itself is matched, as is anything under it. A root
+        # directory becomes an empty prefix
+        self._vars.append((name, dir.rstrip("/\\")))
+        # Longest directory first, so nested directories are preferred
+        self._vars.sort(key=lambda v: -len(v[1]))
+
+    def items(self) -> Tuple[Tuple[str,str],...]:
+        return tuple(self._vars)
+
+    def encode(self, path : str) -> str:
+        for name, dir in self._vars:
+            if path.startswith(dir) and (len(path) == len(dir) or path[len(dir)] in "/\\"):
+                return "${%s}%s" % (name, path[len(dir):])
+        return path
+
+    def decode(self, path : str) -> str:
+        if not path.startswith("${"):
+            return path
+        end = path.find("}")
+        if end == -1:
+            return path
+        name = path[2:end]
+        for n, dir in self._vars:
+            if n == name:
+                return dir + path[end+1:]
+        raise ValueError("Undefined path variable %s in %s" % (name, path))
@@ -0,0 +1,54 @@
+#****************************************************************************
+#* realpath_cache.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import os
+from typing import Dict
+
+class RealPathCache(object):
+    """
+    Memoized canonical paths, so that a file reached through different
+    include directories, '..' segments or symlinks is known by one name.
+    A directory is resolved once, however many of its files are looked
+    up. After that, a file costs one lstat() to rule out a symlink.
+
+    Entries are never invalidated, so a cache should live no longer than
+    a build (or a generation of a ScanPool). Lookups from several threads
+    are safe: racing lookups of the same path resolve it the same way.
+    """
+
+    def __init__(self):
+        self._dir_m : Dict[str,str] = {}
+        self._path_m : Dict[str,str] = {}
+
+    def realpath(self, path : str) -> str:
+        ret = self._path_m.get(path)
+        if ret is None:
+            # Resolve the directory first. Collapsing '..' before that
+            # would be wrong if the directory is a symlink
+            dir, name = os.path.split(path)
+            real_dir = self._dir_m.get(dir)
+            if real_dir is None:
+                real_dir = self._dir_m.setdefault(dir, os.path.realpath(dir))
+            ret = os.path.join(real_dir, name)
+            if os.path.islink(ret):
+                ret = os.path.realpath(ret)
+            ret = self._path_m.setdefault(path, ret)
+        return ret
@@ -0,0 +1,140 @@
+#****************************************************************************
+#* scan_cache.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may 
+#* not use this file except in compliance with the License.  
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software 
+#* distributed under the License is distributed on an "AS IS" BASIS, 
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  
+#* See the License for the specific language governing permissions and 
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author: 
+#*
+#****************************************************************************
+import os
+import tempfile
+from typing import Dict, List
+from .svpp_directives import DirectiveScan
+
+# Caches written by a different scanner, or a different format version,
+# are ignored. The native library writes 'native-1'
+SCANNER = "python-1"
+
+_HEADER = "svdep-scan-cache 1 "
+
+_KINDS = ("include", "define", "undef", "ifdef", "ifndef", "elsif", "else", "endif")
+
+_ESCAPES = {"\\": "\\\\", "\n": "\\n", "\r": "\\r"}
+_UNESCAPES = {"\\": "\\", "n": "\n", "r": "\r"}
+
+def _escape(s : str) -> str:
+    return "".join(_ESCAPES.get(c, c) for c in s)
+
+def _unescape(s : str) -> str:
+    ret = []
+    i = 0
+    while i < len(s):
+        if s[i] == "\\":
+            i += 1
+            if i >= len(s) or s[i] not in _UNESCAPES.keys():
+                raise ValueError("Bad escape")
+            ret.append(_UNESCAPES[s[i]])
+        else:
+            ret.append(s[i])
+        i += 1
+    return "".join(ret)
+
+def scan_lines(scan : DirectiveScan) -> List[str]:
+    """The guard and directive records of a scan, as written to a cache"""
+    ret = []
+    if scan.guard is not None:
+        ret.append("guard %s" % _escape(scan.guard))
+    for kind, arg in scan.directives:
+        ret.append(("%s %s" % (kind, _escape(arg))) if arg else kind)
+    return ret
+
+def parse_scan_line(scan : DirectiveScan, line : str):
+    """Adds a guard or directive record to a scan. Raises ValueError if it is neither"""
+    word, _, rest = line.partition(" ")
+    if word == "guard":
+        scan.guard = _unescape(rest)
+    elif word in _KINDS:
+        scan.directives.append((word, _unescape(rest)))
+    else:
+        raise ValueError("Unknown entry %s" % word)
+
+def load_scan_cache(path : str) -> Dict[str,DirectiveScan]:
+    """
+    Loads a scan cache written by save_scan_cache(). Returns a map of file
+    path to DirectiveScan. A missing or unusable cache yields an empty map.
+    """
+    try:
+        with open(path, "r", newline="\n") as fp:
+            lines = fp.read().split("\n")
+    except (OSError, UnicodeDecodeError):
+        return {}
+
+    if not lines or lines[0] != _HEADER + SCANNER:
+        return {}
+
+    ret = {}
+    scan = None
+    try:
+        for line in lines[1:]:
+            if line == "":
+                continue
+            word, _, rest = line.partition(" ")
+            if scan is None:
+                if word != "file":
+                    raise ValueError("Expected file entry")
+                mtime_ns, size, name = rest.split(" ", 2)
+                scan = DirectiveScan(mtime_ns=int(mtime_ns), size=int(size))
+                ret[_unescape(name)] = scan
+            elif word == "end":
+                scan = None
+            else:
+                parse_scan_line(scan, line)
+    except ValueError:
+        return {}
+
+    if scan is not None:
+        # Truncated
+        return {}
+
+    return ret
+
+def save_scan_cache(path : str, scans : Dict[str,DirectiveScan]):
+    """
+    Writes directive scans to a cache file. Scans without a recorded
+    modification time and size can't be validated, so are skipped. The
+    file is replaced atomically.
+    """
+    lines = [_HEADER + SCANNER]
+    for name, scan in scans.items():
+        if scan.mtime_ns is None or scan.size is None:
+            continue
+        lines.append("file %d %d %s" % (scan.mtime_ns, scan.size, _escape(name)))
+        lines.extend(scan_lines(scan))
+        lines.append("end")
+
+    # Several processes may save the same cache at once. Each writes its
+    # own temporary, so none can rename another's half-written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                               prefix=os.path.basename(path) + ".tmp-")
+    try:
+        with os.fdopen(fd, "w", newline="\n") as fp:
+            fp.write("\n".join(lines) + "\n")
+        # mkstemp() creates the file private to its owner
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
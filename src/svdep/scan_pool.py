@@ -0,0 +1,161 @@
+#****************************************************************************
+#* scan_pool.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from .file_deps_report import FileDepsReport
+from .realpath_cache import RealPathCache
+from .scan_store import ScanStore, scan_content
+from .svpp_directives import DirectiveScan, scan_includes
+
+class ScanPool(object):
+    """
+    File state shared by the builds of many compilation units, which may
+    run on different threads. Within a generation (see begin()), each file
+    is read and lexed at most once, whichever unit reaches it first, and
+    stat results are reused by every unit.
+
+    Directive scans are kept in 'directive_m' (the same map a single
+    TaskBuildFileCollection uses), and carry over to later generations
+    while a file's modification time and size are unchanged.
+
+    'realpath_c' canonicalizes paths for builds with 'canonical' set.
+    Directive scans are also looked up in, and added to, 'scan_store' (if
+    set) before a file is lexed, whether or not a build evaluates
+    conditionals.
+
+    Work is counted in the report of the build that performs it.
+    """
+
+    def __init__(self, directive_m : Dict[str,DirectiveScan] = None,
+                 scan_store : ScanStore = None):
+        self.directive_m = directive_m if directive_m is not None else {}
+        self.scan_store = scan_store
+        # Include names for builds that don't evaluate conditionals
+        self._include_m : Dict[str,Tuple[int,int,List[str]]] = {}
+        self._lock = threading.Lock()
+        self.begin()
+
+    def begin(self):
+        """
+        Starts a new generation. Files may have changed since the last
+        one, so they are stat'd again before their scans are reused.
+        Must not be called while builds are using the pool.
+        """
+        self._stat_m : Dict[str,Optional[os.stat_result]] = {}
+        self._scan_f : Dict[str,Future] = {}
+        self._include_f : Dict[str,Future] = {}
+        self.realpath_c = RealPathCache()
+
+    def stat(self, path, report : FileDepsReport) -> Optional[os.stat_result]:
+        """
+        Stat result for a path, or None if it doesn't exist. Only 'stats'
+        is counted. The time is left to the caller, since include probes
+        are timed as resolution.
+        """
+        if path in self._stat_m.keys():
+            return self._stat_m[path]
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        report.stats += 1
+        # Two units may race to stat the same file. Either result will do
+        return self._stat_m.setdefault(path, st)
+
+    def scan(self, path, report : FileDepsReport) -> DirectiveScan:
+        """Directives of a file, reading it only if no valid scan is known"""
+        return self._once(self._scan_f, path, report, lambda: self._scan(path, report))
+
+    def includes(self, path, report : FileDepsReport) -> List[str]:
+        """Names of every `include in a file, regardless of conditionals"""
+        return self._once(self._include_f, path, report, lambda: self._includes(path, report))
+
+    def _once(self, future_m : Dict[str,Future], path, report, fn : Callable):
+        with self._lock:
+            future = future_m.get(path)
+            owner = future is None
+            if owner:
+                future = Future()
+                future_m[path] = future
+
+        if owner:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+        else:
+            # Another unit got there first
+            report.scan_cache_hits += 1
+        return future.result()
+
+    def _stat_file(self, path, report) -> os.stat_result:
+        start = time.perf_counter()
+        st = self.stat(path, report)
+        report.time_stat += time.perf_counter() - start
+        if st is None:
+            raise FileNotFoundError("File %s doesn't exist" % path)
+        return st
+
+    def _read(self, path, report) -> str:
+        start = time.perf_counter()
+        with open(path, "r") as fp:
+            content = fp.read()
+        report.bytes_read += len(content)
+        report.time_read += time.perf_counter() - start
+        return content
+
+    def _scan(self, path, report) -> DirectiveScan:
+        st = self._stat_file(path, report)
+        scan = self.directive_m.get(path)
+        if scan is not None and scan.mtime_ns == st.st_mtime_ns and scan.size == st.st_size:
+            report.scan_cache_hits += 1
+            return scan
+
+        report.scan_cache_misses += 1
+        content = self._read(path, report)
+        scan = scan_content(content, self.scan_store, report)
+        scan.mtime_ns = st.st_mtime_ns
+        scan.size = st.st_size
+        self.directive_m[path] = scan
+        return scan
+
+    def _includes(self, path, report) -> List[str]:
+        if self.scan_store is not None:
+            # Scans are stored as directives
+            return self._scan(path, report).includes()
+        st = self._stat_file(path, report)
+        entry = self._include_m.get(path)
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            report.scan_cache_hits += 1
+            return entry[2]
+
+        report.scan_cache_misses += 1
+        content = self._read(path, report)
+        start = time.perf_counter()
+        names = scan_includes(content)
+        report.time_scan += time.perf_counter() - start
+        report.files_scanned += 1
+        self._include_m[path] = (st.st_mtime_ns, st.st_size, names)
+        return names
@@ -0,0 +1,142 @@
+#****************************************************************************
+#* scan_store.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import hashlib
+import os
+import tempfile
+import time
+from typing import Callable, Optional, Union
+from .file_deps_report import FileDepsReport
+from .scan_cache import SCANNER, scan_lines, parse_scan_line
+from .svpp_directives import DirectiveScan, scan_directives
+
+_HEADER = "svdep-scan-store 1 "
+
+class ScanStore(object):
+    """
+    Backend of a content-addressed store of directive scans, which may be
+    shared by many machines. Keys are '<scanner>/<digest>', where the
+    digest is the SHA-256 of the file content, so an entry is valid for
+    any file with that content, wherever and whenever it was scanned.
+
+    get() must return a complete entry or None, even while other
+    processes put() the same key. Failures are not errors: a store is
+    only ever an optimization.
+    """
+
+    def get(self, key : str) -> Optional[str]:
+        raise NotImplementedError()
+
+    def put(self, key : str, data : str):
+        raise NotImplementedError()
+
+class DirScanStore(ScanStore):
+    """
+    Store in a directory, eg on an NFS mount shared by a CI farm. Entries
+    are files at '<path>/<scanner>/<digest[:2]>/<digest>'. Each is written
+    to a temporary file in the same directory and renamed into place, so
+    concurrent writers of the same entry can't corrupt it.
+    """
+
+    def __init__(self, path : str):
+        self.path = path
+
+    def _entry(self, key : str) -> str:
+        scanner, _, digest = key.partition("/")
+        return os.path.join(self.path, scanner, digest[:2], digest)
+
+    def get(self, key : str) -> Optional[str]:
+        try:
+            with open(self._entry(key), "r", newline="\n") as fp:
+                return fp.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def put(self, key : str, data : str):
+        entry = self._entry(key)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), prefix=".tmp-")
+            with os.fdopen(fd, "w", newline="\n") as fp:
+                fp.write(data)
+            # Other users of the store must be able to read the entry
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, entry)
+        except OSError:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+def open_scan_store(store : Union[str,ScanStore,None]) -> Optional[ScanStore]:
+    """A store from a directory path, or the store itself"""
+    if isinstance(store, str):
+        return DirScanStore(store)
+    return store
+
+def scan_key(content : str) -> str:
+    """Store key of the scan of 'content' by this scanner"""
+    digest = hashlib.sha256(content.encode("utf-8", "surrogateescape")).hexdigest()
+    return "%s/%s" % (SCANNER, digest)
+
+def get_scan(store : ScanStore, key : str) -> Optional[DirectiveScan]:
+    """The stored scan for a key, or None if there is no usable entry"""
+    data = store.get(key)
+    if data is None:
+        return None
+    lines = data.split("\n")
+    if lines[0] != _HEADER + SCANNER or "end" not in lines:
+        return None
+    ret = DirectiveScan()
+    try:
+        for line in lines[1:lines.index("end")]:
+            parse_scan_line(ret, line)
+    except ValueError:
+        return None
+    return ret
+
+def put_scan(store : ScanStore, key : str, scan : DirectiveScan):
+    lines = [_HEADER + SCANNER] + scan_lines(scan) + ["end"]
+    store.put(key, "\n".join(lines) + "\n")
+
+def scan_content(content : str, store : Optional[ScanStore], report : FileDepsReport,
+                 scan_f : Callable[[str],DirectiveScan] = scan_directives) -> DirectiveScan:
+    """
+    Directives of file content, taken from 'store' if it has them.
+    Otherwise the content is scanned with 'scan_f', and the scan is added
+    to the store
+    """
+    start = time.perf_counter()
+    key = None
+    scan = None
+    if store is not None:
+        key = scan_key(content)
+        scan = get_scan(store, key)
+        if scan is not None:
+            report.scan_store_hits += 1
+        else:
+            report.scan_store_misses += 1
+    if scan is None:
+        scan = scan_f(content)
+        report.files_scanned += 1
+        if store is not None:
+            put_scan(store, key, scan)
+    report.time_scan += time.perf_counter() - start
+    return scan
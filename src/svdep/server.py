@@ -0,0 +1,190 @@
+#****************************************************************************
+#* server.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from typing import Dict, Tuple
+from .__main__ import CmdEnv, EXIT_ERROR, EXIT_OK, main as cmd_main
+from .collection_journal import journal_path
+from .file_collection import FileCollection
+from .watcher import ChangeTracker
+
+class ServerEnv(CmdEnv):
+    """
+    Command environment for one request. Parsed collections and directive
+    scans are shared with every other request through the server
+    """
+
+    def __init__(self, server : 'SvdepServer', cwd, out, err):
+        super().__init__(cwd, out, err)
+        self.server = server
+
+    def loadCollection(self, path) -> FileCollection:
+        if self.db is not None:
+            # The database serves concurrent readers itself
+            return super().loadCollection(path)
+        key = self._cacheKey(path)
+        with self.server.lock:
+            ent = self.server.collection_m.get(path)
+            if ent is not None and ent[0] == key:
+                self._loaded[path] = ent[1]
+                return ent[1]
+        collection = super().loadCollection(path)
+        self.server.cacheCollection(path, key, collection)
+        return collection
+
+    def saveCollection(self, path, collection : FileCollection):
+        super().saveCollection(path, collection)
+        if self.db is not None:
+            return
+        self.server.cacheCollection(path, self._cacheKey(path), collection)
+
+    def _cacheKey(self, path):
+        # A collection changes when its file or journal does, and the same
+        # file loads differently under different path variables
+        st = os.stat(path)
+        try:
+            jst = os.stat(journal_path(path))
+            journal = (jst.st_mtime_ns, jst.st_size)
+        except FileNotFoundError:
+            journal = None
+        return (st.st_mtime_ns, st.st_size, journal, self.path_vars.items())
+
+    def check(self, unit, collection : FileCollection, timestamp : float) -> bool:
+        if self.server.tracker is None:
+            return super().check(unit, collection, timestamp)
+        return self.server.tracker.check(collection, unit.filelist.files, timestamp)
+
+    def checkUnits(self, units, collections, timestamps):
+        if self.server.tracker is None:
+            return super().checkUnits(units, collections, timestamps)
+        return [self.server.tracker.check(collection, unit.filelist.files, timestamp)
+                for unit, collection, timestamp in zip(units, collections, timestamps)]
+
+    def buildArgs(self):
+        from . import TaskBuildFileCollection
+        from .task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+        if TaskBuildFileCollection is PyTaskBuildFileCollection:
+            # Directive scans are validated against each file's mtime and
+            # size, so one map can serve every unit
+            return {"directive_m": self.server.directive_m}
+        return {}
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                argv = req["argv"]
+                cwd = req.get("cwd")
+            except (ValueError, KeyError, TypeError):
+                rsp = {"status": EXIT_ERROR, "stdout": "",
+                       "stderr": "svdep: error: malformed request\n"}
+            else:
+                rsp = self.server.run(argv, cwd)
+            self.wfile.write((json.dumps(rsp) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class SvdepServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Answers svdep commands received over a Unix domain socket. Each
+    connection is served by its own thread, so clients run concurrently.
+    Requests are JSON objects, one per line: {"argv": [...], "cwd": "..."},
+    where argv is an svdep command line and relative paths are resolved
+    against cwd. Each response is {"status": N, "stdout": "...",
+    "stderr": "..."}. The 'ping' and 'shutdown' commands are handled by
+    the server itself.
+
+    With 'watch' set, checks are answered by a ChangeTracker, which uses
+    file-change notifications where available.
+    """
+    daemon_threads = True
+
+    _log = logging.getLogger("SvdepServer")
+
+    def __init__(self, socket_path : str, watch : bool = False):
+        self.socket_path = socket_path
+        self.tracker = ChangeTracker() if watch else None
+        self.lock = threading.Lock()
+        self.collection_m : Dict[str,Tuple[Tuple[int,int],FileCollection]] = {}
+        self.directive_m = {}
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _Handler)
+        # Commands read and write files as the server's user. Don't let
+        # other users drive it
+        os.chmod(socket_path, 0o600)
+
+    def cacheCollection(self, path, key, collection : FileCollection):
+        with self.lock:
+            ent = self.collection_m.get(path)
+            self.collection_m[path] = (key, collection)
+        if ent is not None and ent[1] is not collection and self.tracker is not None:
+            self.tracker.forget(ent[1])
+
+    def run(self, argv, cwd) -> Dict:
+        if argv == ["ping"]:
+            return {"status": EXIT_OK, "stdout": "", "stderr": ""}
+        if argv == ["shutdown"]:
+            # shutdown() waits for serve_forever(), so can't run on this thread
+            threading.Thread(target=self.shutdown).start()
+            return {"status": EXIT_OK, "stdout": "", "stderr": ""}
+        if len(argv) and argv[0] == "server":
+            return {"status": EXIT_ERROR, "stdout": "",
+                    "stderr": "svdep: error: can't start a server from a server\n"}
+
+        out = io.StringIO()
+        err = io.StringIO()
+        status = cmd_main(argv, ServerEnv(self, cwd, out, err))
+        self._log.debug("%s -> %d" % (" ".join(argv), status))
+        return {"status": status, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+    def server_close(self):
+        super().server_close()
+        if self.tracker is not None:
+            self.tracker.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+def _remove_stale_socket(socket_path):
+    """Removes a socket left by a server that exited without cleaning up"""
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+            return
+    raise OSError("An svdep server is already listening on %s" % socket_path)
+
+def serve(socket_path : str, watch : bool = False):
+    """Runs a server until it receives a 'shutdown' request"""
+    server = SvdepServer(socket_path, watch)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
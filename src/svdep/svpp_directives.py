@@ -0,0 +1,203 @@
+#****************************************************************************
+#* svpp_directives.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import dataclasses as dc
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Directives that affect dependencies. Everything else is ignored
+_ARG_DIRECTIVES = ("include", "define", "undef", "ifdef", "ifndef", "elsif")
+_NOARG_DIRECTIVES = ("else", "endif")
+
+@dc.dataclass
+class DirectiveScan(object):
+    """
+    Result of scan_directives(). 'directives' is the ordered list of
+    dependency-relevant directives as (directive, argument) tuples, where
+    the argument is the include name or macro name ('' for `else and
+    `endif). 'guard' is the include-guard macro if the whole file is
+    wrapped in `ifndef X ... `endif, otherwise None. 'mtime_ns' and
+    'size' identify the version of the file that was scanned.
+    """
+    directives : List[Tuple[str,str]] = dc.field(default_factory=list)
+    guard : Optional[str] = None
+    mtime_ns : Optional[int] = None
+    size : Optional[int] = None
+
+    def includes(self) -> List[str]:
+        """Names of every `include, as scan_includes() returns them"""
+        return [arg for name, arg in self.directives if name == "include"]
+
+def scan_directives(content : str) -> DirectiveScan:
+    """
+    Extract dependency-relevant preprocessor directives from SystemVerilog
+    source. The result doesn't depend on macro state, so it can be
+    evaluated any number of times with evaluate_directives().
+    """
+    from .svpp_lexer import mk_lexer
+    ret = DirectiveScan()
+    lexer = mk_lexer(debug=False)
+    lexer.input(content)
+
+    # Include-guard tracking. Comments never reach us as tokens, so any
+    # token outside the `ifndef/`endif pair defeats the guard
+    guard = None
+    guard_ok = True
+    guard_closed = False
+    depth = 0
+
+    while tok:=lexer.token():
+        if guard_closed or (guard is None and
+                (tok.type != "DIRECTIVE" or tok.value != "ifndef")):
+            # Something outside the `ifndef/`endif pair
+            guard_ok = False
+
+        if tok.type != "DIRECTIVE":
+            continue
+        name = "elsif" if tok.value == "elseif" else tok.value
+
+        if name in ("ifdef", "ifndef"):
+            depth += 1
+        elif name in ("elsif", "else") and depth == 1:
+            guard_ok = False
+        elif name == "endif" and depth > 0:
+            depth -= 1
+            guard_closed = (depth == 0)
+
+        if name in _NOARG_DIRECTIVES:
+            ret.directives.append((name, ""))
+        elif name in _ARG_DIRECTIVES:
+            arg_t = lexer.token()
+            if arg_t is None:
+                break
+            ret.directives.append((name, arg_t.value))
+            if guard is None and name == "ifndef":
+                guard = arg_t.value
+
+            if name == "define":
+                # The macro body runs to the end of the logical line. Drop
+                # its tokens so directives in the body aren't interpreted
+                end = _logical_line_end(content, arg_t.lexpos)
+                while tok:=lexer.token():
+                    if tok.lexpos >= end:
+                        lexer.lexpos = tok.lexpos
+                        break
+
+    if guard_ok and guard_closed:
+        ret.guard = guard
+
+    return ret
+
+def scan_includes(content : str) -> List[str]:
+    """
+    Names of every `include in SystemVerilog source, in order, without
+    regard to conditional directives. This is what a build that doesn't
+    evaluate conditionals follows.
+    """
+    from .svpp_lexer import mk_lexer
+    ret = []
+    lexer = mk_lexer(debug=False)
+    lexer.input(content)
+    while tok:=lexer.token():
+        if tok.type == "DIRECTIVE" and tok.value == "include":
+            name_t = lexer.token()
+            if name_t is None:
+                break
+            ret.append(name_t.value)
+    return ret
+
+def _logical_line_end(content : str, pos : int) -> int:
+    """Returns the position of the newline ending a '\\'-continued line"""
+    while True:
+        nl = content.find("\n", pos)
+        if nl == -1:
+            return len(content)
+        if nl > 0 and content[nl-1] == "\\":
+            pos = nl + 1
+        elif nl > 1 and content[nl-1] == "\r" and content[nl-2] == "\\":
+            pos = nl + 1
+        else:
+            return nl
+
+@dc.dataclass
+class _CondState(object):
+    active : bool
+    seen_true : bool
+    in_else : bool = False
+
+def evaluate_directives(
+        directives : List[Tuple[str,str]],
+        macros : Dict[str,str],
+        include_f : Callable[[str],None]):
+    """
+    Replay directives from scan_directives() against a macro table. The
+    table is updated in place by active `define/`undef directives, and
+    include_f is called for each active `include at its point in the file.
+    """
+    for name in iter_directives(directives, macros):
+        include_f(name)
+
+def iter_directives(
+        directives : List[Tuple[str,str]],
+        macros : Dict[str,str]) -> Iterator[str]:
+    """
+    Generator form of evaluate_directives(). Yields each active `include,
+    pausing the replay until the caller has processed it. Lets callers
+    follow nested includes without recursing.
+    """
+    stack : List[_CondState] = []
+
+    for name, arg in directives:
+        active = not stack or stack[-1].active
+
+        if name == "include":
+            if active:
+                yield arg
+        elif name == "define":
+            if active:
+                macros[arg] = "1"
+        elif name == "undef":
+            if active:
+                macros.pop(arg, None)
+        elif name in ("ifdef", "ifndef"):
+            defined = (arg in macros) != (name == "ifndef")
+            seen_true = defined and active
+            stack.append(_CondState(seen_true, seen_true))
+        elif name == "elsif":
+            if not stack or stack[-1].in_else:
+                continue
+            parent_active = len(stack) == 1 or stack[-2].active
+            state = stack[-1]
+            if not state.seen_true and arg in macros and parent_active:
+                state.active = True
+                state.seen_true = True
+            else:
+                state.active = False
+        elif name == "else":
+            if not stack or stack[-1].in_else:
+                continue
+            parent_active = len(stack) == 1 or stack[-2].active
+            state = stack[-1]
+            state.in_else = True
+            state.active = not state.seen_true and parent_active
+        elif name == "endif":
+            if stack:
+                stack.pop()
+
@@ -1,76 +1,369 @@
 import os
+import stat
 import dataclasses as dc
 import logging
-from typing import ClassVar, Dict, List
+import time
+from typing import ClassVar, Dict, List, Tuple, Union
 from .file_collection import FileCollection
+from .file_deps_report import FileDepsReport
 from .file_info import FileInfo
-from .svpp_lexer import mk_lexer
+from .realpath_cache import RealPathCache
+from .scan_cache import load_scan_cache, save_scan_cache
+from .scan_pool import ScanPool
+from .scan_store import ScanStore, open_scan_store, scan_content
+from .svpp_directives import DirectiveScan, scan_directives, scan_includes, iter_directives
 
 @dc.dataclass
 class TaskBuildFileCollection(object):
+    """
+    Builds a FileCollection from a list of root files.
+
+    By default, every `include is followed regardless of `ifdef state.
+    When user defines are supplied, or compilation_unit is set, conditional
+    directives are evaluated and only active includes are followed. In
+    compilation-unit mode, macro state flows through includes in order and
+    from one root file to the next.
+
+    build_define_sets() builds one collection per +define configuration,
+    reading and lexing each file only once across all configurations.
+
+    Include guards are recorded in each FileInfo. In compilation-unit mode,
+    a guarded file is not re-processed while its guard macro is defined.
+    Guards recorded in a 'previous' collection are reused for unchanged
+    files, so even the first inclusion can be skipped. Change counts are
+    carried over from 'previous' too, and incremented for files whose
+    modification time moved.
+
+    When conditionals are evaluated, each file's directives are extracted
+    once and cached per (path, mtime, size). Setting 'scan_cache' to a
+    file path persists that cache, so unchanged files are not read at all
+    by later builds. 'scan_store' adds a content-addressed store, which
+    may be shared by many machines (a directory path, or a ScanStore):
+    a file whose content was scanned anywhere before is read, but not
+    lexed again. Builds that don't evaluate conditionals use both too,
+    when either is set.
+
+    When 'scan_pool' is set, file state comes from the pool instead, so
+    that builds of many units (see TaskBuildUnits) share it.
+
+    When 'canonical' is set, files are recorded by their real path, so a
+    file reached through different include directories, '..' segments or
+    symlinks is stat'd and scanned once. The path a file was first reached
+    by is kept in FileInfo.spelled when it differs.
+
+    After build() or build_define_sets(), 'report' holds counters and
+    per-phase timings for the call.
+    """
     root_paths : List[str]
     incdirs : List[str] = dc.field(default_factory=list)
     collection : FileCollection = None
     depth : int = 0
     inc_m : Dict[str,str] = dc.field(default_factory=dict)
+    defines : Dict[str,str] = None
+    compilation_unit : bool = False
+    directive_m : Dict[str,DirectiveScan] = dc.field(default_factory=dict)
+    previous : FileCollection = None
+    scan_cache : str = None
+    scan_store : Union[str,ScanStore] = None
+    report : FileDepsReport = None
+    scan_pool : ScanPool = None
+    canonical : bool = False
 
     _log : ClassVar = logging.getLogger("TaskBuildFileCollection")
 
     def build(self) -> FileCollection:
+        start = time.perf_counter()
+        self.report = FileDepsReport()
+        self._loadScanCache()
+        ret = self._build(self.defines)
+        self._saveScanCache()
+        self.report.time_total = time.perf_counter() - start
+        return ret
+
+    def build_define_sets(self, define_sets : List[Dict[str,str]]) -> List[FileCollection]:
+        """
+        Builds one FileCollection per define set, in order. Each set is
+        applied on top of the common 'defines'. Directive extraction is
+        shared, so only conditional evaluation runs per configuration.
+        """
+        start = time.perf_counter()
+        self.report = FileDepsReport()
+        ret = []
+        incdirs = self.incdirs.copy()
+        self._loadScanCache()
+
+        for define_set in define_sets:
+            defines = dict(self.defines or {})
+            defines.update(define_set)
+
+            # Include resolution depends on the search path, which grows as
+            # includes are found. Start each configuration from scratch
+            self.incdirs = incdirs.copy()
+            self.inc_m = {}
+            ret.append(self._build(defines))
+
+        self._saveScanCache()
+        self.report.time_total = time.perf_counter() - start
+        return ret
+
+    def _loadScanCache(self):
+        if self.scan_cache is not None:
+            for path, scan in load_scan_cache(self.scan_cache).items():
+                self.directive_m.setdefault(path, scan)
+
+    def _saveScanCache(self):
+        if self.scan_cache is not None:
+            save_scan_cache(self.scan_cache, self.directive_m)
+
+    def _build(self, defines) -> FileCollection:
         self.collection = FileCollection()
+        self._validated = set()
+        self._scan_store = open_scan_store(self.scan_store)
+        if self.canonical and self.scan_pool is None:
+            self._realpath_c = RealPathCache()
+        conditional = defines is not None or self.compilation_unit
+        macros = dict(defines or {})
 
-        for path in self.root_paths:
-            if os.path.isfile(path):
-                path_dir = os.path.dirname(path)
+        for spelled in self.root_paths:
+            if self._isfile(spelled):
+                path_dir = os.path.dirname(spelled)
                 if path_dir not in self.incdirs:
                     self.incdirs.append(path_dir)
-                info = self._buildFileInfo(path)
+                path = self._canonical(spelled)
+                if conditional:
+                    if not self.compilation_unit:
+                        macros = dict(defines or {})
+                    info = self._buildFileInfoCond(path, macros, defines, spelled)
+                else:
+                    info = self._buildFileInfo(path, spelled)
                 self.collection.root_files.append(info)            
             else:
-                raise Exception("File %s doesn't exist" % path)
+                raise Exception("File %s doesn't exist" % spelled)
 
         return self.collection
+
+    def _buildFileInfoCond(self, path, macros, defines, spelled=None):
+        """Builds file info while evaluating conditional directives"""
+        # Includes are followed depth-first with an explicit stack of the
+        # files being evaluated, so include depth isn't limited by Python's
+        # recursion limit. Each file's directives are replayed by a
+        # generator that pauses at every active `include
+        stack = []
+        active = set()
+
+        def enter(path, macros, spelled):
+            self._log.debug("buildFileInfoCond: %s" % path)
+            first = path not in self.collection.file_info.keys()
+            if first:
+                ret = FileInfo(
+                    path,
+                    self._getmtime(path))
+                if spelled is not None and spelled != path:
+                    ret.spelled = spelled
+                prev = self._applyHistory(ret)
+                if prev is not None and abs(prev.timestamp - ret.timestamp) < 1e-6:
+                    ret.guard = prev.guard
+                self.collection.file_info[path] = ret
+            else:
+                ret = self.collection.file_info[path]
+                if not self.compilation_unit or path in active:
+                    # Without shared macro state, a file evaluates the same way
+                    # every time. A file including itself must not re-enter
+                    return ret
+
+            if ret.guard is not None and ret.guard in macros:
+                # Multiple-include optimization: the file can't contribute
+                # anything while its guard is defined
+                return ret
+
+            scan = self._scanFile(path)
+            ret.guard = scan.guard
+            active.add(path)
+            stack.append((ret, first, macros, iter_directives(scan.directives, macros)))
+            return ret
+
+        ret = enter(path, macros, spelled)
+        while len(stack) > 0:
+            info, first, macros, includes = stack[-1]
+            name = next(includes, None)
+            if name is None:
+                active.remove(info.name)
+                stack.pop()
+                continue
+
+            inc_path = self._resolveInclude(name)
+            if inc_path is None:
+                self._log.critical("Failed to find include %s" % name)
+                continue
+            path_dir = os.path.dirname(inc_path)
+            if path_dir not in self.incdirs:
+                self.incdirs.append(path_dir)
+            canon_path = self._canonical(inc_path)
+            if first or canon_path not in info.includes:
+                info.includes.append(canon_path)
+            if self.compilation_unit:
+                enter(canon_path, macros, inc_path)
+            else:
+                enter(canon_path, dict(defines or {}), inc_path)
+
+        return ret
+
+    def _applyHistory(self, info : FileInfo) -> FileInfo:
+        """
+        Carries a file's change count over from 'previous', counting a
+        modification-time change. Returns the previous entry, if any
+        """
+        prev = self.previous.file_info.get(info.name) if self.previous is not None else None
+        if prev is not None:
+            info.changes = prev.changes
+            if abs(prev.timestamp - info.timestamp) >= 1e-6:
+                info.changes += 1
+        return prev
+
+    def _canonical(self, path) -> str:
+        """Real path of a file when canonicalizing, otherwise 'path'"""
+        if not self.canonical:
+            return path
+        start = time.perf_counter()
+        if self.scan_pool is not None:
+            ret = self.scan_pool.realpath_c.realpath(path)
+        else:
+            ret = self._realpath_c.realpath(path)
+        self.report.time_resolve += time.perf_counter() - start
+        return ret
+
+    def _scanFile(self, path) -> DirectiveScan:
+        """Returns the directives of a file, re-scanning only if it changed"""
+        if self.scan_pool is not None:
+            return self.scan_pool.scan(path, self.report)
+        scan = self.directive_m.get(path)
+        if path not in self._validated:
+            # Files may change between builds. Check once per build
+            report = self.report
+            start = time.perf_counter()
+            st = os.stat(path)
+            report.stats += 1
+            report.time_stat += time.perf_counter() - start
+            if scan is None or scan.mtime_ns != st.st_mtime_ns or scan.size != st.st_size:
+                report.scan_cache_misses += 1
+                content = self._readFile(path)
+                scan = scan_content(content, self._scan_store, report, scan_directives)
+                scan.mtime_ns = st.st_mtime_ns
+                scan.size = st.st_size
+                self.directive_m[path] = scan
+            else:
+                report.scan_cache_hits += 1
+            self._validated.add(path)
+        return scan
+
+    def _readFile(self, path) -> str:
+        start = time.perf_counter()
+        with open(path, "r") as fp:
+            content = fp.read()
+        self.report.bytes_read += len(content)
+        self.report.time_read += time.perf_counter() - start
+        return content
+
+    def _isfile(self, path) -> bool:
+        start = time.perf_counter()
+        ret = self._probe(path)
+        self.report.time_stat += time.perf_counter() - start
+        return ret
+
+    def _probe(self, path) -> bool:
+        """Whether path is a regular file. Counts the stat, but doesn't time it"""
+        if self.scan_pool is not None:
+            st = self.scan_pool.stat(path, self.report)
+            return st is not None and stat.S_ISREG(st.st_mode)
+        self.report.stats += 1
+        return os.path.isfile(path)
+
+    def _getmtime(self, path) -> float:
+        start = time.perf_counter()
+        if self.scan_pool is not None:
+            st = self.scan_pool.stat(path, self.report)
+            if st is None:
+                raise FileNotFoundError("File %s doesn't exist" % path)
+            ret = st.st_mtime
+        else:
+            ret = os.path.getmtime(path)
+            self.report.stats += 1
+        self.report.time_stat += time.perf_counter() - start
+        return ret
+
+    def _resolveInclude(self, name):
+        report = self.report
+        if name in self.inc_m.keys():
+            # Already did the searching
+            report.include_cache_hits += 1
+            return self.inc_m[name]
+        start = time.perf_counter()
+        ret = None
+        for incdir in self.incdirs:
+            inc_path = os.path.join(incdir, name)
+            report.include_probes += 1
+            if self._probe(inc_path):
+                self.inc_m[name] = inc_path
+                ret = inc_path
+                break
+            report.include_probes_failed += 1
+        report.time_resolve += time.perf_counter() - start
+        return ret
     
-    def _buildFileInfo(self, path):
-        self._log.debug("buildFileInfo: %s" % path)
+    def _buildFileInfo(self, path, spelled=None):
         if path in self.collection.file_info.keys():
-            ret = self.collection.file_info[path]
-        else:
+            return self.collection.file_info[path]
+
+        # Includes are followed depth-first with an explicit stack, so
+        # include depth isn't limited by Python's recursion limit
+        stack = []
+
+        def enter(path, spelled):
+            self._log.debug("buildFileInfo: %s" % path)
             ret = FileInfo(
                 path,
-                os.path.getmtime(path))
+                self._getmtime(path))
+            if spelled is not None and spelled != path:
+                ret.spelled = spelled
+            self._applyHistory(ret)
 
             self.collection.file_info[path] = ret
 
             # Now, need to process the file content
-            with open(path, "r") as fp:
-                lexer = mk_lexer(debug=False)
-                lexer.input(fp.read())
-
-            while tok:=lexer.token():
-#                print("tok: %s" % str(tok))
-                if tok.type == "DIRECTIVE" and tok.value == "include":
-                    name_t = lexer.token()
-                    self._log.debug("name_t: %s" % name_t.value)
-
-                    inc_path = None
-                    if name_t.value in self.inc_m.keys():
-                        # Already did the searching
-                        inc_path = self.inc_m[name_t.value]
-                    else:
-                        for incdir in self.incdirs:
-                            if os.path.isfile(os.path.join(incdir, name_t.value)):
-                                inc_path = os.path.join(incdir, name_t.value)
-                                self.inc_m[name_t.value] = inc_path
-                                break
-                    if inc_path is not None:
-                        path_dir = os.path.dirname(name_t.value)
-                        if path_dir not in self.incdirs:
-                            self.incdirs.append(path_dir)
-                        inc = self._buildFileInfo(inc_path)
-                        ret.includes.append(inc.name)
-                    else:
-                        self._log.critical("Failed to find include %s" % name_t.value)
+            if self.scan_pool is not None:
+                names = self.scan_pool.includes(path, self.report)
+            elif self.scan_cache is not None or self._scan_store is not None:
+                # Scans are cached and stored as directives
+                names = self._scanFile(path).includes()
+            else:
+                content = self._readFile(path)
+                self.report.files_scanned += 1
+                start = time.perf_counter()
+                names = scan_includes(content)
+                self.report.time_scan += time.perf_counter() - start
+            stack.append((ret, iter(names)))
+            return ret
+
+        ret = enter(path, spelled)
+        while len(stack) > 0:
+            info, names = stack[-1]
+            name = next(names, None)
+            if name is None:
+                stack.pop()
+                continue
+
+            self._log.debug("include: %s" % name)
+            inc_path = self._resolveInclude(name)
+            if inc_path is not None:
+                path_dir = os.path.dirname(name)
+                if path_dir not in self.incdirs:
+                    self.incdirs.append(path_dir)
+                canon_path = self._canonical(inc_path)
+                info.includes.append(canon_path)
+                if canon_path not in self.collection.file_info.keys():
+                    enter(canon_path, inc_path)
+            else:
+                self._log.critical("Failed to find include %s" % name)
 
         return ret
         
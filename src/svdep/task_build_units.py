@@ -0,0 +1,101 @@
+#****************************************************************************
+#* task_build_units.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import os
+import dataclasses as dc
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Union
+from .build_unit import BuildUnit
+from .file_collection import FileCollection
+from .file_deps_report import FileDepsReport
+from .scan_cache import load_scan_cache, save_scan_cache
+from .scan_pool import ScanPool
+from .scan_store import ScanStore, open_scan_store
+from .svpp_directives import DirectiveScan
+from .task_build_file_collection import TaskBuildFileCollection
+
+@dc.dataclass
+class TaskBuildUnits(object):
+    """
+    Builds one FileCollection per compilation unit. Units whose filelists
+    overlap share a ScanPool, so each file is read and lexed at most once
+    per build() however many units include it.
+
+    Units are built on up to 'jobs' threads (default: one per CPU). Every
+    unit is built even if another fails; the first failure, in unit order,
+    is then raised.
+
+    'directive_m', 'scan_cache' and 'scan_store' serve as in
+    TaskBuildFileCollection.
+    After build(), 'report' holds the sum of the units' counters, with
+    'time_total' the wall time of the whole call.
+    """
+    units : List[BuildUnit]
+    jobs : int = None
+    directive_m : Dict[str,DirectiveScan] = dc.field(default_factory=dict)
+    scan_cache : str = None
+    scan_store : Union[str,ScanStore] = None
+    report : FileDepsReport = None
+
+    def build(self) -> List[FileCollection]:
+        start = time.perf_counter()
+        self.report = FileDepsReport()
+        if self.scan_cache is not None:
+            for path, scan in load_scan_cache(self.scan_cache).items():
+                self.directive_m.setdefault(path, scan)
+
+        pool = ScanPool(self.directive_m, open_scan_store(self.scan_store))
+        tasks = []
+        for unit in self.units:
+            tasks.append(TaskBuildFileCollection(
+                unit.root_paths,
+                incdirs=list(unit.incdirs),
+                defines=unit.defines,
+                compilation_unit=unit.compilation_unit,
+                previous=unit.previous,
+                canonical=unit.canonical,
+                scan_pool=pool))
+
+        def build_f(task):
+            try:
+                return task.build(), None
+            except Exception as e:
+                return None, e
+
+        jobs = min(self.jobs if self.jobs else (os.cpu_count() or 1), len(tasks))
+        if jobs <= 1:
+            results = [build_f(t) for t in tasks]
+        else:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(build_f, tasks))
+
+        for task in tasks:
+            if task.report is not None:
+                self.report.add(task.report)
+        for _, error in results:
+            if error is not None:
+                raise error
+
+        if self.scan_cache is not None:
+            save_scan_cache(self.scan_cache, self.directive_m)
+        self.report.time_total = time.perf_counter() - start
+        return [collection for collection, _ in results]
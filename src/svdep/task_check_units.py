@@ -0,0 +1,72 @@
+#****************************************************************************
+#* task_check_units.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import os
+import time
+from typing import Dict, List, Optional
+from .check_result import CheckResult
+from .file_collection import FileCollection
+from .file_deps_report import FileDepsReport
+from .task_check_up_to_date import TaskCheckUpToDate
+
+class TaskCheckUnits(object):
+    """
+    Checks many collections at once, one per compilation unit, each against
+    its own root files and reference time. The files recorded in all the
+    collections are gathered first, and each distinct path is stat'd once
+    however many units include it.
+    """
+
+    def __init__(self, root_files : List[List[str]]):
+        self.root_files = root_files
+        # Counters and timings of the most-recent check, summed over units
+        self.report = None
+
+    def check(self, collections : List[FileCollection], timestamps : List[float]) -> List[bool]:
+        return [r.up_to_date for r in self.check_results(collections, timestamps)]
+
+    def check_results(self, collections : List[FileCollection], timestamps : List[float],
+                      collect_all : bool = False) -> List[CheckResult]:
+        """Like check(), but reports why each stale collection is stale"""
+        start = time.perf_counter()
+        self.report = FileDepsReport()
+
+        mtime_m : Dict[str,Optional[float]] = {}
+        for collection in collections:
+            for path in collection.file_info.keys():
+                mtime_m.setdefault(path, None)
+        stat_start = time.perf_counter()
+        for path in mtime_m.keys():
+            try:
+                mtime_m[path] = os.path.getmtime(path)
+            except OSError:
+                pass
+        self.report.stats += len(mtime_m)
+        self.report.time_stat += time.perf_counter() - stat_start
+
+        ret = []
+        for root_files, collection, timestamp in zip(self.root_files, collections, timestamps):
+            task = TaskCheckUpToDate(root_files)
+            task.mtime_m = mtime_m
+            ret.append(task.check_result(collection, timestamp, collect_all))
+            self.report.add(task.report)
+        self.report.time_total = time.perf_counter() - start
+        return ret
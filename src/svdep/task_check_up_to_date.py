@@ -20,7 +20,9 @@
 #*
 #****************************************************************************
 import os
-from typing import List
+import time
+from typing import Dict, List
+from .check_result import CheckResult, StaleFile
 from .file_collection import FileCollection
 from .file_info import FileInfo
 from .file_deps_report import FileDepsReport
@@ -30,50 +32,110 @@ class TaskCheckUpToDate(object):
     def __init__(self, root_files, incdirs=[]):
         self.root_files = root_files
         self.incdirs = incdirs
-        pass
+        # Counters and timings of the most-recent check
+        self.report = None
+        # Full outcome of the most-recent check_roots()
+        self.last_result = None
+        # Modification times (None if missing) already gathered by the
+        # caller, eg TaskCheckUnits. Other files are stat'd
+        self.mtime_m = None
 
     def check(self, info : FileCollection, timestamp : int) -> bool:
-        ret = True
-
-        ret &= (len(info.root_files) == len(self.root_files))
-
-        if ret:
-            for i in range(len(info.root_files)):
-                ret &= info.root_files[i].name == self.root_files[i]
-
-                if ret:
-                    ret &= (os.path.getmtime(self.root_files[i]) <= timestamp)
-
-                    if ret:
-                        # Check included files
-                        for inc_f in info.root_files[i].includes:
-                            ret &= self._checkInclude(info, info.file_info[inc_f], timestamp)
-
-                            if not ret:
-                                break
-                
-                if not ret:
-                    break
-
+        return self.check_result(info, timestamp).up_to_date
+
+    def check_result(self, info : FileCollection, timestamp : int,
+                     collect_all : bool = False) -> CheckResult:
+        """
+        Like check(), but reports why the collection is stale. The
+        traversal stops at the first stale file unless 'collect_all' is
+        set, in which case every stale file is listed.
+        """
+        start = time.perf_counter()
+        self.report = FileDepsReport()
+        ret = CheckResult(timestamp)
+        self._collect_all = collect_all
+        # Track visited files here rather than in the collection, so the
+        # same collection can be checked again (or concurrently)
+        self._checked = set()
+
+        # Roots of a canonicalized collection may be requested as spelled
+        if (len(info.root_files) != len(self.root_files) or
+                not all(r.matches(p) for r, p in zip(info.root_files, self.root_files))):
+            ret.roots_recorded = [r.name for r in info.root_files]
+            ret.roots_requested = list(self.root_files)
+
+        if collect_all or not ret.root_mismatch:
+            self._checkRoots(info, timestamp, ret)
+
+        self.report.time_total = time.perf_counter() - start
         return ret
-    
-    def _checkInclude(self, info : FileCollection, inc : FileInfo, timestamp):
-        if inc.checked:
-            return True
-        else:
-            ret = (os.path.getmtime(inc.name) <= timestamp)
-
-            if ret:
-                for si in inc.includes:
-                    sub_inc = info.file_info[si]
-                    ret &= self._checkInclude(info, sub_inc, timestamp)
-
-                    if not ret:
-                        break
-
-            inc.checked = True
-            return ret
-
-
 
+    def check_roots(self, info : FileCollection, timestamp : int) -> Dict[str,bool]:
+        """
+        Returns a verdict per root file, in 'root_files' order: True if
+        neither the root nor anything it includes changed. Each file is
+        stat'd once, however many roots include it. A root missing from
+        the collection is stale. 'last_result' holds the full check.
+        """
+        self.last_result = self.check_result(info, timestamp, collect_all=True)
+        stale = set()
+        for f in self.last_result.stale:
+            stale.update(info.affected_roots(f.path))
+        recorded = {}
+        for r in info.root_files:
+            recorded[r.name] = r.name
+            if r.spelled is not None:
+                recorded.setdefault(r.spelled, r.name)
+        return {root: root in recorded.keys() and recorded[root] not in stale
+                for root in self.root_files}
+
+    def _checkRoots(self, info : FileCollection, timestamp, result : CheckResult):
+        if not self._collect_all:
+            # Files that changed in earlier rebuilds are the likeliest to
+            # have changed again. Look at them first, so a stale collection
+            # is usually found after a few stats
+            hot = sorted((fi for fi in info.file_info.values() if fi.changes > 0),
+                         key=lambda fi: (-fi.changes, fi.name))
+            for fi in hot:
+                if self._checkFile(info, fi.name, timestamp, result):
+                    return
+
+        # Closures are memoized in the collection, so re-checking the same
+        # collection doesn't traverse it again
+        for root in info.root_files:
+            for path in info.closure(root.name):
+                if self._checkFile(info, path, timestamp, result) and not self._collect_all:
+                    return
+
+    def _checkFile(self, info : FileCollection, path, timestamp, result : CheckResult) -> bool:
+        """Checks a file not yet checked. Returns True if it is stale"""
+        if path in self._checked:
+            return False
+        self._checked.add(path)
+
+        fi = info.file_info.get(path)
+        if fi is None:
+            # Included, but not recorded in the collection. Neither its
+            # state nor its own includes are known
+            result.stale.append(StaleFile(path, 0.0, self._getmtime(path)))
+            return True
+        self.report.files_checked += 1
 
+        mtime = self._getmtime(path)
+        if mtime is None or mtime > timestamp:
+            result.stale.append(StaleFile(path, fi.timestamp, mtime))
+            return True
+        return False
+
+    def _getmtime(self, path) -> float:
+        """Modification time of a file, or None if it doesn't exist"""
+        if self.mtime_m is not None and path in self.mtime_m.keys():
+            return self.mtime_m[path]
+        start = time.perf_counter()
+        try:
+            ret = os.path.getmtime(path)
+        except OSError:
+            ret = None
+        self.report.stats += 1
+        self.report.time_stat += time.perf_counter() - start
+        return ret
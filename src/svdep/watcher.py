@@ -0,0 +1,323 @@
+#****************************************************************************
+#* watcher.py
+#*
+#* Copyright 2023-2025 Matthew Ballance and Contributors
+#*
+#* Licensed under the Apache License, Version 2.0 (the "License"); you may
+#* not use this file except in compliance with the License.
+#* You may obtain a copy of the License at:
+#*
+#*   http://www.apache.org/licenses/LICENSE-2.0
+#*
+#* Unless required by applicable law or agreed to in writing, software
+#* distributed under the License is distributed on an "AS IS" BASIS,
+#* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#* See the License for the specific language governing permissions and
+#* limitations under the License.
+#*
+#* Created on:
+#*     Author:
+#*
+#****************************************************************************
+import ctypes
+import errno
+import logging
+import os
+import struct
+import sys
+import threading
+from typing import Dict, List, Optional, Set
+from .file_collection import FileCollection
+
+# inotify event masks (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+    _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF |
+    _IN_ONLYDIR)
+
+_EVENT_HDR = struct.Struct("iIII")
+
+class _Inotify(object):
+    """Minimal ctypes binding to the Linux inotify API"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._add_watch.restype = ctypes.c_int
+        init1 = libc.inotify_init1
+        init1.argtypes = [ctypes.c_int]
+        init1.restype = ctypes.c_int
+        self.fd = init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def addWatch(self, path : str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def read(self):
+        """Yields (wd, mask, name) for every pending event"""
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return
+            off = 0
+            while off + _EVENT_HDR.size <= len(buf):
+                wd, mask, _, nlen = _EVENT_HDR.unpack_from(buf, off)
+                off += _EVENT_HDR.size
+                name = buf[off:off+nlen].rstrip(b"\0")
+                off += nlen
+                yield wd, mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+class _Entry(object):
+    """A tracked collection, with the mtime of each of its files"""
+
+    def __init__(self, collection : FileCollection):
+        self.collection = collection
+        # abspath -> mtime, or None if the file is missing
+        self.mtime : Dict[str,Optional[float]] = {}
+        self.max_mtime = 0.0
+        self.missing = 0
+        # Changes up to this sequence number are reflected in 'mtime'
+        self.seq = 0
+
+    def update(self, apath : str):
+        old = self.mtime[apath]
+        try:
+            new = os.stat(apath).st_mtime
+        except OSError:
+            new = None
+        self.mtime[apath] = new
+
+        self.missing += (new is None) - (old is None)
+        if new is not None and new >= self.max_mtime:
+            self.max_mtime = new
+        elif old is not None and old == self.max_mtime:
+            # The newest file got older (eg restored from backup)
+            self.max_mtime = max((m for m in self.mtime.values() if m is not None), default=0.0)
+
+class ChangeTracker(object):
+    """
+    Answers up-to-date checks for loaded FileCollections from file-change
+    notifications. On Linux, the directory of every file in a collection is
+    watched with inotify, along with the directory of its real path when it
+    is reached through a symlink. The first check of a collection stats each file
+    once; after that a check only stats files reported changed since the
+    previous check, so it is O(1) when nothing changed.
+
+    Where inotify isn't available, when the watch limit is reached, or when
+    events may have been lost (queue overflow, a watched directory removed),
+    the tracker falls back to stat checks automatically. 'watching' reports
+    whether notifications are in use. The tracker is thread-safe.
+    """
+
+    _log = logging.getLogger("ChangeTracker")
+
+    # Changes already applied to every entry are pruned past this many
+    _PRUNE_THRESHOLD = 4096
+
+    def __init__(self, use_inotify : bool = True):
+        self._lock = threading.Lock()
+        self._inotify : Optional[_Inotify] = None
+        # A directory reached through a symlink shares its target's watch
+        self._wd_m : Dict[int,List[str]] = {}
+        self._dir_m : Dict[str,int] = {}
+        self._entries : Dict[int,_Entry] = {}
+        # Absolute paths of all tracked files
+        self._files : Set[str] = set()
+        # Tracked files that are symlinks, and the real path of each tracked
+        # file reached through a symlink -> its tracked paths. An edit made
+        # through the real path only raises events in its directory
+        self._links : Set[str] = set()
+        self._targets : Dict[str,Set[str]] = {}
+        # Tracked file -> sequence number of its most-recent change event
+        self._changed : Dict[str,int] = {}
+        self._seq = 0
+
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                self._log.info("inotify unavailable (%s). Using stat checks" % str(e))
+
+    @property
+    def watching(self) -> bool:
+        return self._inotify is not None
+
+    def check(self, collection : FileCollection, root_files : List[str], timestamp : float) -> bool:
+        """
+        Returns True if the collection's root files match 'root_files' and
+        no file in it is missing or newer than 'timestamp'. The collection
+        must not be modified while it is tracked.
+        """
+        if len(collection.root_files) != len(root_files):
+            return False
+        for i, r in enumerate(collection.root_files):
+            if not r.matches(root_files[i]):
+                return False
+
+        with self._lock:
+            if self._inotify is not None:
+                self._poll()
+                entry = self._entries.get(id(collection))
+                if entry is None or entry.collection is not collection:
+                    entry = self._register(collection)
+
+            if self._inotify is None:
+                return self._statCheck(collection.file_info.keys(), timestamp)
+
+            if len(self._changed) < len(entry.mtime):
+                changed = [p for p, seq in self._changed.items()
+                           if seq > entry.seq and p in entry.mtime.keys()]
+            else:
+                changed = [p for p in entry.mtime.keys()
+                           if self._changed.get(p, 0) > entry.seq]
+            for apath in changed:
+                entry.update(apath)
+            entry.seq = self._seq
+
+            if len(self._changed) > self._PRUNE_THRESHOLD:
+                self._prune()
+
+            return entry.missing == 0 and entry.max_mtime <= timestamp
+
+    def forget(self, collection : FileCollection):
+        """Stops tracking a collection, eg once it has been replaced"""
+        with self._lock:
+            entry = self._entries.get(id(collection))
+            if entry is not None and entry.collection is collection:
+                del self._entries[id(collection)]
+
+    def close(self):
+        with self._lock:
+            self._disable()
+
+    def _statCheck(self, paths, timestamp) -> bool:
+        for path in paths:
+            try:
+                if os.stat(path).st_mtime > timestamp:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _register(self, collection) -> Optional[_Entry]:
+        entry = _Entry(collection)
+        apaths = [os.path.abspath(p) for p in collection.file_info.keys()]
+
+        # Arm watches before taking the baseline, so no change can slip
+        # between the two
+        for apath in apaths:
+            if not self._watch(os.path.dirname(apath)):
+                return None
+            rpath = os.path.realpath(apath)
+            if rpath != apath:
+                if not self._watch(os.path.dirname(rpath)):
+                    return None
+                if os.path.islink(apath):
+                    self._links.add(apath)
+                self._targets.setdefault(rpath, set()).add(apath)
+
+        for apath in apaths:
+            self._files.add(apath)
+            entry.mtime[apath] = None
+            entry.missing += 1
+            entry.update(apath)
+        entry.seq = self._seq
+
+        self._entries[id(collection)] = entry
+        return entry
+
+    def _watch(self, dir) -> bool:
+        if dir in self._dir_m.keys():
+            return True
+        try:
+            wd = self._inotify.addWatch(dir)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                # The baseline stat will find the file missing
+                return True
+            self._log.warning("Failed to watch %s (%s). Falling back to stat checks" % (
+                dir, str(e)))
+            self._disable()
+            return False
+        self._wd_m.setdefault(wd, []).append(dir)
+        self._dir_m[dir] = wd
+        return True
+
+    def _poll(self):
+        for wd, mask, name in self._inotify.read():
+            if mask & _IN_Q_OVERFLOW:
+                self._log.info("inotify queue overflowed. Re-taking baselines")
+                self._reset()
+                continue
+            dirs = self._wd_m.get(wd)
+            if dirs is None:
+                continue
+            if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                # The directory is gone (or moved), so its watch can't be
+                # trusted. Drop it and re-take baselines
+                del self._wd_m[wd]
+                for dir in dirs:
+                    del self._dir_m[dir]
+                self._reset()
+            elif name != "":
+                for dir in dirs:
+                    apath = os.path.join(dir, name)
+                    if apath in self._links:
+                        # The link itself changed, and may now point elsewhere.
+                        # Re-take baselines, watching its new target
+                        self._reset()
+                        break
+                    for p in self._targets.get(apath, ()):
+                        self._seq += 1
+                        self._changed[p] = self._seq
+                    if apath in self._files:
+                        self._seq += 1
+                        self._changed[apath] = self._seq
+
+    def _prune(self):
+        oldest = min((e.seq for e in self._entries.values()), default=self._seq)
+        self._changed = {p: seq for p, seq in self._changed.items() if seq > oldest}
+
+    def _reset(self):
+        # Entries re-register, taking a fresh baseline, on their next check
+        self._entries.clear()
+        self._changed.clear()
+        self._links.clear()
+        self._targets.clear()
+
+    def _disable(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._wd_m.clear()
+        self._dir_m.clear()
+        self._entries.clear()
+        self._files.clear()
+        self._changed.clear()
+        self._links.clear()
+        self._targets.clear()
@@ -0,0 +1,22 @@
+import pytest
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+from svdep.task_build_units import TaskBuildUnits as PyTaskBuildUnits
+from svdep.native import is_native_available, NativeTaskBuildFileCollection, NativeTaskBuildUnits
+
+@pytest.fixture(params=["python", "native"])
+def build_cls(request):
+    """Return each available TaskBuildFileCollection implementation."""
+    if request.param == "native":
+        if not is_native_available():
+            pytest.skip("Native library not available")
+        return NativeTaskBuildFileCollection
+    return PyTaskBuildFileCollection
+
+@pytest.fixture(params=["python", "native"])
+def units_cls(request):
+    """Return each available TaskBuildUnits implementation."""
+    if request.param == "native":
+        if not is_native_available():
+            pytest.skip("Native library not available")
+        return NativeTaskBuildUnits
+    return PyTaskBuildUnits
@@ -0,0 +1,56 @@
+import json
+import os
+import pytest
+from svdep.__main__ import main, EXIT_OK
+from svdep.bench import TreeSpec, generate_tree, run_benchmarks
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+
+def test_generate_tree(tmp_path):
+    """Every generated file is reachable, and the tree is reproducible"""
+    spec = TreeSpec(num_files=40, num_roots=2, depth=3, file_size=256)
+    roots, incdirs = generate_tree(spec, str(tmp_path / "a"))
+    assert len(roots) == 2
+    assert len(incdirs) == spec.num_incdirs
+
+    info = PyTaskBuildFileCollection(roots, incdirs=incdirs, defines={}).build()
+    assert len(info.file_info) == spec.num_files
+
+    generate_tree(spec, str(tmp_path / "b"))
+    for root, _, files in os.walk(str(tmp_path / "a")):
+        for f in files:
+            path = os.path.join(root, f)
+            other = path.replace(os.sep + "a" + os.sep, os.sep + "b" + os.sep, 1)
+            with open(path) as fa, open(other) as fb:
+                assert fa.read() == fb.read()
+
+def test_run_benchmarks(build_cls, tmp_path):
+    impl = "python" if build_cls is PyTaskBuildFileCollection else "native"
+    spec = TreeSpec(num_files=20, file_size=128)
+    results = run_benchmarks(spec, str(tmp_path), repeat=1, impls=[impl])
+
+    # Results must survive a round trip through JSON
+    results = json.loads(json.dumps(results))
+    assert results["spec"]["num_files"] == 20
+    assert [r["op"] for r in results["results"]] == [
+        "build", "check", "check_each", "check_units", "hash", "json_save", "json_load"]
+    for r in results["results"]:
+        assert r["impl"] == impl
+        assert r["files"] == 20
+        assert len(r["runs"]) == 1
+
+def test_bench_cmd(capsys):
+    assert main(["bench", "--files", "12", "--file-size", "64", "--repeat", "1",
+                 "--impl", "python", "--format", "json"]) == EXIT_OK
+    results = json.loads(capsys.readouterr().out)
+    assert results["skipped"] == []
+    assert len(results["results"]) == 7
+
+def test_check_units_faster(tmp_path):
+    """Checking units together beats checking them one call at a time"""
+    from svdep import is_native_available
+    if not is_native_available():
+        pytest.skip("Native library not available")
+    spec = TreeSpec(num_files=400, num_roots=16, file_size=64, shared_headers=20)
+    results = run_benchmarks(spec, str(tmp_path), repeat=3, impls=["native"])
+    times = {r["op"]: r["min"] for r in results["results"]}
+    assert times["check_units"] < times["check_each"]
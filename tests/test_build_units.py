@@ -0,0 +1,112 @@
+import json
+import os
+import pytest
+from svdep.build_unit import BuildUnit
+from svdep.native import NativeTaskBuildFileCollection, NativeTaskBuildUnits
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+from svdep.__main__ import main, EXIT_OK
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(tmp_path):
+    """Eight units whose roots all include the same headers"""
+    _write(tmp_path, "inc/common.svh", """
+`ifndef COMMON_SVH
+`define COMMON_SVH
+`include "leaf.svh"
+`endif
+""")
+    _write(tmp_path, "inc/leaf.svh", "// leaf\n")
+    _write(tmp_path, "inc/gate.svh", "// gate\n")
+    _write(tmp_path, "inc/rtl.svh", "// rtl\n")
+    units = []
+    for i in range(8):
+        root = _write(tmp_path, "unit%d.sv" % i, """
+`include "common.svh"
+`ifdef GATE
+`include "gate.svh"
+`else
+`include "rtl.svh"
+`endif
+""")
+        units.append(BuildUnit(
+            [root],
+            incdirs=[os.path.join(str(tmp_path), "inc")],
+            defines={"GATE": None} if i % 2 else {},
+            compilation_unit=(i % 4 == 3)))
+    return units
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_units_match_single_builds(units_cls, tmp_path, jobs):
+    units = _setup(tmp_path)
+    if units_cls is NativeTaskBuildUnits:
+        build_cls = NativeTaskBuildFileCollection
+    else:
+        build_cls = PyTaskBuildFileCollection
+    collections = units_cls(units, jobs=jobs).build()
+    assert len(collections) == len(units)
+
+    for unit, collection in zip(units, collections):
+        single = build_cls(
+            unit.root_paths,
+            incdirs=list(unit.incdirs),
+            defines=unit.defines,
+            compilation_unit=unit.compilation_unit).build()
+        assert collection.to_dict() == single.to_dict()
+
+def test_units_scan_once(units_cls, tmp_path):
+    """Each file is read and scanned once, however many units include it"""
+    units = _setup(tmp_path)
+    task = units_cls(units, jobs=4)
+    task.build()
+    # Eight roots and four headers
+    assert task.report.files_scanned == 12
+
+def test_units_scan_cache(units_cls, tmp_path):
+    units = _setup(tmp_path)
+    cache = os.path.join(str(tmp_path), "scan.cache")
+    units_cls(units, scan_cache=cache).build()
+    assert os.path.isfile(cache)
+
+    task = units_cls(units, scan_cache=cache)
+    task.build()
+    assert task.report.files_scanned == 0
+
+def test_units_missing_root(units_cls, tmp_path):
+    units = _setup(tmp_path)
+    units.append(BuildUnit([os.path.join(str(tmp_path), "missing.sv")], defines={}))
+    with pytest.raises(Exception):
+        units_cls(units, jobs=4).build()
+
+def test_units_no_defines(tmp_path):
+    """Builds that don't evaluate conditionals share include scans too"""
+    from svdep.task_build_units import TaskBuildUnits
+    units = _setup(tmp_path)
+    for unit in units:
+        unit.defines = None
+        unit.compilation_unit = False
+    task = TaskBuildUnits(units, jobs=4)
+    collections = task.build()
+    assert task.report.files_scanned == 12
+    for unit, collection in zip(units, collections):
+        single = PyTaskBuildFileCollection(unit.root_paths, incdirs=list(unit.incdirs)).build()
+        assert collection.to_dict() == single.to_dict()
+
+def test_manifest_build_jobs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _setup(tmp_path)
+    _write(tmp_path, "units.txt", "".join(
+        "unit%d.json unit%d.sv +incdir+inc%s\n" % (i, i, " +define+GATE" if i % 2 else " +define+RTL")
+        for i in range(8)))
+
+    assert main(["build", "--manifest", "units.txt", "-j", "4"]) == EXIT_OK
+    for i in range(8):
+        with open(os.path.join(str(tmp_path), "unit%d.json" % i), "r") as fp:
+            data = json.load(fp)
+        names = [os.path.basename(p) for p in data["file_info"].keys()]
+        assert ("gate.svh" in names) == (i % 2 == 1)
@@ -0,0 +1,100 @@
+import os
+import pytest
+from svdep.build_unit import BuildUnit
+from svdep.task_check_up_to_date import TaskCheckUpToDate as PyTaskCheckUpToDate
+from svdep.__main__ import main, EXIT_OK
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "symlink"), reason="Requires symlinks")
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(tmp_path):
+    """A header reached through a symlinked directory and a '..' path"""
+    base = os.path.realpath(str(tmp_path))
+    defs = _write(base, "ip/inc/defs.svh", "// defs\n")
+    os.symlink(os.path.join(base, "ip"), os.path.join(base, "ip_link"))
+    _write(base, "ip/inc/pkg.svh", '`include "../inc/defs.svh"\n')
+    top = _write(base, "src/top.sv", '`include "defs.svh"\n`include "pkg.svh"\n')
+    incdirs = [os.path.join(base, "ip_link", "inc"), os.path.join(base, "ip", "inc")]
+    return base, top, defs, incdirs
+
+@pytest.mark.parametrize("defines", [None, {"X": "1"}])
+def test_merged(build_cls, tmp_path, defines):
+    base, top, defs, incdirs = _setup(tmp_path)
+
+    info = build_cls([top], incdirs=incdirs, defines=defines).build()
+    assert len([p for p in info.file_info.keys() if p.endswith("defs.svh")]) == 2
+
+    task = build_cls([top], incdirs=incdirs, defines=defines, canonical=True)
+    info = task.build()
+    assert sorted(info.file_info.keys()) == sorted([
+        top, defs, os.path.join(base, "ip", "inc", "pkg.svh")])
+    assert info.file_info[top].includes[0] == defs
+    # The first spelling is kept for reporting
+    assert info.file_info[defs].spelled == os.path.join(base, "ip_link", "inc", "defs.svh")
+    assert info.file_info[top].spelled is None
+    assert task.report.files_scanned == 3
+
+    loaded = type(info).from_dict(info.to_dict())
+    assert loaded.file_info[defs].spelled == info.file_info[defs].spelled
+
+def test_spelled_roots(build_cls, tmp_path):
+    base, top, defs, incdirs = _setup(tmp_path)
+    os.symlink(os.path.join(base, "src"), os.path.join(base, "src_link"))
+    root = os.path.join(base, "src_link", "top.sv")
+
+    info = build_cls([root], incdirs=incdirs, canonical=True).build()
+    assert info.root_files[0].name == top
+    assert info.root_files[0].spelled == root
+
+    # Roots are matched as spelled or canonical
+    timestamp = max(os.path.getmtime(p) for p in info.file_info.keys())
+    assert PyTaskCheckUpToDate([root]).check(info, timestamp)
+    assert PyTaskCheckUpToDate([top]).check(info, timestamp)
+    assert PyTaskCheckUpToDate([root]).check_roots(info, timestamp) == {root: True}
+    os.utime(defs, (timestamp + 10, timestamp + 10))
+    assert PyTaskCheckUpToDate([root]).check_roots(info, timestamp) == {root: False}
+
+def test_units_share(units_cls, tmp_path):
+    base, top, defs, incdirs = _setup(tmp_path)
+    other = _write(base, "src/other.sv", '`include "../ip/inc/defs.svh"\n')
+    task = units_cls([
+        BuildUnit([top], incdirs=incdirs, canonical=True),
+        BuildUnit([other], canonical=True)])
+    collections = task.build()
+    assert defs in collections[0].file_info.keys()
+    assert defs in collections[1].file_info.keys()
+    # top, other, pkg.svh and defs.svh: each is read once
+    assert task.report.files_scanned == 4
+
+def test_canonical_cmd(tmp_path, capsys):
+    base, top, defs, incdirs = _setup(tmp_path)
+    collection = os.path.join(base, "top.json")
+    args = ["-c", collection, "--canonical", top] + ["+incdir+%s" % d for d in incdirs]
+    assert main(["build"] + args) == EXIT_OK
+    assert main(["check"] + args) == EXIT_OK
+    assert main(["deps", "-c", collection]) == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == [
+        top, defs, os.path.join(base, "ip", "inc", "pkg.svh")]
+
+@pytest.mark.parametrize("defines", [None, {}])
+def test_deep_include_chain(build_cls, tmp_path, defines):
+    """Include depth is not limited by the stack"""
+    depth = 10000
+    base = os.path.realpath(str(tmp_path))
+    for i in range(depth):
+        _write(base, "inc/f%d.svh" % i, '`include "f%d.svh"\n' % (i + 1))
+    _write(base, "inc/f%d.svh" % depth, "// last\n")
+    top = _write(base, "top.sv", '`include "f0.svh"\n')
+
+    info = build_cls(
+        [top], incdirs=[os.path.join(base, "inc")], defines=defines, canonical=True).build()
+    assert len(info.file_info) == depth + 2
+    assert info.file_info[os.path.join(base, "inc", "f5.svh")].includes == [
+        os.path.join(base, "inc", "f6.svh")]
+    assert len(info.closure(top)) == depth + 2
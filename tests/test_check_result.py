@@ -0,0 +1,206 @@
+import os
+import pytest
+from svdep.__main__ import main, EXIT_OK, EXIT_STALE
+from svdep.native import is_native_available, NativeTaskCheckUpToDate
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+from svdep.task_check_up_to_date import TaskCheckUpToDate as PyTaskCheckUpToDate
+
+@pytest.fixture(params=["python", "native"])
+def check_cls(request):
+    if request.param == "native":
+        if not is_native_available():
+            pytest.skip("Native library not available")
+        return NativeTaskCheckUpToDate
+    return PyTaskCheckUpToDate
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(tmp_path):
+    dir = str(tmp_path)
+    a = _write(dir, "a.svh", '`include "c.svh"\n')
+    b = _write(dir, "b.svh", "// b\n")
+    c = _write(dir, "c.svh", "// c\n")
+    top = _write(dir, "top.sv", '`include "a.svh"\n`include "b.svh"\n')
+    info = PyTaskBuildFileCollection([top]).build()
+    timestamp = max(os.path.getmtime(p) for p in (a, b, c, top))
+    return top, a, b, c, info, timestamp
+
+def _touch_later(path, timestamp):
+    os.utime(path, (timestamp + 10, timestamp + 10))
+
+def test_up_to_date(check_cls, tmp_path):
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    result = check_cls([top]).check_result(info, timestamp)
+    assert result
+    assert result.up_to_date
+    assert result.stale == []
+    assert not result.root_mismatch
+
+def test_first_stale(check_cls, tmp_path):
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    _touch_later(c, timestamp)
+    _touch_later(b, timestamp)
+
+    result = check_cls([top]).check_result(info, timestamp)
+    assert not result
+    # Traversal is depth-first, in include order
+    assert [s.path for s in result.stale] == [c]
+    stale = result.first_stale
+    assert stale.recorded == pytest.approx(info.file_info[c].timestamp)
+    assert stale.current == pytest.approx(timestamp + 10)
+    assert not stale.missing
+    assert result.timestamp == pytest.approx(timestamp)
+    assert check_cls([top]).check(info, timestamp) is False
+
+def test_collect_all(check_cls, tmp_path):
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    _touch_later(c, timestamp)
+    os.remove(b)
+
+    result = check_cls([top]).check_result(info, timestamp, collect_all=True)
+    assert [s.path for s in result.stale] == [c, b]
+    assert result.stale[1].missing
+
+def test_unrecorded_include(check_cls, tmp_path):
+    """An include missing from file_info is stale, whatever its mtime"""
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    del info.file_info[c]
+    info.invalidate_index()
+
+    result = check_cls([top]).check_result(info, timestamp, collect_all=True)
+    assert [s.path for s in result.stale] == [c]
+    assert result.stale[0].recorded == 0.0
+    assert result.stale[0].current == pytest.approx(os.path.getmtime(c))
+    assert check_cls([top]).check(info, timestamp) is False
+    assert check_cls([top]).check_roots(info, timestamp) == {top: False}
+
+def test_root_mismatch(check_cls, tmp_path):
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    result = check_cls([top, a]).check_result(info, timestamp)
+    assert not result
+    assert result.root_mismatch
+    assert result.roots_recorded == [top]
+    assert result.roots_requested == [top, a]
+    assert result.stale == []
+
+    # Collecting everything continues past the mismatch
+    _touch_later(b, timestamp)
+    result = check_cls([a]).check_result(info, timestamp, collect_all=True)
+    assert result.root_mismatch
+    assert [s.path for s in result.stale] == [b]
+
+def test_explain_cmd(tmp_path, capsys, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(str(tmp_path), "a.svh", "// a\n")
+    _write(str(tmp_path), "b.svh", "// b\n")
+    _write(str(tmp_path), "top.sv", '`include "a.svh"\n`include "b.svh"\n')
+    assert main(["build", "-c", "unit.json", "top.sv"]) == EXIT_OK
+    assert main(["check", "--explain", "-c", "unit.json", "top.sv"]) == EXIT_OK
+    assert capsys.readouterr().out == ""
+
+    timestamp = os.path.getmtime("unit.json")
+    _touch_later("a.svh", timestamp)
+    _touch_later("b.svh", timestamp)
+    assert main(["check", "--explain", "-c", "unit.json", "top.sv"]) == EXIT_STALE
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert lines[0].startswith("newer: ") and "a.svh" in lines[0]
+
+    assert main(["check", "--all", "-c", "unit.json", "top.sv"]) == EXIT_STALE
+    assert len(capsys.readouterr().out.splitlines()) == 2
+
+def test_check_roots(check_cls, tmp_path):
+    dir = str(tmp_path)
+    _write(dir, "pkg.svh", "// pkg\n")
+    _write(dir, "own.svh", "// own\n")
+    r1 = _write(dir, "r1.sv", '`include "pkg.svh"\n')
+    r2 = _write(dir, "r2.sv", '`include "pkg.svh"\n`include "own.svh"\n')
+    r3 = _write(dir, "r3.sv", "// r3\n")
+    info = PyTaskBuildFileCollection([r1, r2, r3]).build()
+    timestamp = max(os.path.getmtime(os.path.join(dir, p)) for p in os.listdir(dir))
+
+    task = check_cls([r1, r2, r3])
+    assert task.check_roots(info, timestamp) == {r1: True, r2: True, r3: True}
+    # Five files, each stat'd once
+    assert task.report.stats == 5
+
+    _touch_later(os.path.join(dir, "own.svh"), timestamp)
+    assert task.check_roots(info, timestamp) == {r1: True, r2: False, r3: True}
+
+    _touch_later(os.path.join(dir, "pkg.svh"), timestamp)
+    assert task.check_roots(info, timestamp) == {r1: False, r2: False, r3: True}
+    assert len(task.last_result.stale) == 2
+
+    # A root that isn't in the collection must be compiled
+    r4 = _write(dir, "r4.sv", "// r4\n")
+    assert check_cls([r3, r4]).check_roots(info, timestamp) == {r3: True, r4: False}
+
+def test_roots_cmd(tmp_path, capsys, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(str(tmp_path), "a.svh", "// a\n")
+    _write(str(tmp_path), "r1.sv", '`include "a.svh"\n')
+    _write(str(tmp_path), "r2.sv", "// r2\n")
+    assert main(["build", "-c", "unit.json", "r1.sv", "r2.sv"]) == EXIT_OK
+    assert main(["check", "--roots", "-c", "unit.json", "r1.sv", "r2.sv"]) == EXIT_OK
+    assert capsys.readouterr().out == ""
+
+    _touch_later("a.svh", os.path.getmtime("unit.json"))
+    assert main(["check", "--roots", "-c", "unit.json", "r1.sv", "r2.sv"]) == EXIT_STALE
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1 and lines[0].endswith("r1.sv")
+
+def test_change_history(build_cls, tmp_path):
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    assert all(fi.changes == 0 for fi in info.file_info.values())
+
+    _touch_later(b, timestamp)
+    info = build_cls([top], previous=info).build()
+    assert info.file_info[b].changes == 1
+    assert info.file_info[c].changes == 0
+
+    # Unchanged files keep their counts through further rebuilds
+    info = build_cls([top], previous=info).build()
+    assert info.file_info[b].changes == 1
+
+    # Counts are saved with the collection
+    loaded = type(info).from_dict(info.to_dict())
+    assert loaded.file_info[b].changes == 1
+
+def test_hot_files_first(check_cls, tmp_path):
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    info.file_info[b].changes = 3
+    _touch_later(b, timestamp)
+    _touch_later(c, timestamp)
+
+    # The frequently-changed file is looked at before any other
+    task = check_cls([top])
+    result = task.check_result(info, timestamp)
+    assert [s.path for s in result.stale] == [b]
+    assert task.report.files_checked == 1
+
+    # Collecting every stale file still follows include order
+    result = check_cls([top]).check_result(info, timestamp, collect_all=True)
+    assert [s.path for s in result.stale] == [c, b]
+
+    # Verdicts don't depend on the history
+    os.utime(b, (timestamp, timestamp))
+    os.utime(c, (timestamp, timestamp))
+    assert check_cls([top]).check(info, timestamp) is True
+
+def test_hot_file_includes_followed(check_cls, tmp_path):
+    """A file looked at first for its history still has its includes checked"""
+    top, a, b, c, info, timestamp = _setup(tmp_path)
+    info.file_info[a].changes = 1
+    _touch_later(c, timestamp)
+
+    task = check_cls([top])
+    result = task.check_result(info, timestamp)
+    assert [s.path for s in result.stale] == [c]
+    assert task.report.files_checked == 3
+    # ...with the same verdict from either implementation
+    assert check_cls([top]).check(info, timestamp) is PyTaskCheckUpToDate([top]).check(info, timestamp)
+    assert check_cls([top]).check_roots(info, timestamp) == {top: False}
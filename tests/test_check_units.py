@@ -0,0 +1,89 @@
+import os
+import pytest
+from svdep.__main__ import main, EXIT_OK, EXIT_STALE
+from svdep.native import is_native_available, NativeTaskCheckUnits
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+from svdep.task_check_units import TaskCheckUnits as PyTaskCheckUnits
+
+@pytest.fixture(params=["python", "native"])
+def check_units_cls(request):
+    if request.param == "native":
+        if not is_native_available():
+            pytest.skip("Native library not available")
+        return NativeTaskCheckUnits
+    return PyTaskCheckUnits
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(tmp_path, n=6):
+    """Units that each include a shared header and a private one"""
+    dir = str(tmp_path)
+    shared = _write(dir, "shared.svh", "// shared\n")
+    roots = []
+    collections = []
+    for i in range(n):
+        _write(dir, "own%d.svh" % i, "// own\n")
+        root = _write(dir, "unit%d.sv" % i, '`include "shared.svh"\n`include "own%d.svh"\n' % i)
+        roots.append([root])
+        collections.append(PyTaskBuildFileCollection([root]).build())
+    timestamp = max(os.path.getmtime(os.path.join(dir, p)) for p in os.listdir(dir))
+    return dir, shared, roots, collections, [timestamp] * n
+
+def _touch_later(path, timestamp):
+    os.utime(path, (timestamp + 10, timestamp + 10))
+
+def test_check_units(check_units_cls, tmp_path):
+    dir, shared, roots, collections, timestamps = _setup(tmp_path)
+    task = check_units_cls(roots)
+    assert task.check(collections, timestamps) == [True] * 6
+    # One stat per distinct file: six roots, six headers and the shared one
+    assert task.report.stats == 13
+
+    _touch_later(os.path.join(dir, "own2.svh"), timestamps[0])
+    assert task.check(collections, timestamps) == [True, True, False, True, True, True]
+
+    _touch_later(shared, timestamps[0])
+    assert task.check(collections, timestamps) == [False] * 6
+
+def test_check_units_results(check_units_cls, tmp_path):
+    dir, shared, roots, collections, timestamps = _setup(tmp_path, 3)
+    os.remove(os.path.join(dir, "own1.svh"))
+    roots[2] = roots[2] + [roots[0][0]]
+
+    results = check_units_cls(roots).check_results(collections, timestamps)
+    assert results[0].up_to_date
+    assert [s.path for s in results[1].stale] == [os.path.join(dir, "own1.svh")]
+    assert results[1].stale[0].missing
+    assert results[2].root_mismatch
+
+def test_check_units_empty(check_units_cls):
+    assert check_units_cls([]).check([], []) == []
+
+def test_manifest_check(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    dir = str(tmp_path)
+    _write(dir, "shared.svh", "// shared\n")
+    lines = []
+    for i in range(4):
+        _write(dir, "unit%d.sv" % i, '`include "shared.svh"\n')
+        lines.append("unit%d.json unit%d.sv\n" % (i, i))
+    _write(dir, "units.txt", "".join(lines))
+
+    assert main(["build", "--manifest", "units.txt"]) == EXIT_OK
+    assert main(["check", "--manifest", "units.txt"]) == EXIT_OK
+    # A missing collection is stale, without affecting the others
+    os.remove(os.path.join(dir, "unit1.json"))
+    capsys.readouterr()
+    assert main(["check", "--manifest", "units.txt"]) == EXIT_STALE
+    assert capsys.readouterr().out.split() == ["unit1.json"]
+
+    # Make unit3's collection older than its source
+    ts = os.path.getmtime(os.path.join(dir, "unit3.sv"))
+    os.utime(os.path.join(dir, "unit3.json"), (ts - 10, ts - 10))
+    assert main(["update", "-v", "--manifest", "units.txt"]) == EXIT_OK
+    assert capsys.readouterr().out.split() == ["Updated", "unit1.json", "Updated", "unit3.json"]
+    assert main(["check", "--manifest", "units.txt"]) == EXIT_OK
@@ -0,0 +1,176 @@
+import os
+import pytest
+from svdep.__main__ import main, EXIT_OK, EXIT_STALE, EXIT_ERROR
+from svdep.filelist import Filelist
+from svdep.hash_files import compute_hash_for_files
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _touch_later(path, ref):
+    """Make 'path' newer than 'ref'"""
+    st = os.stat(ref)
+    os.utime(path, (st.st_atime + 10, st.st_mtime + 10))
+
+def _setup(tmp_path):
+    _write(tmp_path, "inc/foo.svh", "// foo\n")
+    _write(tmp_path, "inc/gate.svh", "// gate\n")
+    _write(tmp_path, "top.sv", """
+`include "foo.svh"
+`ifdef GATE
+`include "gate.svh"
+`endif
+""")
+    return _write(tmp_path, "unit.f", """
+// Unit filelist
++incdir+inc
+top.sv
+""")
+
+def test_filelist(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(tmp_path, "sub/sub.f", "b.sv -I ../inc2\n")
+    flist = _write(tmp_path, "top.f", """
+# comment
++incdir+inc1+inc1 a.sv   // trailing comment
++define+A+B=2 -DC=3
+-F sub/sub.f
+-timescale=1ns/1ps
+""")
+    fl = Filelist()
+    fl.addArgs(["-f", flist])
+    assert fl.files == ["a.sv", "sub/b.sv"]
+    assert fl.incdirs == ["inc1", "sub/../inc2"]
+    assert fl.defines == {"A": None, "B": "2", "C": "3"}
+
+def test_build_check(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _setup(tmp_path)
+
+    assert main(["check", "-c", "unit.json", "-f", "unit.f"]) == EXIT_STALE
+    assert main(["build", "-c", "unit.json", "-f", "unit.f"]) == EXIT_OK
+    assert main(["check", "-c", "unit.json", "-f", "unit.f"]) == EXIT_OK
+
+    # A different root list is stale
+    assert main(["check", "-c", "unit.json", "top.sv", "top.sv"]) == EXIT_STALE
+
+    _touch_later("inc/foo.svh", "unit.json")
+    assert main(["check", "-c", "unit.json", "-f", "unit.f"]) == EXIT_STALE
+
+    # A deleted dependency is stale, not an error
+    os.remove("inc/foo.svh")
+    assert main(["check", "-c", "unit.json", "-f", "unit.f"]) == EXIT_STALE
+
+def test_update(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    _setup(tmp_path)
+
+    assert main(["update", "-v", "-c", "unit.json", "-f", "unit.f"]) == EXIT_OK
+    assert capsys.readouterr().out == "Updated unit.json\n"
+
+    # Up-to-date collections are left untouched
+    assert main(["update", "-v", "-c", "unit.json", "-f", "unit.f"]) == EXIT_OK
+    assert capsys.readouterr().out == ""
+
+def test_update_loads_once(tmp_path, monkeypatch):
+    """A stale collection is rebuilt from the copy its check loaded"""
+    from svdep.__main__ import CmdEnv
+    monkeypatch.chdir(tmp_path)
+    _setup(tmp_path)
+    _write(tmp_path, "units.txt", "unit1.json -f unit.f\nunit2.json -f unit.f\n")
+    assert main(["build", "-c", "unit1.json", "-f", "unit.f"]) == EXIT_OK
+    assert main(["build", "-c", "unit2.json", "-f", "unit.f"]) == EXIT_OK
+    _touch_later("inc/foo.svh", "unit1.json")
+    _touch_later("inc/foo.svh", "unit2.json")
+
+    loads = []
+    load = CmdEnv.loadCollection
+    def counted(self, path):
+        loads.append(os.path.basename(path))
+        return load(self, path)
+    monkeypatch.setattr(CmdEnv, "loadCollection", counted)
+    assert main(["update", "-c", "unit1.json", "-f", "unit.f"]) == EXIT_OK
+    assert loads == ["unit1.json"]
+    del loads[:]
+    _touch_later("inc/foo.svh", "unit1.json")
+    assert main(["update", "--manifest", "units.txt"]) == EXIT_OK
+    assert loads == ["unit1.json", "unit2.json"]
+
+def test_deps(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    _setup(tmp_path)
+
+    assert main(["deps", "-f", "unit.f", "+define+GATE"]) == EXIT_OK
+    assert capsys.readouterr().out.split() == ["top.sv", "inc/foo.svh", "inc/gate.svh"]
+
+    assert main(["build", "-c", "unit.json", "-f", "unit.f", "+define+GATE"]) == EXIT_OK
+    assert main(["deps", "-c", "unit.json", "--format", "make", "--target", "out.o"]) == EXIT_OK
+    assert capsys.readouterr().out == "out.o: \\\n  top.sv \\\n  inc/foo.svh \\\n  inc/gate.svh\n"
+
+def test_hash(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    _setup(tmp_path)
+
+    assert main(["hash", "-f", "unit.f"]) == EXIT_OK
+    h1 = capsys.readouterr().out.strip()
+    _write(tmp_path, "inc/foo.svh", "// foo changed\n")
+    assert main(["hash", "-f", "unit.f"]) == EXIT_OK
+    h2 = capsys.readouterr().out.strip()
+    assert len(h1) == 32 and h1 != h2
+
+def test_deep_include_chain(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    for i in range(10000):
+        _write(tmp_path, "inc/f%d.svh" % i, '`include "f%d.svh"\n' % (i + 1))
+    _write(tmp_path, "inc/f10000.svh", "// last\n")
+    _write(tmp_path, "top.sv", '`include "f0.svh"\n')
+    args = ["+incdir+inc", "top.sv"]
+
+    assert main(["build", "-c", "unit.json"] + args) == EXIT_OK
+    assert main(["check", "-c", "unit.json"] + args) == EXIT_OK
+    assert main(["hash"] + args) == EXIT_OK
+    h1 = capsys.readouterr().out.strip()
+    assert h1 == compute_hash_for_files(["top.sv"], incdirs=["inc"])
+    _write(tmp_path, "inc/f10000.svh", "// changed\n")
+    assert compute_hash_for_files(["top.sv"], incdirs=["inc"]) not in (None, h1)
+
+def test_manifest(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    _setup(tmp_path)
+    _write(tmp_path, "other.sv", "// other\n")
+    _write(tmp_path, "units.txt", """
+# collection  source arguments
+unit1.json -f unit.f
+unit2.json other.sv
+""")
+
+    assert main(["check", "--manifest", "units.txt"]) == EXIT_STALE
+    assert capsys.readouterr().out.split() == ["unit1.json", "unit2.json"]
+
+    assert main(["update", "--manifest", "units.txt"]) == EXIT_OK
+    assert main(["check", "--manifest", "units.txt"]) == EXIT_OK
+    assert capsys.readouterr().out == ""
+
+    _touch_later("other.sv", "unit2.json")
+    assert main(["check", "--manifest", "units.txt"]) == EXIT_STALE
+    assert capsys.readouterr().out.split() == ["unit2.json"]
+
+def test_errors(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+
+    assert main(["build", "-c", "unit.json", "missing.sv"]) == EXIT_ERROR
+    assert "svdep: error:" in capsys.readouterr().err
+    assert main(["build", "-c", "unit.json"]) == EXIT_ERROR
+
+    assert main(["build", "missing.sv"]) == EXIT_ERROR
+    assert "requires -c/--collection" in capsys.readouterr().err
+
+    # A mistyped option is reported rather than taken for a simulator option
+    _write(tmp_path, "top.sv", "// top\n")
+    assert main(["check", "-c", "unit.json", "--explian", "top.sv"]) == EXIT_ERROR
+    assert "unrecognized arguments: --explian" in capsys.readouterr().err
+    assert main(["build", "-c", "unit.json", "-sv", "+acc", "top.sv", "--", "--top-module"]) == EXIT_OK
@@ -0,0 +1,81 @@
+import os
+import threading
+from svdep.file_collection import FileCollection
+from svdep.file_info import FileInfo
+from svdep.hash_files import compute_hash_for_collection
+from svdep.task_check_up_to_date import TaskCheckUpToDate as PyTaskCheckUpToDate
+
+def _collection(edges, roots):
+    ret = FileCollection()
+    for name, includes in edges:
+        ret.file_info[name] = FileInfo(name, 0, includes=includes)
+    ret.root_files = [ret.file_info[r] for r in roots]
+    return ret
+
+def test_closure():
+    # Dict order differs from discovery order
+    c = _collection([("b", ["d"]), ("r2", ["b", "e"]), ("r1", ["a", "b"]),
+                     ("a", ["c"]), ("c", []), ("d", []), ("e", [])], ["r1", "r2"])
+    assert c.closure("r1") == ["r1", "a", "c", "b", "d"]
+    assert c.closure("r2") == ["b", "d", "r2", "e"]
+    assert c.closure("b") == ["b", "d"]
+    assert c.all_files() == ["r1", "a", "c", "b", "d", "r2", "e"]
+
+    bits = c.closure_bits("r1") & c.closure_bits("r2")
+    assert sorted(c.file_path(i) for i in range(bits.bit_length()) if (bits >> i) & 1) == ["b", "d"]
+
+def test_closure_cycle():
+    c = _collection([("r", ["a"]), ("a", ["b"]), ("b", ["a", "c"]), ("c", [])], ["r"])
+    assert c.closure("a") == ["a", "b", "c"]
+    assert c.closure("b") == ["a", "b", "c"]
+    assert c.closure("r") == ["r", "a", "b", "c"]
+    assert c.affected_roots("c") == ["r"]
+
+def test_closure_invalidate():
+    c = _collection([("r", ["a"]), ("a", []), ("b", [])], ["r"])
+    assert c.closure("r") == ["r", "a"]
+    c.update_file(FileInfo("a", 0, includes=["b"]))
+    assert c.closure("r") == ["r", "a", "b"]
+    c.file_info["b"].includes.append("x")
+    c.invalidate_index()
+    assert c.closure("r") == ["r", "a", "b", "x"]
+
+def test_deep_chain(tmp_path):
+    """Include depth isn't limited by the recursion limit"""
+    n = 3000
+    paths = [os.path.join(str(tmp_path), "f%d.svh" % i) for i in range(n)]
+    for p in paths:
+        with open(p, "w") as fp:
+            fp.write("\n")
+    c = _collection([(p, [paths[i+1]] if i+1 < n else []) for i, p in enumerate(paths)],
+                    [paths[0]])
+    assert c.closure(paths[0]) == paths
+    assert c.affected_roots(paths[-1]) == [paths[0]]
+    assert compute_hash_for_collection(c) is not None
+
+    timestamp = max(os.path.getmtime(p) for p in paths)
+    assert PyTaskCheckUpToDate([paths[0]]).check(c, timestamp)
+    os.utime(paths[-1], (timestamp + 10, timestamp + 10))
+    result = PyTaskCheckUpToDate([paths[0]]).check_result(c, timestamp)
+    assert [s.path for s in result.stale] == [paths[-1]]
+
+def test_concurrent_queries():
+    """Memoized state is filled in consistently when queried from many threads"""
+    n = 2000
+    edges = [("f%d" % i, ["f%d" % (i + 1), "g%d" % (i % 50)]) for i in range(n)]
+    edges += [("f%d" % n, [])] + [("g%d" % i, []) for i in range(50)]
+    c = _collection(edges, ["f0", "f1000"])
+    expected = _collection(edges, ["f0", "f1000"])
+    want = [expected.closure("f0"), expected.closure("f1000"), expected.affected_roots("g7")]
+
+    for _ in range(5):
+        c.invalidate_index()
+        results = []
+        def query():
+            results.append([c.closure("f0"), c.closure("f1000"), c.affected_roots("g7")])
+        threads = [threading.Thread(target=query) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [want] * 8
@@ -0,0 +1,133 @@
+import os
+import threading
+import pytest
+from svdep import CollectionDb, FileCollection, PathVars
+from svdep.file_info import FileInfo
+from svdep.__main__ import main, EXIT_OK, EXIT_STALE
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(ws):
+    _write(ws, "inc/defs.svh", "`ifndef DEFS_SVH\n`define DEFS_SVH\n`endif\n")
+    _write(ws, "inc/pkg.svh", '`include "defs.svh"\n')
+    _write(ws, "other.sv", '`include "defs.svh"\n')
+    return _write(ws, "top.sv", '`include "pkg.svh"\n`include "defs.svh"\n')
+
+def test_round_trip(build_cls, tmp_path):
+    top = _setup(str(tmp_path))
+    info = build_cls([top], incdirs=[str(tmp_path / "inc")]).build()
+    info.root_files[0].changes = info.file_info[top].changes = 2
+
+    with CollectionDb(str(tmp_path / "units.db")) as db:
+        with pytest.raises(KeyError):
+            db.load("top")
+        db.save("top", info)
+        assert db.units() == ["top"]
+        loaded = db.load("top")
+    assert loaded == FileCollection.from_dict(info.to_dict())
+    assert loaded.closure(top) == info.closure(top)
+
+def test_incremental(tmp_path):
+    db = CollectionDb(str(tmp_path / "units.db"))
+    collection = FileCollection()
+    for i in range(10):
+        collection.file_info["/ws/f%d.svh" % i] = FileInfo("/ws/f%d.svh" % i, 1.0)
+    top = FileInfo("/ws/top.sv", 1.0, includes=list(collection.file_info.keys()))
+    collection.file_info[top.name] = top
+    collection.root_files.append(top)
+    assert db.save("top", collection) == 11
+    assert db.save("top", collection) == 0
+
+    # Only the rows of changed files are written
+    collection.file_info["/ws/f3.svh"].timestamp = 2.0
+    collection.file_info["/ws/f4.svh"].guard = "F4"
+    del collection.file_info["/ws/f9.svh"]
+    top.includes.remove("/ws/f9.svh")
+    assert db.save("top", collection) == 4
+    assert db.load("top") == collection
+    db.close()
+
+def test_units_share_paths(tmp_path):
+    path = str(tmp_path / "units.db")
+    with CollectionDb(path) as db:
+        for unit in ["a", "b"]:
+            collection = FileCollection()
+            collection.file_info["/ws/defs.svh"] = FileInfo("/ws/defs.svh", 1.0)
+            db.save(unit, collection)
+        assert db._db.execute("SELECT COUNT(*) FROM paths").fetchone()[0] == 1
+        db.remove("a")
+        assert db.units() == ["b"]
+        with pytest.raises(KeyError):
+            db.saved("a")
+
+def test_concurrent_writers(tmp_path):
+    path = str(tmp_path / "units.db")
+    CollectionDb(path).close()
+    errors = []
+
+    def save(unit):
+        try:
+            with CollectionDb(path) as db:
+                for i in range(20):
+                    collection = FileCollection()
+                    for j in range(20):
+                        name = "/ws/f%d.svh" % j
+                        collection.file_info[name] = FileInfo(name, float(i))
+                    db.save(unit, collection)
+                    assert len(db.load(unit).file_info) == 20
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=("unit%d" % i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with CollectionDb(path) as db:
+        assert db.units() == ["unit0", "unit1", "unit2", "unit3"]
+        assert all(db.load(u).file_info["/ws/f0.svh"].timestamp == 19.0 for u in db.units())
+
+def test_path_vars(tmp_path):
+    with CollectionDb(str(tmp_path / "units.db")) as db:
+        collection = FileCollection()
+        top = FileInfo("/ci/ws/top.sv", 1.0, includes=["/tools/uvm.svh"])
+        collection.file_info[top.name] = top
+        collection.root_files.append(top)
+        db.save("top", collection, PathVars({"WS": "/ci/ws"}))
+        loaded = db.load("top", PathVars({"WS": "/home/me/ws"}))
+        assert loaded.root_files[0].name == "/home/me/ws/top.sv"
+        assert loaded.file_info["/home/me/ws/top.sv"].includes == ["/tools/uvm.svh"]
+        with pytest.raises(ValueError):
+            db.load("top")
+
+def test_db_cmd(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    _setup(str(tmp_path))
+    _write(str(tmp_path), "units.txt", """
+top -f top.f
+other other.sv +incdir+inc
+""")
+    _write(str(tmp_path), "top.f", "top.sv\n+incdir+inc\n")
+
+    assert main(["check", "--db", "units.db", "--manifest", "units.txt"]) == EXIT_STALE
+    assert capsys.readouterr().out.split() == ["top", "other"]
+    assert main(["update", "--db", "units.db", "--manifest", "units.txt"]) == EXIT_OK
+    assert main(["check", "--db", "units.db", "--manifest", "units.txt"]) == EXIT_OK
+    assert not os.path.exists("top") and not os.path.exists("other")
+
+    with CollectionDb("units.db") as db:
+        saved = db.saved("other")
+    defs = os.path.join(str(tmp_path), "inc", "defs.svh")
+    os.utime(defs, (saved + 10, saved + 10))
+    assert main(["check", "--db", "units.db", "-c", "top", "-f", "top.f"]) == EXIT_STALE
+    assert main(["affected", "--db", "units.db", "--manifest", "units.txt", "other.sv"]) == EXIT_OK
+    assert capsys.readouterr().out.split() == ["other"]
+    assert main(["deps", "--db", "units.db", "-c", "top"]) == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == [
+        "top.sv", os.path.join("inc", "pkg.svh"), os.path.join("inc", "defs.svh")]
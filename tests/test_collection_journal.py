@@ -0,0 +1,200 @@
+import json
+import os
+import pytest
+import threading
+import time
+from svdep import FileCollection, PathVars
+from svdep.collection_journal import journal_path, load_collection, save_collection, _apply
+from svdep.file_info import FileInfo
+from svdep.__main__ import main, EXIT_OK, EXIT_STALE
+
+def _collection(n=50):
+    ret = FileCollection()
+    for i in range(n):
+        name = "/ws/inc/f%d.svh" % i
+        ret.file_info[name] = FileInfo(name, 1.0)
+    top = FileInfo("/ws/top.sv", 1.0, includes=list(ret.file_info.keys()))
+    ret.file_info[top.name] = top
+    ret.root_files.append(top)
+    return ret
+
+def _copy(collection):
+    return FileCollection.from_dict(collection.to_dict())
+
+def test_append_and_replay(tmp_path):
+    path = str(tmp_path / "top.json")
+    collection = _collection()
+    assert save_collection(path, collection)
+    snapshot = os.stat(path)
+
+    updated = _copy(collection)
+    updated.file_info["/ws/inc/f3.svh"].timestamp = 2.0
+    updated.file_info["/ws/inc/f4.svh"].guard = "F4_SVH"
+    assert not save_collection(path, updated, previous=collection)
+    # The snapshot is untouched. The journal holds the two changed files
+    assert os.stat(path).st_mtime_ns == snapshot.st_mtime_ns
+    with open(journal_path(path), "r") as fp:
+        lines = fp.read().splitlines()
+    assert len(lines) == 4
+    assert load_collection(path) == updated
+
+    # Deletes and root changes
+    again = _copy(updated)
+    del again.file_info["/ws/inc/f9.svh"]
+    again.root_files[0].includes.remove("/ws/inc/f9.svh")
+    again.file_info["/ws/top.sv"].includes.remove("/ws/inc/f9.svh")
+    assert not save_collection(path, again, previous=updated)
+    loaded = load_collection(path)
+    assert loaded == again
+    assert "/ws/inc/f9.svh" not in loaded.closure("/ws/top.sv")
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / "top.json")
+    collection = _collection()
+    save_collection(path, collection)
+    snapshots = 0
+    for i in range(40):
+        updated = _copy(collection)
+        updated.file_info["/ws/inc/f%d.svh" % i].timestamp = 10.0 + i
+        if save_collection(path, updated, previous=collection):
+            snapshots += 1
+            assert not os.path.exists(journal_path(path))
+        collection = updated
+        assert load_collection(path) == collection
+    assert 0 < snapshots < 10
+
+def test_incomplete_batch(tmp_path):
+    path = str(tmp_path / "top.json")
+    collection = _collection()
+    save_collection(path, collection)
+    updated = _copy(collection)
+    updated.file_info["/ws/inc/f1.svh"].timestamp = 2.0
+    save_collection(path, updated, previous=collection)
+
+    # A batch cut short by a crash is ignored
+    with open(journal_path(path), "a") as fp:
+        fp.write('{"put": {"name": "/ws/inc/f2.svh", "timestamp": 3.0, "includes": []}}\n{"pu')
+    assert load_collection(path) == updated
+
+    # ...and the next save starts a new snapshot rather than appending to it
+    again = _copy(updated)
+    again.file_info["/ws/inc/f5.svh"].timestamp = 4.0
+    assert save_collection(path, again, previous=updated)
+    assert load_collection(path) == again
+
+def test_stale_journal_ignored(tmp_path):
+    path = str(tmp_path / "top.json")
+    collection = _collection()
+    save_collection(path, collection)
+    updated = _copy(collection)
+    updated.file_info["/ws/inc/f1.svh"].timestamp = 2.0
+    save_collection(path, updated, previous=collection)
+
+    # The collection is rewritten by something that doesn't know about journals
+    with open(path, "w") as fp:
+        json.dump(collection.to_dict(), fp)
+    assert load_collection(path) == collection
+
+def test_path_vars(tmp_path):
+    path = str(tmp_path / "top.json")
+    vars = PathVars({"WS": "/ws"})
+    collection = _collection(4)
+    save_collection(path, collection, vars)
+    updated = _copy(collection)
+    del updated.file_info["/ws/inc/f1.svh"]
+    updated.file_info["/ws/inc/f2.svh"].timestamp = 2.0
+    save_collection(path, updated, vars, previous=collection, compact_ratio=10.0)
+    with open(journal_path(path), "r") as fp:
+        assert "/ws/" not in fp.read()
+
+    loaded = load_collection(path, PathVars({"WS": "/other"}))
+    assert sorted(loaded.file_info.keys()) == [
+        "/other/inc/f0.svh", "/other/inc/f2.svh", "/other/inc/f3.svh", "/other/top.sv"]
+    assert loaded.file_info["/other/inc/f2.svh"].timestamp == 2.0
+
+def _modify_since_saved(path, saved):
+    """Makes 'path' newer than the 'saved' files, all in the past"""
+    now = time.time()
+    for p in saved:
+        if os.path.exists(p):
+            os.utime(p, (now - 100, now - 100))
+    os.utime(path, (now - 50, now - 50))
+
+def test_journal_cmd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for i in range(20):
+        with open("f%d.svh" % i, "w") as fp:
+            fp.write("// f%d\n" % i)
+    with open("top.sv", "w") as fp:
+        fp.write("".join('`include "f%d.svh"\n' % i for i in range(20)))
+    args = ["-c", "top.json", "--journal", "top.sv"]
+
+    assert main(["update"] + args) == EXIT_OK
+    assert not os.path.exists(journal_path("top.json"))
+    _modify_since_saved("f3.svh", ["top.json"])
+    assert main(["check"] + args) == EXIT_STALE
+    assert main(["update"] + args) == EXIT_OK
+    assert os.path.exists(journal_path("top.json"))
+    # Checks are against the journal's time
+    assert main(["check"] + args) == EXIT_OK
+
+    # Saving without --journal writes a snapshot
+    _modify_since_saved("f4.svh", ["top.json", journal_path("top.json")])
+    assert main(["update", "-c", "top.json", "top.sv"]) == EXIT_OK
+    assert not os.path.exists(journal_path("top.json"))
+    assert main(["check"] + args) == EXIT_OK
+
+def test_replay_keeps_index():
+    """Replayed records update the reverse index rather than discarding it"""
+    collection = _collection(4)
+    assert collection.includers("/ws/inc/f2.svh") == ["/ws/top.sv"]
+    f1 = FileInfo("/ws/inc/f1.svh", 2.0, includes=["/ws/inc/f2.svh"])
+    top = FileInfo("/ws/top.sv", 1.0, includes=["/ws/inc/f0.svh", "/ws/inc/f1.svh"])
+    for op, arg in [("put", f1.to_dict()), ("put", top.to_dict()), ("del", "/ws/inc/f3.svh"),
+                    ("roots", [top.to_dict()])]:
+        _apply(collection, op, arg, None)
+    assert collection._includers is not None
+    assert sorted(collection.includers("/ws/inc/f2.svh")) == ["/ws/inc/f1.svh"]
+    assert collection.affected_roots("/ws/inc/f2.svh") == ["/ws/top.sv"]
+
+    # The incrementally-maintained index matches a fresh one
+    incremental = {p: sorted(collection.includers(p)) for p in collection.file_info.keys()}
+    collection.invalidate_index()
+    assert {p: sorted(collection.includers(p)) for p in collection.file_info.keys()} == incremental
+
+def test_concurrent_appends(tmp_path):
+    """Batches appended by concurrent writers are never interleaved"""
+    path = str(tmp_path / "top.json")
+    collection = _collection(400)
+    save_collection(path, collection)
+    errors = []
+
+    def save(n):
+        try:
+            for i in range(10):
+                updated = _copy(collection)
+                for f in range(200):
+                    updated.file_info["/ws/inc/f%d.svh" % f].timestamp = 10.0 + n * 100 + i
+                save_collection(path, updated, previous=collection, compact_ratio=1000.0)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert [f for f in os.listdir(tmp_path) if ".tmp-" in f] == []
+
+    # A writer may fall back to a snapshot when it races another, but each
+    # batch in the journal is whole: one writer's 200 files and its 'end'
+    lines = []
+    if os.path.isfile(journal_path(path)):
+        with open(journal_path(path), "r") as fp:
+            lines = [json.loads(l) for l in fp.read().splitlines()]
+    assert max(len(lines) - 1, 0) % 201 == 0
+    for i in range(1, len(lines), 201):
+        stamps = set(r["put"]["timestamp"] for r in lines[i:i+200])
+        assert len(stamps) == 1
+        assert lines[i+200] == {"end": 200}
+    assert load_collection(path).file_info["/ws/inc/f0.svh"].timestamp >= 10.0
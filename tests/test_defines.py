@@ -0,0 +1,164 @@
+import os
+import pytest
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _include_names(info, path):
+    return [os.path.basename(p) for p in info.file_info[path].includes]
+
+def _setup_cfg(tmp_path):
+    _write(tmp_path, "cfg.svh", "`define USE_FOO\n")
+    _write(tmp_path, "foo.svh", "// foo\n")
+    _write(tmp_path, "bar.svh", "// bar\n")
+    return _write(tmp_path, "top.sv", """
+`include "cfg.svh"
+`ifdef USE_FOO
+`include "foo.svh"
+`else
+`include "bar.svh"
+`endif
+""")
+
+def test_user_defines(build_cls, tmp_path):
+    _write(tmp_path, "gate.svh", "// gate\n")
+    _write(tmp_path, "rtl.svh", "// rtl\n")
+    top = _write(tmp_path, "top.sv", """
+`ifdef GATE_LEVEL
+`include "gate.svh"
+`else
+`include "rtl.svh"
+`endif
+""")
+
+    info = build_cls([top], defines={"GATE_LEVEL": None}).build()
+    assert _include_names(info, top) == ["gate.svh"]
+
+    info = build_cls([top], defines={}).build()
+    assert _include_names(info, top) == ["rtl.svh"]
+
+def test_file_local_macros(build_cls, tmp_path):
+    """Without compilation-unit mode, included defines don't reach the includer"""
+    top = _setup_cfg(tmp_path)
+    info = build_cls([top], defines={}).build()
+    assert _include_names(info, top) == ["cfg.svh", "bar.svh"]
+
+def test_compilation_unit_include(build_cls, tmp_path):
+    """In compilation-unit mode, macros flow out of included files"""
+    top = _setup_cfg(tmp_path)
+    info = build_cls([top], compilation_unit=True).build()
+    assert _include_names(info, top) == ["cfg.svh", "foo.svh"]
+    assert not any(os.path.basename(p) == "bar.svh" for p in info.file_info.keys())
+
+def test_compilation_unit_across_roots(build_cls, tmp_path):
+    """In compilation-unit mode, macros flow from one root file to the next"""
+    _write(tmp_path, "foo.svh", "// foo\n")
+    _write(tmp_path, "bar.svh", "// bar\n")
+    root1 = _write(tmp_path, "root1.sv", "`define FROM_ROOT1\n")
+    root2 = _write(tmp_path, "root2.sv", """
+`ifdef FROM_ROOT1
+`include "foo.svh"
+`else
+`include "bar.svh"
+`endif
+""")
+
+    info = build_cls([root1, root2], compilation_unit=True).build()
+    assert _include_names(info, root2) == ["foo.svh"]
+
+    info = build_cls([root1, root2], defines={}).build()
+    assert _include_names(info, root2) == ["bar.svh"]
+
+def test_compilation_unit_reinclude(build_cls, tmp_path):
+    """A header is re-evaluated under the macro state at each inclusion"""
+    _write(tmp_path, "a.svh", "// a\n")
+    _write(tmp_path, "b.svh", "// b\n")
+    _write(tmp_path, "sel.svh", """
+`ifdef SEL_B
+`include "b.svh"
+`else
+`include "a.svh"
+`endif
+""")
+    top = _write(tmp_path, "top.sv", """
+`include "sel.svh"
+`define SEL_B
+`include "sel.svh"
+""")
+
+    info = build_cls([top], compilation_unit=True).build()
+    sel = os.path.join(str(tmp_path), "sel.svh")
+    assert _include_names(info, sel) == ["a.svh", "b.svh"]
+    assert _include_names(info, top) == ["sel.svh", "sel.svh"]
+
+def test_define_body_ignored(build_cls, tmp_path):
+    """Directives inside a macro body don't affect conditional state"""
+    _write(tmp_path, "foo.svh", "// foo\n")
+    top = _write(tmp_path, "top.sv", """
+`define M(x) \\
+  `ifdef x \\
+  `endif
+`ifndef NOT_DEFINED
+`include "foo.svh"
+`endif
+""")
+    info = build_cls([top], compilation_unit=True).build()
+    assert _include_names(info, top) == ["foo.svh"]
+
+def _setup_configs(tmp_path):
+    _write(tmp_path, "gate.svh", "// gate\n")
+    _write(tmp_path, "rtl.svh", "// rtl\n")
+    _write(tmp_path, "fast.svh", "// fast\n")
+    _write(tmp_path, "common.svh", """
+`ifdef FAST_SIM
+`include "fast.svh"
+`endif
+""")
+    return _write(tmp_path, "top.sv", """
+`include "common.svh"
+`ifdef GATE_LEVEL
+`include "gate.svh"
+`else
+`include "rtl.svh"
+`endif
+""")
+
+def test_define_sets(build_cls, tmp_path):
+    """Each define set yields the same collection as a separate build"""
+    top = _setup_configs(tmp_path)
+    define_sets = [{"GATE_LEVEL": None}, {}, {"GATE_LEVEL": "1"}]
+
+    infos = build_cls([top], defines={"FAST_SIM": None}).build_define_sets(define_sets)
+    assert len(infos) == len(define_sets)
+
+    for info, define_set in zip(infos, define_sets):
+        defines = {"FAST_SIM": None}
+        defines.update(define_set)
+        expected = build_cls([top], defines=defines).build()
+        assert info.to_dict() == expected.to_dict()
+
+    common = os.path.join(str(tmp_path), "common.svh")
+    assert _include_names(infos[0], top) == ["common.svh", "gate.svh"]
+    assert _include_names(infos[1], top) == ["common.svh", "rtl.svh"]
+    assert _include_names(infos[0], common) == ["fast.svh"]
+
+def test_define_sets_scan_once(tmp_path, monkeypatch):
+    """The Python builder extracts directives once per file across define sets"""
+    import svdep.task_build_file_collection as tbfc
+    top = _setup_configs(tmp_path)
+
+    scanned = []
+    scan_directives = tbfc.scan_directives
+    def scan_directives_w(content):
+        scanned.append(content)
+        return scan_directives(content)
+    monkeypatch.setattr(tbfc, "scan_directives", scan_directives_w)
+
+    PyTaskBuildFileCollection([top]).build_define_sets(
+        [{"GATE_LEVEL": None}, {}, {"FAST_SIM": None}])
+    # top.sv, common.svh, gate.svh, rtl.svh, fast.svh
+    assert len(scanned) == 5
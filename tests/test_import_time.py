@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import svdep
+
+def _importtime(code):
+    """Runs 'code' under 'python -X importtime'. Returns {module: cumulative us}"""
+    env = dict(os.environ)
+    srcdir = os.path.dirname(os.path.dirname(os.path.abspath(svdep.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join([srcdir] + ([env["PYTHONPATH"]] if "PYTHONPATH" in env else []))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, capture_output=True, text=True, check=True)
+
+    ret = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            ret[fields[2].strip()] = int(fields[1])
+    return ret
+
+def test_import_is_lazy():
+    """'import svdep' doesn't import ply or touch the native library"""
+    modules = _importtime("import svdep")
+    assert "svdep" in modules.keys()
+    for heavy in ("ply", "ply.lex", "svdep.native", "svdep.svpp_lexer", "ctypes"):
+        assert heavy not in modules.keys(), "%s imported (svdep: %dus)" % (heavy, modules["svdep"])
+
+def test_check_without_lexer(tmp_path):
+    """Loading and checking a collection never imports the lexer"""
+    modules = _importtime("""
+import svdep
+c = svdep.FileCollection.from_dict({"root_files": [], "file_info": {}})
+svdep._PythonTaskCheckUpToDate([]).check(c, 0)
+""")
+    assert "svdep.task_check_up_to_date" in modules.keys()
+    assert "ply" not in modules.keys()
+    assert "svdep.svpp_lexer" not in modules.keys()
+
+def test_lexer_on_use(tmp_path):
+    """ply is imported once the Python scanner actually runs"""
+    path = tmp_path / "top.sv"
+    path.write_text("// top\\n")
+    modules = _importtime("""
+import svdep
+svdep._PythonTaskBuildFileCollection([%r]).build()
+""" % str(path))
+    assert "ply.lex" in modules.keys()
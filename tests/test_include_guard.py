@@ -0,0 +1,89 @@
+import os
+import pytest
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+GUARDED = """// Header comment
+`ifndef G_SVH
+`define G_SVH
+`ifdef SEL_B
+`include "b.svh"
+`else
+`include "a.svh"
+`endif
+`endif // G_SVH
+"""
+
+@pytest.mark.parametrize("content,guard", [
+    (GUARDED, "G_SVH"),
+    ("/* c */ `ifndef X\n`define X\n`endif\n/* trailing */\n", "X"),
+    ("`timescale 1ns/1ps\n`ifndef X\n`define X\n`endif\n", None),
+    ("module m; endmodule\n`ifndef X\n`define X\n`endif\n", None),
+    ("`ifndef X\n`define X\n`endif\nmodule m; endmodule\n", None),
+    ("`ifndef X\n`define X\n`else\n`endif\n", None),
+    ("`ifndef X\n`define X\n`endif\n`ifndef Y\n`endif\n", None),
+    ("`ifdef X\n`endif\n", None),
+])
+def test_guard_detection(build_cls, tmp_path, content, guard):
+    hdr = _write(tmp_path, "hdr.svh", content)
+    top = _write(tmp_path, "top.sv", '`include "hdr.svh"\n')
+    info = build_cls([top], compilation_unit=True).build()
+    assert info.file_info[hdr].guard == guard
+
+def test_guard_skips_reinclude(build_cls, tmp_path):
+    """A guarded header is not re-processed while its guard is defined"""
+    _write(tmp_path, "a.svh", "// a\n")
+    _write(tmp_path, "b.svh", "// b\n")
+    g = _write(tmp_path, "g.svh", GUARDED)
+    top = _write(tmp_path, "top.sv", """
+`include "g.svh"
+`define SEL_B
+`include "g.svh"
+""")
+
+    info = build_cls([top], compilation_unit=True).build()
+    assert [os.path.basename(p) for p in info.file_info[g].includes] == ["a.svh"]
+    assert not any(os.path.basename(p) == "b.svh" for p in info.file_info.keys())
+
+def test_guard_persisted(build_cls, tmp_path):
+    """Guards from a previous collection let unchanged headers be skipped"""
+    from svdep import FileCollection
+    _write(tmp_path, "a.svh", "// a\n")
+    _write(tmp_path, "x.svh", "// x\n")
+    g = _write(tmp_path, "g.svh", GUARDED)
+    top = _write(tmp_path, "top.sv", '`include "g.svh"\n')
+
+    info = build_cls([top], compilation_unit=True).build()
+    assert info.file_info[g].guard == "G_SVH"
+    previous = FileCollection.from_dict(info.to_dict())
+
+    # Change the header's content without changing its timestamp. Since
+    # the recorded guard is trusted, the new content is never read
+    st = os.stat(g)
+    _write(tmp_path, "g.svh", '`include "x.svh"\n')
+    os.utime(g, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    info = build_cls(
+        [top], defines={"G_SVH": None}, compilation_unit=True,
+        previous=previous).build()
+    assert info.file_info[g].includes == []
+    assert info.file_info[g].guard == "G_SVH"
+
+def test_guard_json(tmp_path):
+    from svdep import FileCollection
+    from svdep.file_info import FileInfo
+    info = FileCollection()
+    info.file_info["a.svh"] = FileInfo("a.svh", 1.0, guard="A_SVH")
+    info.file_info["b.svh"] = FileInfo("b.svh", 1.0)
+
+    d = info.to_dict()
+    assert d["file_info"]["a.svh"]["guard"] == "A_SVH"
+    assert "guard" not in d["file_info"]["b.svh"]
+
+    info = FileCollection.from_dict(d)
+    assert info.file_info["a.svh"].guard == "A_SVH"
+    assert info.file_info["b.svh"].guard is None
@@ -0,0 +1,78 @@
+import os
+import pytest
+from svdep import native
+
+@pytest.fixture
+def isfile_calls(monkeypatch):
+    calls = []
+    isfile = os.path.isfile
+    def isfile_w(path):
+        calls.append(path)
+        return isfile(path)
+    monkeypatch.setattr(os.path, "isfile", isfile_w)
+    return calls
+
+def test_env_override(monkeypatch, isfile_calls):
+    monkeypatch.setenv(native.NATIVE_LIB_ENV, "/opt/svdep/libsvdep.so")
+    assert native._find_native_library() == "/opt/svdep/libsvdep.so"
+    monkeypatch.setenv(native.NATIVE_LIB_ENV, "none")
+    assert native._find_native_library() is None
+    assert isfile_calls == []
+
+def test_cached_discovery(tmp_path, monkeypatch, isfile_calls):
+    libdir = tmp_path / "lib"
+    libdir.mkdir()
+    lib = libdir / native._native_lib_name()
+    lib.write_text("")
+    monkeypatch.delenv(native.NATIVE_LIB_ENV, raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(native, "_search_paths", lambda: [str(tmp_path / "none"), str(libdir)])
+
+    assert native._find_native_library() == str(lib)
+    assert len(isfile_calls) == 3
+
+    # The second lookup goes straight to the recorded path
+    del isfile_calls[:]
+    assert native._find_native_library() == str(lib)
+    assert isfile_calls[1:] == [str(lib)]
+
+    # No directory searched ahead of the library is looked at, even one
+    # that has changed
+    (tmp_path / "none").mkdir()
+    first = tmp_path / "none" / native._native_lib_name()
+    first.write_text("")
+    del isfile_calls[:]
+    assert native._find_native_library() == str(lib)
+    assert isfile_calls[1:] == [str(lib)]
+
+    # A stale record falls back to a full search
+    os.remove(str(lib))
+    assert native._find_native_library() == str(first)
+    del isfile_calls[:]
+    assert native._find_native_library() == str(first)
+    assert isfile_calls[1:] == [str(first)]
+    os.remove(str(first))
+    assert native._find_native_library() is None
+
+def test_unwritable_cache(tmp_path, monkeypatch):
+    libdir = tmp_path / "lib"
+    libdir.mkdir()
+    lib = libdir / native._native_lib_name()
+    lib.write_text("")
+    monkeypatch.delenv(native.NATIVE_LIB_ENV, raising=False)
+    monkeypatch.setattr(native, "_search_paths", lambda: [str(libdir)])
+
+    # The cache directory can't be created under a file, whoever runs
+    # the test. Each lookup searches instead
+    (tmp_path / "cache").write_text("")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    assert native._find_native_library() == str(lib)
+    assert native._find_native_library() == str(lib)
+
+    # Nor is a temporary left behind when the record can't be replaced
+    def replace(src, dst):
+        raise PermissionError(13, "Permission denied", dst)
+    monkeypatch.setattr(os, "replace", replace)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "ro"))
+    assert native._find_native_library() == str(lib)
+    assert os.listdir(str(tmp_path / "ro" / "svdep")) == []
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import pytest
+from svdep import FileCollection, PathVars
+from svdep.__main__ import main, EXIT_OK, EXIT_STALE, EXIT_ERROR
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(ws):
+    _write(ws, "ip/defs.svh", "// defs\n")
+    _write(ws, "rtl/pkg.svh", '`include "defs.svh"\n')
+    return _write(ws, "rtl/top.sv", '`include "pkg.svh"\n')
+
+def test_encode_decode():
+    vars = PathVars({"WS": "/work/ws/", "IP": "/work/ws/ip"})
+    # The longest matching directory is used
+    assert vars.encode("/work/ws/ip/defs.svh") == "${IP}/defs.svh"
+    assert vars.encode("/work/ws/rtl/top.sv") == "${WS}/rtl/top.sv"
+    assert vars.encode("/work/ws") == "${WS}"
+    assert vars.encode("/work/ws2/top.sv") == "/work/ws2/top.sv"
+    assert vars.encode("/tools/uvm.sv") == "/tools/uvm.sv"
+
+    other = PathVars({"WS": "/ci/build/42", "IP": "/ci/build/42/ip"})
+    assert other.decode("${IP}/defs.svh") == "/ci/build/42/ip/defs.svh"
+    assert other.decode("/tools/uvm.sv") == "/tools/uvm.sv"
+    with pytest.raises(ValueError):
+        PathVars().decode("${WS}/rtl/top.sv")
+    with pytest.raises(ValueError):
+        PathVars.parse(["WS"])
+
+def test_relocate(build_cls, tmp_path):
+    ws1 = str(tmp_path / "ws1")
+    top = _setup(ws1)
+    info = build_cls([top], incdirs=[os.path.join(ws1, "ip")]).build()
+
+    d = info.to_dict(PathVars({"WS": ws1}))
+    assert all(p.startswith("${WS}/") for p in d["file_info"].keys())
+
+    ws2 = str(tmp_path / "ws2")
+    loaded = FileCollection.from_dict(json.loads(json.dumps(d)), PathVars({"WS": ws2}))
+    assert loaded.root_files[0].name == os.path.join(ws2, "rtl", "top.sv")
+    assert loaded.closure(loaded.root_files[0].name) == [
+        os.path.join(ws2, "rtl", "top.sv"),
+        os.path.join(ws2, "rtl", "pkg.svh"),
+        os.path.join(ws2, "ip", "defs.svh")]
+
+    # Without variables, collections are written as before
+    assert FileCollection.from_dict(info.to_dict()) == info
+
+def test_relocate_cmd(tmp_path, monkeypatch):
+    ws1 = str(tmp_path / "ws1")
+    top1 = _setup(ws1)
+    collection = str(tmp_path / "top.json")
+
+    monkeypatch.chdir(ws1)
+    assert main(["build", "-c", collection, "--path-var", "WS=.", top1, "+incdir+ip"]) == EXIT_OK
+    with open(collection) as fp:
+        assert "${WS}/rtl/top.sv" in json.load(fp)["file_info"].keys()
+
+    # A fresh checkout elsewhere reuses the collection as-is
+    ws2 = str(tmp_path / "ws2")
+    shutil.copytree(ws1, ws2)
+    later = os.path.getmtime(collection) + 10
+    os.utime(collection, (later, later))
+    monkeypatch.chdir(ws2)
+    top2 = os.path.join(ws2, "rtl", "top.sv")
+    check = ["check", "-c", collection, "--path-var", "WS=.", top2, "+incdir+ip"]
+    assert main(check) == EXIT_OK
+    os.utime(os.path.join(ws2, "ip", "defs.svh"), (later + 10, later + 10))
+    assert main(check) == EXIT_STALE
+
+    # The collection can't be loaded without its variable
+    assert main(["deps", "-c", collection]) == EXIT_ERROR
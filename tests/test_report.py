@@ -0,0 +1,83 @@
+import os
+import pytest
+from svdep.__main__ import main, EXIT_OK
+from svdep.file_deps_report import FileDepsReport
+from svdep.native import is_native_available, NativeTaskCheckUpToDate
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+from svdep.task_check_up_to_date import TaskCheckUpToDate as PyTaskCheckUpToDate
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(tmp_path):
+    _write(tmp_path, "inc2/a.svh", "// a\n")
+    _write(tmp_path, "inc2/b.svh", "// b\n")
+    top = _write(tmp_path, "top.sv", '`include "a.svh"\n`include "b.svh"\n`include "a.svh"\n')
+    incdirs = [os.path.join(tmp_path, "inc1"), os.path.join(tmp_path, "inc2")]
+    return top, incdirs
+
+def test_build_report(build_cls, tmp_path):
+    top, incdirs = _setup(tmp_path)
+    cache = os.path.join(tmp_path, "scan.cache")
+
+    task = build_cls([top], incdirs=incdirs, defines={}, scan_cache=cache)
+    task.build()
+    report = task.report
+    assert report.files_scanned == 3
+    assert report.bytes_read == sum(os.path.getsize(p) for p in [
+        top, os.path.join(incdirs[1], "a.svh"), os.path.join(incdirs[1], "b.svh")])
+    # a.svh and b.svh are each found in the second directory
+    assert report.include_probes == 4
+    assert report.include_probes_failed == 2
+    assert report.include_cache_hits == 1
+    assert report.scan_cache_misses == 3
+    assert report.scan_cache_hits == 0
+    assert report.stats >= 3 + report.include_probes
+    assert report.time_total > 0
+    assert report.time_total >= report.time_read
+
+    # Unchanged files are served from the persistent scan cache
+    task = build_cls([top], incdirs=incdirs, defines={}, scan_cache=cache)
+    task.build()
+    assert task.report.files_scanned == 0
+    assert task.report.bytes_read == 0
+    assert task.report.scan_cache_hits == 3
+
+@pytest.mark.parametrize("impl", ["python", "native"])
+def test_check_report(impl, tmp_path):
+    if impl == "native" and not is_native_available():
+        pytest.skip("Native library not available")
+    check_cls = PyTaskCheckUpToDate if impl == "python" else NativeTaskCheckUpToDate
+    top, incdirs = _setup(tmp_path)
+    info = PyTaskBuildFileCollection([top], incdirs=incdirs).build()
+
+    task = check_cls([top], incdirs)
+    assert task.check(info, os.path.getmtime(top) + 10)
+    assert task.report.files_checked == 3
+    assert task.report.stats == 3
+    assert task.report.files_scanned == 0
+
+def test_report_dict():
+    report = FileDepsReport(files_scanned=2, time_read=0.5)
+    other = FileDepsReport.from_dict(dict(report.to_dict(), unknown=1))
+    other.add(report)
+    assert other.files_scanned == 4
+    assert other.time_read == 1.0
+    assert "files_scanned:" in other.format()
+
+def test_stats_cmd(tmp_path, capsys, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    top, incdirs = _setup(tmp_path)
+    args = ["top.sv", "+incdir+inc1+inc2", "-c", "unit.json"]
+    assert main(["build", "--stats"] + args) == EXIT_OK
+    err = capsys.readouterr().err
+    assert "files_scanned:" in err
+    assert "time_json:" in err
+
+    assert main(["check", "--stats"] + args) == EXIT_OK
+    lines = dict(l.split(":", 1) for l in capsys.readouterr().err.splitlines())
+    assert int(lines["files_checked"]) == 3
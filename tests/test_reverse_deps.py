@@ -0,0 +1,77 @@
+import os
+from svdep.__main__ import main, EXIT_OK
+from svdep.file_collection import FileCollection
+from svdep.file_info import FileInfo
+
+def _collection():
+    """Roots r1 and r2. r1 includes a and c; a includes b; r2 includes c"""
+    ret = FileCollection()
+    for name, includes in [("r1", ["a", "c"]), ("a", ["b"]), ("b", []),
+                           ("c", []), ("r2", ["c", "c"])]:
+        ret.file_info[name] = FileInfo(name, 0, includes=includes)
+    ret.root_files = [ret.file_info["r1"], ret.file_info["r2"]]
+    return ret
+
+def test_includers():
+    c = _collection()
+    assert c.includers("c") == ["r1", "r2"]
+    assert c.includers("b") == ["a"]
+    assert c.includers("r1") == []
+    assert c.includers("unknown") == []
+
+def test_affected_roots():
+    c = _collection()
+    assert c.affected_roots("b") == ["r1"]
+    assert c.affected_roots("c") == ["r1", "r2"]
+    assert c.affected_roots("r2") == ["r2"]
+    assert c.affected_roots("unknown") == []
+
+def test_update_file():
+    c = _collection()
+    assert c.affected_roots("b") == ["r1"]
+
+    # r2 now includes a instead of c
+    c.update_file(FileInfo("r2", 0, includes=["a"]))
+    assert c.includers("c") == ["r1"]
+    assert c.includers("a") == ["r1", "r2"]
+    assert c.affected_roots("b") == ["r1", "r2"]
+
+    c.update_file(FileInfo("d", 0, includes=["b"]))
+    assert c.includers("b") == ["a", "d"]
+
+    c.remove_file("a")
+    assert c.includers("b") == ["d"]
+    assert c.affected_roots("b") == []
+
+    # The incrementally-maintained index matches a fresh one
+    incremental = {p: c.includers(p) for p in c.file_info.keys()}
+    c.invalidate_index()
+    assert {p: sorted(c.includers(p)) for p in c.file_info.keys()} == \
+        {p: sorted(l) for p, l in incremental.items()}
+
+    # An entry modified in place, without invalidating the index, can
+    # still be replaced and removed
+    c.file_info["d"].includes.append("c")
+    c.update_file(FileInfo("d", 0, includes=["b"]))
+    c.remove_file("d")
+    assert c.includers("b") == []
+
+def test_affected_cmd(tmp_path, capsys, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, content in [("a.svh", '`include "b.svh"\n'), ("b.svh", ""), ("c.svh", ""),
+                          ("u1.sv", '`include "a.svh"\n'), ("u2.sv", '`include "c.svh"\n')]:
+        with open(name, "w") as fp:
+            fp.write(content)
+    assert main(["build", "-c", "u1.json", "u1.sv"]) == EXIT_OK
+    assert main(["build", "-c", "u2.json", "u2.sv"]) == EXIT_OK
+    with open("units.txt", "w") as fp:
+        fp.write("u1.json u1.sv\nu2.json u2.sv\n")
+
+    assert main(["affected", "-c", "u1.json", os.path.join(str(tmp_path), "b.svh")]) == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == ["u1.sv"]
+
+    assert main(["affected", "--manifest", "units.txt", "c.svh"]) == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == ["u2.json"]
+
+    assert main(["affected", "--manifest", "units.txt", "b.svh", "c.svh"]) == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == ["u1.json", "u2.json"]
@@ -0,0 +1,112 @@
+import os
+import threading
+import pytest
+from svdep.scan_cache import SCANNER, load_scan_cache, save_scan_cache
+from svdep.svpp_directives import DirectiveScan
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _include_names(info, path):
+    return [os.path.basename(p) for p in info.file_info[path].includes]
+
+def _setup(tmp_path):
+    _write(tmp_path, "a.svh", "// a\n")
+    _write(tmp_path, "b.svh", "// b\n")
+    _write(tmp_path, "c.svh", "// c\n")
+    return _write(tmp_path, "top.sv", """
+`ifdef USE_C
+`include "c.svh"
+`endif
+`include "a.svh"
+""")
+
+def test_scan_cache_replay(build_cls, tmp_path):
+    """Unchanged files are evaluated from the cache, not re-read"""
+    top = _setup(tmp_path)
+    cache = os.path.join(str(tmp_path), "scan.cache")
+
+    info = build_cls([top], defines={}, scan_cache=cache).build()
+    assert _include_names(info, top) == ["a.svh"]
+    assert os.path.isfile(cache)
+
+    # Rewrite the file with the same size and modification time. Only a
+    # build that replays the cached skeleton still sees a.svh
+    st = os.stat(top)
+    with open(top, "r") as fp:
+        content = fp.read()
+    _write(tmp_path, "top.sv", content.replace("a.svh", "b.svh"))
+    os.utime(top, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    info = build_cls([top], defines={"USE_C": None}, scan_cache=cache).build()
+    assert _include_names(info, top) == ["c.svh", "a.svh"]
+
+    # Once the modification time moves, the file is scanned again
+    os.utime(top, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+    info = build_cls([top], defines={}, scan_cache=cache).build()
+    assert _include_names(info, top) == ["b.svh"]
+
+def test_scan_cache_corrupt(build_cls, tmp_path):
+    """An unusable cache file is ignored and replaced"""
+    top = _setup(tmp_path)
+    cache = _write(tmp_path, "scan.cache", "svdep-scan-cache 1 other\nfile x\n")
+
+    info = build_cls([top], defines={}, scan_cache=cache).build()
+    assert _include_names(info, top) == ["a.svh"]
+    with open(cache, "r") as fp:
+        assert fp.readline().startswith("svdep-scan-cache 1 ")
+
+def test_scan_cache_format(tmp_path):
+    """The Python cache round-trips, including characters that need escaping"""
+    cache = os.path.join(str(tmp_path), "scan.cache")
+    scans = {
+        "/p/with space\\and\nnewline.sv": DirectiveScan(
+            directives=[("ifndef", "G"), ("define", "G"),
+                        ("include", "sub dir/x.svh"), ("else", ""), ("endif", "")],
+            guard="G", mtime_ns=1234567890123456789, size=42),
+        "/p/unvalidated.sv": DirectiveScan(directives=[("include", "y.svh")]),
+    }
+    save_scan_cache(cache, scans)
+
+    with open(cache, "r") as fp:
+        lines = fp.read().splitlines()
+    assert lines[0] == "svdep-scan-cache 1 " + SCANNER
+    assert lines[1] == "file 1234567890123456789 42 /p/with space\\\\and\\nnewline.sv"
+    assert lines[2:] == ["guard G", "ifndef G", "define G",
+                         "include sub dir/x.svh", "else", "endif", "end"]
+
+    loaded = load_scan_cache(cache)
+    assert list(loaded.keys()) == ["/p/with space\\and\nnewline.sv"]
+    assert loaded["/p/with space\\and\nnewline.sv"] == scans["/p/with space\\and\nnewline.sv"]
+
+    # A truncated cache is discarded as a whole
+    with open(cache, "w") as fp:
+        fp.write("\n".join(lines[:-1]) + "\n")
+    assert load_scan_cache(cache) == {}
+
+def test_scan_cache_concurrent_saves(build_cls, tmp_path):
+    """Builds saving the same cache at once each write their own temporary"""
+    top = _setup(tmp_path)
+    cache = os.path.join(str(tmp_path), "scan.cache")
+    errors = []
+
+    def build():
+        try:
+            for _ in range(10):
+                build_cls([top], defines={}, scan_cache=cache).build()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sorted(os.listdir(str(tmp_path))) == ["a.svh", "b.svh", "c.svh", "scan.cache", "top.sv"]
+    # The cache left behind is complete
+    task = build_cls([top], defines={}, scan_cache=cache)
+    task.build()
+    assert task.report.files_scanned == 0
@@ -0,0 +1,139 @@
+import os
+import pytest
+from svdep.build_unit import BuildUnit
+from svdep.scan_store import ScanStore, scan_key
+from svdep.task_build_file_collection import TaskBuildFileCollection as PyTaskBuildFileCollection
+from svdep.task_build_units import TaskBuildUnits as PyTaskBuildUnits
+from svdep.__main__ import main, EXIT_OK
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _workspace(base):
+    """A unit whose files are identical in every workspace"""
+    _write(base, "inc/a.svh", "`ifndef A_SVH\n`define A_SVH\n`endif\n")
+    _write(base, "inc/b.svh", "// b\n")
+    return _write(base, "top.sv", '`ifdef USE_B\n`include "b.svh"\n`endif\n`include "a.svh"\n')
+
+def _entries(store):
+    return [os.path.join(d, f) for d, _, files in os.walk(store) for f in files]
+
+def test_shared_between_workspaces(build_cls, tmp_path):
+    store = os.path.join(str(tmp_path), "store")
+    ws1 = os.path.join(str(tmp_path), "ws1")
+    ws2 = os.path.join(str(tmp_path), "ws2")
+
+    task = build_cls([_workspace(ws1)], incdirs=[os.path.join(ws1, "inc")],
+                     defines={"USE_B": None}, scan_store=store)
+    task.build()
+    assert task.report.files_scanned == 3
+    assert task.report.scan_store_misses == 3
+    assert len(_entries(store)) == 3
+
+    # The same content at other paths is not scanned again
+    top = _workspace(ws2)
+    task = build_cls([top], incdirs=[os.path.join(ws2, "inc")],
+                     defines={"USE_B": None}, scan_store=store)
+    info = task.build()
+    assert task.report.files_scanned == 0
+    assert task.report.scan_store_hits == 3
+    assert info.file_info[top].includes == [
+        os.path.join(ws2, "inc", "b.svh"), os.path.join(ws2, "inc", "a.svh")]
+    assert info.file_info[os.path.join(ws2, "inc", "a.svh")].guard == "A_SVH"
+
+def test_without_conditionals(tmp_path):
+    """Python builds that follow every `include use the store too"""
+    store = os.path.join(str(tmp_path), "store")
+    for i, ws in enumerate(["ws1", "ws2"]):
+        ws = os.path.join(str(tmp_path), ws)
+        top = _workspace(ws)
+        task = PyTaskBuildFileCollection([top], incdirs=[os.path.join(ws, "inc")], scan_store=store)
+        info = task.build()
+        assert len(info.file_info) == 3
+        assert task.report.files_scanned == (3 if i == 0 else 0)
+
+        task = PyTaskBuildUnits([BuildUnit([top], incdirs=[os.path.join(ws, "inc")])], scan_store=store)
+        assert len(task.build()[0].file_info) == 3
+        assert task.report.files_scanned == 0
+
+def test_units(units_cls, tmp_path):
+    store = os.path.join(str(tmp_path), "store")
+    for i, ws in enumerate(["ws1", "ws2"]):
+        ws = os.path.join(str(tmp_path), ws)
+        task = units_cls([
+            BuildUnit([_workspace(ws)], incdirs=[os.path.join(ws, "inc")], defines={}),
+            BuildUnit([_workspace(ws)], incdirs=[os.path.join(ws, "inc")], defines={"USE_B": None})],
+            scan_store=store)
+        collections = task.build()
+        assert len(collections[1].file_info) == 3
+        assert task.report.files_scanned == (3 if i == 0 else 0)
+
+def test_bad_entries_ignored(build_cls, tmp_path):
+    store = os.path.join(str(tmp_path), "store")
+    ws = os.path.join(str(tmp_path), "ws")
+    top = _workspace(ws)
+    build_cls([top], incdirs=[os.path.join(ws, "inc")], defines={}, scan_store=store).build()
+
+    # Truncate every entry, as if its writer had been killed
+    for path in _entries(store):
+        with open(path, "r") as fp:
+            content = fp.read()
+        with open(path, "w") as fp:
+            fp.write(content[:content.index("\nend")])
+
+    task = build_cls([top], incdirs=[os.path.join(ws, "inc")], defines={}, scan_store=store)
+    info = task.build()
+    assert task.report.files_scanned == 2
+    assert len(info.file_info) == 2
+
+    # The entries were replaced
+    task = build_cls([top], incdirs=[os.path.join(ws, "inc")], defines={}, scan_store=store)
+    task.build()
+    assert task.report.files_scanned == 0
+
+def test_unwritable_store(build_cls, tmp_path):
+    store = _write(str(tmp_path), "store", "not a directory\n")
+    ws = os.path.join(str(tmp_path), "ws")
+    task = build_cls([_workspace(ws)], incdirs=[os.path.join(ws, "inc")], defines={}, scan_store=store)
+    assert len(task.build().file_info) == 2
+    assert task.report.files_scanned == 2
+
+class _DictStore(ScanStore):
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key, None)
+
+    def put(self, key, data):
+        self.entries[key] = data
+
+def test_custom_backend(tmp_path):
+    store = _DictStore()
+    top = _workspace(str(tmp_path))
+    with open(top, "r") as fp:
+        content = fp.read()
+
+    PyTaskBuildFileCollection([top], incdirs=[os.path.join(str(tmp_path), "inc")],
+                              defines={}, scan_store=store).build()
+    assert scan_key(content) in store.entries
+    assert len(store.entries) == 2
+
+    task = PyTaskBuildFileCollection([top], incdirs=[os.path.join(str(tmp_path), "inc")],
+                                     defines={}, scan_store=store)
+    task.build()
+    assert task.report.files_scanned == 0
+
+def test_scan_store_cmd(tmp_path):
+    store = os.path.join(str(tmp_path), "store")
+    for ws in ["ws1", "ws2"]:
+        ws = os.path.join(str(tmp_path), ws)
+        top = _workspace(ws)
+        assert main(["build", "-c", os.path.join(ws, "top.json"), "--scan-store", store,
+                     "+incdir+%s" % os.path.join(ws, "inc"), "+define+USE_B", top]) == EXIT_OK
+    assert len(_entries(store)) == 3
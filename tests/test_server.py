@@ -0,0 +1,101 @@
+import os
+import threading
+import pytest
+from svdep import client
+from svdep.server import SvdepServer
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+@pytest.fixture(params=[False, True], ids=["stat", "watch"])
+def server(request, tmp_path):
+    # Keep the socket path short: sun_path is limited to ~100 bytes
+    socket_path = os.path.join(str(tmp_path), "s")
+    server = SvdepServer(socket_path, watch=request.param)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    client.request(socket_path, ["shutdown"])
+    thread.join()
+    server.server_close()
+
+def test_server_commands(server, tmp_path):
+    _write(tmp_path, "foo.svh", "// foo\n")
+    _write(tmp_path, "top.sv", "`include \"foo.svh\"\n")
+    cwd = str(tmp_path)
+
+    assert client.request(server.socket_path, ["ping"], cwd)["status"] == 0
+
+    # Relative paths are resolved against the client's directory
+    rsp = client.request(server.socket_path, ["check", "-c", "unit.json", "top.sv"], cwd)
+    assert rsp["status"] == 1
+    rsp = client.request(server.socket_path, ["build", "-c", "unit.json", "top.sv"], cwd)
+    assert rsp["status"] == 0
+    assert os.path.isfile(os.path.join(cwd, "unit.json"))
+    rsp = client.request(server.socket_path, ["check", "-c", "unit.json", "top.sv"], cwd)
+    assert rsp["status"] == 0
+
+    rsp = client.request(server.socket_path, ["deps", "-c", "unit.json"], cwd)
+    assert [os.path.basename(p) for p in rsp["stdout"].split()] == ["top.sv", "foo.svh"]
+
+    rsp = client.request(server.socket_path, ["check"], cwd)
+    assert rsp["status"] == 2
+    assert "requires -c/--collection" in rsp["stderr"]
+
+def test_server_cached_collection(server, tmp_path):
+    """A cached collection is re-read once its file changes"""
+    _write(tmp_path, "a.sv", "// a\n")
+    _write(tmp_path, "b.sv", "// b\n")
+    cwd = str(tmp_path)
+
+    assert client.request(server.socket_path, ["build", "-c", "unit.json", "a.sv"], cwd)["status"] == 0
+    assert client.request(server.socket_path, ["check", "-c", "unit.json", "a.sv"], cwd)["status"] == 0
+
+    # Rewritten behind the server's back
+    assert client.request(server.socket_path, ["build", "-c", "other.json", "b.sv"], cwd)["status"] == 0
+    os.replace(os.path.join(cwd, "other.json"), os.path.join(cwd, "unit.json"))
+    assert client.request(server.socket_path, ["check", "-c", "unit.json", "a.sv"], cwd)["status"] == 1
+    assert client.request(server.socket_path, ["check", "-c", "unit.json", "b.sv"], cwd)["status"] == 0
+
+def test_server_concurrent(server, tmp_path):
+    cwd = str(tmp_path)
+    for i in range(8):
+        _write(tmp_path, "inc%d.svh" % i, "// inc\n")
+        _write(tmp_path, "top%d.sv" % i, "`include \"inc%d.svh\"\n" % i)
+
+    results = {}
+    def run(i):
+        argv = ["update", "-c", "unit%d.json" % i, "top%d.sv" % i]
+        results[i] = [client.request(server.socket_path, argv, cwd)["status"] for _ in range(5)]
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: [0]*5 for i in range(8)}
+    for i in range(8):
+        rsp = client.request(server.socket_path, ["check", "-c", "unit%d.json" % i, "top%d.sv" % i], cwd)
+        assert rsp["status"] == 0
+
+def test_stale_socket(tmp_path):
+    socket_path = os.path.join(str(tmp_path), "s")
+    server = SvdepServer(socket_path)
+    try:
+        with pytest.raises(OSError):
+            SvdepServer(socket_path)
+    finally:
+        server.server_close()
+    assert not os.path.exists(socket_path)
+
+    # A socket file with no server behind it is replaced
+    import socket
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_path)
+    sock.close()
+    server = SvdepServer(socket_path)
+    server.server_close()
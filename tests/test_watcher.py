@@ -0,0 +1,148 @@
+import errno
+import os
+import pytest
+from svdep.task_build_file_collection import TaskBuildFileCollection
+from svdep.watcher import ChangeTracker, _Inotify
+
+def _write(dir, name, content):
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+    return path
+
+def _setup(tmp_path):
+    _write(tmp_path, "inc/a.svh", "// a\n")
+    _write(tmp_path, "inc/b.svh", "`include \"a.svh\"\n")
+    top = _write(tmp_path, "top.sv", "`include \"b.svh\"\n")
+    collection = TaskBuildFileCollection([top], incdirs=[os.path.join(str(tmp_path), "inc")]).build()
+    timestamp = max(os.path.getmtime(p) for p in collection.file_info.keys()) + 1
+    return top, collection, timestamp
+
+def _touch(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+@pytest.fixture(params=["inotify", "stat"])
+def tracker(request):
+    ret = ChangeTracker(use_inotify=(request.param == "inotify"))
+    if request.param == "inotify" and not ret.watching:
+        pytest.skip("inotify not available")
+    yield ret
+    ret.close()
+
+def test_tracker_check(tracker, tmp_path):
+    top, collection, ts = _setup(tmp_path)
+    a = os.path.join(str(tmp_path), "inc", "a.svh")
+
+    assert tracker.check(collection, [top], ts)
+    assert not tracker.check(collection, [top, top], ts)
+
+    _touch(a, ts + 10)
+    assert not tracker.check(collection, [top], ts)
+    assert tracker.check(collection, [top], ts + 10)
+
+    # Restoring the old mtime makes it up to date again
+    _touch(a, ts - 10)
+    assert tracker.check(collection, [top], ts)
+
+    os.remove(a)
+    assert not tracker.check(collection, [top], ts)
+    _write(tmp_path, "inc/a.svh", "// a\n")
+    _touch(a, ts - 10)
+    assert tracker.check(collection, [top], ts)
+
+def test_tracker_no_stat_when_unchanged(tmp_path, monkeypatch):
+    tracker = ChangeTracker()
+    if not tracker.watching:
+        pytest.skip("inotify not available")
+    top, collection, ts = _setup(tmp_path)
+    assert tracker.check(collection, [top], ts)
+
+    stats = []
+    os_stat = os.stat
+    def stat_w(path, *args, **kwargs):
+        stats.append(path)
+        return os_stat(path, *args, **kwargs)
+    monkeypatch.setattr(os, "stat", stat_w)
+
+    assert tracker.check(collection, [top], ts)
+    assert stats == []
+
+    _touch(top, ts - 5)
+    assert tracker.check(collection, [top], ts)
+    assert stats == [top]
+    tracker.close()
+
+def test_tracker_watch_limit(tmp_path, monkeypatch):
+    """Running out of watches falls back to stat checks"""
+    tracker = ChangeTracker()
+    if not tracker.watching:
+        pytest.skip("inotify not available")
+    def add_watch(self, path):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+    monkeypatch.setattr(_Inotify, "addWatch", add_watch)
+
+    top, collection, ts = _setup(tmp_path)
+    assert tracker.check(collection, [top], ts)
+    assert not tracker.watching
+
+    _touch(top, ts + 10)
+    assert not tracker.check(collection, [top], ts)
+
+def test_tracker_overflow(tmp_path, monkeypatch):
+    """Lost events make the tracker re-take its baseline"""
+    tracker = ChangeTracker()
+    if not tracker.watching:
+        pytest.skip("inotify not available")
+    top, collection, ts = _setup(tmp_path)
+    assert tracker.check(collection, [top], ts)
+
+    # Simulate the queue overflowing: the change's own event is dropped
+    read = _Inotify.read
+    def read_overflow(self):
+        for _ in read(self):
+            pass
+        yield -1, 0x4000, ""
+    monkeypatch.setattr(_Inotify, "read", read_overflow)
+    _touch(top, ts + 10)
+
+    assert not tracker.check(collection, [top], ts)
+    assert tracker.watching
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="Requires symlinks")
+def test_tracker_symlinks(tracker, tmp_path):
+    """Edits made through the real path of a symlinked file are seen"""
+    base = os.path.realpath(str(tmp_path))
+    _write(base, "ip/inc/defs.svh", "// defs\n")
+    _write(base, "ip/inc/other.svh", "// other\n")
+    _write(base, "vendor/a.svh", "// a\n")
+    _write(base, "vendor/b.svh", "// b\n")
+    os.symlink(os.path.join(base, "ip"), os.path.join(base, "ip_link"))
+    os.symlink(os.path.join(base, "vendor", "a.svh"), os.path.join(base, "a.svh"))
+    top = _write(base, "top.sv",
+        '`include "a.svh"\n`include "ip_link/inc/defs.svh"\n`include "ip/inc/other.svh"\n')
+    collection = TaskBuildFileCollection([top], incdirs=[base]).build()
+    ts = max(os.path.getmtime(p) for p in collection.file_info.keys()) + 1
+    assert tracker.check(collection, [top], ts)
+
+    _touch(os.path.join(base, "vendor", "a.svh"), ts + 10)
+    assert not tracker.check(collection, [top], ts)
+    _touch(os.path.join(base, "vendor", "a.svh"), ts - 10)
+    assert tracker.check(collection, [top], ts)
+
+    # Both spellings of a symlinked directory are tracked
+    _touch(os.path.join(base, "ip", "inc", "defs.svh"), ts + 10)
+    assert not tracker.check(collection, [top], ts)
+    _touch(os.path.join(base, "ip", "inc", "defs.svh"), ts - 10)
+    _touch(os.path.join(base, "ip", "inc", "other.svh"), ts + 10)
+    assert not tracker.check(collection, [top], ts)
+    _touch(os.path.join(base, "ip", "inc", "other.svh"), ts - 10)
+    assert tracker.check(collection, [top], ts)
+
+    # A retargeted link is followed to its new target
+    os.remove(os.path.join(base, "a.svh"))
+    os.symlink(os.path.join(base, "vendor", "b.svh"), os.path.join(base, "a.svh"))
+    _touch(os.path.join(base, "vendor", "b.svh"), ts - 10)
+    assert tracker.check(collection, [top], ts)
+    _touch(os.path.join(base, "vendor", "b.svh"), ts + 10)
+    assert not tracker.check(collection, [top], ts)
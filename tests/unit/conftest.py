@@ -63,6 +63,15 @@ def svdep_lib():
     lib.svdep_add_root_file.restype = ctypes.c_int
     lib.svdep_add_root_file.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
     
+    lib.svdep_add_define.restype = ctypes.c_int
+    lib.svdep_add_define.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+    
+    lib.svdep_clear_defines.restype = ctypes.c_int
+    lib.svdep_clear_defines.argtypes = [ctypes.c_void_p]
+    
+    lib.svdep_set_compilation_unit.restype = ctypes.c_int
+    lib.svdep_set_compilation_unit.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    
     lib.svdep_build.restype = ctypes.c_int
     lib.svdep_build.argtypes = [ctypes.c_void_p]
     
@@ -72,12 +81,46 @@ def svdep_lib():
     lib.svdep_load_json.restype = ctypes.c_int
     lib.svdep_load_json.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
     
+    lib.svdep_load_json_units.restype = ctypes.c_int
+    lib.svdep_load_json_units.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_int,
+                                          ctypes.c_char_p]
+    
     lib.svdep_check_up_to_date.restype = ctypes.c_int
     lib.svdep_check_up_to_date.argtypes = [ctypes.c_void_p, ctypes.c_double]
     
     lib.svdep_get_error.restype = ctypes.c_char_p
     lib.svdep_get_error.argtypes = [ctypes.c_void_p]
     
+    lib.svdep_set_fast_scan.restype = ctypes.c_int
+    lib.svdep_set_fast_scan.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    
+    lib.svdep_load_scan_cache.restype = ctypes.c_int
+    lib.svdep_load_scan_cache.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    lib.svdep_save_scan_cache.restype = ctypes.c_int
+    lib.svdep_save_scan_cache.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+
+    lib.svdep_set_scan_store.restype = ctypes.c_int
+    lib.svdep_set_scan_store.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    lib.svdep_check_up_to_date_all.restype = ctypes.c_int
+    lib.svdep_check_up_to_date_all.argtypes = [ctypes.c_void_p, ctypes.c_double]
+    
+    lib.svdep_get_check_result.restype = ctypes.c_char_p
+    lib.svdep_get_check_result.argtypes = [ctypes.c_void_p]
+    
+    lib.svdep_get_includers.restype = ctypes.c_char_p
+    lib.svdep_get_includers.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    lib.svdep_get_affected_roots.restype = ctypes.c_char_p
+    lib.svdep_get_affected_roots.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    
+    lib.svdep_get_report.restype = ctypes.c_char_p
+    lib.svdep_get_report.argtypes = [ctypes.c_void_p]
+    
+    lib.svdep_add_path_var.restype = ctypes.c_int
+    lib.svdep_add_path_var.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+    
     return lib
 
 @pytest.fixture
@@ -0,0 +1,96 @@
+"""
+test_fast_scan.py - Differential tests between the fast-path and byte-wise scanners
+"""
+import json
+import random
+import pytest
+from pathlib import Path
+
+# Fragments chosen to exercise the places where the fast path skips bytes:
+# strings (with escapes and continuations), comments, division operators
+# and directives appearing inside non-code regions.
+FRAGMENTS = [
+    'module m; endmodule\n',
+    'assign a = b / c;\n',
+    'assign a = b/c/d;\n',
+    '$display("`include \\"notreal1.svh\\"");\n',
+    '$display("escaped \\\\");\n',
+    '"unterminated string\n',
+    '"line \\\n continued `include \\"notreal2.svh\\""\n',
+    '// `include "notreal3.svh"\n',
+    '/* `include "notreal4.svh" */\n',
+    '/* multi\n * line `include "notreal5.svh"\n */\n',
+    '/*/ odd comment opener */\n',
+    '`include "inc0.svh"\n',
+    '`include "inc1.svh" // trailing comment\n',
+    '`include "inc2.svh" /* trailing\n block */\n',
+    '`include <inc3.svh>\n',
+    '`include `INC_MACRO\n',
+    '`define FOO 1\n',
+    '`define BAR(a, b) a / b \\\n  + "q`uote"\n',
+    '`undef FOO\n',
+    '`ifdef FOO\n`include "inc4.svh"\n`endif\n',
+    '`ifndef FOO\n`include "inc5.svh"\n`else\n`include "inc6.svh"\n`endif\n',
+    '`ifdef BAR\n`elsif FOO\n`include "inc7.svh"\n`endif\n',
+    '`timescale 1ns/1ps\n',
+    "logic [7:0] x = 8'hFF;\n",
+    'wire \\escaped"id ;\n',
+    '`\n',
+    '/',
+]
+
+
+def _build(svdep_lib, tmpdir, root, fast):
+    ctx = svdep_lib.svdep_create()
+    try:
+        svdep_lib.svdep_set_fast_scan(ctx, 1 if fast else 0)
+        svdep_lib.svdep_add_incdir(ctx, str(tmpdir).encode())
+        svdep_lib.svdep_add_root_file(ctx, str(root).encode())
+        assert svdep_lib.svdep_build(ctx) == 0
+        return json.loads(svdep_lib.svdep_get_json(ctx).decode())
+    finally:
+        svdep_lib.svdep_destroy(ctx)
+
+
+def _write_includes(tmpdir):
+    for i in range(8):
+        (Path(tmpdir) / ("inc%d.svh" % i)).write_text("// inc%d\n" % i)
+
+
+def test_fast_scan_matches_bytewise_fragments(svdep_lib, tmp_path):
+    """Each fragment on its own produces the same includes on both paths."""
+    _write_includes(tmp_path)
+    for i, frag in enumerate(FRAGMENTS):
+        root = tmp_path / ("frag%d.sv" % i)
+        root.write_text(frag)
+        fast = _build(svdep_lib, tmp_path, root, True)
+        slow = _build(svdep_lib, tmp_path, root, False)
+        assert fast == slow, "Mismatch on fragment %d: %r" % (i, frag)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fast_scan_matches_bytewise_random(svdep_lib, tmp_path, seed):
+    """Random concatenations of fragments produce the same includes."""
+    _write_includes(tmp_path)
+    rng = random.Random(seed)
+    root = tmp_path / "random.sv"
+    root.write_text("".join(rng.choice(FRAGMENTS) for _ in range(200)))
+
+    fast = _build(svdep_lib, tmp_path, root, True)
+    slow = _build(svdep_lib, tmp_path, root, False)
+    assert fast == slow
+
+
+def test_fast_scan_finds_includes(svdep_lib, tmp_path):
+    """The fast path ignores includes inside strings and comments."""
+    _write_includes(tmp_path)
+    root = tmp_path / "test.sv"
+    root.write_text(
+        '$display("`include \\"notreal.svh\\"");\n'
+        '/* `include "notreal.svh" */ `include "inc0.svh"\n'
+        'assign a = b / c; // `include "notreal.svh"\n'
+        '`include "inc1.svh"\n')
+
+    data = _build(svdep_lib, tmp_path, root, True)
+    includes = [Path(p).name for p in data["root_files"][0]["includes"]]
+    assert includes == ["inc0.svh", "inc1.svh"]
@@ -1,6 +1,7 @@
 """
 test_native_basic.py - Basic tests for the native SVDep library
 """
+import ctypes
 import json
 import os
 import pytest
@@ -125,3 +126,112 @@ def test_check_up_to_date(svdep_lib, svdep_ctx, test_data_dir):
     svdep_lib.svdep_destroy(ctx2)
     
     assert result == 1  # Should be up to date
+
+def test_reverse_dependencies(svdep_lib, svdep_ctx):
+    """Test the reverse-dependency queries."""
+    data = {
+        "root_files": [
+            {"name": "r1", "timestamp": 0, "includes": ["a"]},
+            {"name": "r2", "timestamp": 0, "includes": ["b"]},
+        ],
+        "file_info": {
+            "r1": {"name": "r1", "timestamp": 0, "includes": ["a"]},
+            "r2": {"name": "r2", "timestamp": 0, "includes": ["b"]},
+            "a": {"name": "a", "timestamp": 0, "includes": ["b"]},
+            "b": {"name": "b", "timestamp": 0, "includes": []},
+        },
+    }
+    assert svdep_lib.svdep_load_json(svdep_ctx, json.dumps(data).encode()) == 0
+
+    includers = json.loads(svdep_lib.svdep_get_includers(svdep_ctx, b"b").decode())
+    assert sorted(includers) == ["a", "r2"]
+    roots = json.loads(svdep_lib.svdep_get_affected_roots(svdep_ctx, b"b").decode())
+    assert roots == ["r1", "r2"]
+    roots = json.loads(svdep_lib.svdep_get_affected_roots(svdep_ctx, b"a").decode())
+    assert roots == ["r1"]
+    assert json.loads(svdep_lib.svdep_get_includers(svdep_ctx, b"x").decode()) == []
+
+def test_directory_relative_stat(svdep_lib, svdep_ctx, tmp_path, monkeypatch):
+    """Files are found, and changes seen, whatever form their path takes."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "inc" / "sub").mkdir(parents=True)
+    (tmp_path / "inc" / "sub" / "x.svh").write_text("// x\n")
+    (tmp_path / "top.sv").write_text('`include "sub/x.svh"\n')
+
+    # The first include directory doesn't exist
+    svdep_lib.svdep_add_incdir(svdep_ctx, str(tmp_path / "missing").encode())
+    svdep_lib.svdep_add_incdir(svdep_ctx, b"inc")
+    svdep_lib.svdep_add_root_file(svdep_ctx, b"top.sv")
+    assert svdep_lib.svdep_build(svdep_ctx) == 0
+    data = json.loads(svdep_lib.svdep_get_json(svdep_ctx).decode())
+    assert data["file_info"]["top.sv"]["includes"] == ["inc/sub/x.svh"]
+
+    # Recorded timestamps are rounded to 1us. Leave a margin
+    ts = max(f["timestamp"] for f in data["file_info"].values()) + 1
+    assert svdep_lib.svdep_check_up_to_date(svdep_ctx, ts) == 1
+    os.utime("inc/sub/x.svh", (ts + 10, ts + 10))
+    assert svdep_lib.svdep_check_up_to_date(svdep_ctx, ts) == 0
+    os.remove("inc/sub/x.svh")
+    os.rmdir("inc/sub")
+    assert svdep_lib.svdep_check_up_to_date(svdep_ctx, ts + 20) == 0
+
+def test_path_vars(svdep_lib, svdep_ctx, tmp_path):
+    """Collections written relative to a path variable load in another workspace."""
+    ws1 = tmp_path / "ws1"
+    (ws1 / "inc").mkdir(parents=True)
+    (ws1 / "inc" / "x.svh").write_text("// x\n")
+    (ws1 / "top.sv").write_text('`include "x.svh"\n')
+
+    svdep_lib.svdep_add_path_var(svdep_ctx, b"WS", str(ws1).encode())
+    svdep_lib.svdep_add_incdir(svdep_ctx, str(ws1 / "inc").encode())
+    svdep_lib.svdep_add_root_file(svdep_ctx, str(ws1 / "top.sv").encode())
+    assert svdep_lib.svdep_build(svdep_ctx) == 0
+    data = json.loads(svdep_lib.svdep_get_json(svdep_ctx).decode())
+    assert data["root_files"][0]["name"] == "${WS}/top.sv"
+    assert data["file_info"]["${WS}/top.sv"]["includes"] == ["${WS}/inc/x.svh"]
+
+    ws2 = tmp_path / "ws2"
+    ctx = svdep_lib.svdep_create()
+    try:
+        # The variable must be defined
+        assert svdep_lib.svdep_load_json(ctx, json.dumps(data).encode()) != 0
+        assert b"WS" in svdep_lib.svdep_get_error(ctx)
+
+        svdep_lib.svdep_add_path_var(ctx, b"WS", str(ws2).encode())
+        assert svdep_lib.svdep_load_json(ctx, json.dumps(data).encode()) == 0
+        roots = json.loads(svdep_lib.svdep_get_affected_roots(ctx, str(ws2 / "inc" / "x.svh").encode()).decode())
+        assert roots == [str(ws2 / "top.sv")]
+    finally:
+        svdep_lib.svdep_destroy(ctx)
+
+def test_load_json_units(svdep_lib):
+    """Collections loaded in one batch share the entries of common files"""
+    def info(name, includes=[]):
+        return {"name": name, "timestamp": 1.0, "includes": includes}
+    data = {
+        "files": [info("a", ["c"]), info("b", ["c"]), info("c")],
+        "units": [
+            {"root_files": [info("a", ["c"])], "file_info": [0, 2]},
+            None,
+            {"root_files": [info("b", ["c"])], "file_info": [1, 2]},
+        ],
+    }
+    ctxs = [svdep_lib.svdep_create() for _ in range(3)]
+    ctx_a = (ctypes.c_void_p * 3)(*ctxs)
+    try:
+        assert svdep_lib.svdep_load_json_units(ctx_a, 3, json.dumps(data).encode()) == 0
+        for ctx, files in zip(ctxs, [["a", "c"], [], ["b", "c"]]):
+            loaded = json.loads(svdep_lib.svdep_get_json(ctx).decode())
+            assert sorted(loaded["file_info"].keys()) == files
+        assert json.loads(svdep_lib.svdep_get_includers(ctxs[2], b"c").decode()) == ["b"]
+
+        # Every context must have a unit, and each index a file
+        data["units"].pop()
+        assert svdep_lib.svdep_load_json_units(ctx_a, 3, json.dumps(data).encode()) != 0
+        assert svdep_lib.svdep_get_error(ctxs[0]) == b"Fewer collections than contexts"
+        data["units"].append({"root_files": [], "file_info": [3]})
+        assert svdep_lib.svdep_load_json_units(ctx_a, 3, json.dumps(data).encode()) != 0
+        assert svdep_lib.svdep_get_error(ctxs[2]) == b"File index out of range"
+    finally:
+        for ctx in ctxs:
+            svdep_lib.svdep_destroy(ctx)
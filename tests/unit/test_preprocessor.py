@@ -456,3 +456,68 @@ def test_undef_then_ifdef_protected_missing(svdep_lib):
         root_info = data["root_files"][0]
         assert len(root_info["includes"]) == 1
         assert "foo.svh" in root_info["includes"][0]
+
+
+def test_add_define(svdep_lib):
+    """Test that user-supplied defines are visible to ifdef."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_file = Path(tmpdir) / "test.sv"
+        foo_svh = Path(tmpdir) / "foo.svh"
+        
+        test_file.write_text('''
+`ifdef USER_DEFINE
+`include "foo.svh"
+`else
+`include "missing.svh"
+`endif
+''')
+        foo_svh.write_text("// foo.svh\n")
+        
+        ctx = svdep_lib.svdep_create()
+        assert svdep_lib.svdep_add_define(ctx, b"USER_DEFINE", None) == 0
+        svdep_lib.svdep_add_incdir(ctx, tmpdir.encode())
+        svdep_lib.svdep_add_root_file(ctx, str(test_file).encode())
+        
+        result = svdep_lib.svdep_build(ctx)
+        assert result == 0
+        
+        json_str = svdep_lib.svdep_get_json(ctx)
+        data = json.loads(json_str.decode())
+        svdep_lib.svdep_destroy(ctx)
+        
+        root_info = data["root_files"][0]
+        assert len(root_info["includes"]) == 1
+        assert "foo.svh" in root_info["includes"][0]
+
+
+def test_compilation_unit_macro_flow(svdep_lib):
+    """Test that macros defined in an include reach the includer in compilation-unit mode."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_file = Path(tmpdir) / "test.sv"
+        cfg_svh = Path(tmpdir) / "cfg.svh"
+        foo_svh = Path(tmpdir) / "foo.svh"
+        
+        test_file.write_text('''
+`include "cfg.svh"
+`ifdef FROM_CFG
+`include "foo.svh"
+`endif
+''')
+        cfg_svh.write_text("`define FROM_CFG\n")
+        foo_svh.write_text("// foo.svh\n")
+        
+        for unit, n_includes in ((0, 1), (1, 2)):
+            ctx = svdep_lib.svdep_create()
+            svdep_lib.svdep_set_compilation_unit(ctx, unit)
+            svdep_lib.svdep_add_incdir(ctx, tmpdir.encode())
+            svdep_lib.svdep_add_root_file(ctx, str(test_file).encode())
+            
+            result = svdep_lib.svdep_build(ctx)
+            assert result == 0
+            
+            json_str = svdep_lib.svdep_get_json(ctx)
+            data = json.loads(json_str.decode())
+            svdep_lib.svdep_destroy(ctx)
+            
+            root_info = data["root_files"][0]
+            assert len(root_info["includes"]) == n_includes